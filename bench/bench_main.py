@@ -0,0 +1,250 @@
+"""
+Point d'entrée du banc de charge.
+
+Lance le vrai serveur dans un processus dédié sur localhost, puis quelques
+processus générateurs de charge (voir loadgen.py) qui pilotent des milliers
+de clients virtuels. Le rapport donne :
+- les débits (MSG envoyés et trames MSG_BROADCAST reçues par seconde)
+- la latence de diffusion p50 / p99 / p999
+- le temps CPU et la mémoire (RSS max) du processus serveur
+
+Le rapport est écrit en JSON (sortie standard ou --json) et peut être ajouté
+comme une ligne à un fichier CSV (--csv) pour suivre les régressions d'une
+version à l'autre.
+
+Exemple :
+    python -m bench.bench_main --clients 2000 --workers 4 --rooms 50 --msg-rate 0.5
+
+Latence du chat pendant des transferts de fichiers : la même charge, puis
+avec des fichiers de 10 Mo envoyés en continu (--file-rate, --file-size) ;
+le p99 doit rester du même ordre (voir les priorités dans outbound.py) :
+    python -m bench.bench_main --clients 200 --rooms 10 --msg-rate 1
+    python -m bench.bench_main --clients 200 --rooms 10 --msg-rate 1 --file-rate 0.005 --file-size 10000000
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bench.loadgen import LatencyHistogram, LoadProfile, run_worker, raise_file_limit
+from server.server import ChatServer
+from server.actors import ActorChatServer
+from server.async_server import AsyncChatServer
+from server.server_main import (
+    run_socket_server, ENGINE_THREAD, ENGINE_ASYNCIO, CONCURRENCY_LOCK, CONCURRENCY_ACTORS,
+)
+
+HOST = "127.0.0.1"
+
+# Délai max (secondes) de démarrage du serveur et de fin des générateurs
+SERVER_START_TIMEOUT = 10.0
+WORKER_GRACE = 30.0
+
+# Colonnes du fichier CSV (une ligne par exécution)
+CSV_FIELDS = (
+    "timestamp", "engine", "concurrency", "clients", "rooms", "msg_rate", "churn_rate",
+    "file_rate", "file_size", "duration", "connected", "messages_per_s", "deliveries_per_s",
+    "file_bytes_per_s",
+    "latency_p50_ms", "latency_p99_ms", "latency_p999_ms",
+    "server_cpu_percent", "server_max_rss_mb", "errors",
+)
+
+
+def serve(conn, host: str, port: int, engine: str, concurrency: str, presence_tick: float):
+    """
+    Processus serveur : sert les clients jusqu'à la demande d'arrêt,
+    puis renvoie sa consommation CPU et mémoire.
+    """
+    raise_file_limit()
+
+    # Les traces par connexion du serveur fausseraient la mesure
+    sys.stdout = open(os.devnull, "w")
+
+    server_class = ActorChatServer if concurrency == CONCURRENCY_ACTORS else ChatServer
+    server = server_class(presence_tick=presence_tick or None)
+
+    if engine == ENGINE_ASYNCIO:
+        target = AsyncChatServer(server, host, port, backlog=4096).run
+    else:
+        target = lambda: run_socket_server(server, host, port)
+    threading.Thread(target=target, daemon=True).start()
+
+    usage_at_start = _usage()
+    conn.recv()  # Attendre la fin de la mesure
+    usage_at_end = _usage()
+
+    conn.send({
+        "cpu_seconds": usage_at_end["cpu_seconds"] - usage_at_start["cpu_seconds"],
+        "max_rss_mb": usage_at_end["max_rss_mb"],
+    })
+
+
+def _usage() -> dict:
+    """Temps CPU et RSS max du processus courant (None si indisponible)."""
+    try:
+        import resource
+    except ImportError:
+        return {"cpu_seconds": 0.0, "max_rss_mb": None}
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss est en Kio sous Linux, en octets sous macOS
+    rss_bytes = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return {
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "max_rss_mb": round(rss_bytes / (1024 * 1024), 1),
+    }
+
+
+def free_port(host: str) -> int:
+    """Demande au système un port libre."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(host: str, port: int, timeout: float = SERVER_START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1.0).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Le serveur n'a pas démarré")
+            time.sleep(0.05)
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def build_report(args, results: list, server_usage: dict) -> dict:
+    """
+    Fusionne les compteurs des générateurs en un rapport.
+    """
+    totals = {}
+    latency = LatencyHistogram()
+    for result in results:
+        latency.merge(LatencyHistogram(result.pop("latency")))
+        for name, value in result.items():
+            totals[name] = totals.get(name, 0) + value
+
+    cpu_seconds = server_usage["cpu_seconds"]
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "engine": args.engine,
+        "concurrency": args.concurrency,
+        "clients": args.clients,
+        "workers": args.workers,
+        "rooms": args.rooms,
+        "msg_rate": args.msg_rate,
+        "churn_rate": args.churn_rate,
+        "file_rate": args.file_rate,
+        "file_size": args.file_size,
+        "message_size": args.message_size,
+        "duration": args.duration,
+        **totals,
+        "messages_per_s": round(totals.get("messages_sent", 0) / args.duration, 1),
+        "deliveries_per_s": round(totals.get("deliveries", 0) / args.duration, 1),
+        "file_bytes_per_s": round(totals.get("file_bytes", 0) / args.duration),
+        "latency_p50_ms": _ms(latency.percentile(50)),
+        "latency_p99_ms": _ms(latency.percentile(99)),
+        "latency_p999_ms": _ms(latency.percentile(99.9)),
+        "server_cpu_seconds": round(cpu_seconds, 2),
+        "server_cpu_percent": round(100 * cpu_seconds / (args.ramp + args.duration), 1),
+        "server_max_rss_mb": server_usage["max_rss_mb"],
+    }
+
+
+def append_csv(path: str, report: dict):
+    """Ajoute le rapport comme une ligne du fichier CSV (en-tête si nouveau)."""
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerow(report)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de charge du serveur de chat")
+    parser.add_argument("--clients", type=int, default=1000, help="Nombre de clients virtuels")
+    parser.add_argument("--workers", type=int, default=4, help="Processus générateurs de charge")
+    parser.add_argument("--rooms", type=int, default=20, help="Nombre de salons")
+    parser.add_argument("--msg-rate", type=float, default=0.5, help="MSG par seconde et par client")
+    parser.add_argument("--churn-rate", type=float, default=0.0, help="Changements de salon par seconde et par client")
+    parser.add_argument("--file-rate", type=float, default=0.0, help="FILE_OFFER par seconde et par client")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024, help="Taille (octets) des fichiers envoyés")
+    parser.add_argument("--message-size", type=int, default=64, help="Taille (caractères) des MSG")
+    parser.add_argument("--duration", type=float, default=10.0, help="Durée de la mesure (secondes)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Durée d'étalement des connexions (secondes)")
+    parser.add_argument("--engine", choices=(ENGINE_THREAD, ENGINE_ASYNCIO), default=ENGINE_ASYNCIO)
+    parser.add_argument("--concurrency", choices=(CONCURRENCY_LOCK, CONCURRENCY_ACTORS), default=CONCURRENCY_LOCK)
+    parser.add_argument("--presence-tick", type=float, default=0.03, help="0 = présences envoyées une à une")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur aléatoire")
+    parser.add_argument("--json", help="Fichier JSON du rapport (défaut : sortie standard)")
+    parser.add_argument("--csv", help="Fichier CSV auquel ajouter le rapport")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    port = free_port(HOST)
+
+    # Serveur
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server_process = multiprocessing.Process(
+        target=serve,
+        args=(child_conn, HOST, port, args.engine, args.concurrency, args.presence_tick),
+        daemon=True,
+    )
+    server_process.start()
+    wait_for_server(HOST, port)
+
+    # Générateurs de charge
+    profile = LoadProfile(args.rooms, args.msg_rate, args.churn_rate, args.file_rate, args.message_size,
+                          args.file_size)
+    result_queue = multiprocessing.Queue()
+    start_at = time.time() + 0.5
+    workers = []
+    for worker_id in range(args.workers):
+        count = args.clients // args.workers + (1 if worker_id < args.clients % args.workers else 0)
+        worker = multiprocessing.Process(
+            target=run_worker,
+            args=(result_queue, HOST, port, count, profile, start_at,
+                  args.ramp, args.duration, worker_id, args.seed),
+            daemon=True,
+        )
+        worker.start()
+        workers.append(worker)
+
+    timeout = 0.5 + args.ramp + args.duration + WORKER_GRACE
+    results = [result_queue.get(timeout=timeout) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    parent_conn.send("stop")
+    server_usage = parent_conn.recv()
+    server_process.join()
+
+    report = build_report(args, results, server_usage)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.csv:
+        append_csv(args.csv, report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
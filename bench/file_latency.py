@@ -0,0 +1,276 @@
+"""
+Latence du chat pendant un transfert de fichier, côté serveur.
+
+Un destinataire (Bob) est relié au vrai serveur (ChatServer, FileRelay,
+file d'envoi et thread écrivain) par une socketpair lue à débit fixe, comme
+un lien réseau. Charlie envoie un MSG horodaté toutes les quelques
+millisecondes ; pendant ce temps, Alice envoie un gros fichier à Bob, au
+rythme que permet la réserve du transfert. Bob mesure la latence de chaque
+MSG_BROADCAST, sans puis avec le transfert.
+
+Avec les priorités des files d'envoi (voir server/outbound.py), le p99 du
+chat reste du même ordre pendant le transfert : un message n'attend jamais
+plus d'une écriture de fichier (bulk_burst), quelle que soit la taille du
+fichier. Le banc mesure le serveur seul : les clients ne partagent pas le
+processeur avec d'autres processus, contrairement à bench_main.
+
+Usage :
+    python -m bench.file_latency                   # mesure et compare à la référence
+    python -m bench.file_latency --save            # enregistre la référence
+    python -m bench.file_latency --link-rate 2     # lien plus lent
+
+Le code de sortie vaut 1 si le fichier n'arrive pas entier, si le p99 du chat
+pendant le transfert dépasse le budget (--max-p99-ms), ou s'il dépasse celui
+de la référence (mêmes taille de fichier et débit) au-delà du seuil
+(--threshold).
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bench.loadgen import LatencyHistogram
+from bench.micro import NullSocket
+from common.protocol import *
+from server.file_relay import FileRelay, SPOOL_BYTES
+from server.outbound import ClientWriter
+from server.server import ChatServer, ClientContext
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "file_latency_baseline.json")
+
+# Budget absolu (ms) du p99 du chat pendant un transfert
+P99_BUDGET_MS = 40.0
+
+# Dégradation tolérée du p99 par rapport à la référence (2.0 = deux fois plus lent)
+DEFAULT_THRESHOLD = 2.0
+
+ROOM = "bench-fichiers"
+
+# Tampon d'envoi du noyau réduit : l'attente se fait dans la file d'envoi du serveur
+SOCKET_BUFFER = 16 * 1024
+
+# Octets lus par appel côté destinataire
+READ_SIZE = 16 * 1024
+
+# Délai max (secondes) d'un transfert
+TRANSFER_TIMEOUT = 120.0
+
+_TIMESTAMP_PREFIX = "t="
+
+
+def _join(server: ChatServer, client: ClientContext, pseudo: str):
+    server.handle_login(client, LOGIN, pack_string(pseudo))
+    server.handle_join(client, pack_string(ROOM))
+
+
+def run_scenario(file_size: int, link_rate: float, duration: float = 2.0,
+                 msg_interval: float = 0.005) -> dict:
+    """
+    Mesure la latence du chat reçu par Bob, avec un transfert de file_size
+    octets vers lui (0 = sans transfert).
+
+    Args:
+        file_size: Taille (octets) du fichier envoyé pendant la mesure
+        link_rate: Débit (octets par seconde) du lien vers Bob
+        duration: Durée (secondes) de la mesure sans transfert ; avec un
+                  transfert, la mesure dure jusqu'à sa fin
+        msg_interval: Intervalle (secondes) entre deux MSG
+
+    Returns:
+        dict: Latences (ms) et débit de fichier reçu
+    """
+    server = ChatServer(file_relay=FileRelay())
+    srv_sock, peer = socket.socketpair()
+    srv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    peer.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    peer.settimeout(0.5)
+
+    bob = ClientContext(srv_sock)
+    bob.outbox = server.create_outbox()
+    bob.writer = ClientWriter(srv_sock, bob.outbox)
+    bob.writer.start()
+    _join(server, bob, "Bob")
+    alice, charlie = ClientContext(NullSocket()), ClientContext(NullSocket())
+    _join(server, alice, "Alice")
+    _join(server, charlie, "Charlie")
+
+    latency = LatencyHistogram()
+    received = {"file_bytes": 0}
+    file_done = threading.Event()
+    stop = threading.Event()
+
+    def read():
+        """Bob : lit au débit du lien et horodate les MSG_BROADCAST reçus."""
+        decoder = FrameDecoder()
+        start = time.monotonic()
+        total = 0
+        while not stop.is_set():
+            try:
+                data = peer.recv(READ_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not data:
+                break
+            total += len(data)
+            decoder.feed(data)
+            for msg_type, payload in decoder:
+                if msg_type == MSG_BROADCAST:
+                    text = decode_payload(MSG_BROADCAST, payload).text
+                    if text.startswith(_TIMESTAMP_PREFIX):
+                        sent_at = int(text[len(_TIMESTAMP_PREFIX):text.index(";")])
+                        latency.record((time.monotonic_ns() - sent_at) / 1e9)
+                elif msg_type == FILE_DATA:
+                    received["file_bytes"] += len(unpack_file_data(payload)[3])
+                elif msg_type == FILE_END:
+                    file_done.set()
+            # Débit du lien : ne pas lire plus vite que link_rate
+            delay = start + total / link_rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def chat():
+        """Charlie : un MSG horodaté toutes les msg_interval secondes."""
+        while not stop.is_set():
+            server.handle_msg(charlie, pack_string(f"{_TIMESTAMP_PREFIX}{time.monotonic_ns()};"))
+            time.sleep(msg_interval)
+
+    def upload():
+        """Alice : envoie le fichier, sans dépasser la moitié de la réserve du transfert."""
+        server.dispatch(alice, FILE_OFFER, encode_payload(FILE_OFFER, "bench.wav", file_size, ""))
+        transfer_id = alice.pending_file.id
+        for client in (bob, charlie):
+            server.dispatch(client, FILE_ACCEPT, encode_payload(FILE_ACCEPT, transfer_id))
+        transfer = server.files.get(transfer_id)
+        chunk = bytes(FILE_CHUNK_SIZE)
+        for offset in range(0, file_size, FILE_CHUNK_SIZE):
+            while transfer.spooled > SPOOL_BYTES // 2 and not stop.is_set():
+                time.sleep(0.001)
+            data = chunk[:min(FILE_CHUNK_SIZE, file_size - offset)]
+            server.dispatch(alice, FILE_DATA, pack_file_data(transfer_id, offset, data))
+        server.dispatch(alice, FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK))
+
+    threads = [threading.Thread(target=read, daemon=True), threading.Thread(target=chat, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    start = time.monotonic()
+    if file_size:
+        threading.Thread(target=upload, daemon=True).start()
+        file_done.wait(TRANSFER_TIMEOUT)
+    else:
+        time.sleep(duration)
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    bob.outbox.close()
+    server.files.stop()
+    srv_sock.close()
+    peer.close()
+
+    def ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 3)
+
+    return {
+        "file_size": file_size,
+        "messages": latency.total,
+        "latency_p50_ms": ms(latency.percentile(50)),
+        "latency_p99_ms": ms(latency.percentile(99)),
+        "latency_p999_ms": ms(latency.percentile(99.9)),
+        "file_complete": received["file_bytes"] == file_size and (file_done.is_set() or not file_size),
+        "file_mb_per_s": round(received["file_bytes"] / elapsed / 1e6, 2),
+    }
+
+
+def check(report: dict, baseline: dict, budget: float = P99_BUDGET_MS,
+          threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Compare une mesure au budget et à la référence.
+
+    Returns:
+        list: Les problèmes trouvés (vide si tout va bien)
+    """
+    transfer = report["chat_with_transfer"]
+    problems = []
+    if not transfer["file_complete"]:
+        problems.append("fichier incomplet")
+    p99 = transfer["latency_p99_ms"]
+    if p99 is None:
+        return problems + ["aucun message reçu pendant le transfert"]
+    if p99 > budget:
+        problems.append(f"p99 {p99} ms > budget {budget} ms")
+
+    reference = baseline.get("chat_with_transfer")
+    if (reference and baseline.get("link_rate_mb_per_s") == report["link_rate_mb_per_s"]
+            and reference["file_size"] == transfer["file_size"] and reference["latency_p99_ms"]):
+        ratio = p99 / reference["latency_p99_ms"]
+        if ratio > threshold:
+            problems.append(f"p99 {p99} ms = x{ratio:.2f} la référence ({reference['latency_p99_ms']} ms)")
+    return problems
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(report: dict, path: str = BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Latence du chat pendant un transfert de fichier")
+    parser.add_argument("--file-size", type=int, default=10 * 1000 * 1000, help="Taille (octets) du fichier")
+    parser.add_argument("--link-rate", type=float, default=10.0, help="Débit (Mo/s) du lien vers le destinataire")
+    parser.add_argument("--duration", type=float, default=2.0, help="Durée (secondes) de la mesure sans transfert")
+    parser.add_argument("--msg-interval", type=float, default=0.005, help="Intervalle (secondes) entre deux MSG")
+    parser.add_argument("--max-p99-ms", type=float, default=P99_BUDGET_MS,
+                        help="Budget (ms) du p99 du chat pendant le transfert")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Dégradation tolérée du p99 (2.0 = deux fois la référence)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Fichier de référence")
+    parser.add_argument("--save", action="store_true", help="Enregistrer la mesure comme référence")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    link_rate = args.link_rate * 1e6
+    # Les traces par connexion du serveur fausseraient la mesure
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = {
+            "link_rate_mb_per_s": args.link_rate,
+            "chat_only": run_scenario(0, link_rate, args.duration, args.msg_interval),
+            "chat_with_transfer": run_scenario(args.file_size, link_rate, args.duration, args.msg_interval),
+        }
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        save_baseline(report, args.baseline)
+        print(f"Référence enregistrée : {args.baseline}")
+        return 0
+
+    problems = check(report, load_baseline(args.baseline), args.max_p99_ms, args.threshold)
+    if problems:
+        print("\nRÉGRESSION :")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+"""
+loadgen.py
+
+Générateur de charge : des clients virtuels (asyncio) qui parlent le vrai
+protocole avec le serveur.
+
+Chaque client virtuel se connecte, fait LOGIN puis JOIN, et déclenche des
+actions au hasard (arrivées de Poisson) selon les débits demandés :
+- MSG : le texte porte l'instant d'envoi, ce qui permet aux membres du salon
+  de mesurer la latence de diffusion à la réception du MSG_BROADCAST
+- JOIN vers un autre salon (rotation des membres)
+- FILE_OFFER : les autres membres acceptent automatiquement le FILE_REQUEST,
+  puis l'émetteur envoie le fichier (FILE_DATA) au rythme de sa connexion,
+  pendant qu'il continue à discuter : les latences de diffusion mesurées
+  pendant les transferts montrent si les fichiers retardent le chat
+
+Les horodatages utilisent time.monotonic_ns, commune à tous les processus
+d'une même machine : serveur et clients doivent tourner sur le même hôte.
+"""
+
+import asyncio
+import math
+import random
+import time
+from common.protocol import *
+
+# Préfixe des pseudos et des salons créés par le banc de test
+BENCH_PREFIX = "bench"
+
+# Capacités annoncées (celles du client graphique)
+BENCH_CAPABILITIES = CAP_PRESENCE_BATCH | CAP_ROOM_SNAPSHOT | CAP_DIRECTORY
+
+# Délai max (secondes) pour LOGIN / JOIN et pour la réponse à un FILE_OFFER
+REPLY_TIMEOUT = 10.0
+FILE_OFFER_TIMEOUT = 5.0
+
+# Temps (secondes) laissé aux dernières diffusions avant la fermeture
+DRAIN_DELAY = 0.5
+
+_TIMESTAMP_PREFIX = "t="
+
+# Contenu des fichiers envoyés (un morceau, réutilisé)
+_FILE_CONTENT = bytes(FILE_CHUNK_SIZE)
+
+
+class LatencyHistogram:
+    """
+    Histogramme de latences à précision relative constante (~1 %).
+
+    Mémoire bornée quel que soit le nombre de mesures, et fusionnable :
+    chaque processus envoie ses compteurs, le processus principal les additionne.
+    """
+
+    GROWTH = 1.01
+    _LOG_GROWTH = math.log(GROWTH)
+
+    def __init__(self, counts: dict = None):
+        # indice de case → nombre de mesures
+        self.counts = dict(counts or {})
+        self.total = sum(self.counts.values())
+
+    def record(self, seconds: float):
+        microseconds = max(seconds * 1e6, 1.0)
+        index = int(math.log(microseconds) / self._LOG_GROWTH)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+
+    def percentile(self, p: float) -> float:
+        """
+        Latence (secondes) sous laquelle se trouvent p % des mesures,
+        None s'il n'y a aucune mesure.
+        """
+        if not self.total:
+            return None
+        rank = math.ceil(self.total * p / 100)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # Milieu (géométrique) de la case
+                return self.GROWTH ** (index + 0.5) / 1e6
+        return None
+
+
+class LoadStats:
+    """
+    Compteurs d'un processus générateur de charge.
+    """
+
+    def __init__(self):
+        self.connected = 0
+        self.connect_failures = 0
+        self.messages_sent = 0
+        self.deliveries = 0
+        self.joins = 0
+        self.file_offers = 0
+        self.file_starts = 0
+        self.file_bytes = 0  # Octets de fichiers reçus
+        self.file_ends = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self) -> dict:
+        result = dict(vars(self))
+        result["latency"] = self.latency.counts
+        return result
+
+
+class LoadProfile:
+    """
+    Paramètres de la charge générée par chaque client virtuel.
+    """
+
+    def __init__(self, rooms: int = 10, msg_rate: float = 1.0, churn_rate: float = 0.0,
+                 file_rate: float = 0.0, message_size: int = 64, file_size: int = 1024 * 1024):
+        """
+        Args:
+            rooms: Nombre de salons entre lesquels les clients se répartissent
+            msg_rate: MSG par seconde et par client
+            churn_rate: Changements de salon par seconde et par client
+            file_rate: FILE_OFFER par seconde et par client
+            message_size: Taille (caractères) du texte des MSG
+            file_size: Taille (octets) des fichiers proposés et envoyés
+        """
+        self.rooms = rooms
+        self.msg_rate = msg_rate
+        self.churn_rate = churn_rate
+        self.file_rate = file_rate
+        self.message_size = max(len(_TIMESTAMP_PREFIX) + 20, min(message_size, MAX_MSG_LEN))
+        self.file_size = min(file_size, MAX_FILE_SIZE)
+
+    @property
+    def event_rate(self) -> float:
+        return self.msg_rate + self.churn_rate + self.file_rate
+
+
+class VirtualClient:
+    """
+    Un client simulé : une connexion, une tâche de lecture, une boucle d'actions.
+    """
+
+    def __init__(self, pseudo: str, room_index: int, profile: LoadProfile,
+                 stats: LoadStats, rng: random.Random, measure_from_ns: int):
+        self.pseudo = pseudo
+        self.room_index = room_index
+        self.profile = profile
+        self.stats = stats
+        self.rng = rng
+        self.measure_from_ns = measure_from_ns
+
+        self.writer = None
+        self.logged_in = asyncio.Event()
+        self.joined = asyncio.Event()
+        self.file_done = asyncio.Event()
+        self.file_done.set()
+        self.uploads = set()  # Envois de fichiers en cours
+
+    def room_name(self) -> str:
+        return f"{BENCH_PREFIX}-{self.room_index}"
+
+    def _send(self, msg_type: int, payload: bytes = b""):
+        self.writer.write(pack_message(msg_type, payload))
+
+    async def run(self, host: str, port: int, stop_at: float):
+        """
+        Joue le scénario jusqu'à l'instant stop_at (time.monotonic()).
+        """
+        try:
+            reader, self.writer = await asyncio.open_connection(host, port)
+        except OSError:
+            self.stats.connect_failures += 1
+            return
+
+        read_task = asyncio.create_task(self._read_loop(reader))
+        try:
+            self._send(LOGIN, pack_login(self.pseudo, BENCH_CAPABILITIES))
+            await asyncio.wait_for(self.logged_in.wait(), REPLY_TIMEOUT)
+
+            self._send(JOIN, encode_payload(JOIN, self.room_name()))
+            await asyncio.wait_for(self.joined.wait(), REPLY_TIMEOUT)
+            self.stats.connected += 1
+
+            await self._act(stop_at)
+
+            # Laisser arriver les diffusions encore en route
+            await asyncio.sleep(DRAIN_DELAY)
+
+        except (asyncio.TimeoutError, ConnectionError, OSError):
+            self.stats.connect_failures += 1
+
+        finally:
+            read_task.cancel()
+            for upload in self.uploads:
+                upload.cancel()
+            self.writer.close()
+
+    async def _act(self, stop_at: float):
+        rate = self.profile.event_rate
+        if rate <= 0:
+            await asyncio.sleep(max(0.0, stop_at - time.monotonic()))
+            return
+
+        while True:
+            delay = self.rng.expovariate(rate)
+            if time.monotonic() + delay >= stop_at:
+                await asyncio.sleep(max(0.0, stop_at - time.monotonic()))
+                return
+            await asyncio.sleep(delay)
+
+            # Pendant un transfert en attente, le serveur refuse MSG et JOIN
+            if not self.file_done.is_set():
+                try:
+                    await asyncio.wait_for(self.file_done.wait(), FILE_OFFER_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.file_done.set()
+                continue
+
+            draw = self.rng.random() * rate
+            if draw < self.profile.msg_rate:
+                self._send_timestamped_msg()
+            elif draw < self.profile.msg_rate + self.profile.churn_rate:
+                self._change_room()
+            else:
+                self._offer_file()
+
+            await self.writer.drain()
+
+    def _send_timestamped_msg(self):
+        sent_at = time.monotonic_ns()
+        text = f"{_TIMESTAMP_PREFIX}{sent_at};"
+        text += "x" * (self.profile.message_size - len(text))
+        self._send(MSG, encode_payload(MSG, text))
+        if sent_at >= self.measure_from_ns:
+            self.stats.messages_sent += 1
+
+    def _change_room(self):
+        if self.profile.rooms < 2:
+            return
+        offset = self.rng.randrange(1, self.profile.rooms)
+        self.room_index = (self.room_index + offset) % self.profile.rooms
+        self._send(JOIN, encode_payload(JOIN, self.room_name()))
+        self.stats.joins += 1
+
+    def _offer_file(self):
+        self.file_done.clear()
+        self._send(FILE_OFFER, encode_payload(FILE_OFFER, f"{self.pseudo}.wav", self.profile.file_size, ""))
+        self.stats.file_offers += 1
+
+    async def _send_file(self, transfer_id: int):
+        """Envoie le fichier accepté, un morceau à la fois, au rythme de la connexion."""
+        size = self.profile.file_size
+        try:
+            for offset in range(0, size, FILE_CHUNK_SIZE):
+                chunk = _FILE_CONTENT[:min(FILE_CHUNK_SIZE, size - offset)]
+                self._send(FILE_DATA, pack_file_data(transfer_id, offset, chunk))
+                await self.writer.drain()
+            self._send(FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK))
+        except (ConnectionError, OSError):
+            pass
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        decoder = FrameDecoder(max_frame=None)
+        while True:
+            data = await reader.read(RECV_BUFFER_SIZE)
+            if not data:
+                return
+            decoder.feed(data)
+            for msg_type, payload in decoder:
+                self._on_frame(msg_type, payload)
+
+    def _on_frame(self, msg_type: int, payload: bytes):
+        if msg_type == MSG_BROADCAST:
+            received_at = time.monotonic_ns()
+            text = decode_payload(MSG_BROADCAST, payload).text
+            if text.startswith(_TIMESTAMP_PREFIX):
+                sent_at = int(text[len(_TIMESTAMP_PREFIX):text.index(";")])
+                if sent_at >= self.measure_from_ns:
+                    self.stats.deliveries += 1
+                    self.stats.latency.record((received_at - sent_at) / 1e9)
+
+        elif msg_type == PING:
+            self._send(PONG)
+
+        elif msg_type == LOGIN_OK:
+            self.logged_in.set()
+
+        elif msg_type == JOIN_OK:
+            self.joined.set()
+
+        elif msg_type == FILE_REQUEST:
+            transfer_id = decode_payload(FILE_REQUEST, payload).transfer
+            self._send(FILE_ACCEPT, encode_payload(FILE_ACCEPT, transfer_id))
+
+        elif msg_type == FILE_START:
+            start = decode_payload(FILE_START, payload)
+            if start.sender == self.pseudo:
+                # Notre offre est acceptée : l'envoi se fait en parallèle du chat
+                upload = asyncio.create_task(self._send_file(start.transfer))
+                self.uploads.add(upload)
+                upload.add_done_callback(self.uploads.discard)
+                self.file_done.set()
+            self.stats.file_starts += 1
+
+        elif msg_type == FILE_CANCEL:
+            self.file_done.set()
+
+        elif msg_type == FILE_DATA:
+            self.stats.file_bytes += len(unpack_file_data(payload)[3])
+
+        elif msg_type == FILE_END:
+            self.stats.file_ends += 1
+
+        elif msg_type in (ERROR, LOGIN_ERR):
+            self.stats.errors += 1
+            self.file_done.set()
+
+
+async def run_clients(host: str, port: int, count: int, profile: LoadProfile,
+                      start_at: float, ramp: float, duration: float,
+                      worker_id: int = 0, seed: int = 0) -> LoadStats:
+    """
+    Lance `count` clients virtuels et attend la fin du scénario.
+
+    Les connexions sont étalées sur `ramp` secondes à partir de start_at
+    (time.time(), commun à tous les processus) ; la mesure couvre ensuite
+    `duration` secondes.
+
+    Returns:
+        LoadStats: Les compteurs de ce processus
+    """
+    stats = LoadStats()
+    rng = random.Random(seed * 1000003 + worker_id)
+
+    # Conversion des instants « horloge murale » en instants monotones
+    offset = time.monotonic() - time.time()
+    start = start_at + offset
+    measure_from = start + ramp
+    stop_at = measure_from + duration
+    measure_from_ns = int(measure_from * 1e9)
+
+    async def start_client(index: int):
+        await asyncio.sleep(max(0.0, start + ramp * index / max(count, 1) - time.monotonic()))
+        client = VirtualClient(
+            f"{BENCH_PREFIX}{worker_id}-{index}",
+            (worker_id * count + index) % max(profile.rooms, 1),
+            profile, stats, random.Random(rng.random()), measure_from_ns,
+        )
+        await client.run(host, port, stop_at)
+
+    await asyncio.gather(*(start_client(i) for i in range(count)))
+    return stats
+
+
+def run_worker(result_queue, host: str, port: int, count: int, profile: LoadProfile,
+               start_at: float, ramp: float, duration: float, worker_id: int, seed: int):
+    """
+    Point d'entrée d'un processus générateur de charge.
+    """
+    raise_file_limit()
+    stats = asyncio.run(run_clients(host, port, count, profile, start_at, ramp, duration, worker_id, seed))
+    result_queue.put(stats.to_dict())
+
+
+def raise_file_limit():
+    """
+    Relève la limite de descripteurs ouverts au maximum autorisé
+    (une socket par client virtuel).
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
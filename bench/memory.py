@@ -0,0 +1,130 @@
+"""
+Mémoire occupée par connexion côté serveur.
+
+Crée N connexions sur des sockets en mémoire, les fait passer par les vrais
+handlers (LOGIN, puis JOIN pour les connexions « dans un salon ») et mesure
+avec tracemalloc la mémoire Python allouée par connexion :
+ClientContext, file d'envoi, entrées dans les index du serveur (clients,
+salons, annuaire), pseudo et nom de salon.
+
+Ne sont pas comptés : l'objet socket et les tampons du noyau, ainsi que le
+thread écrivain (moteur à threads) ou la tâche d'écriture (moteur asyncio).
+
+Budget par connexion (vérifié par tests/test_memory.py) :
+- connexion inactive (authentifiée, hors salon) : IDLE_CONNECTION_BUDGET
+- connexion dans un salon                      : IN_ROOM_CONNECTION_BUDGET
+
+Usage :
+    python -m bench.memory --connections 10000 --room-size 50
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.protocol import *
+from server.server import ChatServer, ClientContext
+
+# Budgets (octets par connexion)
+IDLE_CONNECTION_BUDGET = 800
+IN_ROOM_CONNECTION_BUDGET = 900
+
+# Les présences sont vidées à la main : le tick automatique ne doit pas se déclencher
+_PRESENCE_TICK = 3600.0
+
+
+class NullSocket:
+    """Socket en mémoire partagée par toutes les connexions : les envois sont oubliés."""
+
+    def send(self, data):
+        return len(data)
+
+    sendall = send
+
+    def close(self):
+        pass
+
+
+def measure_connections(count: int, in_room: bool, room_size: int = 50) -> float:
+    """
+    Mesure la mémoire allouée par connexion.
+
+    Args:
+        count: Nombre de connexions
+        in_room: Faire entrer chaque connexion dans un salon
+        room_size: Nombre de membres par salon
+
+    Returns:
+        float: Octets par connexion
+    """
+    server = ChatServer(presence_tick=_PRESENCE_TICK)
+    sock = NullSocket()
+    capabilities = pack_int(CAP_PRESENCE_BATCH | CAP_ROOM_SNAPSHOT | CAP_DIRECTORY)
+
+    # Données de test préparées hors mesure (un client réel les envoie sur le réseau)
+    logins = [pack_string(f"utilisateur_{i:06d}") + capabilities for i in range(count)]
+    joins = [pack_string(f"salon_{i // room_size:05d}") for i in range(count)]
+
+    gc.collect()
+    # Les handlers journalisent sur stdout : ces écritures ne sont pas comptées
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+
+            clients = []
+            for i in range(count):
+                client = ClientContext(sock)
+                server.dispatch(client, LOGIN, logins[i])
+                if in_room:
+                    server.dispatch(client, JOIN, joins[i])
+                clients.append(client)
+            server.presence.flush()
+
+            # Files d'envoi créées après coup : les trames de LOGIN / JOIN ne sont pas comptées
+            for client in clients:
+                client.outbox = server.create_outbox()
+
+            del logins, joins
+            gc.collect()
+            used = tracemalloc.get_traced_memory()[0] - start
+        finally:
+            tracemalloc.stop()
+            server.presence.stop()
+
+    # La liste `clients` elle-même n'appartient pas au serveur
+    used -= sys.getsizeof(clients)
+    return used / count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mémoire par connexion côté serveur")
+    parser.add_argument("--connections", type=int, default=10000, help="Nombre de connexions")
+    parser.add_argument("--room-size", type=int, default=50, help="Membres par salon")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    idle = measure_connections(args.connections, in_room=False)
+    in_room = measure_connections(args.connections, in_room=True, room_size=args.room_size)
+
+    report = {
+        "connections": args.connections,
+        "room_size": args.room_size,
+        "idle_bytes_per_connection": round(idle),
+        "idle_budget": IDLE_CONNECTION_BUDGET,
+        "in_room_bytes_per_connection": round(in_room),
+        "in_room_budget": IN_ROOM_CONNECTION_BUDGET,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Microbenchmarks des codecs (common/protocol.py) et des handlers du serveur.
+
+Chaque benchmark mesure le coût d'une opération isolée, sans réseau :
+- encodage / décodage de chaque type de message
+- diffusion d'un MSG dans des salons de 10, 1 000 et 10 000 membres
+  (sockets en mémoire)
+- rotation des membres (JOIN d'un salon à l'autre)
+
+Pour des mesures stables, chaque benchmark est répété plusieurs fois et le
+meilleur temps est retenu. Les temps sont exprimés relativement à une boucle
+de calibration, ce qui permet de comparer des mesures prises sur des
+machines différentes.
+
+Usage :
+    python -m bench.micro                  # mesure et compare à la référence
+    python -m bench.micro --save           # enregistre la référence
+    python -m bench.micro --filter fanout  # seulement certains benchmarks
+
+Le code de sortie vaut 1 si un benchmark est plus lent que la référence
+au-delà du seuil (--threshold).
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.protocol import *
+from server.server import ChatServer, ClientContext
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "micro_baseline.json")
+
+# Ralentissement toléré par rapport à la référence (1.25 = 25 % plus lent)
+DEFAULT_THRESHOLD = 1.25
+
+# Répétitions d'une mesure (le meilleur temps est retenu)
+DEFAULT_REPEAT = 5
+
+# Durée minimale (secondes) d'une répétition
+MIN_MEASURE_TIME = 0.2
+
+CALIBRATION = "calibration"
+
+
+class NullSocket:
+    """Socket en mémoire : les envois sont comptés puis oubliés."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    def send(self, data):
+        self.bytes_sent += len(data)
+        return len(data)
+
+    sendall = send
+
+    def close(self):
+        pass
+
+
+# ==================== Benchmarks ====================
+#
+# Chaque fonction prépare son état et retourne la fonction à mesurer.
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@benchmark(CALIBRATION)
+def bench_calibration():
+    values = list(range(100))
+
+    def run():
+        total = 0
+        for value in values:
+            total += value
+        return total
+    return run
+
+
+@benchmark("pack_string")
+def bench_pack_string():
+    return lambda: pack_string("Bonjour à tous, ceci est un message de test")
+
+
+@benchmark("unpack_string")
+def bench_unpack_string():
+    data = pack_string("Bonjour à tous, ceci est un message de test")
+    return lambda: unpack_string(data)
+
+
+@benchmark("pack_message")
+def bench_pack_message():
+    payload = pack_string("Alice") + pack_string("Bonjour à tous")
+    return lambda: pack_message(MSG_BROADCAST, payload)
+
+
+@benchmark("unpack_header")
+def bench_unpack_header():
+    header = pack_message(MSG, pack_string("Bonjour"))[:HEADER_SIZE]
+    return lambda: unpack_header(header)
+
+
+# Exemples de chaque type de message : type → (encodeur, décodeur)
+_MEMBERS = [f"membre_{i}" for i in range(50)]
+
+CODEC_SAMPLES = {
+    "LOGIN": (
+        lambda: pack_message(LOGIN, pack_login("Alice", CAP_PRESENCE_BATCH)),
+        lambda payload: unpack_login(payload),
+    ),
+    "LOGIN_OK": (
+        lambda: pack_message(LOGIN_OK, pack_int(CAP_PRESENCE_BATCH)),
+        lambda payload: unpack_int(payload),
+    ),
+    "LOGIN_ERR": (
+        lambda: pack_message(LOGIN_ERR, pack_string("Pseudo déjà utilisé")),
+        lambda payload: decode_payload(LOGIN_ERR, payload),
+    ),
+    "JOIN": (
+        lambda: pack_message(JOIN, pack_string("général")),
+        lambda payload: decode_payload(JOIN, payload),
+    ),
+    "JOIN_OK": (
+        lambda: pack_message(JOIN_OK),
+        lambda payload: None,
+    ),
+    "LEAVE": (
+        lambda: pack_message(LEAVE),
+        lambda payload: None,
+    ),
+    "ROOM_QUERY": (
+        lambda: pack_message(ROOM_QUERY, pack_string("général")),
+        lambda payload: decode_payload(ROOM_QUERY, payload),
+    ),
+    "MSG": (
+        lambda: pack_message(MSG, pack_string("Bonjour à tous")),
+        lambda payload: decode_payload(MSG, payload),
+    ),
+    "MSG_BROADCAST": (
+        lambda: pack_message(MSG_BROADCAST, pack_string("Alice") + pack_string("Bonjour à tous")),
+        lambda payload: decode_payload(MSG_BROADCAST, payload),
+    ),
+    "ROOM_UPDATE": (
+        lambda: pack_message(ROOM_UPDATE, pack_string("général") + pack_string("Alice") + pack_string("join")),
+        lambda payload: decode_payload(ROOM_UPDATE, payload),
+    ),
+    "ROOM_UPDATE_BATCH": (
+        lambda: pack_message(ROOM_UPDATE_BATCH, pack_room_update_batch(
+            [("général", member, "join") for member in _MEMBERS])),
+        lambda payload: unpack_room_update_batch(payload),
+    ),
+    "ROOM_SNAPSHOT": (
+        lambda: pack_message(ROOM_SNAPSHOT, pack_room_snapshot("général", _MEMBERS)[0]),
+        lambda payload: unpack_room_snapshot(payload),
+    ),
+    "DIRECTORY": (
+        lambda: pack_message(DIRECTORY, pack_directory({f"salon_{i}": i for i in range(50)})),
+        lambda payload: unpack_directory(payload),
+    ),
+    "ERROR": (
+        lambda: pack_message(ERROR, bytes([0x06]) + pack_string("Action non autorisée")),
+        lambda payload: decode_payload(ERROR, payload),
+    ),
+    "PING": (
+        lambda: pack_message(PING),
+        lambda payload: None,
+    ),
+    "FILE_OFFER": (
+        lambda: pack_message(FILE_OFFER, pack_string("morceau.wav") + pack_int(1024 * 1024) + pack_string("0" * 64)),
+        lambda payload: decode_payload(FILE_OFFER, payload),
+    ),
+    "FILE_REQUEST": (
+        lambda: pack_message(FILE_REQUEST, pack_int(1) + pack_string("Alice") + pack_string("morceau.wav") + pack_int(1024 * 1024)
+                             + pack_string("0" * 64)),
+        lambda payload: decode_payload(FILE_REQUEST, payload),
+    ),
+}
+
+
+def _codec_benchmarks():
+    for name, (encode, decode) in CODEC_SAMPLES.items():
+
+        def setup_encode(encode=encode):
+            return encode
+
+        def setup_decode(encode=encode, decode=decode):
+            stream = encode()
+
+            def run():
+                decoder = FrameDecoder()
+                decoder.feed(stream)
+                _, payload = decoder.next_frame()
+                return decode(payload)
+            return run
+
+        BENCHMARKS[f"encode.{name}"] = setup_encode
+        BENCHMARKS[f"decode.{name}"] = setup_decode
+
+
+_codec_benchmarks()
+
+
+@benchmark("decode.stream_100_frames")
+def bench_decode_stream():
+    stream = b"".join(pack_message(MSG_BROADCAST, pack_string("Alice") + pack_string(f"message {i}"))
+                      for i in range(100))
+
+    def run():
+        decoder = FrameDecoder()
+        decoder.feed(stream)
+        return list(decoder)
+    return run
+
+
+def make_room(server: ChatServer, room_name: str, size: int, prefix: str = "membre") -> list:
+    """
+    Remplit un salon de `size` clients authentifiés sur des sockets en mémoire.
+    """
+    clients = []
+    with server.lock:
+        members = server.rooms.setdefault(room_name, set())
+        for i in range(size):
+            client = ClientContext(NullSocket())
+            client.pseudo = f"{prefix}_{room_name}_{i}"
+            client.state = STATE_IN_ROOM
+            client.room = room_name
+            client.capabilities = CAP_PRESENCE_BATCH | CAP_ROOM_SNAPSHOT | CAP_DIRECTORY
+            server.clients[client.pseudo] = client
+            members.add(client.pseudo)
+            server.directory.member_joined(room_name)
+            clients.append(client)
+    return clients
+
+
+def _fanout_benchmark(size: int):
+    def setup():
+        server = ChatServer()
+        sender = make_room(server, "salon", size)[0]
+        payload = pack_string("Bonjour à tous")
+        return lambda: server.handle_msg(sender, payload)
+    return setup
+
+
+def _churn_benchmark(size: int):
+    def setup():
+        server = ChatServer()
+        make_room(server, "A", size)
+        make_room(server, "B", size)
+        mover = make_room(server, "A", 1, prefix="mobile")[0]
+        targets = [pack_string("B"), pack_string("A")]
+        state = {"next": 0}
+
+        def run():
+            server.handle_join(mover, targets[state["next"]])
+            state["next"] ^= 1
+        return run
+    return setup
+
+
+for _size in (10, 1000, 10000):
+    BENCHMARKS[f"fanout.handle_msg.{_size}"] = _fanout_benchmark(_size)
+for _size in (10, 1000):
+    BENCHMARKS[f"churn.handle_join.{_size}"] = _churn_benchmark(_size)
+
+
+# ==================== Mesure et comparaison ====================
+
+def measure(setup, repeat: int = DEFAULT_REPEAT, min_time: float = MIN_MEASURE_TIME) -> float:
+    """
+    Mesure le temps (secondes) d'un appel : meilleur temps sur `repeat` répétitions.
+    """
+    timer = timeit.Timer(setup())
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, timer.timeit(number))
+    return best / number
+
+
+def run_benchmarks(names, repeat: int = DEFAULT_REPEAT, min_time: float = MIN_MEASURE_TIME) -> dict:
+    """
+    Mesure les benchmarks demandés (et la calibration).
+
+    Returns:
+        dict: nom → {"ns": temps absolu, "relative": temps / calibration}
+    """
+    # Calibration mesurée avant et après : la machine est parfois plus lente
+    # au démarrage (fréquence CPU), le meilleur des deux est retenu
+    calibration = measure(BENCHMARKS[CALIBRATION], repeat, min_time)
+    timings = {name: measure(BENCHMARKS[name], repeat, min_time)
+               for name in names if name != CALIBRATION}
+    calibration = min(calibration, measure(BENCHMARKS[CALIBRATION], repeat, min_time))
+    timings[CALIBRATION] = calibration
+
+    return {
+        name: {"ns": round(seconds * 1e9, 1), "relative": seconds / calibration}
+        for name, seconds in timings.items()
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Compare des mesures à la référence.
+
+    Returns:
+        list: (nom, ratio) des benchmarks plus lents que `threshold` fois la référence
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if name == CALIBRATION or reference is None:
+            continue
+        ratio = result["relative"] / reference["relative"]
+        if ratio > threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results: dict, path: str = BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks du protocole et des handlers")
+    parser.add_argument("--filter", default="", help="Ne mesurer que les benchmarks dont le nom contient ce texte")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Répétitions par benchmark")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Ralentissement toléré (1.25 = 25 %% plus lent que la référence)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Fichier de référence")
+    parser.add_argument("--save", action="store_true", help="Enregistrer les mesures comme référence")
+    parser.add_argument("--list", action="store_true", help="Lister les benchmarks")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    names = [name for name in BENCHMARKS if args.filter in name]
+
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    results = run_benchmarks(names, args.repeat)
+    baseline = load_baseline(args.baseline)
+
+    print(f"{'benchmark':40} {'ns/op':>12} {'référence':>12} {'ratio':>7}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None or name == CALIBRATION:
+            print(f"{name:40} {result['ns']:>12.1f} {'-':>12} {'-':>7}")
+        else:
+            ratio = result["relative"] / reference["relative"]
+            print(f"{name:40} {result['ns']:>12.1f} {reference['ns']:>12.1f} {ratio:>7.2f}")
+
+    if args.save:
+        save_baseline({**baseline, **results}, args.baseline)
+        print(f"Référence enregistrée : {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRÉGRESSION (seuil x{args.threshold}) :")
+        for name, ratio in regressions:
+            print(f"  {name} : x{ratio:.2f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
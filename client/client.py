@@ -1,22 +1,46 @@
 import socket
+import weakref
 from common.protocol import *
 
 
-def login(sock, pseudo: str):
+# Un décodeur par socket : les octets lus en trop (trames collées)
+# sont conservés pour l'appel suivant au lieu d'être perdus
+_decoders = weakref.WeakKeyDictionary()
+
+
+def _recv_frame(sock):
+    """
+    Lit la prochaine trame complète envoyée par le serveur.
+
+    Returns:
+        tuple: (msg_type, payload), ou (None, b"") si la connexion est fermée
+    """
+    decoder = _decoders.get(sock)
+    if decoder is None:
+        decoder = _decoders[sock] = FrameDecoder(inflate=True, resolve_aliases=True, max_frame=None)
+
+    frame = recv_frame(sock, decoder)
+    if frame is None:
+        return None, b""
+    return frame
+
+
+def login(sock, pseudo: str, capabilities: int = None):
     """
     Envoie une demande de connexion au serveur et retourne sa réponse.
+
+    Args:
+        sock: La socket connectée au serveur
+        pseudo: Le pseudo demandé
+        capabilities: Masque des capacités optionnelles (None = protocole d'origine)
     """
 
     # Encodage et envoi du message LOGIN
-    payload = pack_string(pseudo)
+    payload = pack_login(pseudo, capabilities)
     sock.send(pack_message(LOGIN, payload))
 
     # Lecture de la réponse du serveur
-    header = sock.recv(5)
-    msg_type, length = unpack_header(header)
-    payload = sock.recv(length)
-
-    return msg_type, payload
+    return _recv_frame(sock)
 
 
 def join_room(sock, room_name: str):
@@ -36,11 +60,7 @@ def join_room(sock, room_name: str):
     sock.send(pack_message(JOIN, payload))
     
     # Lecture de la réponse du serveur
-    header = sock.recv(5)
-    msg_type, length = unpack_header(header)
-    payload = sock.recv(length)
-    
-    return msg_type, payload
+    return _recv_frame(sock)
 
 
 def leave_room(sock):
@@ -80,21 +100,14 @@ def receive_broadcast(sock):
         tuple: (pseudo, message) — l'expéditeur et son message
     """
     
-    # Lire l'en-tête
-    header = sock.recv(5)
-    msg_type, length = unpack_header(header)
-    
-    # Lire le payload
-    payload = sock.recv(length)
+    # Lire la trame complète
+    msg_type, payload = _recv_frame(sock)
     
     if msg_type != MSG_BROADCAST:
         # Ce n'est pas un broadcast, retourner le type pour traitement
         return None, None, msg_type, payload
     
-    # Décoder le payload : [pseudo][message]
-    pseudo = unpack_string(payload)
-    # Calculer où commence le message (après le pseudo)
-    pseudo_len = 2 + len(pseudo.encode('utf-8'))
-    message = unpack_string(payload[pseudo_len:])
+    # Décoder le payload en une passe : [pseudo][message]
+    pseudo, message = decode_payload(MSG_BROADCAST, payload)
     
     return pseudo, message
@@ -23,6 +23,7 @@ from client.ui.chat_panel import ChatPanel
 
 # Import du gestionnaire réseau
 from client.network.connection import NetworkManager
+from client.roster import RoomRoster
 
 # Import du protocole
 from common.protocol import *
@@ -44,7 +45,7 @@ class ChatClient:
         # État du chat
         self.current_room = None
         self.custom_channel_name = None
-        self.room_members = {}  # room_name -> set de membres
+        self.roster = RoomRoster()  # Membres et nombre de membres des rooms
         self._pending_room = None
         
         # Configuration de la page
@@ -53,7 +54,9 @@ class ChatClient:
         # Gestionnaire réseau
         self.network = NetworkManager(
             on_message_callback=self._handle_message,
-            on_disconnect_callback=self._handle_disconnect
+            on_disconnect_callback=self._handle_disconnect,
+            on_reconnecting_callback=self._handle_reconnecting,
+            on_reconnected_callback=self._handle_reconnected
         )
         
         # Afficher le dialog de connexion
@@ -166,12 +169,13 @@ class ChatClient:
         self.server_tree.update_display(
             current_room=self.current_room,
             custom_channel_name=self.custom_channel_name,
-            room_members=self.room_members,
-            my_pseudo=self.pseudo
+            room_members=self.roster.members,
+            my_pseudo=self.pseudo,
+            room_counts=self.roster.counts
         )
         
         # Mettre à jour le panneau d'info
-        current_members = self.room_members.get(self.current_room, set()) if self.current_room else set()
+        current_members = self.roster.members.get(self.current_room, set()) if self.current_room else set()
         self.info_panel.update_info(
             channel=self.current_room,
             user_count=len(current_members)
@@ -265,22 +269,27 @@ class ChatClient:
         
         elif msg_type == ROOM_UPDATE:
             self._handle_room_update(payload)
+        
+        elif msg_type == ROOM_UPDATE_BATCH:
+            self._handle_room_update_batch(payload)
+        
+        elif msg_type == ROOM_SNAPSHOT:
+            self._handle_room_snapshot(payload)
+        
+        elif msg_type == DIRECTORY:
+            self._handle_directory(payload)
     
     def _handle_msg_broadcast(self, payload: bytes):
         """Traite un message broadcast."""
-        pseudo = unpack_string(payload)
-        offset = 2 + len(pseudo.encode('utf-8'))
-        message = unpack_string(payload[offset:])
+        pseudo, message = decode_payload(MSG_BROADCAST, payload)
         
         is_system = pseudo == "Serveur"
         is_me = pseudo == self.pseudo
         
         # Mettre à jour la liste des membres si nécessaire
-        if not is_system and pseudo not in self.room_members.get(self.current_room, set()):
+        if not is_system and pseudo not in self.roster.members.get(self.current_room, set()):
             if self.current_room:
-                if self.current_room not in self.room_members:
-                    self.room_members[self.current_room] = set()
-                self.room_members[self.current_room].add(pseudo)
+                self.roster.apply_update(self.current_room, pseudo, "join")
                 self._refresh_ui()
         
         self.chat_panel.add_chat_message(pseudo, message, is_me=is_me, is_system=is_system)
@@ -294,9 +303,7 @@ class ChatClient:
             self._pending_room = None
         
         # Initialiser les membres de la room
-        if room not in self.room_members:
-            self.room_members[room] = set()
-        self.room_members[room].add(self.pseudo)
+        self.roster.apply_update(room, self.pseudo, "join")
         
         self._refresh_ui()
         self.chat_panel.add_log(f'Joined channel "{room}"', TS_BLUE)
@@ -304,32 +311,59 @@ class ChatClient:
     
     def _handle_error(self, payload: bytes):
         """Traite un message d'erreur."""
-        code = payload[0]
-        error_msg = unpack_string(payload[1:])
+        code, error_msg = decode_payload(ERROR, payload)
         self.chat_panel.add_log(f"Error: {error_msg}", TS_RED)
         self.page.update()
     
     def _handle_room_update(self, payload: bytes):
         """Traite une mise à jour de room."""
-        room_name = unpack_string(payload)
-        offset = 2 + len(room_name.encode('utf-8'))
-        user = unpack_string(payload[offset:])
-        offset += 2 + len(user.encode('utf-8'))
-        action = unpack_string(payload[offset:])
+        room_name, user, action = decode_payload(ROOM_UPDATE, payload)
         
-        # Mettre à jour room_members
-        if room_name not in self.room_members:
-            self.room_members[room_name] = set()
+        self.roster.apply_update(room_name, user, action)
+        self._refresh_ui()
+    
+    def _handle_room_update_batch(self, payload: bytes):
+        """Traite un lot de mises à jour de room (un seul rafraîchissement)."""
+        for room_name, user, action in unpack_room_update_batch(payload):
+            self.roster.apply_update(room_name, user, action)
+        self._refresh_ui()
+    
+    def _handle_directory(self, payload: bytes):
+        """Traite l'annuaire des rooms reçu juste après la connexion."""
+        self.roster.set_counts(unpack_directory(payload))
         
-        if action == "join":
-            self.room_members[room_name].add(user)
-        elif action == "leave":
-            self.room_members[room_name].discard(user)
+        # Les membres ne sont demandés que pour les rooms affichées
+        if self.roster.counts.get("Default Channel"):
+            self.network.send_room_query("Default Channel")
         
         self._refresh_ui()
     
+    def _handle_room_snapshot(self, payload: bytes):
+        """Traite la liste complète des membres d'une room (après JOIN_OK ou ROOM_QUERY)."""
+        room_name, flags, members = unpack_room_snapshot(payload)
+        
+        # Un seul rafraîchissement, une fois la liste complète
+        if self.roster.apply_snapshot(room_name, flags, members):
+            self._refresh_ui()
+    
+    def _handle_reconnecting(self, attempt: int, delay: float):
+        """Connexion perdue : une reconnexion automatique est en cours."""
+        if attempt == 1:
+            self.chat_panel.add_log("Connection lost, reconnecting...", TS_RED)
+        else:
+            self.chat_panel.add_log(f"Reconnection attempt {attempt} in {delay:.1f}s", TS_RED)
+        self.page.update()
+    
+    def _handle_reconnected(self, resumed: bool):
+        """Connexion rétablie (appelé avant le traitement des messages suivants)."""
+        if not resumed and self.current_room:
+            # Session perdue : le gestionnaire réseau rejoint à nouveau le channel
+            self._pending_room = self.current_room
+        self.chat_panel.add_log("Reconnected to server", TS_BLUE)
+        self.page.update()
+    
     def _handle_disconnect(self):
-        """Gère la déconnexion du serveur."""
+        """Gère la déconnexion du serveur (reconnexion abandonnée)."""
         self.chat_panel.add_log("Disconnected from server", TS_RED)
         self.page.update()
         
@@ -343,7 +377,7 @@ class ChatClient:
             self.pseudo = None
             self.current_room = None
             self.custom_channel_name = None
-            self.room_members = {}
+            self.roster.clear()
             
             self.page.controls.clear()
             self.page.overlay.clear()
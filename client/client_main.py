@@ -7,12 +7,15 @@ Usage:
 Commandes disponibles:
     /join <salon>  - Rejoindre un salon
     /leave         - Quitter le salon
+    /history <salon> [séquence] - Page d'historique (avant la séquence donnée)
+    /search <salon> <mots>      - Rechercher des messages
     /quit          - Quitter le client
     <message>      - Envoyer un message
 """
 
 import socket
 import threading
+import time
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -22,26 +25,41 @@ from common.protocol import *
 SERVER_IP = "127.0.0.1"
 SERVER_PORT = 5555
 
+# Capacités optionnelles annoncées au serveur lors du LOGIN
+CLIENT_CAPABILITIES = (CAP_PRESENCE_BATCH | CAP_ROOM_SNAPSHOT | CAP_DIRECTORY
+                       | CAP_COMPRESSION | CAP_ALIASES)
 
-def receive_messages(sock):
+
+def print_room_update(user: str, action: str):
+    """
+    Affiche l'arrivée ou le départ d'un utilisateur.
+    """
+    if action == "join":
+        print(f"\n[→ {user} a rejoint le salon]")
+    else:
+        print(f"\n[← {user} a quitté le salon]")
+
+
+def receive_messages(sock, decoder):
     """
     Thread qui écoute les messages du serveur en continu.
     """
     while True:
         try:
-            header = sock.recv(5)
-            if not header:
+            frame = recv_frame(sock, decoder)
+            if frame is None:
                 print("\n[Déconnecté du serveur]")
                 break
             
-            msg_type, length = unpack_header(header)
-            payload = sock.recv(length) if length > 0 else b""
+            msg_type, payload = frame
             
-            if msg_type == MSG_BROADCAST:
+            if msg_type == PING:
+                # Heartbeat : le serveur vérifie que le client est toujours là
+                sock.send(pack_message(PONG))
+            
+            elif msg_type == MSG_BROADCAST:
                 # Décoder pseudo + message
-                pseudo = unpack_string(payload)
-                pseudo_len = 2 + len(pseudo.encode('utf-8'))
-                message = unpack_string(payload[pseudo_len:])
+                pseudo, message = decode_payload(MSG_BROADCAST, payload)
                 print(f"\n[{pseudo}] {message}")
                 print("> ", end="", flush=True)
             
@@ -50,23 +68,54 @@ def receive_messages(sock):
                 print("> ", end="", flush=True)
             
             elif msg_type == ERROR:
-                code = payload[0]
-                error_msg = unpack_string(payload[1:])
+                code, error_msg = decode_payload(ERROR, payload)
                 print(f"\n[Erreur {code}] {error_msg}")
                 print("> ", end="", flush=True)
             
             elif msg_type == ROOM_UPDATE:
                 # Notification quand un user rejoint/quitte le salon
-                room_name = unpack_string(payload)
-                offset = 2 + len(room_name.encode('utf-8'))
-                user = unpack_string(payload[offset:])
-                offset += 2 + len(user.encode('utf-8'))
-                action = unpack_string(payload[offset:])
+                update = decode_payload(ROOM_UPDATE, payload)
                 
-                if action == "join":
-                    print(f"\n[→ {user} a rejoint le salon]")
+                print_room_update(update.user, update.action)
+                print("> ", end="", flush=True)
+            
+            elif msg_type == DIRECTORY:
+                counts = unpack_directory(payload)
+                if counts:
+                    rooms = ", ".join(f"{room} ({count})" for room, count in sorted(counts.items()))
+                    print(f"\n[Salons : {rooms}]")
                 else:
-                    print(f"\n[← {user} a quitté le salon]")
+                    print("\n[Aucun salon ouvert]")
+                print("> ", end="", flush=True)
+            
+            elif msg_type == ROOM_SNAPSHOT:
+                room_name, flags, members = unpack_room_snapshot(payload)
+                print(f"\n[Membres de {room_name} : {', '.join(sorted(members))}]")
+                print("> ", end="", flush=True)
+            
+            elif msg_type == HISTORY_CHUNK:
+                room_name, flags, entries = unpack_history_chunk(payload)
+                print(f"\n[Historique de {room_name}]")
+                for entry in entries:
+                    when = time.strftime("%d/%m %H:%M", time.localtime(entry.timestamp / 1000))
+                    print(f"  #{entry.seq} {when} [{entry.sender}] {entry.text}")
+                if flags & HISTORY_AT_START:
+                    print("[Début de l'historique]")
+                elif entries:
+                    print(f"[Suite : /history {room_name} {entries[0].seq}]")
+                print("> ", end="", flush=True)
+            
+            elif msg_type == SEARCH_RESULTS:
+                room_name, query, total, offset, entries = unpack_search_results(payload)
+                print(f"\n[Recherche « {query} » dans {room_name} : {total} résultat(s)]")
+                for entry in entries:
+                    when = time.strftime("%d/%m %H:%M", time.localtime(entry.timestamp / 1000))
+                    print(f"  {when} [{entry.sender}] {entry.text}")
+                print("> ", end="", flush=True)
+            
+            elif msg_type == ROOM_UPDATE_BATCH:
+                for room_name, user, action in unpack_room_update_batch(payload):
+                    print_room_update(user, action)
                 print("> ", end="", flush=True)
             
         except Exception as e:
@@ -93,23 +142,26 @@ def main():
         return
     
     # Login
-    sock.send(pack_message(LOGIN, pack_string(pseudo)))
-    header = sock.recv(5)
-    msg_type, length = unpack_header(header)
+    decoder = FrameDecoder(inflate=True, resolve_aliases=True, max_frame=None)
+    sock.send(pack_message(LOGIN, pack_login(pseudo, CLIENT_CAPABILITIES)))
+    frame = recv_frame(sock, decoder)
+    if frame is None:
+        print("Connexion fermée par le serveur.")
+        return
+    msg_type, payload = frame
     
     if msg_type == LOGIN_OK:
         print(f"Bienvenue {pseudo} !")
     else:
-        payload = sock.recv(length)
-        error = unpack_string(payload)
+        error = decode_payload(LOGIN_ERR, payload).reason
         print(f"Échec du login: {error}")
         return
     
     # Lancer le thread de réception
-    receiver = threading.Thread(target=receive_messages, args=(sock,), daemon=True)
+    receiver = threading.Thread(target=receive_messages, args=(sock, decoder), daemon=True)
     receiver.start()
     
-    print("\nCommandes: /join <salon> | /leave | /quit")
+    print("\nCommandes: /join <salon> | /history <salon> | /search <salon> <mots> | /leave | /quit")
     print("Ou tapez directement un message.\n")
     
     # Boucle principale
@@ -123,10 +175,25 @@ def main():
             if msg.startswith("/join "):
                 room = msg[6:].strip()
                 if room:
-                    sock.send(pack_message(JOIN, pack_string(room)))
+                    sock.send(encode_message(JOIN, room))
                 else:
                     print("Usage: /join <nom_du_salon>")
             
+            elif msg.startswith("/history "):
+                args = msg[9:].split()
+                if args and (len(args) == 1 or args[1].isdigit()):
+                    before = int(args[1]) if len(args) > 1 else 0
+                    sock.send(encode_message(HISTORY_REQUEST, args[0], before, MAX_HISTORY_COUNT))
+                else:
+                    print("Usage: /history <nom_du_salon> [séquence]")
+            
+            elif msg.startswith("/search "):
+                args = msg[8:].split(maxsplit=1)
+                if len(args) == 2:
+                    sock.send(encode_message(SEARCH, args[0], args[1], 0, 20))
+                else:
+                    print("Usage: /search <nom_du_salon> <mots>")
+            
             elif msg == "/leave":
                 sock.send(pack_message(LEAVE))
                 print("[Vous avez quitté le salon]")
@@ -137,7 +204,7 @@ def main():
             
             else:
                 # Envoyer un message
-                sock.send(pack_message(MSG, pack_string(msg)))
+                sock.send(encode_message(MSG, msg))
         
         except KeyboardInterrupt:
             print("\nAu revoir !")
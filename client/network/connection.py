@@ -3,8 +3,21 @@ connection.py - Gestion de la connexion réseau.
 
 Gère la connexion au serveur, l'envoi de messages,
 et la boucle de réception.
+
+Quand la connexion est perdue, elle est rétablie automatiquement : reprise
+de la session (RESUME) si le serveur la propose, sinon nouveau LOGIN puis
+JOIN du channel courant. Les messages envoyés pendant la coupure sont gardés
+et partent dès la reconnexion.
+
+Après un redémarrage du serveur, tous les clients perdent la connexion au
+même instant : la première tentative est tirée au hasard dans une fenêtre
+(RECONNECT_WINDOW), les suivantes s'espacent exponentiellement, avec un
+délai lui aussi tiré au hasard (« full jitter »). Les reconnexions
+s'étalent au lieu d'arriver toutes ensemble.
 """
 
+import collections
+import random
 import socket
 import threading
 import sys
@@ -14,20 +27,70 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from common.protocol import *
 
+# Capacités optionnelles annoncées au serveur lors du LOGIN
+CLIENT_CAPABILITIES = (CAP_PRESENCE_BATCH | CAP_ROOM_SNAPSHOT | CAP_DIRECTORY
+                       | CAP_COMPRESSION | CAP_ALIASES | CAP_RESUME)
+
+# Reconnexion automatique
+CONNECT_TIMEOUT = 5.0      # Délai (secondes) d'établissement d'une connexion
+RECONNECT_WINDOW = 10.0    # Fenêtre (secondes) où est tirée la première tentative
+RECONNECT_DELAY = 1.0      # Délai maximal (secondes) de la deuxième tentative, doublé ensuite
+RECONNECT_MAX_DELAY = 30.0  # Délai maximal (secondes) entre deux tentatives
+RECONNECT_ATTEMPTS = 10    # Tentatives avant d'abandonner (0 = pas de reconnexion)
+PENDING_FRAMES = 100       # Trames gardées pendant une coupure (les plus anciennes sont perdues)
+
 
 class NetworkManager:
     """Gère la connexion réseau avec le serveur."""
     
-    def __init__(self, on_message_callback, on_disconnect_callback):
+    def __init__(self, on_message_callback, on_disconnect_callback,
+                 on_reconnecting_callback=None, on_reconnected_callback=None,
+                 reconnect_window: float = RECONNECT_WINDOW,
+                 reconnect_delay: float = RECONNECT_DELAY,
+                 reconnect_max_delay: float = RECONNECT_MAX_DELAY,
+                 reconnect_attempts: int = RECONNECT_ATTEMPTS,
+                 rng=None):
         """
         Args:
             on_message_callback: Fonction(msg_type, payload) appelée pour chaque message reçu
-            on_disconnect_callback: Fonction() appelée lors de la déconnexion
+            on_disconnect_callback: Fonction() appelée lors de la déconnexion (reconnexion abandonnée)
+            on_reconnecting_callback: Fonction(tentative, délai) appelée avant chaque tentative
+            on_reconnected_callback: Fonction(resumed) appelée une fois reconnecté ;
+                resumed vaut False si la session a été perdue (nouveau LOGIN)
+            reconnect_window: Fenêtre (secondes) où est tirée la première tentative
+            reconnect_delay: Délai maximal (secondes) de la deuxième tentative, doublé ensuite
+            reconnect_max_delay: Délai maximal (secondes) entre deux tentatives
+            reconnect_attempts: Tentatives avant d'abandonner (0 = pas de reconnexion)
+            rng: Générateur aléatoire (remplaçable dans les tests)
         """
         self.sock = None
         self.connected = False
+        self.decoder = None
+        self.capabilities = 0  # Capacités retenues par le serveur
+        # L'interface et la boucle de réception (PONG) écrivent sur la même socket
+        self._send_lock = threading.Lock()
         self.on_message = on_message_callback
         self.on_disconnect = on_disconnect_callback
+        self.on_reconnecting = on_reconnecting_callback
+        self.on_reconnected = on_reconnected_callback
+        
+        # Reconnexion
+        self.reconnect_window = reconnect_window
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.reconnect_attempts = reconnect_attempts
+        self.rng = rng or random.Random()
+        self.reconnecting = False
+        self._address = None
+        self._pseudo = None
+        self._closing = threading.Event()  # Remplacé à chaque connect()
+        self._pending = collections.deque(maxlen=PENDING_FRAMES)  # Trames envoyées pendant une coupure
+        
+        # Session : ce qu'il faut pour la reprendre ou rejoindre à nouveau le channel
+        self.session_token = None
+        self.last_seq = 0        # Séquence du dernier message reçu (MSG_BROADCAST_SEQ)
+        self.current_room = None  # Channel confirmé par JOIN_OK
+        self._joining = None      # Channel demandé, en attente de JOIN_OK
     
     def connect(self, ip: str, port: int, pseudo: str) -> tuple[bool, str]:
         """
@@ -41,85 +104,288 @@ class NetworkManager:
         Returns:
             tuple: (success: bool, error_message: str ou None)
         """
+        self._address = (ip, port)
+        self._pseudo = pseudo
+        self._closing = threading.Event()
+        self._pending.clear()
+        self.session_token = None
+        self.current_room = self._joining = None
+        
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((ip, port))
-            
-            # Envoyer le LOGIN
-            self.sock.send(pack_message(LOGIN, pack_string(pseudo)))
-            
-            # Attendre la réponse
-            header = self.sock.recv(5)
-            msg_type, length = unpack_header(header)
-            
-            if msg_type == LOGIN_OK:
-                self.connected = True
-                return True, None
-            else:
-                # Erreur de login
-                payload = self.sock.recv(length)
-                error_msg = unpack_string(payload)
-                self.sock.close()
-                return False, error_msg
-                
+            # Le décodeur est conservé pour la boucle de réception :
+            # des trames reçues juste après LOGIN_OK ne sont pas perdues
+            self.sock, self.decoder, _ = self._open()
+            self.connected = True
+            return True, None
         except ConnectionRefusedError:
             return False, "Server not available"
         except Exception as ex:
             return False, str(ex)
     
+    def _open(self) -> tuple:
+        """
+        Ouvre une connexion et s'authentifie : RESUME si une session est en
+        cours, sinon (ou si elle a expiré) LOGIN.
+        
+        Returns:
+            tuple: (socket, décodeur, True si la session a été reprise)
+        
+        Raises:
+            ConnectionError: Login refusé ou connexion fermée par le serveur
+        """
+        sock = socket.create_connection(self._address, timeout=CONNECT_TIMEOUT)
+        try:
+            decoder = FrameDecoder(inflate=True, resolve_aliases=True, max_frame=None)
+            
+            if self.session_token is not None:
+                sock.sendall(pack_message(RESUME, pack_resume(self.session_token, self.last_seq)))
+                msg_type, _ = self._expect(sock, decoder)
+                if msg_type == RESUME_OK:
+                    # Les trames suivantes (membres du channel, messages manqués)
+                    # restent dans le décodeur pour la boucle de réception
+                    sock.settimeout(None)
+                    return sock, decoder, True
+                # Session expirée (LOGIN_ERR) : LOGIN sur la même connexion
+            
+            sock.sendall(pack_message(LOGIN, pack_login(self._pseudo, CLIENT_CAPABILITIES)))
+            msg_type, payload = self._expect(sock, decoder)
+            if msg_type != LOGIN_OK:
+                raise ConnectionError(decode_payload(LOGIN_ERR, payload).reason)
+            
+            # Un serveur d'origine répond par un LOGIN_OK vide
+            capabilities, self.session_token = unpack_login_ok(payload)
+            self.capabilities = capabilities or 0
+            self.last_seq = 0
+            sock.settimeout(None)
+            return sock, decoder, False
+        except BaseException:
+            sock.close()
+            raise
+    
+    @staticmethod
+    def _expect(sock, decoder) -> tuple[int, bytes]:
+        frame = recv_frame(sock, decoder)
+        if frame is None:
+            raise ConnectionError("Connection closed by server")
+        return frame
+    
     def disconnect(self):
-        """Ferme la connexion."""
-        self.connected = False
-        if self.sock:
+        """Ferme la connexion (et arrête une reconnexion en cours)."""
+        self._closing.set()
+        with self._send_lock:
+            self.connected = False
+            self.reconnecting = False
+            self._pending.clear()
+            sock, self.sock = self.sock, None
+        if sock:
             try:
-                self.sock.close()
+                sock.close()
             except:
                 pass
-            self.sock = None
     
     def start_receive_loop(self):
         """Démarre la boucle de réception dans un thread séparé."""
-        thread = threading.Thread(target=self._receive_loop, daemon=True)
+        thread = threading.Thread(target=self._receive_loop, args=(self._closing,), daemon=True)
         thread.start()
     
-    def _receive_loop(self):
-        """Boucle de réception des messages du serveur."""
-        while self.connected:
+    def _receive_loop(self, closing: threading.Event):
+        """Boucle de réception des messages du serveur, reconnexions comprises."""
+        while True:
+            self._receive(self.sock, self.decoder)
+            
+            with self._send_lock:
+                if closing.is_set():
+                    return  # Fermeture demandée par disconnect()
+                self.connected = False
+                self.reconnecting = self.reconnect_attempts > 0
             try:
-                header = self.sock.recv(5)
-                if not header:
-                    # Connexion fermée par le serveur
-                    self.connected = False
+                self.sock.close()
+            except:
+                pass
+            
+            if not self._reconnect(closing):
+                if not closing.is_set():
+                    self.disconnect()
                     self.on_disconnect()
-                    break
-                
-                msg_type, length = unpack_header(header)
-                payload = self.sock.recv(length) if length > 0 else b""
+                return
+    
+    def _receive(self, sock, decoder):
+        """Reçoit et traite les messages jusqu'à la perte de la connexion."""
+        try:
+            while True:
+                # Traiter d'abord les trames déjà reçues (ex : pendant le login)
+                for msg_type, payload in decoder:
+                    self._handle(msg_type, payload)
                 
-                # Transmettre le message au callback
-                self.on_message(msg_type, payload)
+                data = sock.recv(RECV_BUFFER_SIZE)
+                if not data:
+                    # Connexion fermée par le serveur
+                    return
                 
-            except Exception as ex:
-                if self.connected:
-                    self.connected = False
-                    self.on_disconnect()
-                break
+                decoder.feed(data)
+        except Exception:
+            return
+    
+    def _handle(self, msg_type: int, payload: bytes):
+        """Suit la session (channel, séquence) puis transmet le message au callback."""
+        # Heartbeat : répondre directement, sans passer par l'interface
+        if msg_type == PING:
+            self._send(Frame(PONG), keep=False)
+            return
         
-        self.connected = False
+        if msg_type == MSG_BROADCAST_SEQ:
+            # L'interface reçoit un MSG_BROADCAST ordinaire
+            seq, sender, text = decode_payload(MSG_BROADCAST_SEQ, payload)
+            self.last_seq = seq
+            msg_type, payload = MSG_BROADCAST, encode_payload(MSG_BROADCAST, sender, text)
+        elif msg_type == JOIN_OK:
+            self.current_room, self._joining = self._joining, None
+            if payload:
+                self.last_seq = decode_payload(JOIN_OK, payload).seq
+        
+        # Transmettre le message au callback
+        self.on_message(msg_type, payload)
+    
+    def _reconnect(self, closing: threading.Event) -> bool:
+        """
+        Tente de rétablir la connexion, avec des délais croissants tirés au hasard.
+        
+        Returns:
+            bool: True si la connexion est rétablie
+        """
+        for attempt in range(1, self.reconnect_attempts + 1):
+            delay = self.next_delay(attempt)
+            if self.on_reconnecting:
+                self.on_reconnecting(attempt, delay)
+            if closing.wait(delay):
+                return False
+            
+            try:
+                sock, decoder, resumed = self._open()
+            except (OSError, ValueError):
+                continue
+            
+            # Sans reprise, le serveur nous a retiré du channel : le rejoindre à nouveau
+            frames = []
+            if not resumed:
+                room = self._joining or self.current_room
+                self.current_room = None
+                if room:
+                    self._joining = room
+                    frames.append(Frame(JOIN, encode_payload(JOIN, room)))
+            
+            with self._send_lock:
+                if closing.is_set():
+                    sock.close()
+                    return False
+                frames.extend(self._pending)
+                try:
+                    send_frames(sock, frames)
+                except OSError:
+                    sock.close()
+                    continue
+                self._pending.clear()
+                self.sock, self.decoder = sock, decoder
+                self.connected = True
+                self.reconnecting = False
+            
+            if self.on_reconnected:
+                self.on_reconnected(resumed)
+            return True
+        return False
+    
+    def next_delay(self, attempt: int) -> float:
+        """
+        Délai avant une tentative de reconnexion (attempt commence à 1).
+        
+        La première tentative est tirée dans toute la fenêtre de
+        reconnexion, les suivantes entre 0 et un plafond qui double à
+        chaque tentative.
+        """
+        if attempt == 1:
+            return self.rng.uniform(0, self.reconnect_window)
+        ceiling = min(self.reconnect_max_delay, self.reconnect_delay * 2 ** (attempt - 2))
+        return self.rng.uniform(0, ceiling)
     
     # ==================== Méthodes d'envoi ====================
     
+    def _send(self, *frames, keep: bool = True):
+        """
+        Envoie une ou plusieurs trames en un seul appel (voir send_frames).
+        
+        Pendant une reconnexion, les trames sont gardées (keep=True) et
+        envoyées dès que la connexion est rétablie.
+        """
+        with self._send_lock:
+            if self.connected:
+                try:
+                    send_frames(self.sock, frames)
+                    return
+                except OSError:
+                    # La boucle de réception va constater la coupure
+                    pass
+            if keep and (self.connected or self.reconnecting):
+                self._pending.extend(frames)
+    
     def send_join(self, room_name: str):
         """Envoie une demande de rejoindre un channel."""
-        if self.connected:
-            self.sock.send(pack_message(JOIN, pack_string(room_name)))
+        self._joining = room_name
+        self._send(Frame(JOIN, encode_payload(JOIN, room_name)))
     
     def send_leave(self):
         """Envoie une demande de quitter le channel actuel."""
-        if self.connected:
-            self.sock.send(pack_message(LEAVE))
+        self.current_room = self._joining = None
+        self._send(Frame(LEAVE))
+    
+    def send_room_query(self, room_name: str):
+        """Demande la liste des membres d'un channel (réponse : ROOM_SNAPSHOT)."""
+        self._send(Frame(ROOM_QUERY, encode_payload(ROOM_QUERY, room_name)))
+    
+    def send_history_request(self, room_name: str, before: int = 0, count: int = MAX_HISTORY_COUNT):
+        """
+        Demande une page de l'historique durable d'un channel (réponse : HISTORY_CHUNK).
+        before = 0 : les messages les plus récents ; sinon ceux qui précèdent cette séquence.
+        """
+        self._send(Frame(HISTORY_REQUEST, encode_payload(HISTORY_REQUEST, room_name, before, count)))
+    
+    def send_search(self, room_name: str, query: str, offset: int = 0, count: int = 20):
+        """Recherche des messages d'un channel (réponse : SEARCH_RESULTS)."""
+        self._send(Frame(SEARCH, encode_payload(SEARCH, room_name, query, offset, count)))
     
     def send_message(self, text: str):
         """Envoie un message dans le channel actuel."""
-        if self.connected:
-            self.sock.send(pack_message(MSG, pack_string(text)))
+        self._send(Frame(MSG, encode_payload(MSG, text)))
+    
+    def send_file_offer(self, filename: str, data: bytes):
+        """
+        Propose un fichier au channel avec sa taille et son empreinte
+        (réponse : FILE_START ou FILE_CANCEL).
+        """
+        self._send(Frame(FILE_OFFER, encode_payload(FILE_OFFER, filename, len(data), file_digest(data))))
+    
+    def send_file_response(self, transfer_id: int, accepted: bool):
+        """Accepte ou refuse le fichier proposé par FILE_REQUEST (identifiant de l'offre)."""
+        msg_type = FILE_ACCEPT if accepted else FILE_REJECT
+        self._send(Frame(msg_type, encode_payload(msg_type, transfer_id)))
+    
+    def send_file(self, transfer_id: int, data: bytes, offset: int = 0):
+        """
+        Envoie le contenu d'un fichier après FILE_START, à partir d'une
+        position : morceaux FILE_DATA puis FILE_END. Après une coupure (ou un
+        FILE_RESUME du serveur), l'envoi reprend à la position vérifiée
+        donnée par FILE_RESUME.
+        """
+        view = memoryview(data)
+        for start in range(offset, len(view), FILE_CHUNK_SIZE):
+            # Un morceau par appel : les PONG peuvent passer entre deux morceaux
+            chunk = view[start:start + FILE_CHUNK_SIZE]
+            self._send(Frame(FILE_DATA, pack_file_data(transfer_id, start, chunk)), keep=False)
+        self._send(Frame(FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)), keep=False)
+    
+    def send_file_resume(self, transfer_id: int, offset: int = 0):
+        """
+        Reprend un transfert : l'émetteur demande la position vérifiée d'où
+        continuer (réponse FILE_RESUME), un destinataire demande la suite à
+        partir des octets déjà reçus.
+        """
+        self._send(Frame(FILE_RESUME, encode_payload(FILE_RESUME, transfer_id, offset)))
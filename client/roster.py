@@ -0,0 +1,93 @@
+"""
+roster.py - Membres et nombre de membres des rooms, vus par le client.
+
+Le nombre de membres d'une room vient de l'annuaire (DIRECTORY) puis suit
+les ROOM_UPDATE. Pour une room dont la liste complète a été reçue
+(ROOM_SNAPSHOT), le nombre suit la liste : un join déjà connu ou un leave
+d'un inconnu ne le change pas.
+
+Sans dépendance à Flet : utilisable (et testable) hors de l'interface.
+"""
+
+import sys
+import os
+
+# Import du protocole
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.protocol import SNAPSHOT_FIRST, SNAPSHOT_LAST
+
+
+class RoomRoster:
+    """
+    Membres (room → set) et nombre de membres (room → int) des rooms.
+    """
+
+    def __init__(self):
+        self.members = {}  # room_name -> set de membres
+        self.counts = {}   # room_name -> nombre de membres (annuaire DIRECTORY)
+        self._complete = set()  # Rooms dont la liste complète est connue
+
+    def clear(self):
+        """Oublie toutes les rooms (déconnexion)."""
+        self.members.clear()
+        self.counts.clear()
+        self._complete.clear()
+
+    def set_counts(self, counts: dict):
+        """
+        Remplace les nombres de membres par ceux d'un DIRECTORY.
+
+        Les listes reçues avant peuvent avoir manqué des changements (reprise
+        de session) : seuls les nombres font foi jusqu'au prochain ROOM_SNAPSHOT.
+        """
+        self.counts.clear()
+        self.counts.update(counts)
+        self._complete.clear()
+
+    def apply_snapshot(self, room_name: str, flags: int, members: list) -> bool:
+        """
+        Applique un fragment de ROOM_SNAPSHOT (après JOIN_OK ou ROOM_QUERY).
+
+        Returns:
+            bool: True une fois la liste complète reçue
+        """
+        # Le premier fragment remplace la liste connue
+        if flags & SNAPSHOT_FIRST or room_name not in self.members:
+            self.members[room_name] = set()
+        self.members[room_name].update(members)
+
+        if not flags & SNAPSHOT_LAST:
+            return False
+        self._complete.add(room_name)
+        self._set_count(room_name, len(self.members[room_name]))
+        return True
+
+    def apply_update(self, room_name: str, user: str, action: str) -> bool:
+        """
+        Applique un join ou un leave.
+
+        Returns:
+            bool: False si le changement était déjà connu
+        """
+        members = self.members.setdefault(room_name, set())
+        if action == "join":
+            changed = user not in members
+            members.add(user)
+        elif action == "leave":
+            changed = user in members
+            members.discard(user)
+        else:
+            return False
+
+        # Liste complète : le nombre ne change qu'avec elle
+        if room_name in self._complete and not changed:
+            return False
+        delta = 1 if action == "join" else -1
+        self._set_count(room_name, self.counts.get(room_name, 0) + delta)
+        return True
+
+    def _set_count(self, room_name: str, count: int):
+        if count > 0:
+            self.counts[room_name] = count
+        else:
+            self.counts.pop(room_name, None)
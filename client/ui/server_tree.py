@@ -1,7 +1,9 @@
 """
 server_tree.py - Panneau gauche avec l'arborescence serveur.
 
-Affiche la hiérarchie : Serveur > Channels > Utilisateurs
+Affiche la hiérarchie : Serveur > Channels > Utilisateurs, avec le nombre
+de membres de chaque channel (annuaire DIRECTORY) et les autres channels du
+serveur.
 """
 
 import flet as ft
@@ -51,6 +53,7 @@ class ServerTree:
             content=ft.Row([
                 ft.Icon(ft.icons.LOCK_OPEN, color=TS_BLUE, size=14),
                 ft.Text("Default Channel", color=TS_TEXT_BLACK, size=12),
+                ft.Text("", color=TS_TEXT_GRAY, size=11),
             ], spacing=8),
             padding=ft.padding.only(left=25, top=5, bottom=5),
             bgcolor=None,
@@ -81,6 +84,7 @@ class ServerTree:
             content=ft.Row([
                 ft.Icon(ft.icons.LOCK, color=TS_BLUE, size=14),
                 ft.Text("", color=TS_TEXT_BLACK, size=12),
+                ft.Text("", color=TS_TEXT_GRAY, size=11),
             ], spacing=8),
             padding=ft.padding.only(left=40, top=5, bottom=5),
             bgcolor=None,
@@ -92,6 +96,9 @@ class ServerTree:
         # Liste des utilisateurs du Custom Channel
         self.custom_users_list = ft.Column(spacing=0)
         
+        # Autres channels du serveur (annuaire), avec leur nombre de membres
+        self.other_channels_list = ft.Column(spacing=0)
+        
         # Input pour créer/rejoindre un custom channel
         self.custom_input = ft.TextField(
             hint_text="Channel name...",
@@ -132,6 +139,7 @@ class ServerTree:
             self.custom_header,
             self.custom_channel_row,
             self.custom_users_list,
+            self.other_channels_list,
             custom_input_row,
         ], spacing=0)
         
@@ -178,8 +186,26 @@ class ServerTree:
         )
         target_list.controls.append(user_row)
     
+    def _add_channel_to_list(self, channel: str, count: int):
+        """Ajoute un autre channel du serveur (clic = le rejoindre)."""
+        channel_row = ft.Container(
+            content=ft.Row([
+                ft.Icon(ft.icons.LOCK, color=TS_TEXT_GRAY, size=14),
+                ft.Text(channel, color=TS_TEXT_BLACK, size=12),
+                ft.Text(self._count_label(count), color=TS_TEXT_GRAY, size=11),
+            ], spacing=8),
+            padding=ft.padding.only(left=40, top=5, bottom=5),
+            border_radius=3,
+            on_click=lambda e: self.on_join_custom_channel(channel),
+        )
+        self.other_channels_list.controls.append(channel_row)
+    
+    @staticmethod
+    def _count_label(count: int) -> str:
+        return f"({count})" if count else ""
+    
     def update_display(self, current_room: str, custom_channel_name: str,
-                       room_members: dict, my_pseudo: str):
+                       room_members: dict, my_pseudo: str, room_counts: dict = None):
         """
         Met à jour l'affichage de l'arborescence.
         
@@ -188,17 +214,21 @@ class ServerTree:
             custom_channel_name: Nom du custom channel (ou None)
             room_members: Dict room_name -> set de membres
             my_pseudo: Mon pseudo (pour le mettre en surbrillance)
+            room_counts: Dict room_name -> nombre de membres (annuaire)
         """
         self.current_room = current_room
         self.custom_channel_name = custom_channel_name
+        room_counts = room_counts or {}
         
         # Effacer les listes
         self.default_users_list.controls.clear()
         self.custom_users_list.controls.clear()
+        self.other_channels_list.controls.clear()
         
         # Style du Default Channel
         is_default = current_room == "Default Channel"
         self.default_channel_row.bgcolor = TS_BG_LIGHT if is_default else None
+        self.default_channel_row.content.controls[2].value = self._count_label(room_counts.get("Default Channel", 0))
         
         # Utilisateurs du Default Channel
         default_members = room_members.get("Default Channel", set())
@@ -209,6 +239,7 @@ class ServerTree:
         if custom_channel_name:
             self.custom_channel_row.visible = True
             self.custom_channel_row.content.controls[1].value = custom_channel_name
+            self.custom_channel_row.content.controls[2].value = self._count_label(room_counts.get(custom_channel_name, 0))
             
             is_custom = current_room == custom_channel_name
             self.custom_channel_row.bgcolor = TS_BG_LIGHT if is_custom else None
@@ -219,6 +250,11 @@ class ServerTree:
                 self._add_user_to_list(user, self.custom_users_list, user == my_pseudo)
         else:
             self.custom_channel_row.visible = False
+        
+        # Autres channels connus par l'annuaire
+        for channel in sorted(room_counts):
+            if channel not in ("Default Channel", custom_channel_name):
+                self._add_channel_to_list(channel, room_counts[channel])
     
     def set_custom_channel(self, name: str):
         """Définit le nom du custom channel."""
@@ -10,18 +10,45 @@ Conventions :
 - L'ordre des octets est big-endian (ordre utilisé en réseau)
 """
 
+import collections
+import hashlib
 import struct
+import zlib
+
+# Formats précompilés
+_HEADER = struct.Struct(">BI")  # En-tête : [TYPE: 1o][LONGUEUR: 4o]
+_U8 = struct.Struct(">B")
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+_U64 = struct.Struct(">Q")
+_ALIAS_UPDATE = struct.Struct(">IIB")  # [ALIAS_SALON: 4o][ALIAS_PSEUDO: 4o][ACTION: 1o]
 
 # Message types
 LOGIN = 0x01
 LOGIN_OK = 0x02
 LOGIN_ERR = 0x03
+RESUME = 0x04  # Reprise d'une session après une coupure (voir CAP_RESUME)
+RESUME_OK = 0x05  # Session reprise
 JOIN = 0x10
 JOIN_OK = 0x11
 LEAVE = 0x12
+ROOM_QUERY = 0x13  # Demande la liste des membres d'un salon
+HISTORY_REQUEST = 0x14  # Demande une page de l'historique durable d'un salon
+SEARCH = 0x15  # Recherche plein texte dans les messages d'un salon
 MSG = 0x20
 MSG_BROADCAST = 0x21
 ROOM_UPDATE = 0x22  # Liste des membres d'un room
+ROOM_UPDATE_BATCH = 0x23  # Plusieurs mises à jour de présence en une trame
+ROOM_SNAPSHOT = 0x24  # Liste complète des membres d'un salon
+DIRECTORY = 0x25  # Liste des salons et de leur nombre de membres
+COMPRESSED = 0x26  # Trame dont le payload est compressé (voir CAP_COMPRESSION)
+ALIAS = 0x27  # Identifiant numérique d'un nom (salon ou pseudo), voir CAP_ALIASES
+MSG_BROADCAST_ALIAS = 0x28  # MSG_BROADCAST, expéditeur désigné par son alias
+ROOM_UPDATE_ALIAS = 0x29  # ROOM_UPDATE, salon et membre désignés par leurs alias
+ROOM_UPDATE_BATCH_ALIAS = 0x2A  # ROOM_UPDATE_BATCH, salons et membres désignés par leurs alias
+HISTORY_CHUNK = 0x2B  # Page de l'historique durable d'un salon
+SEARCH_RESULTS = 0x2C  # Page de résultats d'une recherche SEARCH
+MSG_BROADCAST_SEQ = 0x2D  # MSG_BROADCAST précédé de son numéro de séquence dans le salon
 ERROR = 0x30
 PING = 0xF0
 PONG = 0xF1
@@ -31,17 +58,91 @@ FILE_ACCEPT = 0x42
 FILE_REJECT = 0x43
 FILE_START = 0x44
 FILE_CANCEL = 0x45
+FILE_DATA = 0x46  # Morceau d'un fichier, relayé de l'émetteur aux destinataires
+FILE_END = 0x47  # Fin (ou abandon) d'un transfert
+FILE_RESUME = 0x48  # Reprise d'un transfert à partir d'une position vérifiée
 
 
 # Constants
 MAX_PSEUDO_LEN = 32
 MAX_ROOM_LEN = 32
 MAX_MSG_LEN = 1024  # Taille max d'un message (voir PROTOCOL.md section 7)
+MAX_HISTORY_COUNT = 100  # Messages max par page HISTORY_CHUNK
+MAX_SEARCH_RESULTS = 50  # Résultats max par page SEARCH_RESULTS
+MAX_FILE_SIZE = 10 * 1024 * 1024  # Taille max d'un fichier proposé (FILE_OFFER)
+FILE_CHUNK_SIZE = 64 * 1024  # Données max par trame FILE_DATA
+
+# Capacités annoncées dans LOGIN (champ optionnel de 4 octets, masque de bits)
+# Un client qui n'annonce rien reçoit le protocole d'origine.
+CAP_PRESENCE_BATCH = 0x01  # Accepte ROOM_UPDATE_BATCH
+CAP_ROOM_SNAPSHOT = 0x02   # Accepte ROOM_SNAPSHOT à la place des ROOM_UPDATE du JOIN
+CAP_DIRECTORY = 0x04       # Reçoit DIRECTORY juste après LOGIN_OK
+CAP_COMPRESSION = 0x08     # Accepte les trames COMPRESSED
+CAP_ALIASES = 0x10         # Accepte ALIAS et les trames *_ALIAS
+CAP_RESUME = 0x20          # Reçoit un jeton de session (LOGIN_OK) et MSG_BROADCAST_SEQ
+
+SESSION_TOKEN_LEN = 16  # Taille (octets) du jeton de session
+
+# Drapeaux de RESUME_OK
+RESUME_GAP = 0x01  # Des messages manqués n'ont pas pu être rejoués (trop anciens)
+
+# Statuts de FILE_END
+FILE_END_OK = 0x00        # Fichier complet
+FILE_END_ABORTED = 0x01   # Émetteur parti, ou fichier incomplet
+FILE_END_TOO_SLOW = 0x02  # Destinataire trop en retard, retiré du transfert
+FILE_END_CORRUPT = 0x03   # Fichier complet mais différent de l'empreinte de FILE_OFFER
+
+# Compression (CAP_COMPRESSION) : deflate brut, chaque trame compressée seule
+# avec un dictionnaire prédéfini commun au client et au serveur
+COMPRESSION_THRESHOLD = 128  # Payload (octets) sous lequel une trame reste brute
+COMPRESSION_LEVEL = 6
+MAX_DECOMPRESSED_PAYLOAD = 1024 * 1024  # Protection contre les « bombes » de décompression
+
+# Fragments fréquents des trames diffusées.
+# Les plus fréquents sont à la fin (distances de recherche plus courtes).
+# Ne jamais modifier sans changer de bit de capacité : les deux côtés
+# doivent utiliser exactement le même dictionnaire.
+COMPRESSION_DICTIONARY = (
+    "Bonjour salut merci oui non est pas fichier audio musique salon général "
+    " a été kické s'est déconnecté s'est connecté".encode("utf-8")
+    # Champs encodés tels quels ([LONGUEUR: 2o][UTF-8]) : actions de ROOM_UPDATE, expéditeur serveur
+    + b"\x00\x05leave\x00\x04join\x00\x07Serveur"
+)
+
+# Actions de présence (ROOM_UPDATE_BATCH)
+ACTION_JOIN = 0x01
+ACTION_LEAVE = 0x02
+
+ACTION_CODES = {"join": ACTION_JOIN, "leave": ACTION_LEAVE}
+ACTION_NAMES = {ACTION_JOIN: "join", ACTION_LEAVE: "leave"}
 
-STATE_CONNECTED = "CONNECTÉ"        # Connexion TCP établie, en attente de LOGIN
-STATE_AUTHENTICATED = "AUTHENTIFIÉ"  # LOGIN réussi, peut faire JOIN
-STATE_IN_ROOM = "DANS_SALON"         # Dans un salon, peut envoyer MSG ou LEAVE
-STATE_WAITING_FILE_CONFIRMATION = "ATTENTE_CONFIRMATION_FICHIER"  # Après FILE_OFFER, en attente de FILE_ACCEPT ou FILE_REJECT
+# Drapeaux de HISTORY_CHUNK
+HISTORY_AT_START = 0x01  # La page contient le plus ancien message conservé
+
+# Fragments de ROOM_SNAPSHOT
+SNAPSHOT_FIRST = 0x01  # Premier fragment : remplace la liste connue
+SNAPSHOT_LAST = 0x02   # Dernier fragment : la liste est complète
+MAX_SNAPSHOT_PAYLOAD = 16 * 1024  # Taille max d'un fragment (octets)
+
+HEADER_SIZE = 5            # 1 octet de type + 4 octets de longueur
+# Plus grande trame envoyée par un client : FILE_DATA plein
+# ([TRANSFERT][POSITION][CRC32] + un morceau) ; au-delà, la connexion est fermée
+MAX_FRAME_SIZE = HEADER_SIZE + 12 + FILE_CHUNK_SIZE
+RECV_BUFFER_SIZE = 65536   # Taille des lectures socket (plusieurs trames par recv)
+
+# États d'une connexion : petits entiers (comparaisons rapides, ordre utilisé
+# par ClientContext.is_authenticated), noms lisibles dans STATE_NAMES
+STATE_CONNECTED = 0                  # Connexion TCP établie, en attente de LOGIN
+STATE_AUTHENTICATED = 1              # LOGIN réussi, peut faire JOIN
+STATE_IN_ROOM = 2                    # Dans un salon, peut envoyer MSG ou LEAVE
+STATE_WAITING_FILE_CONFIRMATION = 3  # Après FILE_OFFER, en attente de FILE_ACCEPT ou FILE_REJECT
+
+STATE_NAMES = {
+    STATE_CONNECTED: "CONNECTÉ",
+    STATE_AUTHENTICATED: "AUTHENTIFIÉ",
+    STATE_IN_ROOM: "DANS_SALON",
+    STATE_WAITING_FILE_CONFIRMATION: "ATTENTE_CONFIRMATION_FICHIER",
+}
 
 
 def pack_int(value: int) -> bytes:
@@ -84,6 +185,21 @@ def unpack_string(data: bytes) -> str:
     return data[2:2 + length].decode("utf-8")
 
 
+def unpack_string_from(data: bytes, offset: int = 0) -> tuple[str, int]:
+    """
+    Décode une chaîne de caractères à partir d'une position donnée,
+    sans recopier le reste des données.
+
+    Returns:
+        tuple: (texte, position juste après la chaîne)
+    """
+
+    length = struct.unpack_from(">H", data, offset)[0]
+    start = offset + 2
+    end = start + length
+    return str(data[start:end], "utf-8"), end
+
+
 def pack_message(msg_type: int, payload: bytes = b"") -> bytes:
     """
     Encode un message complet (type + longueur + payload).
@@ -94,7 +210,7 @@ def pack_message(msg_type: int, payload: bytes = b"") -> bytes:
     - N octets : payload
     """
     
-    header = struct.pack(">BI", msg_type, len(payload))
+    header = _HEADER.pack(msg_type, len(payload))
     return header + payload
 
 
@@ -106,6 +222,805 @@ def unpack_header(header: bytes) -> tuple[int, int]:
         tuple: (msg_type, payload_length)
     """
     
-    msg_type = header[0]
-    length = struct.unpack(">I", header[1:5])[0]
-    return msg_type, length
+    return _HEADER.unpack_from(header)
+
+
+# ==================== Codec par table ====================
+#
+# Les messages à structure fixe sont décrits par une table : type → champs.
+# Le décodage se fait en une seule passe, sans ré-encoder les chaînes pour
+# calculer les positions, et produit un objet léger (namedtuple) :
+#
+#     update = decode_payload(ROOM_UPDATE, payload)
+#     update.room, update.user, update.action
+#
+# Les messages à structure variable (LOGIN, ROOM_UPDATE_BATCH, ROOM_SNAPSHOT,
+# DIRECTORY, HISTORY_CHUNK, SEARCH_RESULTS) gardent leurs fonctions dédiées plus bas.
+
+# Types de champs
+STR = "str"  # [longueur 2o][utf-8]
+U8 = "u8"    # entier 1 octet
+U16 = "u16"  # entier 2 octets
+U32 = "u32"  # entier 4 octets
+U64 = "u64"  # entier 8 octets
+
+MESSAGE_SCHEMAS = {
+    LOGIN_ERR: ("LoginError", (("reason", STR),)),
+    JOIN: ("Join", (("room", STR),)),
+    JOIN_OK: ("JoinOk", (("seq", U64),)),  # Payload vide sans CAP_RESUME
+    ROOM_QUERY: ("RoomQuery", (("room", STR),)),
+    HISTORY_REQUEST: ("HistoryRequest", (("room", STR), ("before", U64), ("count", U16))),
+    SEARCH: ("Search", (("room", STR), ("query", STR), ("offset", U16), ("count", U16))),
+    MSG: ("Msg", (("text", STR),)),
+    MSG_BROADCAST: ("MsgBroadcast", (("sender", STR), ("text", STR))),
+    MSG_BROADCAST_SEQ: ("MsgBroadcastSeq", (("seq", U64), ("sender", STR), ("text", STR))),
+    RESUME_OK: ("ResumeOk", (("flags", U8),)),
+    ROOM_UPDATE: ("RoomUpdate", (("room", STR), ("user", STR), ("action", STR))),
+    ERROR: ("Error", (("code", U8), ("message", STR))),
+    FILE_OFFER: ("FileOffer", (("filename", STR), ("size", U32), ("digest", STR))),
+    FILE_REQUEST: ("FileRequest", (("transfer", U32), ("sender", STR), ("filename", STR), ("size", U32), ("digest", STR))),
+    FILE_ACCEPT: ("FileAccept", (("transfer", U32),)),
+    FILE_REJECT: ("FileReject", (("transfer", U32),)),
+    FILE_START: ("FileStart", (("transfer", U32), ("sender", STR), ("filename", STR), ("size", U32), ("digest", STR))),
+    FILE_CANCEL: ("FileCancel", (("transfer", U32), ("reason", STR))),
+    FILE_END: ("FileEnd", (("transfer", U32), ("status", U8))),
+    FILE_RESUME: ("FileResume", (("transfer", U32), ("offset", U32))),
+    ALIAS: ("Alias", (("id", U32), ("name", STR))),
+    MSG_BROADCAST_ALIAS: ("MsgBroadcastAlias", (("sender", U32), ("text", STR))),
+    ROOM_UPDATE_ALIAS: ("RoomUpdateAlias", (("room", U32), ("user", U32), ("action", U8))),
+}
+
+
+class MessageCodec:
+    """
+    Encodeur / décodeur d'un type de message décrit dans MESSAGE_SCHEMAS.
+    """
+
+    __slots__ = ("msg_type", "cls", "kinds")
+
+    def __init__(self, msg_type: int, name: str, fields):
+        self.msg_type = msg_type
+        self.cls = collections.namedtuple(name, [field for field, _ in fields])
+        self.kinds = tuple(kind for _, kind in fields)
+
+    def encode(self, *values) -> bytes:
+        parts = []
+        for kind, value in zip(self.kinds, values):
+            if kind is STR:
+                data = value.encode("utf-8")
+                parts.append(_U16.pack(len(data)))
+                parts.append(data)
+            elif kind is U32:
+                parts.append(_U32.pack(value))
+            elif kind is U16:
+                parts.append(_U16.pack(value))
+            elif kind is U64:
+                parts.append(_U64.pack(value))
+            else:
+                parts.append(_U8.pack(value))
+        return b"".join(parts)
+
+    def decode(self, payload: bytes):
+        values = []
+        offset = 0
+        for kind in self.kinds:
+            if kind is STR:
+                length = _U16.unpack_from(payload, offset)[0]
+                offset += 2
+                values.append(str(payload[offset:offset + length], "utf-8"))
+                offset += length
+            elif kind is U32:
+                values.append(_U32.unpack_from(payload, offset)[0])
+                offset += 4
+            elif kind is U16:
+                values.append(_U16.unpack_from(payload, offset)[0])
+                offset += 2
+            elif kind is U64:
+                values.append(_U64.unpack_from(payload, offset)[0])
+                offset += 8
+            else:
+                values.append(payload[offset])
+                offset += 1
+        return self.cls._make(values)
+
+
+MESSAGE_CODECS = {
+    msg_type: MessageCodec(msg_type, name, fields)
+    for msg_type, (name, fields) in MESSAGE_SCHEMAS.items()
+}
+
+
+def encode_payload(msg_type: int, *values) -> bytes:
+    """
+    Encode le payload d'un message décrit dans MESSAGE_SCHEMAS.
+
+    Exemple : encode_payload(ROOM_UPDATE, "général", "Alice", "join")
+    """
+    return MESSAGE_CODECS[msg_type].encode(*values)
+
+
+def decode_payload(msg_type: int, payload: bytes):
+    """
+    Décode en une passe le payload d'un message décrit dans MESSAGE_SCHEMAS.
+
+    Returns:
+        namedtuple: Les champs du message (ex : .room, .user, .action)
+    """
+    return MESSAGE_CODECS[msg_type].decode(payload)
+
+
+def encode_message(msg_type: int, *values) -> bytes:
+    """Encode un message complet (en-tête + payload) décrit dans MESSAGE_SCHEMAS."""
+    return pack_message(msg_type, MESSAGE_CODECS[msg_type].encode(*values))
+
+
+def pack_login(pseudo: str, capabilities: int = None) -> bytes:
+    """
+    Encode le payload LOGIN : [pseudo] suivi, si fourni, du masque de capacités.
+    """
+    payload = pack_string(pseudo)
+    if capabilities is not None:
+        payload += pack_int(capabilities)
+    return payload
+
+
+def unpack_login(payload: bytes) -> tuple[str, int]:
+    """
+    Décode le payload LOGIN.
+
+    Returns:
+        tuple: (pseudo, capabilities) — capabilities vaut None si le client
+        n'a rien annoncé (client d'origine)
+    """
+    pseudo, offset = unpack_string_from(payload)
+    if len(payload) >= offset + 4:
+        return pseudo, _U32.unpack_from(payload, offset)[0]
+    return pseudo, None
+
+
+def pack_login_ok(capabilities: int, token: bytes = None) -> bytes:
+    """
+    Encode le payload LOGIN_OK : capacités retenues suivies, si la session
+    peut être reprise (CAP_RESUME), du jeton de session.
+    """
+    payload = pack_int(capabilities)
+    if token is not None:
+        payload += token
+    return payload
+
+
+def unpack_login_ok(payload: bytes) -> tuple[int, bytes]:
+    """
+    Décode le payload LOGIN_OK.
+
+    Returns:
+        tuple: (capabilities, jeton) — capabilities vaut None pour un serveur
+        d'origine (payload vide), jeton vaut None sans CAP_RESUME
+    """
+    if len(payload) < 4:
+        return None, None
+    capabilities = _U32.unpack_from(payload)[0]
+    token = payload[4:4 + SESSION_TOKEN_LEN]
+    return capabilities, bytes(token) if len(token) == SESSION_TOKEN_LEN else None
+
+
+def pack_resume(token: bytes, last_seq: int) -> bytes:
+    """
+    Encode le payload RESUME : [JETON: 16o][DERNIÈRE SÉQUENCE REÇUE: 8o].
+    """
+    return bytes(token) + _U64.pack(last_seq)
+
+
+def unpack_resume(payload: bytes) -> tuple[bytes, int]:
+    """
+    Décode le payload RESUME.
+
+    Returns:
+        tuple: (jeton, dernière séquence reçue dans le salon)
+    """
+    if len(payload) != SESSION_TOKEN_LEN + 8:
+        raise ValueError("RESUME invalide")
+    return bytes(payload[:SESSION_TOKEN_LEN]), _U64.unpack_from(payload, SESSION_TOKEN_LEN)[0]
+
+
+def unpack_file_offer(payload: bytes) -> tuple[str, int, str]:
+    """
+    Décode le payload FILE_OFFER. L'empreinte est optionnelle : un client
+    d'origine envoie seulement [FILENAME][SIZE].
+
+    Returns:
+        tuple: (nom du fichier, taille, empreinte SHA-256 en hexadécimal ou "")
+    """
+    filename, end = unpack_string_from(payload)
+    size = _U32.unpack_from(payload, end)[0]
+    digest = unpack_string_from(payload, end + 4)[0] if len(payload) > end + 4 else ""
+    return filename, size, digest
+
+
+def file_digest(data) -> str:
+    """Empreinte d'un fichier entier annoncée dans FILE_OFFER (SHA-256, hexadécimal)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_file_digest(digest: str) -> bool:
+    """True si digest est une empreinte SHA-256 en hexadécimal (minuscules)."""
+    return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest)
+
+
+_FILE_DATA = struct.Struct(">III")  # [TRANSFERT: 4o][POSITION: 4o][CRC32: 4o]
+
+
+def pack_file_data(transfer_id: int, offset: int, data) -> bytes:
+    """
+    Encode le payload FILE_DATA : [TRANSFERT: 4o][POSITION: 4o][CRC32: 4o][DONNÉES].
+    La position est celle du premier octet du morceau dans le fichier.
+    """
+    return _FILE_DATA.pack(transfer_id, offset, zlib.crc32(data)) + bytes(data)
+
+
+def unpack_file_data(payload) -> tuple[int, int, int, memoryview]:
+    """
+    Décode le payload FILE_DATA (les données ne sont pas copiées ni vérifiées).
+
+    Returns:
+        tuple: (identifiant du transfert, position, CRC32 annoncé, données)
+    """
+    if len(payload) < _FILE_DATA.size:
+        raise ValueError("FILE_DATA invalide")
+    transfer_id, offset, crc = _FILE_DATA.unpack_from(payload)
+    return transfer_id, offset, crc, memoryview(payload)[_FILE_DATA.size:]
+
+
+def pack_room_update_batch(updates) -> bytes:
+    """
+    Encode le payload ROOM_UPDATE_BATCH.
+
+    Format :
+    - 2 octets : nombre de mises à jour
+    - pour chacune : [salon][utilisateur][ACTION: 1o]
+
+    Args:
+        updates: Liste de tuples (salon, utilisateur, action) avec action "join" ou "leave"
+    """
+    parts = [struct.pack(">H", len(updates))]
+    for room_name, user, action in updates:
+        parts.append(pack_string(room_name))
+        parts.append(pack_string(user))
+        parts.append(bytes([ACTION_CODES[action]]))
+    return b"".join(parts)
+
+
+def unpack_room_update_batch(payload: bytes) -> list:
+    """
+    Décode le payload ROOM_UPDATE_BATCH.
+
+    Returns:
+        list: Liste de tuples (salon, utilisateur, action)
+    """
+    count = struct.unpack_from(">H", payload)[0]
+    offset = 2
+    updates = []
+    for _ in range(count):
+        room_name, offset = unpack_string_from(payload, offset)
+        user, offset = unpack_string_from(payload, offset)
+        action = ACTION_NAMES[payload[offset]]
+        offset += 1
+        updates.append((room_name, user, action))
+    return updates
+
+
+def pack_room_update_batch_alias(updates) -> bytes:
+    """
+    Encode le payload ROOM_UPDATE_BATCH_ALIAS.
+
+    Format :
+    - 2 octets : nombre de mises à jour
+    - pour chacune : [ALIAS_SALON: 4o][ALIAS_PSEUDO: 4o][ACTION: 1o]
+
+    Args:
+        updates: Liste de tuples (alias_salon, alias_pseudo, action) avec action "join" ou "leave"
+    """
+    parts = [_U16.pack(len(updates))]
+    for room_id, user_id, action in updates:
+        parts.append(_ALIAS_UPDATE.pack(room_id, user_id, ACTION_CODES[action]))
+    return b"".join(parts)
+
+
+def unpack_room_update_batch_alias(payload: bytes) -> list:
+    """
+    Décode le payload ROOM_UPDATE_BATCH_ALIAS.
+
+    Returns:
+        list: Tuples (alias_salon, alias_pseudo, action) avec action "join" ou "leave"
+    """
+    count = _U16.unpack_from(payload)[0]
+    return [
+        (room_id, user_id, ACTION_NAMES[code])
+        for room_id, user_id, code in _ALIAS_UPDATE.iter_unpack(payload[2:2 + count * _ALIAS_UPDATE.size])
+    ]
+
+
+def pack_room_snapshot(room_name: str, members, max_payload: int = MAX_SNAPSHOT_PAYLOAD) -> list:
+    """
+    Encode la liste des membres d'un salon en un ou plusieurs payloads ROOM_SNAPSHOT.
+
+    Format d'un fragment :
+    - [salon] (chaîne préfixée sur 2 octets)
+    - 1 octet : drapeaux (SNAPSHOT_FIRST, SNAPSHOT_LAST)
+    - 2 octets : nombre de pseudos dans le fragment
+    - pour chaque pseudo : [LONGUEUR: 1o][PSEUDO: UTF-8] (pseudo ≤ 32 caractères)
+
+    Returns:
+        list: Les payloads, dans l'ordre d'envoi (au moins un, même si le salon est vide)
+    """
+    room = pack_string(room_name)
+    budget = max(max_payload - len(room) - 3, 1)
+
+    chunks = []
+    current = []
+    size = 0
+    for member in members:
+        encoded = member.encode("utf-8")
+        entry = bytes([len(encoded)]) + encoded
+        if current and size + len(entry) > budget:
+            chunks.append(current)
+            current = []
+            size = 0
+        current.append(entry)
+        size += len(entry)
+    chunks.append(current)
+
+    payloads = []
+    for i, chunk in enumerate(chunks):
+        flags = 0
+        if i == 0:
+            flags |= SNAPSHOT_FIRST
+        if i == len(chunks) - 1:
+            flags |= SNAPSHOT_LAST
+        payloads.append(room + struct.pack(">BH", flags, len(chunk)) + b"".join(chunk))
+    return payloads
+
+
+def unpack_room_snapshot(payload: bytes) -> tuple[str, int, list]:
+    """
+    Décode un fragment ROOM_SNAPSHOT.
+
+    Returns:
+        tuple: (salon, drapeaux, liste des pseudos)
+    """
+    room_name, offset = unpack_string_from(payload)
+    flags, count = struct.unpack_from(">BH", payload, offset)
+    offset += 3
+
+    members = []
+    for _ in range(count):
+        length = payload[offset]
+        start = offset + 1
+        offset = start + length
+        members.append(str(payload[start:offset], "utf-8"))
+    return room_name, flags, members
+
+
+# Message de l'historique durable : numéro de séquence, horodatage (ms), expéditeur, texte
+HistoryEntry = collections.namedtuple("HistoryEntry", ["seq", "timestamp", "sender", "text"])
+
+_HISTORY_ENTRY = struct.Struct(">QQ")  # [SÉQUENCE: 8o][HORODATAGE: 8o]
+
+
+def pack_history_chunk(room_name: str, entries, at_start: bool) -> bytes:
+    """
+    Encode le payload HISTORY_CHUNK.
+
+    Format :
+    - [salon][DRAPEAUX: 1o][NOMBRE: 2o]
+    - pour chaque message, du plus ancien au plus récent :
+      [SÉQUENCE: 8o][HORODATAGE: 8o][expéditeur][texte]
+
+    Args:
+        room_name: Le nom du salon
+        entries: Les messages (HistoryEntry)
+        at_start: La page contient le plus ancien message conservé
+    """
+    parts = [pack_string(room_name), _U8.pack(HISTORY_AT_START if at_start else 0)]
+    _pack_entries(parts, entries)
+    return b"".join(parts)
+
+
+def unpack_history_chunk(payload: bytes) -> tuple[str, int, list]:
+    """
+    Décode le payload HISTORY_CHUNK.
+
+    Returns:
+        tuple: (salon, drapeaux, liste de HistoryEntry)
+    """
+    room_name, offset = unpack_string_from(payload)
+    flags = payload[offset]
+    entries, _ = _unpack_entries(payload, offset + 1)
+    return room_name, flags, entries
+
+
+def _pack_entries(parts: list, entries):
+    """[NOMBRE: 2o] puis, pour chaque message : [SÉQUENCE: 8o][HORODATAGE: 8o][expéditeur][texte]"""
+    parts.append(_U16.pack(len(entries)))
+    for entry in entries:
+        parts.append(_HISTORY_ENTRY.pack(entry.seq, entry.timestamp))
+        parts.append(pack_string(entry.sender))
+        parts.append(pack_string(entry.text))
+
+
+def _unpack_entries(payload: bytes, offset: int) -> tuple[list, int]:
+    count = _U16.unpack_from(payload, offset)[0]
+    offset += 2
+    entries = []
+    for _ in range(count):
+        seq, timestamp = _HISTORY_ENTRY.unpack_from(payload, offset)
+        sender, offset = unpack_string_from(payload, offset + _HISTORY_ENTRY.size)
+        text, offset = unpack_string_from(payload, offset)
+        entries.append(HistoryEntry(seq, timestamp, sender, text))
+    return entries, offset
+
+
+def pack_search_results(room_name: str, query: str, total: int, offset: int, entries) -> bytes:
+    """
+    Encode le payload SEARCH_RESULTS.
+
+    Format :
+    - [salon][requête][TOTAL: 4o][DÉCALAGE: 2o][NOMBRE: 2o]
+    - pour chaque résultat, du plus pertinent au moins pertinent :
+      [IDENTIFIANT: 8o][HORODATAGE: 8o][expéditeur][texte]
+
+    Args:
+        room_name: Le nom du salon
+        query: La requête, telle que reçue
+        total: Nombre total de messages trouvés
+        offset: Rang du premier résultat de la page
+        entries: Les résultats (HistoryEntry, seq = identifiant du message)
+    """
+    parts = [pack_string(room_name), pack_string(query), _U32.pack(total), _U16.pack(offset)]
+    _pack_entries(parts, entries)
+    return b"".join(parts)
+
+
+def unpack_search_results(payload: bytes) -> tuple[str, str, int, int, list]:
+    """
+    Décode le payload SEARCH_RESULTS.
+
+    Returns:
+        tuple: (salon, requête, total, décalage, liste de HistoryEntry)
+    """
+    room_name, offset = unpack_string_from(payload)
+    query, offset = unpack_string_from(payload, offset)
+    total = _U32.unpack_from(payload, offset)[0]
+    first = _U16.unpack_from(payload, offset + 4)[0]
+    entries, _ = _unpack_entries(payload, offset + 6)
+    return room_name, query, total, first, entries
+
+
+def pack_directory(counts: dict) -> bytes:
+    """
+    Encode le payload DIRECTORY.
+
+    Format :
+    - 4 octets : nombre de salons
+    - pour chacun : [salon][NOMBRE_MEMBRES: 4o]
+
+    Args:
+        counts: Dictionnaire salon → nombre de membres
+    """
+    parts = [pack_int(len(counts))]
+    for room_name, count in counts.items():
+        parts.append(pack_string(room_name))
+        parts.append(pack_int(count))
+    return b"".join(parts)
+
+
+def unpack_directory(payload: bytes) -> dict:
+    """
+    Décode le payload DIRECTORY.
+
+    Returns:
+        dict: salon → nombre de membres
+    """
+    count = unpack_int(payload)
+    offset = 4
+    counts = {}
+    for _ in range(count):
+        room_name, offset = unpack_string_from(payload, offset)
+        counts[room_name] = struct.unpack_from(">I", payload, offset)[0]
+        offset += 4
+    return counts
+
+
+def pack_compressed(msg_type: int, payload: bytes) -> bytes:
+    """
+    Encode le payload COMPRESSED : [TYPE: 1o][payload compressé].
+
+    Returns:
+        bytes: Le payload COMPRESSED, ou None si la trame doit rester brute
+        (plus petite que COMPRESSION_THRESHOLD, ou compression non rentable)
+    """
+    if len(payload) < COMPRESSION_THRESHOLD:
+        return None
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                  zdict=COMPRESSION_DICTIONARY)
+    packed = _U8.pack(msg_type) + compressor.compress(payload) + compressor.flush()
+    if len(packed) >= len(payload):
+        return None
+    return packed
+
+
+def unpack_compressed(payload: bytes) -> tuple[int, bytes]:
+    """
+    Décode le payload COMPRESSED.
+
+    Returns:
+        tuple: (msg_type, payload) de la trame d'origine
+
+    Raises:
+        ValueError: Données corrompues, ou payload décompressé trop grand
+    """
+    if not payload:
+        raise ValueError("Trame COMPRESSED vide")
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=COMPRESSION_DICTIONARY)
+    try:
+        data = decompressor.decompress(payload[1:], MAX_DECOMPRESSED_PAYLOAD)
+    except zlib.error as e:
+        raise ValueError(f"Trame COMPRESSED invalide : {e}") from None
+    if decompressor.unconsumed_tail:
+        raise ValueError("Trame COMPRESSED trop grande")
+    if not decompressor.eof:
+        raise ValueError("Trame COMPRESSED tronquée")
+    return payload[0], data
+
+
+# Trames qui désignent salons et pseudos par leurs alias
+_ALIASED_TYPES = (MSG_BROADCAST_ALIAS, ROOM_UPDATE_ALIAS, ROOM_UPDATE_BATCH_ALIAS)
+
+
+class FrameDecoder:
+    """
+    Décodeur de trames incrémental.
+
+    TCP est un flux d'octets : un recv() peut renvoyer une trame partielle,
+    ou plusieurs trames collées. Le décodeur accumule les octets reçus
+    (par morceaux de taille quelconque) et restitue uniquement les trames
+    complètes.
+
+    Les en-têtes sont lus directement dans le tampon (struct.unpack_from) et
+    chaque payload n'est copié qu'une seule fois, via une memoryview.
+
+    Une trame annoncée plus grande que max_frame est refusée dès son en-tête
+    (ValueError) : un pair ne peut pas faire accumuler le tampon sans fin.
+    Les clients, qui font confiance au serveur, passent max_frame=None (un
+    DIRECTORY ou une page d'historique peut dépasser un morceau de fichier).
+
+    Côté client, le décodeur peut aussi défaire les extensions de transport :
+    - inflate=True : les trames COMPRESSED sont décompressées au passage
+    - resolve_aliases=True : les ALIAS sont retenus (et non restitués), les
+      trames *_ALIAS sont restituées sous leur forme d'origine (noms en clair)
+    L'appelant ne voit ainsi que les trames du protocole d'origine.
+
+    Usage :
+        decoder = FrameDecoder()
+        decoder.feed(sock.recv(RECV_BUFFER_SIZE))
+        for msg_type, payload in decoder:
+            ...
+    """
+
+    def __init__(self, inflate: bool = False, resolve_aliases: bool = False,
+                 max_frame: int = MAX_FRAME_SIZE):
+        self._buffer = bytearray()
+        self._pos = 0  # Début de la prochaine trame non lue dans le tampon
+        self.inflate = inflate
+        self.max_frame = max_frame
+        # alias → nom (un alias désigne toujours le même nom)
+        self.aliases = {} if resolve_aliases else None
+
+    def feed(self, data: bytes):
+        """
+        Ajoute des octets reçus au tampon.
+        """
+        # Compacter : supprimer les trames déjà restituées en une seule fois
+        if self._pos:
+            del self._buffer[:self._pos]
+            self._pos = 0
+
+        self._buffer += data
+
+    def next_frame(self):
+        """
+        Extrait la prochaine trame complète du tampon.
+
+        Returns:
+            tuple: (msg_type, payload), ou None si aucune trame n'est complète
+
+        Raises:
+            ValueError: Trame plus grande que max_frame
+        """
+        frame = self._next_raw_frame()
+        if self.aliases is None:
+            return frame
+        while frame is not None:
+            msg_type, payload = frame
+            if msg_type == ALIAS:
+                alias = decode_payload(ALIAS, payload)
+                self.aliases[alias.id] = alias.name
+            elif msg_type in _ALIASED_TYPES:
+                return self._resolve(msg_type, payload)
+            else:
+                return frame
+            frame = self._next_raw_frame()
+        return None
+
+    def _resolve(self, msg_type: int, payload: bytes) -> tuple[int, bytes]:
+        """
+        Remet les noms en clair dans une trame *_ALIAS.
+
+        Raises:
+            ValueError: Alias inconnu (jamais annoncé par ALIAS)
+        """
+        names = self.aliases
+        try:
+            if msg_type == MSG_BROADCAST_ALIAS:
+                msg = decode_payload(MSG_BROADCAST_ALIAS, payload)
+                return MSG_BROADCAST, encode_payload(MSG_BROADCAST, names[msg.sender], msg.text)
+            if msg_type == ROOM_UPDATE_ALIAS:
+                update = decode_payload(ROOM_UPDATE_ALIAS, payload)
+                return ROOM_UPDATE, encode_payload(ROOM_UPDATE, names[update.room], names[update.user],
+                                                   ACTION_NAMES[update.action])
+            return ROOM_UPDATE_BATCH, pack_room_update_batch([
+                (names[room_id], names[user_id], action)
+                for room_id, user_id, action in unpack_room_update_batch_alias(payload)
+            ])
+        except KeyError as e:
+            raise ValueError(f"Alias inconnu : {e}") from None
+
+    def _next_raw_frame(self):
+        buffer = self._buffer
+        pos = self._pos
+        available = len(buffer) - pos
+
+        if available < HEADER_SIZE:
+            return None
+
+        msg_type, length = _HEADER.unpack_from(buffer, pos)
+        if self.max_frame is not None and HEADER_SIZE + length > self.max_frame:
+            raise ValueError(f"Trame trop grande : {length} octets (type {msg_type:#04x})")
+        if available - HEADER_SIZE < length:
+            return None
+
+        start = pos + HEADER_SIZE
+        end = start + length
+        with memoryview(buffer) as view:
+            payload = bytes(view[start:end])
+
+        self._pos = end
+        if msg_type == COMPRESSED and self.inflate:
+            return unpack_compressed(payload)
+        return msg_type, payload
+
+    def pending(self) -> int:
+        """
+        Nombre d'octets reçus mais pas encore restitués.
+        """
+        return len(self._buffer) - self._pos
+
+    def __iter__(self):
+        """
+        Itère sur toutes les trames complètes disponibles.
+        """
+        frame = self.next_frame()
+        while frame is not None:
+            yield frame
+            frame = self.next_frame()
+
+
+def recv_frame(sock, decoder: FrameDecoder):
+    """
+    Lit une trame complète sur une socket bloquante.
+
+    Les octets lus en trop restent dans le décodeur pour l'appel suivant :
+    il faut donc toujours réutiliser le même décodeur pour une socket.
+
+    Returns:
+        tuple: (msg_type, payload), ou None si la connexion est fermée
+    """
+    frame = decoder.next_frame()
+    while frame is None:
+        data = sock.recv(RECV_BUFFER_SIZE)
+        if not data:
+            return None
+        decoder.feed(data)
+        frame = decoder.next_frame()
+    return frame
+
+
+class Frame:
+    """
+    Trame à envoyer, gardée en deux morceaux : l'en-tête précalculé et le
+    payload d'origine (bytes, bytearray ou memoryview), sans les concaténer.
+
+    send_frames écrit les deux morceaux en un seul appel système (sendmsg) :
+    un payload volumineux diffusé à N clients n'est jamais recopié.
+    """
+
+    __slots__ = ("header", "payload")
+
+    def __init__(self, msg_type: int, payload=b""):
+        self.header = _HEADER.pack(msg_type, len(payload))
+        self.payload = payload
+
+    def __len__(self):
+        return HEADER_SIZE + len(self.payload)
+
+    def __bytes__(self):
+        return self.header + bytes(self.payload)
+
+
+class SharedFrame:
+    """
+    Trame diffusée à plusieurs destinataires.
+
+    La trame brute est encodée une fois ; sa version COMPRESSED est calculée
+    au premier destinataire qui a négocié CAP_COMPRESSION, puis partagée par
+    tous les suivants.
+    """
+
+    __slots__ = ("msg_type", "frame", "_compressed")
+
+    def __init__(self, msg_type: int, payload: bytes):
+        self.msg_type = msg_type
+        self.frame = Frame(msg_type, payload)
+        self._compressed = None  # None : pas encore calculée, False : non rentable
+
+    def for_capabilities(self, capabilities: int) -> Frame:
+        """
+        Trame à envoyer à un client ayant négocié ces capacités.
+        """
+        if not capabilities & CAP_COMPRESSION:
+            return self.frame
+        if self._compressed is None:
+            packed = pack_compressed(self.msg_type, self.frame.payload)
+            self._compressed = Frame(COMPRESSED, packed) if packed is not None else False
+        return self._compressed or self.frame
+
+
+# Nombre max de tampons par appel sendmsg (IOV_MAX vaut 1024 sous Linux et macOS)
+MAX_SEND_BUFFERS = 1024
+
+
+def send_frames(sock, frames):
+    """
+    Envoie une suite de trames (bytes ou Frame) en entier.
+
+    Avec sendmsg, toutes les trames partent en un minimum d'appels système,
+    sans copie. Sinon (Windows, sockets simulées), chaque trame est envoyée
+    avec sendall.
+    """
+    sendmsg = getattr(sock, "sendmsg", None)
+    if sendmsg is None:
+        for frame in frames:
+            sock.sendall(bytes(frame))
+        return
+
+    buffers = []
+    for frame in frames:
+        if isinstance(frame, Frame):
+            buffers.append(memoryview(frame.header))
+            if len(frame.payload):
+                buffers.append(memoryview(frame.payload))
+        else:
+            buffers.append(memoryview(frame))
+
+    i = 0
+    while i < len(buffers):
+        sent = sendmsg(buffers[i:i + MAX_SEND_BUFFERS])
+        # Envoi partiel : sauter les tampons complets, entamer le suivant
+        while sent:
+            size = len(buffers[i])
+            if sent >= size:
+                sent -= size
+                i += 1
+            else:
+                buffers[i] = buffers[i][sent:]
+                sent = 0
@@ -0,0 +1,336 @@
+"""
+actors.py
+
+Mode de concurrence « un acteur par salon ».
+
+Dans ChatServer, chaque JOIN, LEAVE et diffusion passe par le lock global
+ChatServer.lock : tous les salons avancent à tour de rôle. Ici, chaque salon
+appartient à un acteur (un thread) qui est le seul à lire et modifier la liste
+de ses membres. Les autres threads ne modifient rien directement : ils
+déposent des commandes (join, leave, broadcast...) dans la boîte aux lettres
+de l'acteur, qui les traite dans l'ordre d'arrivée.
+
+Deux salons actifs progressent donc en parallèle, sans lock partagé sur le
+chemin critique. Seuls le registre des acteurs (création / retrait d'un salon)
+et la liste globale des clients (LOGIN, départ) restent protégés par un lock.
+Les ROOM_UPDATE d'un acteur partent vers une copie figée de cette liste,
+refaite (sous le lock) seulement après un LOGIN ou un départ : un JOIN ou un
+LEAVE ne prend pas le lock global tant que la liste ne change pas.
+
+Le dashboard admin (get_clients_info, kick_client) passe lui aussi par les
+boîtes aux lettres.
+"""
+
+import collections
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from server.server import ChatServer, ClientContext, SERVER_SENDER
+from common.protocol import *
+
+# Délai max (secondes) d'attente d'une réponse d'acteur
+ACTOR_REPLY_TIMEOUT = 2.0
+
+
+class RoomActor(threading.Thread):
+    """
+    Acteur propriétaire d'un salon : seul ce thread accède à self.members.
+    """
+
+    def __init__(self, server: "ActorChatServer", room_name: str):
+        super().__init__(daemon=True, name=f"salon-{room_name}")
+        self.server = server
+        self.room_name = room_name
+
+        # pseudo → ClientContext
+        self.members = {}
+
+        self.closed = False
+        self._mailbox = collections.deque()
+        self._cond = threading.Condition()
+
+        self._handlers = {
+            "join": self._on_join,
+            "leave": self._on_leave,
+            "broadcast": self._on_broadcast,
+            "members": self._on_members,
+            "info": self._on_info,
+        }
+
+    def post(self, command: str, *args) -> bool:
+        """
+        Dépose une commande dans la boîte aux lettres.
+
+        Returns:
+            bool: False si l'acteur est arrêté (salon vide retiré du registre)
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            self._mailbox.append((command, args))
+            self._cond.notify()
+        return True
+
+    def is_idle(self) -> bool:
+        """Vrai si le salon est vide et la boîte aux lettres aussi (à appeler sous self._cond)."""
+        return not self._mailbox and not self.members
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._mailbox:
+                    self._cond.wait()
+                command, args = self._mailbox.popleft()
+
+            try:
+                self._handlers[command](*args)
+            except Exception as e:
+                print(f"Erreur dans le salon {self.room_name} ({command}) : {e}")
+
+            # Un salon vide s'arrête (comme ChatServer supprime un salon vide)
+            if not self.members and self.server._retire_actor(self):
+                break
+
+    # ==================== Commandes ====================
+
+    def _on_join(self, client: ClientContext):
+        existing_members = list(self.members)
+        self.members[client.pseudo] = client
+
+        self.server._send_join_ok(client, self.room_name, existing_members)
+
+        # Notifier TOUS les clients que le nouveau a rejoint (pour la liste globale)
+        self.server._broadcast_room_update(self.room_name, client.pseudo, "join")
+
+        # Notifier les autres dans le chat
+        self._on_broadcast(SERVER_SENDER, f"{client.pseudo} s'est connecté", client.pseudo)
+
+    def _on_leave(self, client: ClientContext, reason: str, done: Future):
+        if self.members.get(client.pseudo) is client:
+            del self.members[client.pseudo]
+
+            self._on_broadcast(SERVER_SENDER, f"{client.pseudo} {reason}", None)
+            self.server._broadcast_room_update(self.room_name, client.pseudo, "leave")
+
+        done.set_result(True)
+
+    def _on_broadcast(self, sender_pseudo: str, message: str, exclude_pseudo: str):
+        # Trame encodée (et compressée) une seule fois pour tous les membres
+        recipients = [member for pseudo, member in self.members.items() if pseudo != exclude_pseudo]
+        self.server._deliver_broadcast(self.room_name, recipients, sender_pseudo, message, exclude_pseudo)
+
+    def _on_members(self, reply: Future):
+        reply.set_result(list(self.members))
+
+    def _on_info(self, reply: Future):
+        reply.set_result([self.server._client_info(member) for member in self.members.values()])
+
+
+class ActorChatServer(ChatServer):
+    """
+    ChatServer dont les salons sont gérés par des acteurs (voir RoomActor).
+
+    self.rooms n'est pas utilisé dans ce mode : l'état d'un salon n'existe
+    que dans son acteur.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        # Registre nom_salon → acteur
+        self.actors = {}
+        self.actors_lock = threading.Lock()
+
+        # Copie figée des clients authentifiés (destinataires des présences),
+        # None = à refaire après un changement de self.clients
+        self._audience = None
+
+    # ==================== Boîtes aux lettres ====================
+
+    def _post(self, room_name: str, command: str, *args, create: bool = False) -> bool:
+        """
+        Dépose une commande pour le salon.
+
+        Args:
+            room_name: Le nom du salon
+            command: La commande (voir RoomActor._handlers)
+            create: Créer le salon (et son acteur) s'il n'existe pas
+
+        Returns:
+            bool: False si le salon n'existe pas
+        """
+        # Chemin rapide : l'acteur existe et tourne, aucun lock partagé
+        actor = self.actors.get(room_name)
+        if actor is not None and actor.post(command, *args):
+            return True
+
+        # Chemin lent : création du salon ou acteur en cours d'arrêt
+        with self.actors_lock:
+            actor = self.actors.get(room_name)
+            if actor is None:
+                if not create:
+                    return False
+                actor = RoomActor(self, room_name)
+                self.actors[room_name] = actor
+                self.aliases.register(room_name)
+                actor.start()
+            return actor.post(command, *args)
+
+    def _ask(self, room_name: str, command: str, default):
+        """
+        Pose une question à l'acteur d'un salon et attend sa réponse.
+        """
+        reply = Future()
+        if not self._post(room_name, command, reply):
+            return default
+        try:
+            return reply.result(ACTOR_REPLY_TIMEOUT)
+        except FutureTimeoutError:
+            return default
+
+    def _retire_actor(self, actor: RoomActor) -> bool:
+        """
+        Retire du registre l'acteur d'un salon vide.
+
+        Returns:
+            bool: True si l'acteur doit s'arrêter
+        """
+        with self.actors_lock:
+            with actor._cond:
+                if not actor.is_idle():
+                    return False
+                actor.closed = True
+            if self.actors.get(actor.room_name) is actor:
+                del self.actors[actor.room_name]
+                self.aliases.release(actor.room_name)
+                if self.sessions is not None:
+                    self.sessions.forget_room(actor.room_name)
+        return True
+
+    # ==================== Liste des clients ====================
+
+    def handle_login(self, client: ClientContext, msg_type: int, payload: bytes) -> bool:
+        accepted = super().handle_login(client, msg_type, payload)
+        self._audience = None
+        return accepted
+
+    def _forget_client(self, client: ClientContext):
+        super()._forget_client(client)
+        self._audience = None
+
+    def _send_directory(self, client: ClientContext):
+        # Copie refaite avant le DIRECTORY : le client reçoit les présences qui le suivent
+        self._audience = None
+        super()._send_directory(client)
+
+    def _presence_recipients(self) -> list:
+        """
+        Destinataires des ROOM_UPDATE envoyés par les acteurs : la copie
+        figée, refaite sous le lock global seulement si la liste a changé.
+        """
+        audience = self._audience
+        if audience is None:
+            with self.lock:
+                audience = self._audience = tuple(self.clients.values())
+        return [c for c in audience if c.is_authenticated()]
+
+    # ==================== Salons ====================
+
+    def handle_join(self, client: ClientContext, payload: bytes):
+        """
+        Traite une demande JOIN : l'état du client change tout de suite,
+        l'acteur du salon se charge de l'ajout et des notifications.
+        """
+        room_name = self._parse_join(client, payload)
+        if room_name is None:
+            return
+
+        # Si le client est déjà dans un salon, le retirer d'abord
+        if client.room is not None:
+            self._remove_client_from_room(client)
+
+        client.room = room_name
+        client.state = STATE_IN_ROOM  # Transition: AUTHENTIFIÉ → DANS_SALON
+
+        self._post(room_name, "join", client, create=True)
+
+    def _remove_client_from_room(self, client: ClientContext, reason: str = "s'est déconnecté") -> Future:
+        """
+        Demande à l'acteur du salon de retirer le client.
+
+        Returns:
+            Future: Résolue quand l'acteur a traité le départ
+        """
+        room_name = client.room
+        if room_name and client.pseudo:
+            self._file_member_left(room_name, client.pseudo)
+
+        # Mettre à jour l'état du client
+        client.room = None
+        client.state = STATE_AUTHENTICATED  # Transition: DANS_SALON → AUTHENTIFIÉ
+
+        done = Future()
+        if not room_name or not self._post(room_name, "leave", client, reason, done):
+            done.set_result(False)
+        return done
+
+    def _broadcast_to_room(self, room_name: str, sender_pseudo: str, message: str, exclude_pseudo: str = None):
+        """Diffusion confiée à l'acteur du salon."""
+        self._post(room_name, "broadcast", sender_pseudo, message, exclude_pseudo)
+
+    def room_members(self, room_name: str) -> list:
+        return self._ask(room_name, "members", [])
+
+    # ==================== Dashboard admin ====================
+
+    def get_clients_info(self) -> list:
+        """
+        Retourne les informations de tous les clients connectés.
+        Les membres des salons sont décrits par leurs acteurs.
+        """
+        with self.lock:
+            clients_info = [self._client_info(c) for c in self.clients.values() if c.room is None]
+
+        with self.actors_lock:
+            actors = list(self.actors.values())
+
+        replies = []
+        for actor in actors:
+            reply = Future()
+            if actor.post("info", reply):
+                replies.append(reply)
+
+        for reply in replies:
+            try:
+                clients_info.extend(reply.result(ACTOR_REPLY_TIMEOUT))
+            except FutureTimeoutError:
+                pass
+        return clients_info
+
+    def kick_client(self, pseudo: str) -> bool:
+        """
+        Kick un client : son départ est traité par l'acteur du salon
+        avant la fermeture de la socket.
+        """
+        with self.lock:
+            client = self.clients.get(pseudo)
+            if client is None:
+                return False
+
+        if client.room:
+            done = self._remove_client_from_room(client, "a été kické")
+            try:
+                done.result(ACTOR_REPLY_TIMEOUT)
+            except FutureTimeoutError:
+                pass
+
+        # Fermer la socket du client (ce qui va déclencher la déconnexion)
+        try:
+            client.sock.close()
+        except OSError:
+            pass
+
+        # Retirer le client de la liste
+        self._forget_client(client)
+
+        return True
@@ -1,7 +1,8 @@
 """
 Dashboard Admin pour le serveur de chat.
 
-Interface Flet affichant en temps réel les clients connectés.
+Interface Flet affichant en temps réel les clients connectés et
+l'efficacité du cache des fichiers audio.
 Doit être lancé dans le même processus que le serveur.
 
 Usage:
@@ -34,7 +35,7 @@ class AdminDashboard:
         
         # Configuration de la page
         self.page.title = "Admin Dashboard - Chat Server"
-        self.page.window.width = 800
+        self.page.window.width = 900
         self.page.window.height = 400
         self.page.bgcolor = ADMIN_BG
         self.page.theme_mode = ft.ThemeMode.DARK
@@ -67,9 +68,23 @@ class AdminDashboard:
             color=ADMIN_TEXT_DIM
         )
         
+        # Cache des fichiers : part des offres servies depuis le cache, octets économisés
+        self.file_stats = ft.Text(
+            "Cache fichiers : -",
+            size=14,
+            color=ADMIN_TEXT_DIM
+        )
+        
         header = ft.Row([
             title,
             ft.Container(expand=True),
+            ft.Container(
+                content=self.file_stats,
+                bgcolor=ADMIN_BG_CARD,
+                padding=ft.padding.only(left=15, right=15, top=8, bottom=8),
+                border_radius=20,
+                border=ft.border.all(1, ADMIN_BORDER),
+            ),
             ft.Container(
                 content=self.client_count,
                 bgcolor=ADMIN_BG_CARD,
@@ -174,11 +189,21 @@ class AdminDashboard:
         """Boucle de rafraîchissement des données."""
         while self.running:
             try:
+                self.update_file_stats()
                 self.update_clients()
             except Exception as e:
                 print(f"Dashboard refresh error: {e}")
             time.sleep(2)
     
+    def update_file_stats(self):
+        """Met à jour les statistiques du cache des fichiers (affichées au prochain page.update)."""
+        stats = self.chat_server.get_file_stats()
+        saved_mb = stats['bytes_saved'] / (1024 * 1024)
+        self.file_stats.value = (
+            f"Cache fichiers : {stats['cache_hit_rate']:.0%} de hits, "
+            f"{saved_mb:.1f} Mo économisés"
+        )
+    
     def update_clients(self):
         """Met à jour la liste des clients."""
         clients = self.chat_server.get_clients_info()
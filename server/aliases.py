@@ -0,0 +1,154 @@
+"""
+aliases.py
+
+Alias numériques des noms (salons, pseudos) pour les clients ayant annoncé
+CAP_ALIASES.
+
+Le serveur attribue un alias (entier, jamais réutilisé) à chaque pseudo
+connecté et à chaque salon ouvert. Un client reçoit la trame ALIAS d'un nom
+juste avant la première trame qui l'utilise ; ensuite, présences et messages
+le désignent par ses 4 octets au lieu du nom complet.
+
+Les alias sont communs à toutes les connexions : une trame *_ALIAS est encodée
+une seule fois par diffusion, chaque connexion ne retient que l'ensemble des
+alias qui lui ont déjà été annoncés. Un nom sans alias (ex : pseudo d'un
+client déjà parti, dans la présence « leave » qui suit sa déconnexion) est
+simplement envoyé en clair.
+"""
+
+import threading
+from common.protocol import *
+
+# Alias retenus au plus par connexion ; au-delà, l'ensemble est vidé
+# et les alias sont annoncés à nouveau (le client garde sa table)
+MAX_CONNECTION_ALIASES = 4096
+
+
+class AliasRegistry:
+    """
+    Table nom → alias, partagée par toutes les connexions.
+
+    Un même nom peut être enregistré plusieurs fois (un salon qui porte le
+    pseudo d'un client) : il garde son alias jusqu'au dernier release().
+    """
+
+    def __init__(self):
+        self._ids = {}   # nom → alias
+        # Enregistrements en plus du premier (rare : seulement pour les noms partagés)
+        self._extra = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def register(self, name: str) -> int:
+        """Attribue un alias au nom (ou retient l'alias existant)."""
+        with self._lock:
+            alias = self._ids.get(name)
+            if alias is None:
+                alias = self._ids[name] = self._next_id
+                self._next_id += 1
+            else:
+                self._extra[name] = self._extra.get(name, 0) + 1
+            return alias
+
+    def release(self, name: str):
+        """Libère un enregistrement du nom ; l'alias disparaît avec le dernier."""
+        with self._lock:
+            extra = self._extra.pop(name, 0)
+            if extra > 1:
+                self._extra[name] = extra - 1
+            elif not extra:
+                self._ids.pop(name, None)
+
+    def lookup(self, names) -> tuple:
+        """
+        Alias de plusieurs noms.
+
+        Returns:
+            tuple: Les alias, ou None si l'un des noms n'en a pas
+        """
+        with self._lock:
+            ids = self._ids
+            try:
+                return tuple(ids[name] for name in names)
+            except KeyError:
+                return None
+
+    def lookup_each(self, names) -> dict:
+        """
+        Alias des noms qui en ont un.
+
+        Returns:
+            dict: nom → alias (les noms sans alias sont absents)
+        """
+        with self._lock:
+            ids = self._ids
+            return {name: ids[name] for name in names if name in ids}
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def announce(client, names, ids) -> bool:
+        """
+        Envoie au client les ALIAS qu'il ne connaît pas encore.
+
+        Un alias n'est noté comme connu qu'une fois sa trame acceptée par la
+        file d'envoi : la trame qui l'utilise part forcément après.
+
+        Returns:
+            bool: False si une trame ALIAS a été refusée (client en retard) :
+            la trame qui devait suivre ne doit pas être envoyée
+        """
+        known = client.aliases
+        if known is None:
+            known = client.aliases = set()
+        for name, alias in zip(names, ids):
+            if alias in known:
+                continue
+            if not client.send(encode_message(ALIAS, alias, name)):
+                return False
+            if len(known) >= MAX_CONNECTION_ALIASES:
+                known.clear()
+            known.add(alias)
+        return True
+
+
+class AliasedFrame:
+    """
+    Trame diffusée sous deux formes, chacune encodée une seule fois :
+    noms en clair pour les clients d'origine, alias pour les clients CAP_ALIASES.
+    """
+
+    __slots__ = ("plain", "names", "_encode_aliased", "_registry", "_ids", "_aliased")
+
+    def __init__(self, registry: AliasRegistry, plain: SharedFrame, names, encode_aliased):
+        """
+        Args:
+            registry: La table des alias du serveur
+            plain: La trame avec les noms en clair
+            names: Les noms que la forme « alias » remplace
+            encode_aliased: Fonction(ids) → SharedFrame de la forme « alias »
+        """
+        self.plain = plain
+        self.names = names
+        self._encode_aliased = encode_aliased
+        self._registry = registry
+        self._ids = None
+        self._aliased = None  # None : pas encore encodée, False : un nom n'a pas d'alias
+
+    def send(self, client, key=None) -> bool:
+        """
+        Envoie la forme adaptée au client (précédée des ALIAS qui lui manquent).
+
+        Returns:
+            bool: False si la trame n'a pas pu être envoyée
+        """
+        if client.capabilities & CAP_ALIASES:
+            if self._aliased is None:
+                self._ids = self._registry.lookup(self.names)
+                self._aliased = self._encode_aliased(self._ids) if self._ids is not None else False
+            if self._aliased:
+                if not self._registry.announce(client, self.names, self._ids):
+                    return False
+                return client.send(self._aliased.for_capabilities(client.capabilities), key)
+        return client.send(self.plain.for_capabilities(client.capabilities), key)
@@ -0,0 +1,223 @@
+"""
+async_server.py
+
+Moteur réseau asyncio pour le serveur de chat.
+
+Alternative au moteur « un thread par client » de server_main.py : une seule
+boucle d'événements gère toutes les connexions, ce qui permet de garder des
+dizaines de milliers de clients (majoritairement inactifs) dans un seul
+processus.
+
+La logique métier reste entièrement dans ChatServer : ce module ne fait que
+lire les trames et les transmettre à ChatServer.dispatch, exactement comme
+ChatServer.handle_client. Le format sur le fil est donc strictement identique.
+"""
+
+import asyncio
+import threading
+
+from server.server import ChatServer, ClientContext, WRITER_FLUSH_TIMEOUT
+from server.outbound import OutboundQueue
+from common.protocol import *
+
+
+class StreamSocket:
+    """
+    Adaptateur exposant l'interface socket utilisée par ChatServer
+    (send / close / shutdown) au-dessus d'un asyncio.StreamWriter.
+
+    En fonctionnement normal les trames passent par la file d'envoi du
+    client (voir outbound.py), vidée par une tâche de la boucle d'événements.
+    L'écriture directe reste non bloquante (mise en tampon par le transport).
+    Les appels venant d'un autre thread (ex : kick depuis le dashboard admin)
+    sont redirigés vers la boucle d'événements.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        self.writer = writer
+        self.loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def _in_loop_thread(self) -> bool:
+        return threading.get_ident() == self._loop_thread
+
+    def send(self, data: bytes) -> int:
+        if self.writer.is_closing():
+            raise ConnectionError("Connexion fermée")
+
+        if self._in_loop_thread():
+            self.writer.write(data)
+        else:
+            self.loop.call_soon_threadsafe(self.writer.write, bytes(data))
+        return len(data)
+
+    def sendall(self, data: bytes):
+        self.send(data)
+
+    def close(self):
+        if self._in_loop_thread():
+            self.writer.close()
+        else:
+            self.loop.call_soon_threadsafe(self.writer.close)
+
+    def shutdown(self, how=None):
+        # Coupe la connexion : la lecture en cours se termine (fin de flux)
+        self.close()
+
+    def getpeername(self):
+        return self.writer.get_extra_info("peername")
+
+
+class AsyncChatServer:
+    """
+    Pilote un ChatServer avec des streams asyncio.
+    """
+
+    def __init__(self, server: ChatServer, host: str, port: int, backlog: int = 1024):
+        """
+        Args:
+            server: La logique serveur (partagée avec le dashboard admin)
+            host: Adresse d'écoute
+            port: Port d'écoute (0 = port choisi par le système)
+            backlog: Taille de la file d'attente des connexions entrantes
+        """
+        self.server = server
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.loop = None
+        self._server = None
+        self.ready = threading.Event()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Traite un client tant que la connexion TCP est ouverte.
+        Équivalent asyncio de ChatServer.handle_client.
+        """
+        sock = StreamSocket(writer, asyncio.get_running_loop())
+        client = ClientContext(sock)
+        outbox = client.outbox = self.server.create_outbox()
+        write_task = asyncio.create_task(self._write_loop(outbox, writer))
+        self.server.connect(client)
+        decoder = FrameDecoder()
+
+        try:
+            while True:
+                data = await reader.read(RECV_BUFFER_SIZE)
+                if not data:
+                    break
+
+                decoder.feed(data)
+                for msg_type, payload in decoder:
+                    if msg_type == RESUME and client.state == STATE_CONNECTED:
+                        # Le contexte de la session reprise remplace celui de la connexion
+                        client = self.server.resume(client, payload)
+                    elif not self.server.dispatch(client, msg_type, payload):
+                        return
+
+        except (ConnectionError, OSError):
+            # Connexion fermée par le client ou après un kick
+            pass
+
+        except ValueError as e:
+            # Trame trop grande (voir MAX_FRAME_SIZE) : connexion fermée
+            print(f"Connexion fermée ({client.pseudo}) : {e}")
+
+        finally:
+            # Vider la file d'envoi de cette connexion avant de la fermer
+            outbox.close()
+            try:
+                await asyncio.wait_for(write_task, WRITER_FLUSH_TIMEOUT)
+            except (asyncio.TimeoutError, ConnectionError, OSError):
+                pass
+            self.server.disconnect(client, sock)
+
+    async def _write_loop(self, outbox: OutboundQueue, writer: asyncio.StreamWriter):
+        """
+        Tâche écrivain d'un client : vide sa file d'envoi sur le transport.
+
+        drain() suspend la tâche tant que le tampon du transport est plein :
+        les trames s'accumulent alors dans la file, soumise aux seuils.
+        """
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        wakeup = asyncio.Event()
+
+        def on_ready():
+            if threading.get_ident() == loop_thread:
+                wakeup.set()
+            else:
+                loop.call_soon_threadsafe(wakeup.set)
+
+        outbox.on_ready = on_ready
+
+        while True:
+            frames = outbox.take_nowait()
+            if frames is None:
+                break
+            if not frames:
+                await wakeup.wait()
+                wakeup.clear()
+                continue
+
+            nbytes = sum(len(frame) for frame in frames)
+            buffers = []
+            for frame in frames:
+                if isinstance(frame, Frame):
+                    buffers.append(frame.header)
+                    buffers.append(frame.payload)
+                else:
+                    buffers.append(frame)
+            try:
+                # Pas de concaténation : le transport écrit les tampons tels quels
+                writer.writelines(buffers)
+                await writer.drain()
+            except (ConnectionError, OSError):
+                outbox.close()
+                break
+            finally:
+                outbox.release(nbytes)
+
+        if outbox.overflowed:
+            # Client trop lent : couper la connexion
+            writer.close()
+
+    async def serve(self):
+        """Ouvre la socket d'écoute et sert les clients jusqu'à l'arrêt."""
+        self.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(
+            self.handle_connection,
+            self.host,
+            self.port,
+            backlog=self.backlog,
+            reuse_address=True,
+        )
+
+        # Port réel (utile si port=0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"Serveur (asyncio) en écoute sur {self.host}:{self.port}")
+        self.ready.set()
+
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            print("Serveur arrêté.")
+
+    def run(self):
+        """Lance la boucle d'événements (bloquant)."""
+        asyncio.run(self.serve())
+
+    def stop(self):
+        """Arrête le serveur depuis n'importe quel thread."""
+        if self.loop and self._server:
+            self.loop.call_soon_threadsafe(self._server.close)
+
+
+def run_asyncio_server(server: ChatServer, host: str, port: int):
+    """
+    Lance le moteur asyncio (bloquant), à appeler dans un thread dédié.
+    """
+    AsyncChatServer(server, host, port).run()
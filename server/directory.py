@@ -0,0 +1,61 @@
+"""
+directory.py
+
+Annuaire des salons : nombre de membres par salon, maintenu au fil des
+JOIN / LEAVE.
+
+Permet d'envoyer à un client qui vient de se connecter la liste de tous les
+salons (trame DIRECTORY) sans parcourir ChatServer.rooms sous le lock global.
+Le payload encodé est mis en cache et n'est reconstruit qu'après un changement.
+"""
+
+import threading
+from common.protocol import pack_directory
+
+
+class RoomDirectory:
+    """
+    Index salon → nombre de membres.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._payload = None  # Payload DIRECTORY en cache (None = à reconstruire)
+
+    def member_joined(self, room_name: str):
+        """Compte un membre de plus dans le salon."""
+        with self._lock:
+            self._counts[room_name] = self._counts.get(room_name, 0) + 1
+            self._payload = None
+
+    def member_left(self, room_name: str):
+        """Compte un membre de moins ; le salon disparaît quand il est vide."""
+        with self._lock:
+            count = self._counts.get(room_name, 0) - 1
+            if count > 0:
+                self._counts[room_name] = count
+            else:
+                self._counts.pop(room_name, None)
+            self._payload = None
+
+    def apply(self, room_name: str, action: str):
+        """Compte un changement de présence ("join" ou "leave")."""
+        if action == "join":
+            self.member_joined(room_name)
+        else:
+            self.member_left(room_name)
+
+    def counts(self) -> dict:
+        """Copie de l'index salon → nombre de membres."""
+        with self._lock:
+            return dict(self._counts)
+
+    def snapshot_payload(self) -> bytes:
+        """
+        Payload DIRECTORY décrivant tous les salons.
+        """
+        with self._lock:
+            if self._payload is None:
+                self._payload = pack_directory(self._counts)
+            return self._payload
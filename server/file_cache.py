@@ -0,0 +1,215 @@
+"""
+file_cache.py
+
+Cache des fichiers audio adressé par contenu : chaque fichier est rangé
+sous son empreinte SHA-256 (celle annoncée dans FILE_OFFER).
+
+Les mêmes extraits sont partagés encore et encore dans les salons. Quand
+une offre annonce une empreinte déjà dans le cache, l'émetteur n'envoie
+rien : les destinataires reçoivent le fichier directement depuis le cache.
+
+Deux niveaux :
+- sur disque, un fichier par empreinte, borné en octets : les moins
+  récemment utilisés sont supprimés au-delà de la taille max
+- en mémoire, les petits fichiers servis récemment (niveau chaud), bornés
+  eux aussi en octets : un extrait populaire n'est pas relu sur disque
+  pour chaque destinataire
+
+Le cache se remplit à la fin d'un transfert vérifié (empreinte conforme),
+à partir du fichier de la réserve (voir file_spool.py). Il survit à un
+redémarrage du serveur.
+"""
+
+import collections
+import os
+import shutil
+import threading
+from common.protocol import *
+
+# Valeurs par défaut
+CACHE_BYTES = 1024 * 1024 * 1024   # Taille max du cache sur disque
+HOT_BYTES = 32 * 1024 * 1024       # Taille max du niveau en mémoire
+HOT_FILE_BYTES = 2 * 1024 * 1024   # Taille max d'un fichier gardé en mémoire
+
+
+class FileCache:
+    """
+    Fichiers par empreinte, sur disque (LRU borné) avec un niveau chaud en mémoire.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = CACHE_BYTES,
+                 hot_bytes: int = HOT_BYTES, hot_file_bytes: int = HOT_FILE_BYTES):
+        """
+        Args:
+            directory: Répertoire du cache (créé s'il n'existe pas)
+            max_bytes: Taille max (octets) des fichiers sur disque
+            hot_bytes: Taille max (octets) des fichiers gardés en mémoire
+            hot_file_bytes: Taille max (octets) d'un fichier gardé en mémoire
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hot_bytes = hot_bytes
+        self.hot_file_bytes = hot_file_bytes
+
+        # Appelé (empreinte) quand un fichier quitte le cache sur disque
+        self.on_evict = None
+
+        self._sizes = collections.OrderedDict()  # empreinte → octets, du moins au plus récemment utilisé
+        self._hot = collections.OrderedDict()    # empreinte → contenu, idem
+        self._bytes = 0
+        self._hot_used = 0
+        self._lock = threading.Lock()
+
+        # Statistiques
+        self.hits = 0         # Offres servies depuis le cache
+        self.misses = 0       # Offres avec empreinte absente du cache
+        self.bytes_saved = 0  # Octets que les émetteurs n'ont pas eu à envoyer
+        self.evicted = 0
+
+        # Fichiers d'un démarrage précédent, du plus ancien au plus récent
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if is_file_digest(name) and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, digest, size in sorted(entries):
+            self._sizes[digest] = size
+            self._bytes += size
+        self._notify(self._evict_locked())
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def lookup(self, digest: str, size: int) -> bool:
+        """
+        Le fichier d'une offre acceptée est-il dans le cache ? (compté dans
+        les statistiques)
+        """
+        with self._lock:
+            hit = self._sizes.get(digest) == size
+            if hit:
+                self._sizes.move_to_end(digest)
+                self.hits += 1
+                self.bytes_saved += size
+            else:
+                self.misses += 1
+        return hit
+
+    def add(self, digest: str, source: str):
+        """
+        Ajoute un fichier vérifié (lien vers le fichier source, ou copie).
+        """
+        with self._lock:
+            if digest in self._sizes:
+                self._sizes.move_to_end(digest)
+                return
+        target = self.path(digest)
+        temporary = target + ".tmp"
+        try:
+            try:
+                os.link(source, temporary)
+            except OSError:
+                shutil.copyfile(source, temporary)
+            os.replace(temporary, target)
+            size = os.path.getsize(target)
+        except OSError as e:
+            print(f"Erreur d'ajout au cache : {e}")
+            return
+        with self._lock:
+            if digest not in self._sizes:
+                self._sizes[digest] = size
+                self._bytes += size
+            evicted = self._evict_locked()
+        self._notify(evicted)
+
+    def read(self, digest: str, offset: int, size: int) -> bytes:
+        """
+        Lit au plus size octets d'un fichier à partir d'une position.
+
+        Returns:
+            bytes: Les octets lus, None si le fichier n'est plus dans le cache
+        """
+        with self._lock:
+            content = self._hot.get(digest)
+            if content is not None:
+                self._hot.move_to_end(digest)
+                self._sizes.move_to_end(digest)
+                return content[offset:offset + size]
+            file_size = self._sizes.get(digest)
+            if file_size is None:
+                return None
+            self._sizes.move_to_end(digest)
+
+        try:
+            with open(self.path(digest), "rb") as file:
+                if file_size > self.hot_file_bytes:
+                    file.seek(offset)
+                    return file.read(size)
+                # Petit fichier : il passe en mémoire pour les prochains destinataires
+                content = file.read()
+        except OSError:
+            return None
+        with self._lock:
+            if digest in self._sizes and digest not in self._hot:
+                self._hot[digest] = content
+                self._hot_used += len(content)
+                while self._hot_used > self.hot_bytes:
+                    _, old = self._hot.popitem(last=False)
+                    self._hot_used -= len(old)
+        return content[offset:offset + size]
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            return digest in self._sizes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sizes)
+
+    @property
+    def size(self) -> int:
+        """Octets gardés sur disque."""
+        with self._lock:
+            return self._bytes
+
+    @property
+    def hot_size(self) -> int:
+        """Octets gardés en mémoire."""
+        with self._lock:
+            return self._hot_used
+
+    @property
+    def hit_rate(self) -> float:
+        """Part des offres (avec empreinte) servies depuis le cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _evict_locked(self) -> list:
+        """
+        Supprime les fichiers les moins récemment utilisés au-delà de la
+        taille max (verrou tenu).
+
+        Returns:
+            list: Empreintes des fichiers supprimés
+        """
+        evicted = []
+        while self._bytes > self.max_bytes and self._sizes:
+            digest, size = self._sizes.popitem(last=False)
+            self._bytes -= size
+            content = self._hot.pop(digest, None)
+            if content is not None:
+                self._hot_used -= len(content)
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                pass
+            evicted.append(digest)
+        self.evicted += len(evicted)
+        return evicted
+
+    def _notify(self, evicted: list):
+        if self.on_evict:
+            for digest in evicted:
+                self.on_evict(digest)
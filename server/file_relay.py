@@ -0,0 +1,761 @@
+"""
+file_relay.py
+
+Transferts de fichiers audio : offres en attente de réponses, puis relais
+des données (FILE_DATA / FILE_END) de l'émetteur vers les destinataires qui
+ont accepté.
+
+Chaque offre reçoit un identifiant de transfert, repris dans FILE_REQUEST,
+FILE_ACCEPT et FILE_REJECT. Le registre est indexé par identifiant (une
+réponse est traitée en O(1), quel que soit le nombre de clients connectés)
+et par salon (départs d'un salon). Les destinataires attendus d'une offre
+sont numérotés : acceptations et refus sont des masques de bits. Une offre
+sans réponse de tous à l'échéance part vers ceux qui ont accepté.
+
+Le serveur ne garde jamais un fichier entier : chaque morceau est relayé dès
+son arrivée. Il est reçu une fois, sa trame FILE_DATA est construite une fois
+(avec le payload reçu, tel quel) et c'est la même trame qui est déposée dans
+la file d'envoi de chaque destinataire : aucune copie par destinataire. Un
+morceau plus grand que `relay_chunk` est découpé, une fois pour tous, en
+trames plus petites (position et CRC32 chacune) : le chat n'attend jamais
+plus d'une de ces trames sur la connexion d'un destinataire.
+
+Un destinataire dont la file d'envoi est pleine ne reçoit plus de morceaux
+pour l'instant (la politique des clients lents les jetterait) : ils
+l'attendent dans la réserve du transfert et partent quand sa file se vide.
+Un morceau quitte la réserve dès que tous les destinataires l'ont reçu. La
+réserve est bornée en octets : un destinataire trop en retard pour y tenir
+est retiré du transfert (FILE_END_TOO_SLOW).
+
+Chaque morceau porte sa position et son CRC32 : le serveur n'accepte que le
+morceau attendu, intact. Sinon, il renvoie à l'émetteur la position vérifiée
+(FILE_RESUME) d'où reprendre. Avec une réserve sur disque (voir
+file_spool.py), les transferts se reprennent aussi après une coupure :
+l'émetteur parti a un délai pour revenir et demander la position vérifiée,
+un destinataire coupé ou retiré demande la suite à partir de ce qu'il a
+déjà reçu, relue depuis le disque. L'empreinte SHA-256 de FILE_OFFER est
+vérifiée sur le fichier entier (FILE_END_CORRUPT si elle diffère).
+
+Avec un cache adressé par contenu (voir file_cache.py), un fichier vérifié
+est gardé sous son empreinte : une offre acceptée dont l'empreinte est dans
+le cache n'est pas envoyée par l'émetteur (FILE_END juste après FILE_START),
+les destinataires la reçoivent depuis le cache, comme une reprise.
+
+Dans la file d'envoi d'un destinataire, les morceaux passent après le chat
+et les PING (voir outbound.py) et les transferts simultanés se partagent la
+connexion : un transfert en direct pèse plus qu'une relecture depuis le
+disque (reprise, cache), car ses morceaux occupent la réserve en mémoire
+tant qu'un destinataire ne les a pas reçus.
+"""
+
+import collections
+import hashlib
+import threading
+import time
+import zlib
+from common.protocol import *
+from server.outbound import DEFAULT_BULK_BURST
+from server.timing_wheel import HashedTimingWheel, DEFAULT_TICK
+
+# Valeurs par défaut
+SPOOL_BYTES = 4 * 1024 * 1024  # Octets gardés par transfert pour les destinataires en retard
+OFFER_TIMEOUT = 60.0           # Délai (secondes) pour répondre à une offre
+RESUME_TIMEOUT = 120.0         # Délai (secondes) pour que l'émetteur parti reprenne l'envoi
+RELAY_CHUNK_SIZE = DEFAULT_BULK_BURST  # Données max par trame FILE_DATA relayée (une écriture)
+
+# Poids dans le partage de la connexion d'un destinataire entre transferts
+LIVE_WEIGHT = 2      # Morceaux relayés en direct (gardés en mémoire)
+CATCH_UP_WEIGHT = 1  # Morceaux relus depuis le disque
+
+# Issue d'une offre
+OFFER_ACCEPTED = "accepted"
+OFFER_REJECTED = "rejected"
+
+
+class Transfer:
+    """
+    Un transfert : offre (destinataires attendus, réponses, échéance), puis
+    envoi (destinataires, réserve des morceaux pas encore reçus par tous).
+    """
+
+    __slots__ = (
+        "id", "sender", "filename", "size", "digest", "room", "pseudos", "bits",
+        "expected", "accepted", "rejected", "deadline", "started",
+        "received", "hasher", "resync", "sender_left", "ended", "status", "cached",
+        "positions", "catchup", "finals", "spool", "first", "spooled", "lock",
+    )
+
+    def __init__(self, transfer_id: int, sender, filename: str, size: int, room: str, pseudos,
+                 digest: str = ""):
+        self.id = transfer_id
+        self.sender = sender
+        self.filename = filename
+        self.size = size
+        self.digest = digest  # Empreinte SHA-256 annoncée ("" = pas de vérification)
+        self.room = room
+
+        # Offre : le destinataire n° i correspond au bit 1 << i
+        self.pseudos = list(pseudos)
+        self.bits = {pseudo: 1 << i for i, pseudo in enumerate(self.pseudos)}
+        self.expected = (1 << len(self.pseudos)) - 1  # Réponses attendues (départs retirés)
+        self.accepted = 0
+        self.rejected = 0
+        self.deadline = None   # Échéance de l'offre (horloge du registre)
+        self.started = False   # FILE_START envoyé
+
+        self.received = 0   # Octets reçus de l'émetteur et vérifiés
+        self.hasher = hashlib.sha256() if digest else None
+        self.resync = False       # FILE_RESUME envoyé à l'émetteur, morceau attendu pas encore reçu
+        self.sender_left = False  # Émetteur parti, le transfert attend sa reprise
+        self.ended = False  # Plus aucun morceau attendu de l'émetteur
+        self.status = None  # Statut final d'un transfert terminé
+        self.cached = False  # Fichier servi depuis le cache, sans envoi de l'émetteur
+
+        # Destinataire → indice (absolu) du prochain morceau à lui envoyer
+        self.positions = {}
+        # Destinataire qui reprend → position (octets) de la suite à relire sur disque
+        self.catchup = {}
+        # Destinataire retiré → trame FILE_END à lui envoyer dès qu'il a de la place
+        self.finals = {}
+        self.spool = collections.deque()  # Trames FILE_DATA (puis FILE_END)
+        self.first = 0    # Indice absolu du premier morceau de la réserve
+        self.spooled = 0  # Octets dans la réserve
+        self.lock = threading.Lock()
+
+    def accepted_pseudos(self) -> list:
+        """Pseudos des destinataires qui ont accepté (et sont encore là)."""
+        mask = self.accepted & self.expected
+        return [pseudo for pseudo, bit in self.bits.items() if mask & bit]
+
+    def pending_pseudos(self) -> list:
+        """Pseudos des destinataires qui n'ont pas refusé (et sont encore là)."""
+        mask = self.expected & ~self.rejected
+        return [pseudo for pseudo, bit in self.bits.items() if mask & bit]
+
+    def end_frame(self, status: int) -> Frame:
+        return Frame(FILE_END, encode_payload(FILE_END, self.id, status))
+
+    def resume_frame(self) -> Frame:
+        return Frame(FILE_RESUME, encode_payload(FILE_RESUME, self.id, self.received))
+
+
+class FileRelay:
+    """
+    Registre des transferts (par identifiant et par salon) et relais de leurs morceaux.
+    """
+
+    def __init__(self, spool_bytes: int = SPOOL_BYTES,
+                 offer_timeout: float = OFFER_TIMEOUT,
+                 spool=None, resume_timeout: float = RESUME_TIMEOUT, cache=None,
+                 relay_chunk: int = RELAY_CHUNK_SIZE,
+                 tick: float = DEFAULT_TICK, clock=time.monotonic):
+        """
+        Args:
+            spool_bytes: Octets gardés par transfert pour les destinataires en retard
+            offer_timeout: Délai (secondes) pour répondre à une offre
+            spool: Réserve sur disque (FileSpool) pour la reprise des
+                   transferts, None = transfert abandonné si l'émetteur part
+            resume_timeout: Délai (secondes) pour que l'émetteur parti reprenne
+                            l'envoi, ou qu'un destinataire reprenne un fichier
+                            servi depuis le cache
+            cache: Cache des fichiers par empreinte (FileCache), rempli à
+                   partir de la réserve sur disque (requise), None = pas de cache
+            relay_chunk: Données max (octets) par trame FILE_DATA relayée
+            tick: Précision des échéances (secondes)
+            clock: Horloge (remplaçable dans les tests)
+        """
+        self.spool_bytes = spool_bytes
+        self.offer_timeout = offer_timeout
+        self.resume_timeout = resume_timeout
+        if not 0 < relay_chunk <= FILE_CHUNK_SIZE:
+            raise ValueError(f"Taille des morceaux relayés hors de ]0, {FILE_CHUNK_SIZE}]")
+        self.relay_chunk = relay_chunk
+        self.clock = clock
+
+        self.spool = spool
+        if spool is not None:
+            spool.on_evict = self._on_evict
+        if cache is not None and spool is None:
+            raise ValueError("Le cache des fichiers requiert une réserve sur disque")
+        self.cache = cache
+        if cache is not None:
+            cache.on_evict = self._on_cache_evict
+
+        # Appelé (transfert, issue) quand une offre arrive à échéance
+        self.on_offer_expired = None
+
+        self._transfers = {}  # identifiant → Transfer (offre, ou émetteur encore attendu)
+        self._offers = {}     # nom_salon → {identifiant: Transfer} des offres en attente
+        self._done = {}       # identifiant → Transfer terminé, encore dans la réserve sur disque (ou le cache)
+        self._next_id = 1
+        # Destinataire → transferts en attente de place dans sa file d'envoi
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self.wheel = HashedTimingWheel(self._on_deadline, tick, clock=clock)
+
+        # Statistiques
+        self.relayed_bytes = 0    # Octets reçus des émetteurs
+        self.too_slow = 0         # Destinataires retirés d'un transfert
+        self.rejected_chunks = 0  # Morceaux hors séquence ou altérés
+        self.resumed = 0          # Reprises (FILE_RESUME) d'un destinataire
+
+    def start(self):
+        self.wheel.start()
+
+    def stop(self):
+        self.wheel.stop()
+
+    def offer(self, sender, filename: str, size: int, room_name: str, pseudos, digest: str = "") -> Transfer:
+        """Enregistre une offre adressée aux pseudos donnés et programme son échéance."""
+        with self._lock:
+            transfer_id = self._next_id
+            self._next_id = self._next_id % 0xFFFFFFFF + 1
+            transfer = Transfer(transfer_id, sender, filename, size, room_name, pseudos, digest)
+            transfer.deadline = self.clock() + self.offer_timeout
+            self._transfers[transfer_id] = transfer
+            self._offers.setdefault(room_name, {})[transfer_id] = transfer
+        self.wheel.schedule(transfer, self.offer_timeout)
+        return transfer
+
+    def room_offer(self, room_name: str) -> Transfer:
+        """
+        L'offre en attente dans un salon, s'il n'y en a qu'une (réponse sans
+        identifiant d'un client d'origine), sinon None.
+        """
+        with self._lock:
+            offers = self._offers.get(room_name)
+            if offers and len(offers) == 1:
+                return next(iter(offers.values()))
+        return None
+
+    def respond(self, transfer_id: int, pseudo: str, accepted: bool) -> tuple:
+        """
+        Enregistre la réponse d'un destinataire attendu.
+
+        Returns:
+            tuple: (Transfer ou None si l'offre est inconnue ou close,
+                    issue : OFFER_ACCEPTED, OFFER_REJECTED ou None si des réponses manquent)
+        """
+        with self._lock:
+            transfer = self._transfers.get(transfer_id)
+            if transfer is None or transfer.started:
+                return None, None
+            bit = transfer.bits.get(pseudo, 0)
+            if accepted:
+                transfer.accepted |= bit
+            else:
+                transfer.rejected |= bit
+            outcome = self._decide(transfer)
+        return transfer, outcome
+
+    def decide(self, transfer_id: int) -> tuple:
+        """
+        Issue d'une offre sans attendre de réponse (ex : aucun destinataire).
+
+        Returns:
+            tuple: (Transfer ou None si l'offre est inconnue ou close,
+                    issue ou None si des réponses manquent)
+        """
+        with self._lock:
+            transfer = self._transfers.get(transfer_id)
+            if transfer is None or transfer.started:
+                return None, None
+            return transfer, self._decide(transfer)
+
+    def member_left(self, room_name: str, pseudo: str) -> list:
+        """
+        Un membre quitte un salon : il n'est plus attendu par les offres du salon.
+
+        Returns:
+            list: (Transfer, issue) des offres décidées par ce départ
+        """
+        decided = []
+        with self._lock:
+            for transfer in list(self._offers.get(room_name, {}).values()):
+                bit = transfer.bits.get(pseudo, 0)
+                if transfer.expected & bit:
+                    transfer.expected &= ~bit
+                    outcome = self._decide(transfer)
+                    if outcome is not None:
+                        decided.append((transfer, outcome))
+        return decided
+
+    def open(self, transfer: Transfer, recipients) -> bool:
+        """
+        Début de l'envoi d'une offre acceptée (avant FILE_START).
+
+        Returns:
+            bool: True si le fichier est dans le cache : rien à attendre de
+                  l'émetteur, serve_cached l'envoie après FILE_START
+        """
+        if transfer.digest and self.cache is not None and self.cache.lookup(transfer.digest, transfer.size):
+            with self._lock:
+                self._transfers.pop(transfer.id, None)
+                self._done[transfer.id] = transfer
+            with transfer.lock:
+                transfer.cached = True
+                transfer.received = transfer.size
+                transfer.hasher = None
+                transfer.ended = True
+                transfer.status = FILE_END_OK
+                transfer.catchup = {client: 0 for client in recipients}
+            # Une offre par demande d'un fichier populaire : chacune n'est
+            # gardée que le temps d'une reprise
+            self.wheel.schedule(transfer, self.resume_timeout)
+            return True
+
+        if self.spool is not None:
+            self.spool.create(transfer.id)
+        with transfer.lock:
+            transfer.positions = {client: 0 for client in recipients}
+        return False
+
+    def serve_cached(self, transfer: Transfer):
+        """
+        Fichier dans le cache (FILE_START envoyé) : l'émetteur reçoit FILE_END,
+        les destinataires le fichier depuis le cache.
+        """
+        with transfer.lock:
+            for recipient in list(transfer.catchup):
+                self._pump(transfer, recipient)
+        self._send(transfer.sender, transfer.end_frame(FILE_END_OK))
+
+    def get(self, transfer_id: int) -> Transfer:
+        with self._lock:
+            return self._transfers.get(transfer_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._transfers)
+
+    def _decide(self, transfer: Transfer, expired: bool = False) -> str:
+        """
+        Issue de l'offre si elle est connue (verrou tenu) : un refus suffit à
+        la rejeter, il faut l'acceptation de tous les destinataires encore
+        présents pour l'ouvrir. À l'échéance, elle part vers ceux qui ont accepté.
+        Sans destinataire (salon vide, ou tous partis), elle est rejetée aussitôt.
+        """
+        if transfer.rejected & transfer.expected or not transfer.expected:
+            outcome = OFFER_REJECTED
+        elif transfer.accepted & transfer.expected == transfer.expected and transfer.expected:
+            outcome = OFFER_ACCEPTED
+        elif expired:
+            outcome = OFFER_ACCEPTED if transfer.accepted & transfer.expected else OFFER_REJECTED
+        else:
+            return None
+
+        # Offre close : plus de réponses attendues
+        offers = self._offers.get(transfer.room)
+        if offers is not None:
+            offers.pop(transfer.id, None)
+            if not offers:
+                del self._offers[transfer.room]
+        if outcome == OFFER_ACCEPTED:
+            transfer.started = True
+        else:
+            del self._transfers[transfer.id]
+        self.wheel.cancel(transfer)
+        return outcome
+
+    def _on_deadline(self, transfer: Transfer):
+        with self._lock:
+            if transfer.cached:
+                # Fichier du cache : plus de reprise possible
+                if self._done.get(transfer.id) is transfer:
+                    del self._done[transfer.id]
+                return
+            if self._transfers.get(transfer.id) is not transfer:
+                return
+            started = transfer.started
+            if not started:
+                outcome = self._decide(transfer, expired=True)
+        if not started:
+            if self.on_offer_expired:
+                self.on_offer_expired(transfer, outcome)
+        elif transfer.sender_left:
+            # L'émetteur n'est pas revenu à temps
+            self.cancel(transfer)
+
+    def data(self, client, payload):
+        """
+        Relaie une trame FILE_DATA de l'émetteur à tous les destinataires.
+
+        Raises:
+            ValueError: Trame invalide, ou transfert inconnu pour ce client
+        """
+        transfer_id, offset, crc, data = unpack_file_data(payload)
+        transfer = self._sender_transfer(client, transfer_id)
+        if transfer is None:
+            return
+        if len(data) > FILE_CHUNK_SIZE:
+            raise ValueError("Morceau trop grand")
+
+        with transfer.lock:
+            if transfer.ended:
+                return
+            if offset < transfer.received:
+                return  # Déjà reçu : l'émetteur est revenu en arrière pour reprendre
+            if offset > transfer.received or zlib.crc32(data) != crc:
+                # Morceau manquant ou altéré : l'émetteur reprend à la position vérifiée
+                self.rejected_chunks += 1
+                if not transfer.resync:
+                    transfer.resync = True
+                    self._send(client, transfer.resume_frame())
+                return
+            transfer.resync = False
+            oversized = transfer.received + len(data) > transfer.size
+            if not oversized:
+                self._accept(transfer, offset, data, payload)
+
+        if oversized:
+            # Plus de données qu'annoncé dans FILE_OFFER : le transfert est abandonné
+            self.cancel(transfer)
+
+    def _accept(self, transfer: Transfer, offset: int, data, payload):
+        """
+        Morceau vérifié : empreinte, réserve sur disque, puis relais (verrou du transfert tenu).
+        """
+        transfer.received += len(data)
+        if transfer.hasher is not None:
+            transfer.hasher.update(data)
+        if self.spool is not None:
+            self.spool.write(transfer.id, offset, data)
+
+        # La trame reçue est relayée telle quelle, une seule fois en mémoire ;
+        # trop grande, elle est découpée une fois pour tous les destinataires
+        if len(data) <= self.relay_chunk:
+            frames = (Frame(FILE_DATA, payload),)
+        else:
+            frames = [Frame(FILE_DATA, pack_file_data(transfer.id, offset + start, data[start:start + self.relay_chunk]))
+                      for start in range(0, len(data), self.relay_chunk)]
+        for frame in frames:
+            transfer.spool.append(frame)
+            transfer.spooled += len(frame)
+        for recipient in list(transfer.positions):
+            self._pump(transfer, recipient)
+        self._enforce_spool(transfer)
+        self.relayed_bytes += len(data)
+
+    def end(self, client, payload):
+        """
+        Fin du fichier annoncée par l'émetteur (FILE_END).
+
+        Raises:
+            ValueError: Trame invalide, ou transfert inconnu pour ce client
+        """
+        transfer_id, status = decode_payload(FILE_END, payload)
+        transfer = self._sender_transfer(client, transfer_id)
+        if transfer is None:
+            return
+
+        if status != FILE_END_OK or transfer.received != transfer.size:
+            self.cancel(transfer)
+            return
+
+        status = FILE_END_OK
+        if transfer.hasher is not None and transfer.hasher.hexdigest() != transfer.digest:
+            status = FILE_END_CORRUPT
+
+        with self._lock:
+            if self._transfers.pop(transfer.id, None) is None:
+                return  # Déjà terminé
+            if self.spool is not None and status == FILE_END_OK:
+                # Les destinataires peuvent encore reprendre
+                self._done[transfer.id] = transfer
+        if self.spool is not None:
+            if status == FILE_END_OK:
+                self.spool.close(transfer.id)
+                if transfer.digest and self.cache is not None:
+                    self.cache.add(transfer.digest, self.spool.path(transfer.id))
+            else:
+                self.spool.discard(transfer.id)
+
+        with transfer.lock:
+            # Après les derniers morceaux, dans la même réserve
+            frame = transfer.end_frame(status)
+            transfer.spool.append(frame)
+            transfer.spooled += len(frame)
+            transfer.ended = True
+            transfer.status = status
+            for recipient in list(transfer.positions):
+                self._pump(transfer, recipient)
+            for recipient in list(transfer.catchup):
+                self._pump(transfer, recipient)
+            self._trim(transfer)
+        if status != FILE_END_OK:
+            self._send(client, frame)
+
+    def resume(self, client, payload):
+        """
+        Reprise d'un transfert (FILE_RESUME) : l'émetteur reçoit la position
+        vérifiée d'où reprendre l'envoi ; un destinataire reçoit la suite à
+        partir de la position demandée.
+
+        Raises:
+            ValueError: Trame invalide, ou transfert inconnu pour ce client
+        """
+        transfer_id, offset = decode_payload(FILE_RESUME, payload)
+        with self._lock:
+            transfer = self._transfers.get(transfer_id) or self._done.get(transfer_id)
+            if transfer is None or not transfer.started:
+                raise ValueError("Transfert inconnu")
+            is_sender = transfer.sender is client or (
+                transfer.sender_left and transfer.sender.pseudo == client.pseudo
+            )
+            if is_sender and transfer.sender_left:
+                # L'émetteur revient sur une nouvelle connexion
+                transfer.sender = client
+                transfer.sender_left = False
+                self.wheel.cancel(transfer)
+
+        if is_sender:
+            with transfer.lock:
+                transfer.resync = False
+                self._send(client, transfer.resume_frame())
+            return
+
+        if client.pseudo not in transfer.accepted_pseudos():
+            raise ValueError("Transfert inconnu")
+        with transfer.lock:
+            # L'ancienne connexion du destinataire ne reçoit plus rien
+            for state in (transfer.positions, transfer.catchup, transfer.finals):
+                for previous in [c for c in state if c.pseudo == client.pseudo]:
+                    del state[previous]
+            if not self._stored(transfer):
+                transfer.finals[client] = transfer.end_frame(FILE_END_ABORTED)
+            else:
+                transfer.catchup[client] = min(offset, transfer.received)
+                self.resumed += 1
+                if transfer.cached:
+                    self.wheel.schedule(transfer, self.resume_timeout)
+            self._pump(transfer, client)
+            self._trim(transfer)
+
+    def cancel(self, transfer: Transfer, status: int = FILE_END_ABORTED):
+        """
+        Abandonne un transfert : les morceaux en réserve sont jetés, émetteur
+        et destinataires reçoivent FILE_END avec ce statut.
+        """
+        with self._lock:
+            if self._transfers.pop(transfer.id, None) is None:
+                return  # Déjà terminé
+        self.wheel.cancel(transfer)
+        if self.spool is not None:
+            self.spool.discard(transfer.id)
+        frame = transfer.end_frame(status)
+        with transfer.lock:
+            transfer.ended = True
+            transfer.status = status
+            transfer.first += len(transfer.spool)
+            transfer.spool.clear()
+            transfer.spooled = 0
+            for recipient in list(transfer.positions) + list(transfer.catchup):
+                transfer.positions.pop(recipient, None)
+                transfer.catchup.pop(recipient, None)
+                transfer.finals[recipient] = frame
+                self._pump(transfer, recipient)
+        if not transfer.sender_left:
+            self._send(transfer.sender, frame)
+
+    def forget(self, client) -> list:
+        """
+        Un client quitte le serveur : ses transferts sont abandonnés (ou, avec
+        une réserve sur disque, attendent sa reprise), et il est retiré de
+        ceux qu'il recevait.
+
+        Returns:
+            list: Les offres de ce client qui attendaient encore des réponses
+        """
+        offers = []
+        with self._lock:
+            transfers = list(self._transfers.values())
+            done = list(self._done.values())
+            waiting = self._waiting.pop(client, ())
+            for transfer in transfers:
+                if transfer.sender is client and not transfer.started:
+                    del self._transfers[transfer.id]
+                    room_offers = self._offers.get(transfer.room, {})
+                    room_offers.pop(transfer.id, None)
+                    if not room_offers:
+                        self._offers.pop(transfer.room, None)
+                    self.wheel.cancel(transfer)
+                    offers.append(transfer)
+                elif transfer.sender is client and self.spool is not None:
+                    transfer.sender_left = True
+                    self.wheel.schedule(transfer, self.resume_timeout)
+        for transfer in transfers:
+            if transfer.sender is client and transfer.started and not transfer.sender_left:
+                self.cancel(transfer)
+        for transfer in set(transfers) | set(done) | set(waiting):
+            with transfer.lock:
+                transfer.positions.pop(client, None)
+                transfer.catchup.pop(client, None)
+                transfer.finals.pop(client, None)
+                self._trim(transfer)
+        return offers
+
+    def _sender_transfer(self, client, transfer_id: int) -> Transfer:
+        """
+        Transfert en cours dont client est l'émetteur, None si le fichier
+        vient du cache (les trames de l'émetteur sont ignorées).
+        """
+        with self._lock:
+            transfer = self._transfers.get(transfer_id)
+            if transfer is None:
+                done = self._done.get(transfer_id)
+                if done is not None and done.cached and done.sender is client:
+                    return None
+        if transfer is None or transfer.sender is not client or not transfer.started or transfer.sender_left:
+            raise ValueError("Transfert inconnu")
+        return transfer
+
+    def _stored(self, transfer: Transfer) -> bool:
+        """Le contenu du transfert est-il encore sur disque (réserve ou cache) ?"""
+        if transfer.cached:
+            return transfer.digest in self.cache
+        return self.spool is not None and transfer.id in self.spool
+
+    def _read(self, transfer: Transfer, offset: int, size: int) -> bytes:
+        if transfer.cached:
+            return self.cache.read(transfer.digest, offset, size)
+        return self.spool.read(transfer.id, offset, size)
+
+    def _pump(self, transfer: Transfer, recipient):
+        """
+        Dépose dans la file du destinataire les morceaux qu'elle peut accepter
+        (verrou du transfert tenu).
+        """
+        outbox = recipient.outbox
+        final = transfer.finals.get(recipient)
+        if final is not None:
+            if outbox is not None and not self._room_for(transfer, recipient, final):
+                return
+            del transfer.finals[recipient]
+            self._send(recipient, final)
+            return
+
+        if recipient in transfer.catchup and not self._catch_up(transfer, recipient):
+            return
+
+        position = transfer.positions[recipient]
+        while position < transfer.first + len(transfer.spool):
+            frame = transfer.spool[position - transfer.first]
+            if outbox is not None and not self._room_for(transfer, recipient, frame):
+                break
+            if not self._send(recipient, frame, LIVE_WEIGHT):
+                # Connexion perdue : plus rien à lui envoyer
+                del transfer.positions[recipient]
+                return
+            position += 1
+        transfer.positions[recipient] = position
+
+        if transfer.ended and position == transfer.first + len(transfer.spool):
+            del transfer.positions[recipient]  # FILE_END reçu
+
+    def _catch_up(self, transfer: Transfer, recipient) -> bool:
+        """
+        Relit depuis le disque la suite demandée par un destinataire qui
+        reprend (verrou du transfert tenu).
+
+        Returns:
+            bool: True s'il est à jour et reçoit désormais les morceaux en direct
+        """
+        outbox = recipient.outbox
+        offset = transfer.catchup[recipient]
+        while offset < transfer.received:
+            data = self._read(transfer, offset, min(self.relay_chunk, transfer.received - offset))
+            if not data:
+                # Fichier supprimé de la réserve (ou du cache) : reprise impossible
+                del transfer.catchup[recipient]
+                transfer.finals[recipient] = transfer.end_frame(FILE_END_ABORTED)
+                self._pump(transfer, recipient)
+                return False
+            frame = Frame(FILE_DATA, pack_file_data(transfer.id, offset, data))
+            if outbox is not None and not self._room_for(transfer, recipient, frame):
+                transfer.catchup[recipient] = offset
+                return False
+            if not self._send(recipient, frame, CATCH_UP_WEIGHT):
+                del transfer.catchup[recipient]
+                return False
+            offset += len(data)
+
+        del transfer.catchup[recipient]
+        if transfer.ended:
+            transfer.finals[recipient] = transfer.end_frame(transfer.status)
+            self._pump(transfer, recipient)
+            return False
+        # À jour : la suite arrive avec les prochains morceaux de l'émetteur
+        transfer.positions[recipient] = transfer.first + len(transfer.spool)
+        return True
+
+    def _room_for(self, transfer: Transfer, recipient, frame) -> bool:
+        """
+        True si la file du destinataire accepte la trame ; sinon le transfert
+        attend qu'elle se vide (verrou du transfert tenu).
+        """
+        outbox = recipient.outbox
+        if outbox.has_room(len(frame)):
+            return True
+        with self._lock:
+            self._waiting.setdefault(recipient, set()).add(transfer)
+        if outbox.on_drain is None:
+            outbox.on_drain = lambda: self._on_drain(recipient)
+        # La file a pu se vider avant l'inscription : ne pas manquer le réveil
+        return outbox.has_room(len(frame))
+
+    def _on_drain(self, recipient):
+        """La file d'envoi du destinataire est repassée sous le seuil bas."""
+        with self._lock:
+            transfers = self._waiting.pop(recipient, None)
+        for transfer in transfers or ():
+            with transfer.lock:
+                if recipient in transfer.positions or recipient in transfer.catchup or recipient in transfer.finals:
+                    self._pump(transfer, recipient)
+                self._trim(transfer)
+
+    def _enforce_spool(self, transfer: Transfer):
+        """
+        Retire les destinataires les plus en retard tant que la réserve
+        dépasse sa taille (verrou du transfert tenu).
+        """
+        self._trim(transfer)
+        while transfer.spooled > self.spool_bytes and transfer.positions:
+            # Après _trim, la réserve commence au morceau attendu par le plus en retard
+            for recipient, position in list(transfer.positions.items()):
+                if position == transfer.first:
+                    del transfer.positions[recipient]
+                    transfer.finals[recipient] = transfer.end_frame(FILE_END_TOO_SLOW)
+                    self.too_slow += 1
+                    self._pump(transfer, recipient)
+            self._trim(transfer)
+
+    def _trim(self, transfer: Transfer):
+        """
+        Retire de la réserve les morceaux reçus par tous (verrou du transfert tenu).
+        """
+        oldest = min(transfer.positions.values(), default=transfer.first + len(transfer.spool))
+        while transfer.first < oldest:
+            transfer.spooled -= len(transfer.spool.popleft())
+            transfer.first += 1
+
+    def _on_evict(self, transfer_id: int):
+        """Le fichier d'un transfert terminé a quitté la réserve sur disque."""
+        with self._lock:
+            transfer = self._done.get(transfer_id)
+            if transfer is not None and not transfer.cached:
+                del self._done[transfer_id]
+
+    def _on_cache_evict(self, digest: str):
+        """Un fichier a quitté le cache : ses transferts ne se reprennent plus."""
+        with self._lock:
+            for transfer_id, transfer in list(self._done.items()):
+                if transfer.cached and transfer.digest == digest:
+                    del self._done[transfer_id]
+                    self.wheel.cancel(transfer)
+
+    @staticmethod
+    def _send(recipient, frame, weight: int = 1) -> bool:
+        try:
+            return recipient.send(frame, weight=weight)
+        except OSError:
+            return False
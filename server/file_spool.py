@@ -0,0 +1,176 @@
+"""
+file_spool.py
+
+Réserve sur disque des fichiers relayés, pour la reprise des transferts
+(FILE_RESUME).
+
+Chaque morceau vérifié (position et CRC32) est écrit à sa position dans un
+fichier `<transfert>.part` du répertoire de réserve. Un destinataire coupé
+ou retiré du transfert reprend à partir de sa dernière position vérifiée :
+les octets déjà reçus par le serveur sont relus depuis ce fichier, puis les
+morceaux suivants lui arrivent en direct.
+
+Les fichiers restent après la fin du transfert (un destinataire peut encore
+reprendre), jusqu'à ce que la réserve dépasse sa taille : les moins
+récemment utilisés (écrits ou relus) sont alors supprimés. Un fichier en
+cours d'écriture n'est jamais supprimé.
+"""
+
+import collections
+import os
+import threading
+
+# Valeurs par défaut
+SPOOL_DIR_BYTES = 256 * 1024 * 1024  # Taille max de la réserve sur disque
+
+PART_SUFFIX = ".part"
+
+
+class FileSpool:
+    """
+    Fichiers partiels (ou complets) des transferts, dans un répertoire borné en taille.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = SPOOL_DIR_BYTES):
+        """
+        Args:
+            directory: Répertoire de la réserve (créé s'il n'existe pas)
+            max_bytes: Taille max (octets) des fichiers gardés
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        # Appelé (identifiant) quand le fichier d'un transfert est supprimé
+        self.on_evict = None
+
+        self._sizes = collections.OrderedDict()  # identifiant → octets, du moins au plus récemment utilisé
+        self._writing = {}  # identifiant → fichier ouvert en écriture
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Statistiques
+        self.evicted = 0
+
+        # Les fichiers d'un démarrage précédent ne sont rattachés à aucun transfert
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith(PART_SUFFIX):
+                os.remove(os.path.join(directory, name))
+
+    def path(self, transfer_id: int) -> str:
+        return os.path.join(self.directory, f"{transfer_id}{PART_SUFFIX}")
+
+    def create(self, transfer_id: int):
+        """Ouvre (vide) le fichier d'un transfert qui commence."""
+        with self._lock:
+            self._drop_locked(transfer_id)
+            self._writing[transfer_id] = open(self.path(transfer_id), "wb")
+            self._sizes[transfer_id] = 0
+
+    def write(self, transfer_id: int, offset: int, data) -> bool:
+        """
+        Écrit un morceau vérifié à sa position.
+
+        Returns:
+            bool: False si le transfert n'a pas (ou plus) de fichier ouvert
+        """
+        with self._lock:
+            file = self._writing.get(transfer_id)
+            if file is None:
+                return False
+            file.seek(offset)
+            file.write(data)
+            end = offset + len(data)
+            size = self._sizes[transfer_id]
+            if end > size:
+                self._sizes[transfer_id] = end
+                self._bytes += end - size
+            self._sizes.move_to_end(transfer_id)
+            evicted = self._evict_locked()
+        self._notify(evicted)
+        return True
+
+    def close(self, transfer_id: int):
+        """Fin de l'écriture : le fichier reste disponible pour les reprises."""
+        with self._lock:
+            file = self._writing.pop(transfer_id, None)
+            if file is not None:
+                file.close()
+            evicted = self._evict_locked()
+        self._notify(evicted)
+
+    def read(self, transfer_id: int, offset: int, size: int) -> bytes:
+        """
+        Relit au plus size octets à partir d'une position.
+
+        Returns:
+            bytes: Les octets lus, None si le fichier a été supprimé
+        """
+        with self._lock:
+            if transfer_id not in self._sizes:
+                return None
+            self._sizes.move_to_end(transfer_id)
+            file = self._writing.get(transfer_id)
+            if file is not None:
+                file.flush()  # Les derniers morceaux écrits sont visibles en lecture
+        try:
+            with open(self.path(transfer_id), "rb") as file:
+                file.seek(offset)
+                return file.read(size)
+        except OSError:
+            return None
+
+    def discard(self, transfer_id: int):
+        """Supprime le fichier d'un transfert (abandonné ou corrompu)."""
+        with self._lock:
+            self._drop_locked(transfer_id)
+
+    def __contains__(self, transfer_id: int) -> bool:
+        with self._lock:
+            return transfer_id in self._sizes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sizes)
+
+    @property
+    def size(self) -> int:
+        """Octets gardés dans la réserve."""
+        with self._lock:
+            return self._bytes
+
+    def _evict_locked(self) -> list:
+        """
+        Supprime les fichiers les moins récemment utilisés au-delà de la
+        taille max, sauf ceux en cours d'écriture (verrou tenu).
+
+        Returns:
+            list: Identifiants des fichiers supprimés
+        """
+        evicted = []
+        for transfer_id in list(self._sizes):
+            if self._bytes <= self.max_bytes:
+                break
+            if transfer_id not in self._writing:
+                self._drop_locked(transfer_id)
+                evicted.append(transfer_id)
+        self.evicted += len(evicted)
+        return evicted
+
+    def _drop_locked(self, transfer_id: int):
+        file = self._writing.pop(transfer_id, None)
+        if file is not None:
+            file.close()
+        size = self._sizes.pop(transfer_id, None)
+        if size is None:
+            return
+        self._bytes -= size
+        try:
+            os.remove(self.path(transfer_id))
+        except OSError:
+            pass
+
+    def _notify(self, evicted: list):
+        if self.on_evict:
+            for transfer_id in evicted:
+                self.on_evict(transfer_id)
@@ -0,0 +1,136 @@
+"""
+heartbeat.py
+
+Surveillance des connexions (PROTOCOL.md section 6).
+
+- Un client qui n'a pas fait LOGIN dans les temps est déconnecté.
+- Un client silencieux depuis PING_INTERVAL reçoit un PING ; après
+  MAX_MISSED_PINGS PING sans réponse, il est déconnecté.
+- Optionnellement, un client sans activité (autre que PONG) depuis
+  idle_timeout est déconnecté.
+
+Tout trafic reçu compte comme preuve de vie : un client actif n'est jamais
+pingé. Les lectures ne touchent aucun minuteur (deux affectations dans
+ChatServer.dispatch) ; l'échéance de chaque client, rangée dans une seule
+roue temporelle, recalcule simplement la suivante à partir de ces dates.
+"""
+
+import socket
+import time
+from common.protocol import *
+from server.timing_wheel import HashedTimingWheel, DEFAULT_TICK
+
+# Valeurs par défaut (PROTOCOL.md section 6)
+PING_INTERVAL = 30.0
+MAX_MISSED_PINGS = 3
+LOGIN_TIMEOUT = 30.0
+
+
+class HeartbeatMonitor:
+    """
+    Programme, pour chaque connexion, une seule échéance dans la roue temporelle.
+    """
+
+    def __init__(self, ping_interval: float = PING_INTERVAL,
+                 max_missed_pings: int = MAX_MISSED_PINGS,
+                 login_timeout: float = LOGIN_TIMEOUT,
+                 idle_timeout: float = None,
+                 tick: float = DEFAULT_TICK,
+                 clock=time.monotonic):
+        """
+        Args:
+            ping_interval: Silence (secondes) avant l'envoi d'un PING
+            max_missed_pings: PING sans réponse tolérés avant déconnexion
+            login_timeout: Délai (secondes) pour envoyer LOGIN, None = illimité
+            idle_timeout: Inactivité (secondes) tolérée, None = illimitée
+            tick: Précision de la roue temporelle (secondes)
+            clock: Horloge (remplaçable dans les tests)
+        """
+        self.ping_interval = ping_interval
+        self.max_missed_pings = max_missed_pings
+        self.login_timeout = login_timeout
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.wheel = HashedTimingWheel(self._on_expire, tick, clock=clock)
+
+    def start(self):
+        self.wheel.start()
+
+    def stop(self):
+        self.wheel.stop()
+
+    def watch(self, client):
+        """
+        Commence la surveillance d'une nouvelle connexion.
+        """
+        now = self.clock()
+        client.connected_at = now
+        client.last_seen = now
+        client.last_activity = now
+        client.missed_pings = 0
+        self.wheel.schedule(client, self.login_timeout or self.ping_interval)
+
+    def seen(self, client, msg_type: int):
+        """
+        Note la réception d'une trame. Aucun minuteur n'est touché :
+        l'échéance en cours constatera le trafic récent.
+        """
+        now = self.clock()
+        client.last_seen = now
+        client.missed_pings = 0
+        if msg_type != PONG:
+            client.last_activity = now
+
+    def unwatch(self, client):
+        """
+        Arrête la surveillance (connexion fermée).
+        """
+        self.wheel.cancel(client)
+
+    def _on_expire(self, client):
+        now = self.clock()
+
+        if client.state == STATE_CONNECTED:
+            if self.login_timeout and now - client.connected_at >= self.login_timeout:
+                self._drop(client, "délai de LOGIN dépassé")
+                return
+
+        if self.idle_timeout:
+            idle = now - client.last_activity
+            if idle >= self.idle_timeout:
+                self._drop(client, "inactif")
+                return
+
+        silent = now - client.last_seen
+        if silent < self.ping_interval:
+            # Trafic récent : pas de PING, prochaine vérification à la fin du silence toléré
+            self.wheel.schedule(client, self._next_delay(client, now, self.ping_interval - silent))
+            return
+
+        if client.missed_pings >= self.max_missed_pings:
+            self._drop(client, f"{client.missed_pings} PING sans réponse")
+            return
+
+        client.missed_pings += 1
+        try:
+            client.send(pack_message(PING))
+        except OSError:
+            pass
+        self.wheel.schedule(client, self._next_delay(client, now, self.ping_interval))
+
+    def _next_delay(self, client, now: float, delay: float) -> float:
+        """Raccourcit le délai si l'inactivité maximale arrive avant."""
+        if self.idle_timeout:
+            delay = min(delay, self.idle_timeout - (now - client.last_activity))
+        return delay
+
+    def _drop(self, client, reason: str):
+        """
+        Coupe la connexion : la boucle de lecture du client se termine
+        et ChatServer.disconnect fait le ménage habituel.
+        """
+        print(f"Déconnexion de {client.pseudo or 'client anonyme'} : {reason}")
+        try:
+            client.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
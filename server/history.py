@@ -0,0 +1,120 @@
+"""
+history.py
+
+Historique récent des salons, en mémoire.
+
+Chaque salon garde les derniers MSG_BROADCAST sous forme de trames déjà
+encodées (tampon circulaire borné en nombre de messages et en octets).
+Un client qui entre dans le salon reçoit cette fin d'historique en une
+seule écriture, juste après JOIN_OK et la liste des membres.
+
+La mémoire totale est bornée quel que soit le nombre de salons : au-delà
+du budget global, les historiques des salons inactifs depuis le plus
+longtemps sont supprimés en premier. L'historique d'un salon survit à son
+dernier membre (reconnexion après une coupure) tant que le budget le permet.
+"""
+
+import collections
+import threading
+
+# Valeurs par défaut
+HISTORY_MESSAGES = 50             # Messages gardés par salon
+HISTORY_BYTES = 64 * 1024         # Octets gardés par salon
+HISTORY_BUDGET = 16 * 1024 * 1024  # Octets gardés pour tous les salons
+
+# Coût fixe compté pour chaque salon (tampon, entrée d'index), afin que
+# le budget borne aussi la mémoire prise par un très grand nombre de salons
+ROOM_OVERHEAD = 512
+
+
+class RoomBuffer:
+    """
+    Tampon circulaire des dernières trames d'un salon.
+    """
+
+    __slots__ = ("frames", "size")
+
+    def __init__(self):
+        self.frames = collections.deque()
+        self.size = 0  # Octets des trames gardées
+
+
+class RoomHistory:
+    """
+    Historiques de tous les salons, rangés du moins au plus récemment actif.
+    """
+
+    def __init__(self, max_messages: int = HISTORY_MESSAGES,
+                 max_bytes: int = HISTORY_BYTES,
+                 budget: int = HISTORY_BUDGET):
+        """
+        Args:
+            max_messages: Nombre max de messages gardés par salon
+            max_bytes: Octets max gardés par salon
+            budget: Octets max gardés pour l'ensemble des salons
+        """
+        self.max_messages = max_messages
+        # Un salon seul tient toujours dans le budget
+        self.max_bytes = min(max_bytes, budget - ROOM_OVERHEAD)
+        self.budget = budget
+
+        self._rooms = collections.OrderedDict()  # nom_salon → RoomBuffer
+        self._size = 0  # Octets comptés (trames + ROOM_OVERHEAD par salon)
+        self._lock = threading.Lock()
+
+        # Statistiques
+        self.evicted_rooms = 0
+
+    def append(self, room_name: str, frame: bytes):
+        """
+        Ajoute une trame MSG_BROADCAST encodée à l'historique du salon.
+        """
+        size = len(frame)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            buffer = self._rooms.get(room_name)
+            if buffer is None:
+                buffer = self._rooms[room_name] = RoomBuffer()
+                self._size += ROOM_OVERHEAD
+            else:
+                self._rooms.move_to_end(room_name)
+
+            buffer.frames.append(frame)
+            buffer.size += size
+            self._size += size
+
+            # Bornes du salon : retirer les plus anciens messages
+            while len(buffer.frames) > self.max_messages or buffer.size > self.max_bytes:
+                removed = len(buffer.frames.popleft())
+                buffer.size -= removed
+                self._size -= removed
+
+            # Budget global : supprimer les salons les moins récemment actifs
+            while self._size > self.budget and len(self._rooms) > 1:
+                _, evicted = self._rooms.popitem(last=False)
+                self._size -= evicted.size + ROOM_OVERHEAD
+                self.evicted_rooms += 1
+
+    def tail(self, room_name: str) -> bytes:
+        """
+        Fin d'historique du salon, trames concaténées (une seule écriture).
+
+        Returns:
+            bytes: Les trames, b"" si le salon n'a pas d'historique
+        """
+        with self._lock:
+            buffer = self._rooms.get(room_name)
+            if buffer is None:
+                return b""
+            return b"".join(buffer.frames)
+
+    def size(self) -> int:
+        """Octets comptés pour l'ensemble des salons."""
+        with self._lock:
+            return self._size
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rooms)
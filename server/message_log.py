@@ -0,0 +1,411 @@
+"""
+message_log.py
+
+Journal durable des messages : un journal par salon, sur disque, en ajout seul.
+
+Organisation d'un salon (répertoire nommé d'après le hash du nom du salon) :
+- des segments de taille fixe `<séquence du premier message>.log`
+- pour chaque segment, un index creux `<séquence>.idx` : la position d'un
+  message sur INDEX_INTERVAL, ce qui suffit pour lire à partir de n'importe
+  quelle séquence en ne parcourant que quelques enregistrements
+
+Enregistrement : [LONGUEUR: 4o][CRC32: 4o][SÉQUENCE: 8o][HORODATAGE ms: 8o][payload MSG_BROADCAST]
+
+Les ajouts ne bloquent jamais la diffusion : handle_msg dépose le message
+dans une file, un thread écrivain l'écrit sur disque par lots. Les lectures
+(pages d'historique, en remontant dans le temps) passent par mmap : seules
+les pages lues sont chargées en mémoire.
+
+Au redémarrage, les segments sont relus depuis le disque ; une fin
+d'enregistrement incomplète (arrêt brutal pendant une écriture) est tronquée.
+La rétention supprime les segments les plus anciens au-delà d'une taille
+ou d'un âge maximum par salon.
+"""
+
+import bisect
+import collections
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from common.protocol import *
+
+# Valeurs par défaut
+SEGMENT_SIZE = 4 * 1024 * 1024              # Taille (octets) d'un segment
+INDEX_INTERVAL = 64                         # Une entrée d'index tous les N messages
+RETENTION_BYTES = 256 * 1024 * 1024         # Taille max du journal d'un salon
+RETENTION_SECONDS = 30 * 24 * 3600.0        # Âge max d'un segment (dernier message)
+MAX_PENDING = 100000                        # Messages en attente d'écriture, au-delà ils sont perdus
+RETENTION_CHECK_INTERVAL = 60.0             # Période (secondes) de la rétention par âge
+
+SEGMENT_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+
+_RECORD = struct.Struct(">IIQQ")       # [LONGUEUR: 4o][CRC32: 4o][SÉQUENCE: 8o][HORODATAGE: 8o]
+_INDEX_ENTRY = struct.Struct(">QI")    # [SÉQUENCE: 8o][POSITION: 4o]
+
+
+def _record_crc(seq: int, timestamp: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(struct.pack(">QQ", seq, timestamp)))
+
+
+class Segment:
+    """
+    Un fichier de segment et son index creux.
+    """
+
+    __slots__ = ("base_seq", "path", "index_path", "index", "size", "next_seq", "last_timestamp")
+
+    def __init__(self, directory: str, base_seq: int):
+        self.base_seq = base_seq
+        self.path = os.path.join(directory, f"{base_seq:020d}{SEGMENT_SUFFIX}")
+        self.index_path = os.path.join(directory, f"{base_seq:020d}{INDEX_SUFFIX}")
+        self.index = []            # [(séquence, position)] croissant
+        self.size = 0              # Octets valides (écrits et relus)
+        self.next_seq = base_seq   # Séquence du prochain message
+        self.last_timestamp = 0    # Horodatage (ms) du dernier message
+
+    def load(self):
+        """
+        Relit l'index et valide la fin du segment ; tronque un enregistrement incomplet.
+        """
+        file_size = os.path.getsize(self.path)
+
+        index = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % _INDEX_ENTRY.size
+            index = [entry for entry in _INDEX_ENTRY.iter_unpack(data[:usable]) if entry[1] < file_size]
+
+        # Reprendre au dernier message indexé (ou au début) et parcourir jusqu'à la fin valide
+        seq, pos = index[-1] if index else (self.base_seq, 0)
+        last_timestamp = 0
+        with open(self.path, "rb") as f:
+            f.seek(pos)
+            data = f.read()
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            length, crc, record_seq, timestamp = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + length
+            if record_seq != seq or end > len(data):
+                break
+            if _record_crc(record_seq, timestamp, data[offset + _RECORD.size:end]) != crc:
+                break
+            last_timestamp = timestamp
+            seq += 1
+            offset = end
+
+        self.index = index
+        self.size = pos + offset
+        self.next_seq = seq
+        self.last_timestamp = last_timestamp
+
+        if self.size < file_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(self.size)
+        if not index or index[-1][0] >= seq:
+            # Index vide ou pointant sur la partie tronquée : le réécrire
+            self.index = [entry for entry in index if entry[0] < seq]
+            if not self.index and self.size:
+                self.index = [(self.base_seq, 0)]
+            with open(self.index_path, "wb") as f:
+                f.write(b"".join(_INDEX_ENTRY.pack(*entry) for entry in self.index))
+
+    def read(self, start_seq: int, end_seq: int, size: int) -> list:
+        """
+        Messages de séquence start_seq ≤ seq < end_seq, lus par mmap.
+
+        Args:
+            size: Octets lisibles (taille au moment de la lecture)
+        """
+        if size == 0:
+            return []
+        i = bisect.bisect_right(self.index, (start_seq, 1 << 32)) - 1
+        pos = self.index[i][1] if i >= 0 else 0
+
+        entries = []
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            while pos + _RECORD.size <= size:
+                length, _, seq, timestamp = _RECORD.unpack_from(data, pos)
+                if seq >= end_seq:
+                    break
+                start = pos + _RECORD.size
+                pos = start + length
+                if seq >= start_seq:
+                    sender, text = decode_payload(MSG_BROADCAST, data[start:pos])
+                    entries.append(HistoryEntry(seq, timestamp, sender, text))
+        return entries
+
+
+class RoomLog:
+    """
+    Journal d'un salon : suite de segments, le dernier reçoit les ajouts.
+    """
+
+    def __init__(self, directory: str, segment_size: int):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segments = []
+        self.lock = threading.Lock()  # Protège la liste des segments (écrivain / lecteurs)
+        self._since_index = 0         # Messages écrits depuis la dernière entrée d'index
+
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(SEGMENT_SUFFIX):
+                segment = Segment(directory, int(name[:-len(SEGMENT_SUFFIX)]))
+                segment.load()
+                self.segments.append(segment)
+        if self.segments:
+            last = self.segments[-1]
+            self._since_index = last.next_seq - last.index[-1][0] if last.index else 0
+
+    @property
+    def next_seq(self) -> int:
+        return self.segments[-1].next_seq if self.segments else 1
+
+    def append(self, records):
+        """
+        Écrit un lot de messages (thread écrivain uniquement).
+
+        Args:
+            records: Liste de (horodatage ms, payload MSG_BROADCAST)
+        """
+        segment = self.segments[-1] if self.segments else None
+        data = bytearray()
+        index = []
+        seq = self.next_seq
+        size = segment.size if segment else 0
+        last_timestamp = 0
+
+        def write():
+            if data:
+                with open(segment.path, "ab") as f:
+                    f.write(data)
+            if index:
+                with open(segment.index_path, "ab") as f:
+                    f.write(b"".join(_INDEX_ENTRY.pack(*entry) for entry in index))
+            with self.lock:
+                segment.index.extend(index)
+                segment.size = size
+                segment.next_seq = seq
+                segment.last_timestamp = last_timestamp or segment.last_timestamp
+
+        for timestamp, payload in records:
+            length = _RECORD.size + len(payload)
+
+            # Segment plein : le sceller et en ouvrir un nouveau
+            if segment is None or (size and size + length > self.segment_size):
+                if segment is not None:
+                    write()
+                segment = Segment(self.directory, seq)
+                open(segment.path, "ab").close()
+                with self.lock:
+                    self.segments.append(segment)
+                data, index, size, last_timestamp = bytearray(), [], 0, 0
+                self._since_index = 0
+
+            if size == 0 or self._since_index >= INDEX_INTERVAL:
+                index.append((seq, size))
+                self._since_index = 0
+
+            data += _RECORD.pack(len(payload), _record_crc(seq, timestamp, payload), seq, timestamp)
+            data += payload
+            size += length
+            seq += 1
+            last_timestamp = timestamp
+            self._since_index += 1
+
+        write()
+
+    def read(self, before: int, count: int) -> tuple[list, bool]:
+        """
+        Jusqu'à count messages précédant la séquence before (0 = les plus récents).
+
+        Returns:
+            tuple: (messages du plus ancien au plus récent, True si le plus
+            ancien message conservé est atteint)
+        """
+        with self.lock:
+            snapshot = [(segment, segment.size) for segment in self.segments if segment.size]
+        if not snapshot:
+            return [], True
+
+        first_seq = snapshot[0][0].base_seq
+        next_seq = snapshot[-1][0].next_seq
+        end = next_seq if before <= 0 or before > next_seq else before
+        start = max(first_seq, end - count)
+
+        entries = []
+        for i, (segment, size) in enumerate(snapshot):
+            segment_end = snapshot[i + 1][0].base_seq if i + 1 < len(snapshot) else next_seq
+            if segment_end <= start or segment.base_seq >= end:
+                continue
+            try:
+                entries.extend(segment.read(start, end, size))
+            except FileNotFoundError:
+                pass  # Segment supprimé par la rétention pendant la lecture
+        return entries, start <= first_seq
+
+    def enforce_retention(self, max_bytes: int, max_age_ms: int, now_ms: int):
+        """
+        Supprime les segments scellés les plus anciens au-delà de la taille
+        ou de l'âge maximum. Le segment actif est toujours gardé.
+        """
+        removed = []
+        with self.lock:
+            total = sum(segment.size for segment in self.segments)
+            while len(self.segments) > 1:
+                oldest = self.segments[0]
+                if total <= max_bytes and oldest.last_timestamp >= now_ms - max_age_ms:
+                    break
+                removed.append(self.segments.pop(0))
+                total -= oldest.size
+        for segment in removed:
+            for path in (segment.path, segment.index_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class MessageLog:
+    """
+    Journaux de tous les salons, alimentés par un thread écrivain.
+    """
+
+    def __init__(self, directory: str,
+                 segment_size: int = SEGMENT_SIZE,
+                 retention_bytes: int = RETENTION_BYTES,
+                 retention_seconds: float = RETENTION_SECONDS,
+                 max_pending: int = MAX_PENDING,
+                 clock=time.time):
+        """
+        Args:
+            directory: Répertoire racine des journaux
+            segment_size: Taille (octets) d'un segment
+            retention_bytes: Taille max du journal d'un salon
+            retention_seconds: Âge max (secondes) d'un segment scellé
+            max_pending: Messages en attente d'écriture au-delà desquels les suivants sont perdus
+            clock: Horloge (remplaçable dans les tests)
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self.max_pending = max_pending
+        self.clock = clock
+
+        self._rooms = {}
+        self._rooms_lock = threading.Lock()
+
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # Un seul lot écrit à la fois (thread écrivain ou flush)
+        self._thread = None
+        self._running = False
+        self._last_retention = clock()
+
+        # Statistiques
+        self.dropped = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le thread écrivain après avoir écrit les messages en attente."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def append(self, room_name: str, sender: str, text: str) -> bool:
+        """
+        Dépose un message à journaliser. Ne bloque jamais sur le disque.
+
+        Returns:
+            bool: False si le message a été perdu (écrivain trop en retard)
+        """
+        timestamp = int(self.clock() * 1000)
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((room_name, timestamp, encode_payload(MSG_BROADCAST, sender, text)))
+            if len(self._pending) == 1:
+                self._cond.notify()
+        return True
+
+    def flush(self):
+        """Écrit tout de suite les messages en attente (dans le thread appelant)."""
+        self._drain()
+
+    def read(self, room_name: str, before: int = 0, count: int = MAX_HISTORY_COUNT) -> tuple[list, bool]:
+        """
+        Page d'historique d'un salon (voir RoomLog.read).
+        """
+        room_log = self._room(room_name, create=False)
+        if room_log is None:
+            return [], True
+        return room_log.read(before, count)
+
+    def _room(self, room_name: str, create: bool = True):
+        with self._rooms_lock:
+            room_log = self._rooms.get(room_name)
+            if room_log is None:
+                directory = os.path.join(self.directory, hashlib.sha256(room_name.encode("utf-8")).hexdigest())
+                if not create and not os.path.isdir(directory):
+                    return None
+                room_log = self._rooms[room_name] = RoomLog(directory, self.segment_size)
+            return room_log
+
+    def _drain(self):
+        """
+        Écrit les messages en attente. Le lot est pris sous le verrou d'écriture :
+        au retour, tout message déposé avant l'appel est sur disque.
+        """
+        with self._write_lock:
+            with self._cond:
+                pending, self._pending = self._pending, collections.deque()
+            if not pending:
+                return
+            batches = {}
+            for room_name, timestamp, payload in pending:
+                batches.setdefault(room_name, []).append((timestamp, payload))
+            for room_name, records in batches.items():
+                room_log = self._room(room_name)
+                room_log.append(records)
+                room_log.enforce_retention(self.retention_bytes, int(self.retention_seconds * 1000),
+                                           int(self.clock() * 1000))
+
+    def _enforce_retention(self):
+        """Rétention par âge de tous les salons (les salons silencieux n'écrivent plus)."""
+        now_ms = int(self.clock() * 1000)
+        with self._rooms_lock:
+            room_logs = list(self._rooms.values())
+        with self._write_lock:
+            for room_log in room_logs:
+                room_log.enforce_retention(self.retention_bytes, int(self.retention_seconds * 1000), now_ms)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and self._running:
+                    self._cond.wait(RETENTION_CHECK_INTERVAL)
+                if not self._running:
+                    return
+            try:
+                self._drain()
+                if self.clock() - self._last_retention >= RETENTION_CHECK_INTERVAL:
+                    self._last_retention = self.clock()
+                    self._enforce_retention()
+            except OSError as e:
+                print(f"Erreur d'écriture du journal : {e}")
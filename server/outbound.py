@@ -0,0 +1,403 @@
+"""
+outbound.py
+
+Files d'envoi par client.
+
+Les handlers de ChatServer ne font plus d'envoi bloquant sur la socket d'un
+destinataire : ils déposent la trame dans la file du client (ClientContext.send)
+et un écrivain dédié la vide (un thread par client pour le moteur à threads,
+une tâche de la boucle d'événements pour le moteur asyncio).
+
+Une diffusion dans un salon ne dépend donc plus du membre le plus lent.
+Chaque file est bornée par deux seuils (en octets) :
+- au-dessus du seuil haut, le client est considéré « en retard »
+- il redevient normal quand la file repasse sous le seuil bas
+
+Pendant qu'un client est en retard, la politique choisie s'applique :
+- POLICY_DROP       : les nouvelles trames sont jetées
+- POLICY_DISCONNECT : le client est déconnecté
+- POLICY_COALESCE   : les mises à jour de présence remplacent celles déjà
+                      en attente pour la même clé, les autres trames sont jetées
+
+Les trames d'une file sont réparties en trois classes de priorité, vidées
+dans l'ordre :
+- PRIORITY_CONTROL : PING / PONG et FILE_RESUME (quelques octets, urgents)
+- PRIORITY_CHAT    : messages, présences, réponses : tout le reste
+- PRIORITY_BULK    : données des fichiers (FILE_DATA, et FILE_END qui les suit)
+
+Chaque écriture emporte toutes les trames de contrôle et de chat en attente,
+mais au plus `bulk_burst` octets de fichiers : un MSG_BROADCAST déposé
+pendant un transfert de 50 Mo n'attend jamais plus d'un morceau. Les
+transferts simultanés vers un même client se partagent ces écritures par
+tourniquet pondéré (deficit round robin, un flux par transfert), et chaque
+flux reste dans l'ordre.
+
+Les octets de fichiers ont leur propre fenêtre (les mêmes seuils, comptés
+à part) : le relais attend qu'elle se vide (has_room, on_drain) au lieu de
+remplir la file, si bien qu'un transfert ne fait jamais passer le client
+« en retard » pour le chat.
+"""
+
+import collections
+import socket
+import threading
+
+from common.protocol import (
+    send_frames, Frame, PING, PONG, FILE_RESUME, FILE_DATA, FILE_END, FILE_CHUNK_SIZE, HEADER_SIZE,
+)
+
+# Politiques appliquées à un client en retard
+POLICY_DROP = "drop"
+POLICY_DISCONNECT = "disconnect"
+POLICY_COALESCE = "coalesce"
+
+POLICIES = (POLICY_DROP, POLICY_DISCONNECT, POLICY_COALESCE)
+
+# Seuils par défaut (octets en attente d'envoi pour un client)
+DEFAULT_HIGH_WATERMARK = 256 * 1024
+DEFAULT_LOW_WATERMARK = 64 * 1024
+
+# Classes de priorité (la plus petite part en premier)
+PRIORITY_CONTROL = 0
+PRIORITY_CHAT = 1
+PRIORITY_BULK = 2
+
+CONTROL_TYPES = frozenset((PING, PONG, FILE_RESUME))
+BULK_TYPES = frozenset((FILE_DATA, FILE_END))
+
+# Octets de fichiers max par écriture (au moins une trame) : un morceau
+# relayé (voir file_relay.RELAY_CHUNK_SIZE)
+DEFAULT_BULK_BURST = 16 * 1024
+
+# Crédit d'un flux de fichier à chaque tour du tourniquet, multiplié par son
+# poids : une trame FILE_DATA pleine (en-tête, transfert, position, CRC32)
+BULK_QUANTUM = FILE_CHUNK_SIZE + HEADER_SIZE + 12
+
+
+def classify(data) -> tuple:
+    """
+    Classe de priorité d'une trame encodée (bytes ou Frame).
+
+    Returns:
+        tuple: (priorité, flux) ; le flux est l'identifiant du transfert
+               pour les trames de fichiers, None sinon
+    """
+    if isinstance(data, Frame):
+        header, payload = data.header, data.payload
+    else:
+        header, payload = data, memoryview(data)[HEADER_SIZE:]
+    if not header:
+        return PRIORITY_CHAT, None
+    msg_type = header[0]
+    if msg_type in BULK_TYPES:
+        return PRIORITY_BULK, bytes(payload[:4])
+    if msg_type in CONTROL_TYPES:
+        return PRIORITY_CONTROL, None
+    return PRIORITY_CHAT, None
+
+
+class OutboundQueue:
+    """
+    File d'envoi bornée d'un client, partagée entre les threads producteurs
+    (handlers) et l'écrivain du client.
+
+    Une file existe pour chaque connexion : elle reste compacte au repos
+    (__slots__, pas de tampon alloué tant que rien n'est en attente).
+    """
+
+    __slots__ = (
+        "high_watermark", "low_watermark", "policy", "bulk_burst",
+        "_control", "_entries", "_by_key", "_streams", "_turn", "_pending", "_taken_bulk",
+        "size", "bulk_size", "congested", "closed", "overflowed",
+        "dropped", "coalesced", "on_ready", "on_drain", "_lock", "_ready",
+    )
+
+    def __init__(self, high_watermark: int = DEFAULT_HIGH_WATERMARK,
+                 low_watermark: int = DEFAULT_LOW_WATERMARK,
+                 policy: str = POLICY_COALESCE,
+                 bulk_burst: int = DEFAULT_BULK_BURST):
+        """
+        Args:
+            high_watermark: Seuil (octets) au-delà duquel le client est en retard
+            low_watermark: Seuil (octets) sous lequel il redevient normal
+            policy: Politique appliquée pendant le retard (voir POLICIES)
+            bulk_burst: Octets de fichiers max par écriture
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Politique inconnue : {policy}")
+        if low_watermark > high_watermark:
+            raise ValueError("Le seuil bas doit être inférieur au seuil haut")
+        if bulk_burst <= 0:
+            raise ValueError("Le volume de fichiers par écriture doit être positif")
+
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.policy = policy
+        self.bulk_burst = bulk_burst
+
+        # Trames de contrôle ; entrées [clé, données] du chat, la clé permet de
+        # fusionner les présences ; flux de fichiers : transfert → [trames,
+        # crédit, poids]. Alloués au premier dépôt, rendus à l'écrivain par take().
+        self._control = None
+        self._entries = None
+        self._by_key = None
+        self._streams = None
+        self._turn = None  # Flux dont le tour est en cours (crédit déjà versé)
+        self._pending = 0  # Trames en file, toutes classes
+
+        # Octets en file + octets pris par l'écrivain mais pas encore envoyés
+        self.size = 0
+        # Dont octets de fichiers (fenêtre à part, voir has_room)
+        self.bulk_size = 0
+        self._taken_bulk = 0  # Octets de fichiers pris par l'écrivain, pas encore envoyés
+        self.congested = False
+        self.closed = False
+        self.overflowed = False  # Fermée par la politique POLICY_DISCONNECT
+
+        # Statistiques
+        self.dropped = 0
+        self.coalesced = 0
+
+        # Appelé quand la file passe de vide à non vide (moteur asyncio)
+        self.on_ready = None
+        # Appelé après un envoi qui ramène les octets de fichiers sous le
+        # seuil bas (relais de fichiers en attente de place, voir file_relay.py)
+        self.on_drain = None
+
+        self._lock = threading.Lock()
+        # Signal « du travail attend l'écrivain » : verrou libéré = signal levé
+        self._ready = threading.Lock()
+        self._ready.acquire()
+
+    def _signal(self):
+        try:
+            self._ready.release()
+        except RuntimeError:
+            pass  # Signal déjà levé
+
+    def put(self, data: bytes, key=None, weight: int = 1) -> bool:
+        """
+        Dépose une trame à envoyer.
+
+        Args:
+            data: La trame encodée
+            key: Clé de fusion (ex : présence d'un utilisateur dans un salon)
+            weight: Poids du transfert dans le partage des écritures
+                    (trames de fichiers uniquement)
+
+        Returns:
+            bool: False si la trame a été jetée
+        """
+        priority, stream = classify(data)
+        with self._lock:
+            if self.closed:
+                return False
+
+            if priority == PRIORITY_BULK:
+                # Hors politique de retard : le relais respecte déjà la fenêtre (has_room)
+                self._append_bulk(data, stream, weight)
+                accepted = True
+            elif self.congested or self.size - self.bulk_size + len(data) > self.high_watermark:
+                self.congested = True
+                accepted = self._put_congested(data, key)
+            else:
+                self._append(data, key, priority)
+                accepted = True
+
+            # Réveiller l'écrivain : première trame en file, ou déconnexion
+            wake = (accepted and self._pending == 1) or self.overflowed
+
+        if wake:
+            self._signal()
+            if self.on_ready:
+                self.on_ready()
+        return accepted
+
+    def has_room(self, nbytes: int) -> bool:
+        """
+        True si une trame de fichier de nbytes octets tient dans la fenêtre
+        des fichiers (seuil haut, octets de fichiers comptés à part).
+        """
+        with self._lock:
+            return self.bulk_size + nbytes <= self.high_watermark
+
+    def _put_congested(self, data: bytes, key) -> bool:
+        """Applique la politique à une trame reçue pendant un retard."""
+        if self.policy == POLICY_DISCONNECT:
+            self.overflowed = True
+            self.closed = True
+            return False
+
+        if self.policy == POLICY_COALESCE and key is not None and self._by_key:
+            entry = self._by_key.get(key)
+            if entry is not None:
+                # Remplacer la mise à jour en attente par la plus récente
+                self.size += len(data) - len(entry[1])
+                entry[1] = data
+                self.coalesced += 1
+                return True
+
+        self.dropped += 1
+        return False
+
+    def _append(self, data: bytes, key, priority: int):
+        if priority == PRIORITY_CONTROL:
+            if self._control is None:
+                self._control = []
+            self._control.append(data)
+        else:
+            entry = [key, data]
+            if self._entries is None:
+                self._entries = []
+            self._entries.append(entry)
+            if key is not None:
+                if self._by_key is None:
+                    self._by_key = {}
+                self._by_key[key] = entry
+        self._pending += 1
+        self.size += len(data)
+
+    def _append_bulk(self, data, stream: bytes, weight: int):
+        if self._streams is None:
+            self._streams = collections.OrderedDict()
+        flow = self._streams.get(stream)
+        if flow is None:
+            flow = self._streams[stream] = [collections.deque(), 0, 1]
+        flow[0].append(data)
+        flow[2] = max(1, weight)
+        self._pending += 1
+        self.size += len(data)
+        self.bulk_size += len(data)
+
+    def _take_locked(self) -> list:
+        frames = self._control or []
+        if self._entries:
+            frames.extend(data for _, data in self._entries)
+        self._control = self._entries = self._by_key = None
+        if self._streams:
+            self._take_bulk_locked(frames)
+        self._pending -= len(frames)
+        return frames
+
+    def _take_bulk_locked(self, frames: list):
+        """
+        Ajoute au plus bulk_burst octets de fichiers (au moins une trame),
+        pris flux par flux selon leur crédit (deficit round robin).
+        """
+        budget = self.bulk_burst
+        streams = self._streams
+        while streams and budget > 0:
+            stream, flow = next(iter(streams.items()))
+            pending = flow[0]
+            if self._turn != stream:
+                # Début de son tour : crédit proportionnel à son poids
+                self._turn = stream
+                flow[1] += BULK_QUANTUM * flow[2]
+            while pending and len(pending[0]) <= flow[1] and budget > 0:
+                data = pending.popleft()
+                flow[1] -= len(data)
+                budget -= len(data)
+                self._taken_bulk += len(data)
+                frames.append(data)
+            if not pending:
+                # Flux vide : il perd son crédit restant
+                del streams[stream]
+                self._turn = None
+            elif len(pending[0]) > flow[1]:
+                streams.move_to_end(stream)
+                self._turn = None
+            # Sinon, écriture pleine au milieu du tour : il reprend à la suivante
+        if not streams:
+            self._streams = None
+
+    def take(self, timeout: float = None):
+        """
+        Retire les trames en attente (bloquant) : toutes celles de contrôle
+        et de chat, puis au plus bulk_burst octets de fichiers.
+
+        Les octets retirés restent comptés jusqu'à l'appel de release(),
+        afin que les seuils tiennent compte des envois en cours.
+
+        Returns:
+            list: Les trames, ou None si la file est fermée et vide
+        """
+        while True:
+            with self._lock:
+                if self._pending:
+                    return self._take_locked()
+                if self.closed:
+                    return None
+            if not self._ready.acquire(timeout=-1 if timeout is None else timeout):
+                return []
+
+    def take_nowait(self):
+        """
+        Retire les trames en attente sans bloquer (comme take()).
+
+        Returns:
+            list: Les trames (éventuellement vide), ou None si la file est fermée et vide
+        """
+        with self._lock:
+            if not self._pending and self.closed:
+                return None
+            return self._take_locked()
+
+    def release(self, nbytes: int):
+        """
+        Signale que nbytes octets pris par take() ont été envoyés.
+        """
+        with self._lock:
+            bulk = min(self._taken_bulk, nbytes)
+            self._taken_bulk -= bulk
+            self.bulk_size -= bulk
+            self.size -= nbytes
+            if self.congested and self.size - self.bulk_size <= self.low_watermark:
+                self.congested = False
+            drained = self.bulk_size <= self.low_watermark
+        if drained and self.on_drain:
+            self.on_drain()
+
+    def close(self):
+        """
+        Fermer la file : plus aucun dépôt, l'écrivain termine les envois en cours.
+        """
+        with self._lock:
+            self.closed = True
+        self._signal()
+        if self.on_ready:
+            self.on_ready()
+
+
+class ClientWriter(threading.Thread):
+    """
+    Thread écrivain d'un client (moteur à threads) : vide la file d'envoi
+    sur la socket. Seul ce thread écrit sur la socket du client.
+    """
+
+    def __init__(self, sock, queue: OutboundQueue):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.queue = queue
+
+    def run(self):
+        while True:
+            frames = self.queue.take()
+            if frames is None:
+                break
+
+            try:
+                # Toutes les trames en attente partent ensemble (sendmsg)
+                send_frames(self.sock, frames)
+            except OSError:
+                # Connexion perdue : plus rien ne sera envoyé
+                self.queue.close()
+                break
+            finally:
+                self.queue.release(sum(len(frame) for frame in frames))
+
+        if self.queue.overflowed:
+            # Débloquer la lecture pour déclencher la déconnexion
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,181 @@
+"""
+presence.py
+
+Agrégation des mises à jour de présence (join / leave).
+
+Sans agrégation, chaque arrivée ou départ envoie une trame ROOM_UPDATE à
+chaque client authentifié : une reconnexion massive de N utilisateurs coûte
+O(N²) trames. L'agrégateur accumule les changements pendant un court
+intervalle (« tick »), ne garde que le dernier changement d'un même
+utilisateur dans un même salon, puis envoie :
+- une seule trame ROOM_UPDATE_BATCH aux clients ayant annoncé CAP_PRESENCE_BATCH
+  (ROOM_UPDATE_BATCH_ALIAS pour les noms qui ont un alias, si le client a
+  aussi annoncé CAP_ALIASES)
+- les ROOM_UPDATE individuels d'origine aux autres clients
+
+L'agrégateur tient aussi l'annuaire des salons (RoomDirectory) à jour, sous
+son verrou : le DIRECTORY d'un client qui se connecte part au tick suivant,
+avec exactement les changements des lots déjà envoyés.
+"""
+
+import threading
+from common.protocol import *
+
+# Intervalle d'agrégation par défaut (secondes)
+DEFAULT_PRESENCE_TICK = 0.03
+
+# Nombre max de mises à jour par trame ROOM_UPDATE_BATCH (compteur sur 2 octets)
+MAX_BATCH_UPDATES = 4096
+
+
+class PresenceAggregator:
+    """
+    Collecte les changements de présence et les diffuse par lots.
+    """
+
+    def __init__(self, server, tick: float = DEFAULT_PRESENCE_TICK):
+        """
+        Args:
+            server: Le ChatServer dont les clients reçoivent les mises à jour
+            tick: Intervalle d'agrégation (secondes)
+        """
+        self.server = server
+        self.tick = tick
+
+        # (salon, utilisateur) → dernière action, dans l'ordre d'arrivée
+        self._pending = {}
+        # Clients qui attendent leur DIRECTORY
+        self._directory_clients = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, room_name: str, user: str, action: str):
+        """
+        Enregistre un changement de présence pour le prochain envoi.
+
+        Args:
+            room_name: Le nom du salon
+            user: L'utilisateur concerné
+            action: "join" ou "leave"
+        """
+        key = (room_name, user)
+        with self._lock:
+            self.server.directory.apply(room_name, action)
+            # join puis leave (ou l'inverse) pendant le même tick : seul le
+            # dernier est annoncé, jamais aucun des deux (un client qui a reçu
+            # entre-temps un ROOM_SNAPSHOT ou un DIRECTORY a vu le premier)
+            self._pending.pop(key, None)
+            self._pending[key] = action
+
+    def send_directory(self, client):
+        """
+        Envoie l'annuaire des salons (DIRECTORY) au client au prochain tick.
+
+        Args:
+            client: Le client qui vient de se connecter (CAP_DIRECTORY)
+        """
+        with self._lock:
+            self._directory_clients.append(client)
+
+    def flush(self):
+        """
+        Envoie les changements accumulés depuis le dernier appel.
+        """
+        with self._lock:
+            directory_clients, self._directory_clients = self._directory_clients, []
+            directory = self.server.directory.snapshot_payload() if directory_clients else None
+            pending, self._pending = self._pending, {}
+
+        # Le DIRECTORY compte déjà les changements de ce tick
+        for client in directory_clients:
+            try:
+                client.send(pack_message(DIRECTORY, directory))
+            except OSError:
+                pass
+        if not pending:
+            return
+
+        updates = [(room_name, user, action) for (room_name, user), action in pending.items()]
+
+        # Les trames sont encodées une seule fois puis partagées entre les clients
+        batch_frames = [
+            SharedFrame(ROOM_UPDATE_BATCH, pack_room_update_batch(updates[i:i + MAX_BATCH_UPDATES]))
+            for i in range(0, len(updates), MAX_BATCH_UPDATES)
+        ]
+        legacy_frames = None
+        alias_frames = None
+
+        waiting = set(directory_clients)
+        with self.server.lock:
+            recipients = [c for c in self.server.clients.values()
+                          if c.is_authenticated() and c not in waiting]
+
+        for client in recipients:
+            try:
+                if client.capabilities & CAP_PRESENCE_BATCH and client.capabilities & CAP_ALIASES:
+                    if alias_frames is None:
+                        alias_frames = self._alias_frames(updates)
+                    for frame, names, ids in alias_frames:
+                        if names and not self.server.aliases.announce(client, names, ids):
+                            continue
+                        client.send(frame.for_capabilities(client.capabilities))
+                elif client.capabilities & CAP_PRESENCE_BATCH:
+                    for frame in batch_frames:
+                        client.send(frame.for_capabilities(client.capabilities))
+                else:
+                    if legacy_frames is None:
+                        legacy_frames = [
+                            (encode_message(ROOM_UPDATE, room_name, user, action),
+                             (ROOM_UPDATE, room_name, user))
+                            for room_name, user, action in updates
+                        ]
+                    for frame, key in legacy_frames:
+                        client.send(frame, key)
+            except OSError:
+                pass
+
+    def _alias_frames(self, updates) -> list:
+        """
+        Lots destinés aux clients CAP_ALIASES : les mises à jour dont le salon
+        et le membre ont un alias partent en ROOM_UPDATE_BATCH_ALIAS, les autres
+        (ex : départ d'un client déjà déconnecté) en ROOM_UPDATE_BATCH.
+
+        Returns:
+            list: Tuples (trame, noms, alias) ; noms et alias à annoncer avant
+            la trame, None pour un lot en clair
+        """
+        ids = self.server.aliases.lookup_each({name for room_name, user, _ in updates for name in (room_name, user)})
+        aliased = [u for u in updates if u[0] in ids and u[1] in ids]
+        plain = [u for u in updates if u[0] not in ids or u[1] not in ids]
+
+        frames = []
+        for i in range(0, len(aliased), MAX_BATCH_UPDATES):
+            chunk = aliased[i:i + MAX_BATCH_UPDATES]
+            names = list(dict.fromkeys(name for room_name, user, _ in chunk for name in (room_name, user)))
+            payload = pack_room_update_batch_alias([(ids[room_name], ids[user], action)
+                                                    for room_name, user, action in chunk])
+            frames.append((SharedFrame(ROOM_UPDATE_BATCH_ALIAS, payload), names, [ids[name] for name in names]))
+        for i in range(0, len(plain), MAX_BATCH_UPDATES):
+            payload = pack_room_update_batch(plain[i:i + MAX_BATCH_UPDATES])
+            frames.append((SharedFrame(ROOM_UPDATE_BATCH, payload), None, None))
+        return frames
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erreur d'envoi des présences : {e}")
+
+    def start(self):
+        """Démarre le thread d'envoi périodique."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le thread d'envoi après un dernier envoi."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
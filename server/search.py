@@ -0,0 +1,284 @@
+"""
+search.py
+
+Recherche plein texte dans les messages des salons (requête SEARCH).
+
+Un index inversé par salon associe chaque mot à la liste des messages qui le
+contiennent (« postings »). Les mots sont normalisés pour le français : en
+minuscules et sans accents (« Été » et « ete » se retrouvent). Les postings
+sont compressés : identifiants de messages croissants stockés en écarts
+successifs, chaque nombre codé en varint (1 octet pour la plupart).
+
+L'index est tenu à jour par un thread dédié : handle_msg ne fait que déposer
+le message dans une file, la tokenisation et l'indexation ont lieu hors du
+chemin de diffusion. Un message est donc trouvable quelques instants après
+avoir été diffusé.
+
+La mémoire est bornée par le nombre de messages indexés : au-delà, les plus
+anciens sont oubliés et les postings sont compactés périodiquement.
+"""
+
+import collections
+import re
+import threading
+import time
+import unicodedata
+from common.protocol import *
+
+# Valeurs par défaut
+MAX_DOCUMENTS = 200000   # Messages indexés, tous salons confondus
+MAX_PENDING = 100000     # Messages en attente d'indexation, au-delà ils ne sont pas indexés
+
+MIN_TOKEN_LEN = 2
+# Mots trop fréquents pour être utiles à une recherche (leurs postings seraient énormes)
+STOP_WORDS = frozenset("""
+    au aux avec ce ces dans de des du elle en et eux il ils je la le les leur lui ma mais me
+    meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te
+    tes toi ton tu un une vos votre vous est sont ai as cette cet
+""".split())
+
+_TOKEN = re.compile(r"\w+")
+# Ligatures que la décomposition Unicode ne sépare pas
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
+
+
+def fold(text: str) -> str:
+    """
+    Normalise un texte pour la recherche : minuscules, sans accents ni ligatures.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold().translate(_LIGATURES))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list:
+    """
+    Mots indexables d'un texte (normalisés, sans mots vides).
+    """
+    return [
+        token for token in _TOKEN.findall(fold(text))
+        if len(token) >= MIN_TOKEN_LEN and token not in STOP_WORDS
+    ]
+
+
+def _append_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_postings(data: bytes) -> dict:
+    """
+    Décode des postings compressés.
+
+    Returns:
+        dict: identifiant du message → nombre d'occurrences du mot
+    """
+    postings = {}
+    doc_id = 0
+    value = shift = 0
+    delta = None
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if delta is None:
+            delta = value
+        else:
+            doc_id += delta
+            postings[doc_id] = value
+            delta = None
+        value = shift = 0
+    return postings
+
+
+class Postings:
+    """
+    Messages contenant un mot : suite de [écart d'identifiant][occurrences] en varint.
+    """
+
+    __slots__ = ("data", "last", "count")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.last = 0   # Identifiant du dernier message ajouté
+        self.count = 0  # Messages dans la liste
+
+    def add(self, doc_id: int, occurrences: int):
+        _append_varint(self.data, doc_id - self.last)
+        _append_varint(self.data, occurrences)
+        self.last = doc_id
+        self.count += 1
+
+
+class SearchIndex:
+    """
+    Index inversé des messages de tous les salons, alimenté par un thread.
+    """
+
+    def __init__(self, max_documents: int = MAX_DOCUMENTS,
+                 max_pending: int = MAX_PENDING,
+                 clock=time.time):
+        """
+        Args:
+            max_documents: Nombre max de messages indexés (les plus anciens sont oubliés)
+            max_pending: Messages en attente au-delà desquels les suivants ne sont pas indexés
+            clock: Horloge (remplaçable dans les tests)
+        """
+        self.max_documents = max_documents
+        self.max_pending = max_pending
+        self.clock = clock
+
+        self._rooms = {}  # nom_salon → {mot: Postings}
+        # Messages indexés, du plus ancien au plus récent :
+        # identifiant → (horodatage ms, expéditeur, texte)
+        self._documents = collections.OrderedDict()
+        self._next_id = 1
+        self._stale = 0  # Messages oubliés encore présents dans les postings
+        self._lock = threading.Lock()
+
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._index_lock = threading.Lock()  # Un seul lot indexé à la fois (thread ou flush)
+        self._thread = None
+        self._running = False
+
+        # Statistiques
+        self.dropped = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="recherche", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le thread d'indexation après avoir indexé les messages en attente."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def add(self, room_name: str, sender: str, text: str) -> bool:
+        """
+        Dépose un message à indexer. Ne tokenise rien dans le thread appelant.
+
+        Returns:
+            bool: False si le message ne sera pas indexé (indexation trop en retard)
+        """
+        timestamp = int(self.clock() * 1000)
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((room_name, timestamp, sender, text))
+            if len(self._pending) == 1:
+                self._cond.notify()
+        return True
+
+    def flush(self):
+        """Indexe tout de suite les messages en attente (dans le thread appelant)."""
+        self._drain()
+
+    def search(self, room_name: str, query: str, offset: int = 0, count: int = MAX_SEARCH_RESULTS) -> tuple[int, list]:
+        """
+        Messages du salon contenant tous les mots de la requête.
+
+        Les résultats sont classés par nombre d'occurrences des mots
+        cherchés, puis du plus récent au plus ancien.
+
+        Returns:
+            tuple: (nombre total de résultats, page de HistoryEntry)
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return 0, []
+
+        # Copier les postings sous le verrou, les décoder en dehors
+        with self._lock:
+            index = self._rooms.get(room_name)
+            if index is None or any(token not in index for token in tokens):
+                return 0, []
+            lists = sorted((index[token] for token in tokens), key=lambda postings: postings.count)
+            lists = [bytes(postings.data) for postings in lists]
+
+        # Intersection en partant de la liste la plus courte
+        scores = decode_postings(lists[0])
+        for data in lists[1:]:
+            if not scores:
+                break
+            other = decode_postings(data)
+            scores = {doc_id: score + other[doc_id] for doc_id, score in scores.items() if doc_id in other}
+
+        with self._lock:
+            documents = self._documents
+            matches = [doc_id for doc_id in scores if doc_id in documents]
+            matches.sort(key=lambda doc_id: (scores[doc_id], doc_id), reverse=True)
+            page = [HistoryEntry(doc_id, *documents[doc_id]) for doc_id in matches[offset:offset + count]]
+        return len(matches), page
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+    def _drain(self):
+        with self._index_lock:
+            with self._cond:
+                pending, self._pending = self._pending, collections.deque()
+            for room_name, timestamp, sender, text in pending:
+                self._index(room_name, timestamp, sender, text)
+
+    def _index(self, room_name: str, timestamp: int, sender: str, text: str):
+        # Tokenisation hors du verrou : les recherches ne l'attendent pas
+        occurrences = collections.Counter(tokenize(text))
+
+        with self._lock:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._documents[doc_id] = (timestamp, sender, text)
+
+            index = self._rooms.get(room_name)
+            if index is None:
+                index = self._rooms[room_name] = {}
+            for token, count in occurrences.items():
+                postings = index.get(token)
+                if postings is None:
+                    postings = index[token] = Postings()
+                postings.add(doc_id, count)
+
+            # Oublier les plus anciens messages ; leurs postings sont retirés
+            # par lots, quand ils représentent la moitié de l'index
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+                self._stale += 1
+            if self._stale and self._stale >= max(len(self._documents), 1):
+                self._compact()
+
+    def _compact(self):
+        """Réécrit les postings sans les messages oubliés (verrou tenu)."""
+        documents = self._documents
+        for room_name, index in list(self._rooms.items()):
+            for token, postings in list(index.items()):
+                kept = Postings()
+                for doc_id, count in decode_postings(postings.data).items():
+                    if doc_id in documents:
+                        kept.add(doc_id, count)
+                if kept.count:
+                    index[token] = kept
+                else:
+                    del index[token]
+            if not index:
+                del self._rooms[room_name]
+        self._stale = 0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+            self._drain()
@@ -1,24 +1,98 @@
 import socket
+import sys
 import threading
-import datetime
+import time
 from common.protocol import *
+from server.outbound import (
+    OutboundQueue, ClientWriter, POLICY_COALESCE,
+    DEFAULT_HIGH_WATERMARK, DEFAULT_LOW_WATERMARK, DEFAULT_BULK_BURST,
+)
+
+from server.presence import PresenceAggregator
+from server.directory import RoomDirectory
+from server.heartbeat import HeartbeatMonitor
+from server.aliases import AliasRegistry, AliasedFrame
+from server.history import RoomHistory
+from server.message_log import MessageLog
+from server.search import SearchIndex
+from server.sessions import SessionManager
+from server.file_relay import FileRelay, OFFER_ACCEPTED
+
+# Capacités optionnelles du protocole prises en charge par ce serveur
+# (CAP_RESUME seulement si la reprise de session est activée)
+SUPPORTED_CAPABILITIES = (CAP_PRESENCE_BATCH | CAP_ROOM_SNAPSHOT | CAP_DIRECTORY
+                          | CAP_COMPRESSION | CAP_ALIASES | CAP_RESUME)
+
+# Expéditeur des messages de service (arrivées, départs) diffusés dans un salon
+SERVER_SENDER = "Serveur"
+
+# Délai max (secondes) pour vider la file d'envoi d'un client qui se déconnecte
+WRITER_FLUSH_TIMEOUT = 2.0
 
 
 class ClientContext:
     """
     Représente l'état d'un client connecté.
+
+    Une instance par connexion : __slots__ évite un dictionnaire d'attributs
+    par client.
     """
 
+    __slots__ = (
+        "sock", "pseudo", "state", "room", "last_message_time", "pending_file",
+        "capabilities", "connected_at", "last_seen", "last_activity",
+        "missed_pings", "outbox", "writer", "aliases", "session",
+    )
+
     def __init__(self, sock):
         self.sock = sock
         self.pseudo = None
         self.state = STATE_CONNECTED
         self.room = None
-        self.last_message_time = None  # datetime du dernier message envoyé
+        self.last_message_time = None  # time.time() du dernier message envoyé
         self.pending_file = None
+        self.capabilities = 0  # Capacités négociées au LOGIN (voir protocol.py)
+
+        # Suivi de vie de la connexion (voir heartbeat.py)
+        self.connected_at = None
+        self.last_seen = None      # Dernière trame reçue (quelle qu'elle soit)
+        self.last_activity = None  # Dernière trame reçue autre que PONG
+        self.missed_pings = 0
+
+        # File d'envoi (None = envoi direct sur la socket)
+        self.outbox = None
+        self.writer = None
+
+        # Alias déjà annoncés à ce client (CAP_ALIASES, voir aliases.py)
+        self.aliases = None
+
+        # Jeton de session (CAP_RESUME, voir sessions.py)
+        self.session = None
+
+    def send(self, data: bytes, key=None, weight: int = 1) -> bool:
+        """
+        Envoie une trame au client.
+
+        Si le client a une file d'envoi, la trame y est déposée et sera
+        écrite par son écrivain : l'appelant n'est jamais bloqué par un
+        client lent.
+
+        Args:
+            data: La trame encodée (bytes ou Frame)
+            key: Clé de fusion des mises à jour de présence (voir outbound.py)
+            weight: Poids d'un transfert de fichier face aux autres transferts
+                    vers ce client (voir outbound.py)
+
+        Returns:
+            bool: False si la trame n'a pas pu être envoyée
+        """
+        if self.outbox is None:
+            self.sock.send(bytes(data))
+            return True
+        return self.outbox.put(data, key, weight)
 
     def is_authenticated(self):
-        return self.state in (STATE_AUTHENTICATED, STATE_IN_ROOM)
+        return STATE_AUTHENTICATED <= self.state <= STATE_IN_ROOM
 
     def is_in_room(self):
         return self.state == STATE_IN_ROOM
@@ -30,9 +104,48 @@ class ChatServer:
     Thread-safe : utilise un Lock pour protéger les structures partagées.
     """
 
-    def __init__(self):
+    def __init__(self, high_watermark: int = DEFAULT_HIGH_WATERMARK,
+                 low_watermark: int = DEFAULT_LOW_WATERMARK,
+                 slow_client_policy: str = POLICY_COALESCE,
+                 bulk_burst: int = DEFAULT_BULK_BURST,
+                 presence_tick: float = None,
+                 heartbeat: HeartbeatMonitor = None,
+                 history: RoomHistory = None,
+                 message_log: MessageLog = None,
+                 search: SearchIndex = None,
+                 resume_grace: float = None,
+                 file_relay: FileRelay = None):
+        """
+        Args:
+            high_watermark: Seuil haut (octets) de la file d'envoi d'un client
+            low_watermark: Seuil bas (octets) de la file d'envoi d'un client
+            slow_client_policy: Politique appliquée à un client en retard
+            bulk_burst: Octets de fichiers max par écriture sur la connexion
+                        d'un client (le chat passe entre deux écritures)
+            presence_tick: Intervalle (secondes) d'agrégation des présences,
+                           None = envoi immédiat de chaque ROOM_UPDATE
+            heartbeat: Surveillance PING/PONG et délais de connexion,
+                       None = aucune surveillance
+            history: Historique récent des salons, rejoué à l'entrée
+                     dans un salon, None = pas d'historique
+            message_log: Journal durable des messages (HISTORY_REQUEST),
+                         None = pas de journal
+            search: Index de recherche plein texte (SEARCH),
+                    None = pas de recherche
+            resume_grace: Délai (secondes) pour reprendre une session après
+                          une coupure (CAP_RESUME), None = pas de reprise
+            file_relay: Registre des offres et relais des fichiers (démarré
+                        par le serveur), None = relais par défaut, sans
+                        échéance des offres
+        """
         self.clients = {}
         
+        # Configuration des files d'envoi (voir outbound.py)
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.slow_client_policy = slow_client_policy
+        self.bulk_burst = bulk_burst
+        
         # Dictionnaire des salons : nom_salon → set de pseudos
         # Exemple : {"général": {"Alice", "Bob"}, "dev": {"Charlie"}}
         self.rooms = {}
@@ -40,6 +153,51 @@ class ChatServer:
         # Lock pour protéger l'accès concurrent aux clients et aux salons
         # Nécessaire car plusieurs threads (un par client) accèdent à ces structures
         self.lock = threading.Lock()
+        
+        # Annuaire salon → nombre de membres, tenu à jour à chaque JOIN / LEAVE
+        # avec l'envoi de la mise à jour de présence (voir _broadcast_room_update)
+        self.directory = RoomDirectory()
+        self._room_update_lock = threading.Lock()
+        
+        # Alias numériques des pseudos connectés et des salons ouverts
+        self.aliases = AliasRegistry()
+        self.aliases.register(SERVER_SENDER)
+        
+        # Agrégateur des mises à jour de présence (voir presence.py)
+        self.presence = None
+        if presence_tick:
+            self.presence = PresenceAggregator(self, presence_tick)
+            self.presence.start()
+        
+        # Surveillance des connexions (voir heartbeat.py)
+        self.heartbeat = heartbeat
+        if heartbeat is not None:
+            heartbeat.start()
+        
+        # Derniers messages de chaque salon (voir history.py)
+        self.history = history
+        
+        # Journal durable des messages (voir message_log.py)
+        self.message_log = message_log
+        if message_log is not None:
+            message_log.start()
+        
+        # Index de recherche plein texte (voir search.py)
+        self.search = search
+        if search is not None:
+            search.start()
+        
+        # Sessions détachées et séquences des salons (voir sessions.py)
+        self.sessions = None
+        if resume_grace:
+            self.sessions = SessionManager(self._expire_session, resume_grace)
+            self.sessions.start()
+        
+        # Offres et transferts de fichiers en cours (voir file_relay.py)
+        self.files = file_relay if file_relay is not None else FileRelay()
+        self.files.on_offer_expired = self._close_file_offer
+        if file_relay is not None:
+            file_relay.start()
     
     def handle_join(self, client: ClientContext, payload: bytes):
         """
@@ -50,17 +208,8 @@ class ChatServer:
             payload: Les données du message (contient le nom du salon)
         """
         
-        # Vérifier que le client est authentifié
-        if not client.is_authenticated():
-            client.sock.send(pack_message(ERROR, bytes([0x06]) + pack_string("Non authentifié")))
-            return
-        
-        # Extraire le nom du salon
-        room_name = unpack_string(payload)
-        
-        # Vérifier que le nom du salon est valide
-        if not room_name or len(room_name) > 32:
-            client.sock.send(pack_message(ERROR, bytes([0x06]) + pack_string("Nom de salon invalide")))
+        room_name = self._parse_join(client, payload)
+        if room_name is None:
             return
         
         # Si le client est déjà dans un salon, le retirer d'abord
@@ -72,6 +221,7 @@ class ChatServer:
             # Créer le salon s'il n'existe pas
             if room_name not in self.rooms:
                 self.rooms[room_name] = set()
+                self.aliases.register(room_name)
             
             # Récupérer les membres actuels avant d'ajouter le nouveau
             existing_members = list(self.rooms[room_name])
@@ -82,19 +232,71 @@ class ChatServer:
         client.room = room_name
         client.state = STATE_IN_ROOM  # Transition: AUTHENTIFIÉ → DANS_SALON
         
-        # Confirmer
-        client.sock.send(pack_message(JOIN_OK))
-        
-        # Envoyer la liste des membres existants au nouveau client via ROOM_UPDATE
-        for member in existing_members:
-            payload = pack_string(room_name) + pack_string(member) + pack_string("join")
-            client.sock.send(pack_message(ROOM_UPDATE, payload))
+        self._send_join_ok(client, room_name, existing_members)
         
         # Notifier TOUS les clients que le nouveau a rejoint (pour la liste globale)
         self._broadcast_room_update(room_name, client.pseudo, "join")
         
         # Notifier les autres dans le chat
-        self._broadcast_to_room(room_name, "Serveur", f"{client.pseudo} s'est connecté", exclude_pseudo=client.pseudo)
+        self._broadcast_to_room(room_name, SERVER_SENDER, f"{client.pseudo} s'est connecté", exclude_pseudo=client.pseudo)
+    
+    def _parse_join(self, client: ClientContext, payload: bytes):
+        """
+        Vérifie une demande JOIN et en extrait le nom du salon.
+        
+        Returns:
+            str: Le nom du salon, ou None si la demande est refusée (erreur déjà envoyée)
+        """
+        
+        # Vérifier que le client est authentifié
+        if not client.is_authenticated():
+            client.send(pack_message(ERROR, bytes([0x06]) + pack_string("Non authentifié")))
+            return None
+        
+        # Extraire le nom du salon
+        # Nom internalisé : une seule copie partagée par les index et les membres
+        room_name = sys.intern(decode_payload(JOIN, payload).room)
+        
+        # Vérifier que le nom du salon est valide
+        if not room_name or len(room_name) > MAX_ROOM_LEN:
+            client.send(pack_message(ERROR, bytes([0x06]) + pack_string("Nom de salon invalide")))
+            return None
+        
+        return room_name
+    
+    def _send_join_ok(self, client: ClientContext, room_name: str, existing_members: list):
+        """
+        Confirme l'entrée dans un salon et envoie la liste de ses membres.
+        
+        Args:
+            client: Le client qui vient d'entrer
+            room_name: Le nom du salon
+            existing_members: Les membres présents avant son arrivée
+        """
+        
+        # Confirmer ; un client CAP_RESUME y trouve la séquence courante du
+        # salon, à partir de laquelle il comptera les messages reçus
+        if client.capabilities & CAP_RESUME:
+            sequence = self.sessions.room(room_name)
+            with sequence.lock:
+                client.send(encode_message(JOIN_OK, sequence.seq))
+        else:
+            client.send(pack_message(JOIN_OK))
+        
+        if client.capabilities & CAP_ROOM_SNAPSHOT:
+            # Liste complète des membres en une (ou quelques) trame(s)
+            for snapshot in pack_room_snapshot(room_name, existing_members + [client.pseudo]):
+                client.send(pack_message(ROOM_SNAPSHOT, snapshot))
+        else:
+            # Envoyer la liste des membres existants au nouveau client via ROOM_UPDATE
+            for member in existing_members:
+                client.send(encode_message(ROOM_UPDATE, room_name, member, "join"))
+        
+        # Derniers messages du salon, en une seule écriture
+        if self.history is not None:
+            replay = self.history.tail(room_name)
+            if replay:
+                client.send(replay)
     
     def handle_leave(self, client: ClientContext):
         """
@@ -106,7 +308,7 @@ class ChatServer:
         
         # Vérifier que le client est dans un salon
         if not client.is_in_room():
-            client.sock.send(pack_message(ERROR, bytes([0x03]) + pack_string("Pas dans un salon")))
+            client.send(pack_message(ERROR, bytes([0x03]) + pack_string("Pas dans un salon")))
             return
         
         # Retirer le client du salon
@@ -114,6 +316,25 @@ class ChatServer:
         
         # Le client sait qu'il a quitté car il a envoyé LEAVE
     
+    def handle_room_query(self, client: ClientContext, payload: bytes):
+        """
+        Traite une demande ROOM_QUERY : renvoie les membres d'un salon
+        (chargement à la demande après DIRECTORY).
+        
+        Args:
+            client: Le contexte du client qui fait la demande
+            payload: Les données du message (contient le nom du salon)
+        """
+        
+        if not client.is_authenticated():
+            client.send(pack_message(ERROR, bytes([0x06]) + pack_string("Non authentifié")))
+            return
+        
+        room_name = decode_payload(ROOM_QUERY, payload).room
+        
+        for snapshot in pack_room_snapshot(room_name, self.room_members(room_name)):
+            client.send(pack_message(ROOM_SNAPSHOT, snapshot))
+    
     def handle_msg(self, client: ClientContext, payload: bytes):
         """
         Traite un message MSG d'un client et le diffuse au salon.
@@ -125,27 +346,75 @@ class ChatServer:
         
         # Vérifier que le client est dans un salon
         if not client.is_in_room():
-            client.sock.send(pack_message(ERROR, bytes([0x03]) + pack_string("Pas dans un salon")))
+            client.send(pack_message(ERROR, bytes([0x03]) + pack_string("Pas dans un salon")))
             return
         
         # Extraire le message
-        message = unpack_string(payload)
+        message = decode_payload(MSG, payload).text
         
         # Vérifier que le message n'est pas vide
         if not message:
-            client.sock.send(pack_message(ERROR, bytes([0x05]) + pack_string("Message vide")))
+            client.send(pack_message(ERROR, bytes([0x05]) + pack_string("Message vide")))
             return
         
         # Vérifier la taille du message
         if len(message) > MAX_MSG_LEN:
-            client.sock.send(pack_message(ERROR, bytes([0x05]) + pack_string("Message trop long")))
+            client.send(pack_message(ERROR, bytes([0x05]) + pack_string("Message trop long")))
             return
         
         # Enregistrer le timestamp du message pour le dashboard admin
-        client.last_message_time = datetime.datetime.now()
+        client.last_message_time = time.time()
         
         # Diffuser le message à tous les clients du salon
-        self._broadcast_to_room(client.room, client.pseudo, message)
+        room_name = client.room
+        self._broadcast_to_room(room_name, client.pseudo, message)
+        
+        # Garder le message pour les prochains arrivants (après la diffusion :
+        # un client qui entre en même temps ne le reçoit jamais deux fois)
+        if self.history is not None:
+            self.history.append(room_name, encode_message(MSG_BROADCAST, client.pseudo, message))
+        if self.message_log is not None:
+            self.message_log.append(room_name, client.pseudo, message)
+        if self.search is not None:
+            self.search.add(room_name, client.pseudo, message)
+    
+    def handle_history_request(self, client: ClientContext, payload: bytes):
+        """
+        Traite une demande HISTORY_REQUEST : renvoie une page du journal durable.
+        
+        Args:
+            client: Le contexte du client qui fait la demande
+            payload: Les données du message (salon, séquence de fin, nombre)
+        """
+        
+        request = decode_payload(HISTORY_REQUEST, payload)
+        count = min(request.count, MAX_HISTORY_COUNT)
+        
+        # Sans journal, le serveur répond par une page vide
+        entries, at_start = [], True
+        if self.message_log is not None and count:
+            entries, at_start = self.message_log.read(request.room, request.before, count)
+        client.send(pack_message(HISTORY_CHUNK, pack_history_chunk(request.room, entries, at_start)))
+    
+    def handle_search(self, client: ClientContext, payload: bytes):
+        """
+        Traite une demande SEARCH : renvoie une page de résultats.
+        
+        Args:
+            client: Le contexte du client qui fait la demande
+            payload: Les données du message (salon, requête, décalage, nombre)
+        """
+        
+        request = decode_payload(SEARCH, payload)
+        count = min(request.count, MAX_SEARCH_RESULTS)
+        
+        # Sans index, le serveur répond par une page vide
+        total, entries = 0, []
+        if self.search is not None and count:
+            total, entries = self.search.search(request.room, request.query, request.offset, count)
+        client.send(pack_message(SEARCH_RESULTS, pack_search_results(
+            request.room, request.query, total, request.offset, entries
+        )))
     
     def _broadcast_to_room(self, room_name: str, sender_pseudo: str, message: str, exclude_pseudo: str = None):
         """
@@ -158,25 +427,58 @@ class ChatServer:
             exclude_pseudo: Pseudo à exclure de la diffusion (optionnel)
         """
         
-        # Vérifier que le salon existe
-        if room_name not in self.rooms:
-            return
+        # Récupérer les destinataires (le lock n'est pas gardé pendant l'envoi)
+        with self.lock:
+            if room_name not in self.rooms:
+                return
+            recipients = [
+                self.clients[pseudo]
+                for pseudo in self.rooms[room_name]
+                if pseudo != exclude_pseudo and pseudo in self.clients
+            ]
+        
+        self._deliver_broadcast(room_name, recipients, sender_pseudo, message, exclude_pseudo)
+    
+    def _deliver_broadcast(self, room_name: str, recipients, sender_pseudo: str, message: str,
+                           exclude_pseudo: str = None):
+        """
+        Envoie un message aux destinataires d'un salon (commun aux deux modes de concurrence).
+        
+        Avec la reprise de session, le message est numéroté et gardé pour
+        être rejoué ; les clients CAP_RESUME le reçoivent avec sa séquence.
+        """
         
         # Construire le payload MSG_BROADCAST : [pseudo][message]
-        broadcast_payload = pack_string(sender_pseudo) + pack_string(message)
-        broadcast_msg = pack_message(MSG_BROADCAST, broadcast_payload)
+        broadcast_payload = encode_payload(MSG_BROADCAST, sender_pseudo, message)
+        # Trame construite (et compressée) une fois, partagée sans copie par tous les destinataires
+        broadcast_msg = AliasedFrame(
+            self.aliases, SharedFrame(MSG_BROADCAST, broadcast_payload), (sender_pseudo,),
+            lambda ids: SharedFrame(MSG_BROADCAST_ALIAS, encode_payload(MSG_BROADCAST_ALIAS, ids[0], message)),
+        )
         
-        # Envoyer à chaque client du salon
-        for pseudo in self.rooms[room_name]:
-            if pseudo == exclude_pseudo:
-                continue
-                
-            if pseudo in self.clients:
-                try:
-                    self.clients[pseudo].sock.send(broadcast_msg)
-                except:
-                    # Si l'envoi échoue, on ignore (le client sera nettoyé plus tard)
-                    pass
+        if self.sessions is None:
+            self._send_each(recipients, broadcast_msg)
+            return
+        
+        # Numéroter et envoyer sous le verrou du salon : les membres reçoivent
+        # les messages dans l'ordre des séquences
+        sequence = self.sessions.room(room_name)
+        with sequence.lock:
+            _, sequenced_payload = sequence.append(sender_pseudo, message, exclude_pseudo)
+            sequenced = SharedFrame(MSG_BROADCAST_SEQ, sequenced_payload)
+            self._send_each(recipients, broadcast_msg, sequenced)
+    
+    @staticmethod
+    def _send_each(recipients, broadcast_msg: AliasedFrame, sequenced: SharedFrame = None):
+        for recipient in recipients:
+            try:
+                if sequenced is not None and recipient.capabilities & CAP_RESUME:
+                    recipient.send(sequenced.for_capabilities(recipient.capabilities))
+                else:
+                    broadcast_msg.send(recipient)
+            except OSError:
+                # Si l'envoi échoue, on ignore (le client sera nettoyé plus tard)
+                pass
     
     def _broadcast_room_update(self, room_name: str, user: str, action: str):
         """
@@ -188,19 +490,58 @@ class ChatServer:
             user: L'utilisateur concerné
             action: "join" ou "leave"
         """
+        # Envoi groupé au prochain tick si l'agrégation est activée
+        # (l'agrégateur compte aussi le changement dans l'annuaire)
+        if self.presence is not None:
+            self.presence.add(room_name, user, action)
+            return
+        
         # Format: [room_name][user][action]
-        payload = pack_string(room_name) + pack_string(user) + pack_string(action)
-        msg = pack_message(ROOM_UPDATE, payload)
+        msg = AliasedFrame(
+            self.aliases, SharedFrame(ROOM_UPDATE, encode_payload(ROOM_UPDATE, room_name, user, action)),
+            (room_name, user),
+            lambda ids: SharedFrame(ROOM_UPDATE_ALIAS, encode_payload(ROOM_UPDATE_ALIAS, *ids, ACTION_CODES[action])),
+        )
         
-        # Envoyer à tous les clients authentifiés
-        with self.lock:
-            for pseudo, client in self.clients.items():
-                if client.is_authenticated():
-                    try:
-                        client.sock.send(msg)
-                    except:
-                        pass
+        # Annuaire, destinataires et envois sous le même verrou que l'envoi
+        # d'un DIRECTORY : un client ne reçoit que les changements que son
+        # DIRECTORY ne compte pas encore
+        with self._room_update_lock:
+            self.directory.apply(room_name, action)
+            recipients = self._presence_recipients()
+            
+            # La clé permet de fusionner les présences en attente d'un client en retard
+            key = (ROOM_UPDATE, room_name, user)
+            for client in recipients:
+                try:
+                    msg.send(client, key)
+                except OSError:
+                    pass
+
+    def _send_directory(self, client: ClientContext):
+        """
+        Envoie l'annuaire des salons (DIRECTORY) à un client qui l'a demandé
+        au LOGIN, après LOGIN_OK ou RESUME_OK.
+
+        Avec l'agrégation, le DIRECTORY part au prochain tick, cohérent avec
+        le lot de présences de ce tick.
+        """
+        if not client.capabilities & CAP_DIRECTORY:
+            return
+        if self.presence is not None:
+            self.presence.send_directory(client)
+            return
+        with self._room_update_lock:
+            client.send(pack_message(DIRECTORY, self.directory.snapshot_payload()))
     
+    def _presence_recipients(self) -> list:
+        """
+        Clients authentifiés, destinataires des ROOM_UPDATE (le lock n'est
+        pas gardé pendant l'envoi).
+        """
+        with self.lock:
+            return [c for c in self.clients.values() if c.is_authenticated()]
+
     def _remove_client_from_room(self, client: ClientContext, reason: str = "s'est déconnecté"):
         """
         Retire un client de son salon actuel et notifie les autres.
@@ -211,19 +552,28 @@ class ChatServer:
             reason: La raison (par défaut "s'est déconnecté")
         """
         room_name = client.room
+        if room_name and client.pseudo:
+            self._file_member_left(room_name, client.pseudo)
         
+        removed = False
         with self.lock:
             if room_name and room_name in self.rooms:
                 # Retirer le pseudo du salon
-                self.rooms[room_name].discard(client.pseudo)
+                if client.pseudo in self.rooms[room_name]:
+                    self.rooms[room_name].remove(client.pseudo)
+                    removed = True
                 
                 # Supprimer le salon s'il est vide (optionnel, mais propre)
                 if len(self.rooms[room_name]) == 0:
                     del self.rooms[room_name]
+                    self.aliases.release(room_name)
+                    if self.sessions is not None:
+                        self.sessions.forget_room(room_name)
         
         # Notifier les autres membres du room dans le chat
         if room_name and client.pseudo:
-            self._broadcast_to_room(room_name, "Serveur", f"{client.pseudo} {reason}")
+            self._broadcast_to_room(room_name, SERVER_SENDER, f"{client.pseudo} {reason}")
+        if removed:
             # Notifier TOUS les clients pour la liste globale
             self._broadcast_room_update(room_name, client.pseudo, "leave")
         
@@ -231,6 +581,19 @@ class ChatServer:
         client.room = None
         client.state = STATE_AUTHENTICATED  # Transition: DANS_SALON → AUTHENTIFIÉ
 
+    def room_members(self, room_name: str) -> list:
+        """
+        Retourne une copie de la liste des membres d'un salon.
+        
+        Args:
+            room_name: Le nom du salon
+            
+        Returns:
+            list: Les pseudos des membres (vide si le salon n'existe pas)
+        """
+        with self.lock:
+            return list(self.rooms.get(room_name, ()))
+
     def get_clients_info(self) -> list:
         """
         Retourne les informations de tous les clients connectés.
@@ -242,14 +605,35 @@ class ChatServer:
         clients_info = []
         with self.lock:
             for pseudo, client in self.clients.items():
-                info = {
-                    'pseudo': pseudo,
-                    'room': client.room or '-',
-                    'last_message': client.last_message_time.strftime('%H:%M:%S') if client.last_message_time else '-'
-                }
-                clients_info.append(info)
+                clients_info.append(self._client_info(client))
         return clients_info
 
+    def get_file_stats(self) -> dict:
+        """
+        Statistiques des transferts de fichiers et du cache, affichées par le dashboard admin.
+        """
+        cache = self.files.cache
+        return {
+            'transfers': len(self.files),
+            'relayed_bytes': self.files.relayed_bytes,
+            'cache_files': len(cache) if cache is not None else 0,
+            'cache_bytes': cache.size if cache is not None else 0,
+            'cache_hits': cache.hits if cache is not None else 0,
+            'cache_hit_rate': cache.hit_rate if cache is not None else 0.0,
+            'bytes_saved': cache.bytes_saved if cache is not None else 0,
+        }
+
+    @staticmethod
+    def _client_info(client: ClientContext) -> dict:
+        """
+        Informations d'un client affichées par le dashboard admin.
+        """
+        return {
+            'pseudo': client.pseudo,
+            'room': client.room or '-',
+            'last_message': time.strftime('%H:%M:%S', time.localtime(client.last_message_time)) if client.last_message_time else '-'
+        }
+
     def kick_client(self, pseudo: str) -> bool:
         """
         Kick un client du serveur.
@@ -278,192 +662,504 @@ class ChatServer:
             pass
         
         # Retirer le client de la liste
-        with self.lock:
-            if pseudo in self.clients:
-                del self.clients[pseudo]
+        self._forget_client(client)
         
         return True
 
+    def _forget_client(self, client: ClientContext):
+        """
+        Retire le client de la liste (sauf si le pseudo a été repris entre-temps)
+        et libère l'alias de son pseudo.
+        """
+        with self.lock:
+            if client.pseudo and self.clients.get(client.pseudo) is client:
+                del self.clients[client.pseudo]
+                self.aliases.release(client.pseudo)
+        if self.sessions is not None:
+            self.sessions.close(client)
+        for offer in self.files.forget(client):
+            self._cancel_file_offer(offer, "L'émetteur s'est déconnecté", notify_sender=False)
+
     def handle_file_offer(self, client: ClientContext, payload: bytes):
         if not client.is_in_room():
-            client.sock.send(pack_message(
+            client.send(pack_message(
                 ERROR,
                 bytes([0x03]) + pack_string("Pas dans un salon")
             ))
             return
 
         if client.state == STATE_WAITING_FILE_CONFIRMATION:
-            client.sock.send(pack_message(
+            client.send(pack_message(
                 ERROR,
                 bytes([0x06]) + pack_string("Déjà une requête en cours")
             ))
             return
 
         # Décodage payload
-        filename = unpack_string(payload)
-        size_offset = 2 + len(filename.encode("utf-8"))
-        size = unpack_int(payload[size_offset:])
+        filename, size, digest = unpack_file_offer(payload)
+        if size > MAX_FILE_SIZE:
+            client.send(pack_message(
+                ERROR,
+                bytes([0x07]) + pack_string("Fichier trop volumineux")
+            ))
+            return
+        if digest and not is_file_digest(digest):
+            client.send(pack_message(
+                ERROR,
+                bytes([0x06]) + pack_string("Empreinte invalide")
+            ))
+            return
+
+        # Offre enregistrée avec ses destinataires attendus : les autres membres du salon
+        pseudos = [pseudo for pseudo in self.room_members(client.room) if pseudo != client.pseudo]
+        offer = self.files.offer(client, filename, size, client.room, pseudos, digest)
 
         # Passage à l'état intermédiaire
         client.state = STATE_WAITING_FILE_CONFIRMATION
-        client.pending_file = {
-            "filename": filename,
-            "size": size,
-            "accepted": set(),
-            "rejected": set()
-        }
+        client.pending_file = offer
 
         # Diffuser la demande aux autres clients du salon
-        request_payload = (
-            pack_string(client.pseudo) +
-            pack_string(filename) +
-            pack_int(size)
-        )
+        request_msg = Frame(FILE_REQUEST, encode_payload(FILE_REQUEST, offer.id, client.pseudo, filename, size, digest))
+        for pseudo in pseudos:
+            recipient = self.clients.get(pseudo)
+            if recipient is not None:
+                recipient.send(request_msg)
 
-        request_msg = pack_message(FILE_REQUEST, request_payload)
+        if not pseudos:
+            # Seul dans le salon : personne ne répondra, l'offre est annulée aussitôt
+            offer, outcome = self.files.decide(offer.id)
+            if outcome is not None:
+                self._close_file_offer(offer, outcome)
 
-        for pseudo in self.rooms.get(client.room, []):
-            if pseudo != client.pseudo:
-                self.clients[pseudo].sock.send(request_msg)
+    def handle_file_response(self, client: ClientContext, payload: bytes, accepted: bool):
+        """
+        Traite FILE_ACCEPT / FILE_REJECT pour l'offre désignée par son identifiant.
+        Sans identifiant (client d'origine), la réponse porte sur l'offre en
+        attente dans le salon du client, si elle est seule.
+        """
+        if payload:
+            transfer_id = decode_payload(FILE_ACCEPT, payload).transfer
+        else:
+            offer = self.files.room_offer(client.room) if client.room else None
+            if offer is None:
+                return  # Aucune offre (ou plusieurs) en attente dans le salon
+            transfer_id = offer.id
 
+        offer, outcome = self.files.respond(transfer_id, client.pseudo, accepted)
+        if outcome is not None:
+            self._close_file_offer(offer, outcome)
 
-    def handle_file_response(self, client: ClientContext, accepted: bool):
-        # Trouver le client émetteur
-        for sender in self.clients.values():
+    def _file_member_left(self, room_name: str, pseudo: str):
+        """Un membre quitte un salon : les offres du salon ne l'attendent plus."""
+        for offer, outcome in self.files.member_left(room_name, pseudo):
+            self._close_file_offer(offer, outcome)
+
+    def _close_file_offer(self, offer, outcome: str):
+        """
+        Issue d'une offre : ouverture du transfert, annoncé à l'émetteur et aux
+        destinataires qui ont accepté, ou FILE_CANCEL.
+        """
+        sender = offer.sender
+        if sender.pending_file is offer:
+            sender.pending_file = None
             if sender.state == STATE_WAITING_FILE_CONFIRMATION:
-                break
-        else:
-            return  # Aucun transfert en attente
+                sender.state = STATE_IN_ROOM
+
+        if outcome != OFFER_ACCEPTED:
+            if offer.rejected & offer.expected:
+                reason = "Refus d'un participant"
+            elif not offer.expected:
+                reason = "Aucun destinataire"
+            else:
+                reason = "Délai dépassé"
+            self._cancel_file_offer(offer, reason)
+            return
+
+        with self.lock:
+            recipients = [self.clients[pseudo] for pseudo in offer.accepted_pseudos() if pseudo in self.clients]
+        cached = self.files.open(offer, recipients)
+        start_msg = Frame(FILE_START, encode_payload(
+            FILE_START, offer.id, sender.pseudo, offer.filename, offer.size, offer.digest
+        ))
+        sender.send(start_msg)
+        for recipient in recipients:
+            recipient.send(start_msg)
+        if cached:
+            # Fichier déjà dans le cache : rien à envoyer pour l'émetteur
+            self.files.serve_cached(offer)
 
-        if accepted:
-            sender.pending_file["accepted"].add(client.pseudo)
+    def _cancel_file_offer(self, offer, reason: str, notify_sender: bool = True):
+        """FILE_CANCEL à l'émetteur et aux destinataires qui n'ont pas refusé."""
+        cancel_msg = Frame(FILE_CANCEL, encode_payload(FILE_CANCEL, offer.id, reason))
+        if notify_sender:
+            offer.sender.send(cancel_msg)
+        with self.lock:
+            recipients = [self.clients[pseudo] for pseudo in offer.pending_pseudos() if pseudo in self.clients]
+        for recipient in recipients:
+            recipient.send(cancel_msg)
+
+    def handle_file_data(self, client: ClientContext, msg_type: int, payload: bytes):
+        """
+        Traite un morceau (FILE_DATA) ou la fin (FILE_END) d'un fichier
+        envoyé par l'émetteur d'un transfert ouvert par FILE_START, et les
+        reprises (FILE_RESUME) de l'émetteur ou d'un destinataire.
+        """
+        try:
+            if msg_type == FILE_DATA:
+                self.files.data(client, payload)
+            elif msg_type == FILE_RESUME:
+                self.files.resume(client, payload)
+            else:
+                self.files.end(client, payload)
+        except ValueError as ex:
+            client.send(pack_message(ERROR, bytes([0x06]) + pack_string(str(ex))))
+
+
+
+    def create_outbox(self) -> OutboundQueue:
+        """
+        Crée la file d'envoi d'un nouveau client selon la configuration du serveur.
+        """
+        return OutboundQueue(self.high_watermark, self.low_watermark, self.slow_client_policy, self.bulk_burst)
+
+    def handle_login(self, client: ClientContext, msg_type: int, payload: bytes) -> bool:
+        """
+        Traite le premier message d'un client (phase LOGIN).
+
+        Args:
+            client: Le contexte du client (état CONNECTÉ)
+            msg_type: Type du message reçu
+            payload: Données du message
+
+        Returns:
+            bool: False si la connexion doit être fermée
+        """
+        if msg_type != LOGIN:
+            client.send(pack_message(
+                LOGIN_ERR,
+                pack_string("Login requis")
+            ))
+            return False
+
+        pseudo, capabilities = unpack_login(payload)
+
+        if not pseudo or len(pseudo) > MAX_PSEUDO_LEN:
+            client.send(pack_message(
+                LOGIN_ERR,
+                pack_string("Pseudo invalide")
+            ))
+            return False
+
+        # Pseudo gardé par une session détachée : le client revient sans son
+        # jeton (ex : application relancée), l'ancienne session prend fin
+        if self.sessions is not None:
+            with self.lock:
+                previous = self.clients.get(pseudo)
+            if previous is not None and self.sessions.is_detached(previous):
+                self._expire_session(previous)
+        
+        # Section critique : vérification et ajout du client
+        with self.lock:
+            if pseudo in self.clients:
+                client.send(pack_message(
+                    LOGIN_ERR,
+                    pack_string("Pseudo déjà utilisé")
+                ))
+                return False
+
+            # Succès
+            client.pseudo = pseudo
+            client.state = STATE_AUTHENTICATED
+            if capabilities is not None:
+                client.capabilities = capabilities & SUPPORTED_CAPABILITIES
+                if self.sessions is None:
+                    client.capabilities &= ~CAP_RESUME
+            self.clients[pseudo] = client
+            self.aliases.register(pseudo)
+
+        # Un client d'origine reçoit un LOGIN_OK vide,
+        # les autres y trouvent les capacités retenues
+        if capabilities is None:
+            client.send(pack_message(LOGIN_OK))
+        elif client.capabilities & CAP_RESUME:
+            client.send(pack_message(LOGIN_OK, pack_login_ok(client.capabilities, self.sessions.open(client))))
         else:
-            sender.pending_file["rejected"].add(client.pseudo)
+            client.send(pack_message(LOGIN_OK, pack_login_ok(client.capabilities)))
+
+        # Annuaire des salons : le client connaît tous les salons dès la connexion
+        self._send_directory(client)
+        print(f"Client authentifié : {pseudo}")
+        return True
+
+    def dispatch(self, client: ClientContext, msg_type: int, payload: bytes) -> bool:
+        """
+        Aiguille un message reçu vers le bon handler selon l'état du client.
+
+        Point d'entrée commun à tous les moteurs réseau (threads ou asyncio) :
+        la machine à états reste ainsi identique quel que soit le moteur.
+
+        Args:
+            client: Le contexte du client émetteur
+            msg_type: Type du message reçu
+            payload: Données du message
+
+        Returns:
+            bool: False si la connexion doit être fermée
+        """
+
+        # Toute trame reçue prouve que le client est vivant
+        if self.heartbeat is not None:
+            self.heartbeat.seen(client, msg_type)
+
+        # --------------------
+        # Phase LOGIN
+        # --------------------
+        if client.state == STATE_CONNECTED:
+            return self.handle_login(client, msg_type, payload)
+
+        # Réponse au heartbeat : acceptée dans tous les états authentifiés
+        if msg_type == PONG:
+            return True
+
+        # ====================
+        # ÉTAT INTERMÉDIAIRE : attente confirmation fichier
+        # ====================
+        if client.state == STATE_WAITING_FILE_CONFIRMATION:
+            if msg_type in (FILE_ACCEPT, FILE_REJECT):
+                # Réponse à l'offre d'un autre membre
+                self.handle_file_response(client, payload, accepted=msg_type == FILE_ACCEPT)
+
+            elif msg_type in (FILE_DATA, FILE_END, FILE_RESUME):
+                # Fichier précédent encore en cours d'envoi
+                self.handle_file_data(client, msg_type, payload)
 
-        # Décision simple : 1 refus = rejet
-        if sender.pending_file["rejected"]:
-            sender.sock.send(pack_message(
-                FILE_CANCEL,
-                pack_string("Refus d'un participant")
+            else:
+                client.send(pack_message(
+                    ERROR,
+                    bytes([0x06]) + pack_string("Action bloquée : transfert en attente")
+                ))
+            return True
+
+        # --------------------
+        # États AUTHENTIFIÉ et DANS_SALON
+        # --------------------
+        if msg_type == JOIN:
+            self.handle_join(client, payload)
+
+        elif msg_type == LEAVE:
+            self.handle_leave(client)
+
+        elif msg_type == MSG:
+            self.handle_msg(client, payload)
+
+        elif msg_type == ROOM_QUERY:
+            self.handle_room_query(client, payload)
+
+        elif msg_type == HISTORY_REQUEST:
+            self.handle_history_request(client, payload)
+
+        elif msg_type == SEARCH:
+            self.handle_search(client, payload)
+
+        elif msg_type == FILE_OFFER:
+            self.handle_file_offer(client, payload)
+
+        elif msg_type in (FILE_ACCEPT, FILE_REJECT):
+            self.handle_file_response(client, payload, accepted=msg_type == FILE_ACCEPT)
+
+        elif msg_type in (FILE_DATA, FILE_END, FILE_RESUME):
+            self.handle_file_data(client, msg_type, payload)
+
+        else:
+            print(f"Message reçu de {client.pseudo}: Type {msg_type}")
+            client.send(pack_message(
+                ERROR,
+                bytes([0x06]) + pack_string("Action non autorisée")
             ))
-            sender.state = STATE_IN_ROOM
-            sender.pending_file = None
+        return True
+
+    def connect(self, client: ClientContext):
+        """
+        Enregistre une nouvelle connexion (avant toute lecture).
+
+        Args:
+            client: Le contexte du client connecté
+        """
+        if self.heartbeat is not None:
+            self.heartbeat.watch(client)
+
+    def disconnect(self, client: ClientContext, sock=None):
+        """
+        Nettoie l'état serveur d'un client dont la connexion est terminée.
+
+        Args:
+            client: Le contexte du client déconnecté
+            sock: La connexion terminée (None = celle du client)
+        """
+        if sock is not None and client.sock is not sock:
+            # Session reprise par une nouvelle connexion (RESUME) : seule
+            # l'ancienne connexion est à fermer
+            try:
+                sock.close()
+            except OSError:
+                pass
             return
 
-        # Tous ont accepté
-        room_clients = self.rooms.get(sender.room, set())
-        if sender.pending_file["accepted"] >= (room_clients - {sender.pseudo}):
-            sender.sock.send(pack_message(FILE_START))
-            sender.state = STATE_IN_ROOM
-            sender.pending_file = None
+        if sock is None:
+            sock = client.sock
+        outbox, writer = client.outbox, client.writer
+
+        with self.lock:
+            resumable = (self.sessions is not None and client.session is not None
+                         and self.clients.get(client.pseudo) is client)
+        if resumable:
+            # Session détachée : le client reste dans son salon, sans
+            # présence diffusée, le temps qu'il revienne (voir sessions.py)
+            if not self.sessions.detach(client, sock):
+                # Reprise arrivée entre-temps sur une nouvelle connexion
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+                return
+            if self.heartbeat is not None:
+                self.heartbeat.unwatch(client)
+        else:
+            if self.heartbeat is not None:
+                self.heartbeat.unwatch(client)
 
+            # Retirer le client du salon s'il y était (même avec une offre
+            # de fichier en attente)
+            if client.room is not None:
+                self._remove_client_from_room(client)
 
+            # Retirer le client de la liste
+            self._forget_client(client)
+
+        # Laisser l'écrivain envoyer les dernières trames (ex : LOGIN_ERR)
+        if outbox is not None:
+            outbox.close()
+        if writer is not None:
+            writer.join(WRITER_FLUSH_TIMEOUT)
+
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _expire_session(self, client: ClientContext):
+        """
+        Fin du délai de grâce d'une session détachée : départ ordinaire.
+        """
+        if client.room is not None:
+            self._remove_client_from_room(client)
+        self._forget_client(client)
+
+    def resume(self, client: ClientContext, payload: bytes) -> ClientContext:
+        """
+        Traite une trame RESUME (à la place de LOGIN) : rattache la nouvelle
+        connexion à la session et rejoue les messages manqués.
+
+        Les moteurs réseau continuent avec le contexte renvoyé.
+
+        Args:
+            client: Le contexte de la nouvelle connexion (état CONNECTÉ)
+            payload: Les données du message (jeton, dernière séquence reçue)
+
+        Returns:
+            ClientContext: Le contexte de la session reprise, ou client si la
+            reprise est refusée (il peut alors faire LOGIN)
+        """
+        try:
+            token, last_seq = unpack_resume(payload)
+        except ValueError:
+            token = None
+        session = self.sessions.claim(token) if self.sessions is not None and token else None
+        if session is None:
+            client.send(pack_message(LOGIN_ERR, pack_string("Session expirée")))
+            return client
+
+        if self.heartbeat is not None:
+            self.heartbeat.unwatch(client)
+        old_sock, old_outbox = session.sock, session.outbox
+        room_name = session.room
+
+        # Membres lus avant de prendre le verrou du salon (en mode acteurs,
+        # l'acteur peut attendre ce verrou pour une diffusion)
+        snapshot = None
+        if room_name and session.capabilities & CAP_ROOM_SNAPSHOT:
+            snapshot = pack_room_snapshot(room_name, self.room_members(room_name))
+
+        # Sous le verrou du salon, aucune diffusion ne passe entre le rejeu
+        # et les messages suivants
+        sequence = self.sessions.room(room_name) if room_name else None
+        if sequence is not None:
+            sequence.lock.acquire()
+        try:
+            self.sessions.attach(session, client.sock, client.outbox, client.writer)
+            session.aliases = None  # Nouvelle connexion : table d'alias du client vide
+
+            missed, gap = sequence.since(last_seq, session.pseudo) if sequence is not None else ([], False)
+            session.send(encode_message(RESUME_OK, RESUME_GAP if gap else 0))
+            for snapshot_payload in snapshot or ():
+                session.send(pack_message(ROOM_SNAPSHOT, snapshot_payload))
+            if missed:
+                # Messages manqués, en une seule écriture
+                session.send(b"".join(pack_message(MSG_BROADCAST_SEQ, missed_payload) for missed_payload in missed))
+        finally:
+            if sequence is not None:
+                sequence.lock.release()
+
+        self._send_directory(session)
+
+        # Ancienne connexion encore ouverte (coupure pas encore vue par le serveur)
+        if old_outbox is not None:
+            old_outbox.close()
+        try:
+            old_sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        if self.heartbeat is not None:
+            self.heartbeat.watch(session)
+        print(f"Session reprise : {session.pseudo}")
+        return session
 
     def handle_client(self, sock):
         """
         Traite un client tant que la connexion TCP est ouverte.
+        Moteur historique : un thread par client, lectures bloquantes.
         """
 
         client = ClientContext(sock)
+        client.outbox = self.create_outbox()
+        client.writer = ClientWriter(sock, client.outbox)
+        client.writer.start()
+        self.connect(client)
+        decoder = FrameDecoder()
 
         try:
             while True:
-                # Lecture de l'en-tête
+                # Lecture d'un bloc d'octets (trames partielles ou multiples)
                 try:
-                    header = sock.recv(5)
+                    data = sock.recv(RECV_BUFFER_SIZE)
                 except OSError:
                     # Socket fermée (par exemple après un kick)
                     break
-                if not header:
+                if not data:
                     break
 
-                msg_type, length = unpack_header(header)
-                payload = sock.recv(length)
-
-                # --------------------
-                # Phase LOGIN
-                # --------------------
-                if client.state == STATE_CONNECTED:
-                    if msg_type != LOGIN:
-                        sock.send(pack_message(
-                            LOGIN_ERR,
-                            pack_string("Login requis")
-                        ))
-                        break
-
-                    pseudo = unpack_string(payload)
-
-                    if not pseudo or len(pseudo) > MAX_PSEUDO_LEN:
-                        sock.send(pack_message(
-                            LOGIN_ERR,
-                            pack_string("Pseudo invalide")
-                        ))
-                        break
-
-                    # Section critique : vérification et ajout du client
-                    with self.lock:
-                        if pseudo in self.clients:
-                            sock.send(pack_message(
-                                LOGIN_ERR,
-                                pack_string("Pseudo déjà utilisé")
-                            ))
-                            break
-
-                        # Succès
-                        client.pseudo = pseudo
-                        client.state = STATE_AUTHENTICATED
-                        self.clients[pseudo] = client # Changed from self.clients_by_pseudo to self.clients to match original structure
-                    
-                    sock.send(pack_message(LOGIN_OK))
-                    print(f"Client authentifié : {pseudo}")
-                    continue
-
-                # ====================
-                # ÉTAT INTERMÉDIAIRE : attente confirmation fichier
-                # ====================
-                if client.state == STATE_WAITING_FILE_CONFIRMATION:
-                    if msg_type == FILE_ACCEPT:
-                        self.handle_file_response(client, accepted=True)
-
-                    elif msg_type == FILE_REJECT:
-                        self.handle_file_response(client, accepted=False)
-
-                    else:
-                        sock.send(pack_message(
-                            ERROR,
-                            bytes([0x06]) + pack_string("Action bloquée : transfert en attente")
-                        ))
-                    continue
-
-
-                # --------------------
-                # États AUTHENTIFIÉ et DANS_SALON
-                # --------------------
-                if msg_type == JOIN:
-                    self.handle_join(client, payload)
-                
-                elif msg_type == LEAVE:
-                    self.handle_leave(client)
-                
-                elif msg_type == MSG:
-                    self.handle_msg(client, payload)
-                # Pour l'instant, on ne gère pas MSG ici, mais on garde la co.
-                else:
-                    print(f"Message reçu de {client.pseudo}: Type {msg_type}")                  
-                    sock.send(pack_message(
-                        ERROR,
-                        bytes([0x06]) + pack_string("Action non autorisée")
-                    ))
+                decoder.feed(data)
+                for msg_type, payload in decoder:
+                    if msg_type == RESUME and client.state == STATE_CONNECTED:
+                        client = self.resume(client, payload)
+                    elif not self.dispatch(client, msg_type, payload):
+                        return
+
+        except ValueError as e:
+            # Trame trop grande (voir MAX_FRAME_SIZE) : connexion fermée
+            print(f"Connexion fermée ({client.pseudo}) : {e}")
 
         finally:
             # Nettoyage lors de la déconnexion
-            # Retirer le client du salon s'il y était
-            if client.is_in_room():
-                self._remove_client_from_room(client)
-            
-            # Retirer le client de la liste
-            with self.lock:
-                if client.pseudo and client.pseudo in self.clients:
-                    del self.clients[client.pseudo]
-
-            sock.close()
+            self.disconnect(client, sock)
@@ -10,6 +10,7 @@ Ce fichier est responsable :
 Il ne contient pas de logique métier : celle-ci reste dans ChatServer.
 """
 
+import argparse
 import socket
 import threading
 # Ensure running the script directly can import package modules
@@ -17,14 +18,35 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from server.server import ChatServer
-from server.admin_gui import run_admin_dashboard
+from server.actors import ActorChatServer
+from server.async_server import run_asyncio_server
+from server.presence import DEFAULT_PRESENCE_TICK
+from server.heartbeat import HeartbeatMonitor, PING_INTERVAL, MAX_MISSED_PINGS, LOGIN_TIMEOUT
+from server.history import RoomHistory, HISTORY_MESSAGES, HISTORY_BYTES, HISTORY_BUDGET
+from server.message_log import MessageLog, SEGMENT_SIZE, RETENTION_BYTES, RETENTION_SECONDS
+from server.search import SearchIndex, MAX_DOCUMENTS
+from server.sessions import RESUME_GRACE
+from server.file_relay import FileRelay, OFFER_TIMEOUT, SPOOL_BYTES, RESUME_TIMEOUT, RELAY_CHUNK_SIZE
+from server.file_spool import FileSpool, SPOOL_DIR_BYTES
+from server.file_cache import FileCache, CACHE_BYTES, HOT_BYTES
+from server.outbound import (
+    POLICIES, POLICY_COALESCE, DEFAULT_HIGH_WATERMARK, DEFAULT_LOW_WATERMARK, DEFAULT_BULK_BURST,
+)
+
+# Moteurs réseau disponibles
+ENGINE_THREAD = "thread"    # un thread par client (historique)
+ENGINE_ASYNCIO = "asyncio"  # une boucle d'événements pour tous les clients
+
+# Modèles de concurrence des salons
+CONCURRENCY_LOCK = "lock"      # un lock global protège tous les salons (historique)
+CONCURRENCY_ACTORS = "actors"  # un acteur (thread) par salon, sans lock partagé
 
 # Adresse et port d'écoute du serveur
 HOST = "0.0.0.0"  # toutes les interfaces
 PORT = 5555       # port à utiliser pour les clients (5000 est utilisé par macOS)
 
 
-def run_socket_server(server):
+def run_socket_server(server, host=HOST, port=PORT):
     """
     Lance le serveur socket dans un thread.
     """
@@ -36,11 +58,11 @@ def run_socket_server(server):
 
     try:
         # Liaison de la socket à l'adresse et au port
-        sock.bind((HOST, PORT))
+        sock.bind((host, port))
 
         # Passage en mode écoute
         sock.listen()
-        print(f"Serveur en écoute sur {HOST}:{PORT}")
+        print(f"Serveur en écoute sur {host}:{port}")
 
         # Boucle principale pour accepter les connexions
         while True:
@@ -61,23 +83,269 @@ def run_socket_server(server):
         print("Serveur arrêté.")
 
 
-def main():
+def parse_args(argv=None):
+    """
+    Lit les options de lancement du serveur.
+    """
+    parser = argparse.ArgumentParser(description="Serveur de chat")
+    parser.add_argument("--host", default=HOST, help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=PORT, help="Port d'écoute")
+    parser.add_argument(
+        "--engine",
+        choices=(ENGINE_THREAD, ENGINE_ASYNCIO),
+        default=ENGINE_THREAD,
+        help="Moteur réseau : un thread par client ou boucle asyncio"
+    )
+    parser.add_argument(
+        "--concurrency",
+        choices=(CONCURRENCY_LOCK, CONCURRENCY_ACTORS),
+        default=CONCURRENCY_LOCK,
+        help="Gestion des salons : lock global ou un acteur par salon"
+    )
+    parser.add_argument(
+        "--high-watermark",
+        type=int,
+        default=DEFAULT_HIGH_WATERMARK,
+        help="Octets en attente au-delà desquels un client est considéré en retard"
+    )
+    parser.add_argument(
+        "--low-watermark",
+        type=int,
+        default=DEFAULT_LOW_WATERMARK,
+        help="Octets en attente sous lesquels un client en retard redevient normal"
+    )
+    parser.add_argument(
+        "--slow-client-policy",
+        choices=POLICIES,
+        default=POLICY_COALESCE,
+        help="Traitement d'un client en retard : jeter, déconnecter ou fusionner les présences"
+    )
+    parser.add_argument(
+        "--bulk-burst",
+        type=int,
+        default=DEFAULT_BULK_BURST,
+        help="Octets de fichiers max par écriture vers un client (le chat passe entre deux écritures)"
+    )
+    parser.add_argument(
+        "--presence-tick",
+        type=float,
+        default=DEFAULT_PRESENCE_TICK,
+        help="Intervalle (secondes) d'agrégation des présences, 0 = envoi immédiat"
+    )
+    parser.add_argument(
+        "--ping-interval",
+        type=float,
+        default=PING_INTERVAL,
+        help="Silence (secondes) au-delà duquel le serveur envoie un PING, 0 = pas de heartbeat"
+    )
+    parser.add_argument(
+        "--max-missed-pings",
+        type=int,
+        default=MAX_MISSED_PINGS,
+        help="Nombre de PING sans réponse avant déconnexion"
+    )
+    parser.add_argument(
+        "--login-timeout",
+        type=float,
+        default=LOGIN_TIMEOUT,
+        help="Délai (secondes) pour envoyer LOGIN après la connexion, 0 = illimité"
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=0,
+        help="Inactivité (secondes, PONG exclus) avant déconnexion, 0 = illimitée"
+    )
+    parser.add_argument(
+        "--history-messages",
+        type=int,
+        default=HISTORY_MESSAGES,
+        help="Messages rejoués à l'entrée dans un salon, 0 = pas d'historique"
+    )
+    parser.add_argument(
+        "--history-bytes",
+        type=int,
+        default=HISTORY_BYTES,
+        help="Octets d'historique gardés par salon"
+    )
+    parser.add_argument(
+        "--history-budget",
+        type=int,
+        default=HISTORY_BUDGET,
+        help="Octets d'historique gardés pour l'ensemble des salons"
+    )
+    parser.add_argument(
+        "--log-dir",
+        default="",
+        help="Répertoire du journal durable des messages, vide = pas de journal"
+    )
+    parser.add_argument(
+        "--log-segment-size",
+        type=int,
+        default=SEGMENT_SIZE,
+        help="Taille (octets) d'un segment du journal"
+    )
+    parser.add_argument(
+        "--log-retention-bytes",
+        type=int,
+        default=RETENTION_BYTES,
+        help="Octets de journal gardés par salon"
+    )
+    parser.add_argument(
+        "--log-retention-seconds",
+        type=float,
+        default=RETENTION_SECONDS,
+        help="Âge max (secondes) des messages gardés dans le journal"
+    )
+    parser.add_argument(
+        "--search-documents",
+        type=int,
+        default=MAX_DOCUMENTS,
+        help="Messages indexés pour la recherche, 0 = pas de recherche"
+    )
+    parser.add_argument(
+        "--resume-grace",
+        type=float,
+        default=RESUME_GRACE,
+        help="Délai (secondes) pour reprendre une session après une coupure, 0 = pas de reprise"
+    )
+    parser.add_argument(
+        "--file-offer-timeout",
+        type=float,
+        default=OFFER_TIMEOUT,
+        help="Délai (secondes) pour répondre à une offre de fichier"
+    )
+    parser.add_argument(
+        "--file-spool-bytes",
+        type=int,
+        default=SPOOL_BYTES,
+        help="Octets gardés par transfert pour les destinataires en retard"
+    )
+    parser.add_argument(
+        "--file-spool-dir",
+        default=None,
+        help="Répertoire de la réserve sur disque des fichiers (reprise des transferts), absent = pas de reprise"
+    )
+    parser.add_argument(
+        "--file-spool-dir-bytes",
+        type=int,
+        default=SPOOL_DIR_BYTES,
+        help="Taille max de la réserve sur disque des fichiers"
+    )
+    parser.add_argument(
+        "--file-resume-timeout",
+        type=float,
+        default=RESUME_TIMEOUT,
+        help="Délai (secondes) pour que l'émetteur d'un fichier reprenne l'envoi après une coupure"
+    )
+    parser.add_argument(
+        "--file-relay-chunk",
+        type=int,
+        default=RELAY_CHUNK_SIZE,
+        help="Données max (octets) par trame FILE_DATA relayée aux destinataires"
+    )
+    parser.add_argument(
+        "--file-cache-bytes",
+        type=int,
+        default=CACHE_BYTES,
+        help="Taille max du cache des fichiers par empreinte (sous-répertoire cache de --file-spool-dir), 0 = pas de cache"
+    )
+    parser.add_argument(
+        "--file-cache-hot-bytes",
+        type=int,
+        default=HOT_BYTES,
+        help="Octets du cache des fichiers gardés en mémoire"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """
     Initialise le serveur et le dashboard admin.
     Le serveur socket tourne dans un thread, le dashboard Flet dans le main thread.
     """
+    args = parse_args(argv)
+
+    heartbeat = None
+    if args.ping_interval:
+        heartbeat = HeartbeatMonitor(
+            ping_interval=args.ping_interval,
+            max_missed_pings=args.max_missed_pings,
+            login_timeout=args.login_timeout or None,
+            idle_timeout=args.idle_timeout or None,
+        )
+
+    history = None
+    if args.history_messages:
+        history = RoomHistory(
+            max_messages=args.history_messages,
+            max_bytes=args.history_bytes,
+            budget=args.history_budget,
+        )
+
+    message_log = None
+    if args.log_dir:
+        message_log = MessageLog(
+            args.log_dir,
+            segment_size=args.log_segment_size,
+            retention_bytes=args.log_retention_bytes,
+            retention_seconds=args.log_retention_seconds,
+        )
+
+    search = None
+    if args.search_documents:
+        search = SearchIndex(max_documents=args.search_documents)
+
+    file_spool = None
+    file_cache = None
+    if args.file_spool_dir:
+        file_spool = FileSpool(args.file_spool_dir, max_bytes=args.file_spool_dir_bytes)
+        if args.file_cache_bytes:
+            file_cache = FileCache(
+                os.path.join(args.file_spool_dir, "cache"),
+                max_bytes=args.file_cache_bytes,
+                hot_bytes=args.file_cache_hot_bytes,
+            )
+
+    server_class = ActorChatServer if args.concurrency == CONCURRENCY_ACTORS else ChatServer
+    server = server_class(
+        high_watermark=args.high_watermark,
+        low_watermark=args.low_watermark,
+        slow_client_policy=args.slow_client_policy,
+        bulk_burst=args.bulk_burst,
+        presence_tick=args.presence_tick,
+        heartbeat=heartbeat,
+        history=history,
+        message_log=message_log,
+        search=search,
+        resume_grace=args.resume_grace or None,
+        file_relay=FileRelay(
+            spool_bytes=args.file_spool_bytes,
+            offer_timeout=args.file_offer_timeout,
+            spool=file_spool,
+            resume_timeout=args.file_resume_timeout,
+            cache=file_cache,
+            relay_chunk=args.file_relay_chunk,
+        ),
+    )
 
-    server = ChatServer()
+    # Choix du moteur réseau
+    if args.engine == ENGINE_ASYNCIO:
+        target = run_asyncio_server
+    else:
+        target = run_socket_server
 
     # Lancer le serveur socket dans un thread séparé
     server_thread = threading.Thread(
-        target=run_socket_server,
-        args=(server,),
+        target=target,
+        args=(server, args.host, args.port),
         daemon=True
     )
     server_thread.start()
 
-    # Lancer le dashboard admin dans le main thread (requis par Flet)
+    # Lancer le dashboard admin dans le main thread (requis par Flet).
+    # Import tardif : les outils sans interface (banc de charge) importent ce module
+    from server.admin_gui import run_admin_dashboard
     print("Dashboard admin lancé")
     run_admin_dashboard(server)
 
@@ -0,0 +1,197 @@
+"""
+sessions.py
+
+Reprise de session après une coupure réseau (CAP_RESUME).
+
+Sans reprise, une connexion perdue retire le client de son salon (départ
+diffusé à tous), puis le client refait LOGIN et JOIN (arrivée diffusée à
+tous) : après une coupure touchant beaucoup de clients, ce sont deux
+tempêtes de présences.
+
+Un client CAP_RESUME reçoit un jeton de session dans LOGIN_OK. Quand sa
+connexion tombe, son ClientContext est seulement détaché : il reste membre
+de son salon, aucune présence n'est diffusée. S'il revient avant la fin du
+délai de grâce (trame RESUME avec le jeton), la nouvelle connexion est
+rattachée au même ClientContext et seuls les messages manqués sont rejoués.
+Sinon, le départ est traité comme une déconnexion ordinaire.
+
+Les messages manqués sont retrouvés grâce à un numéro de séquence par salon :
+chaque diffusion reçoit le suivant, les clients CAP_RESUME le reçoivent dans
+MSG_BROADCAST_SEQ, et chaque salon garde ses derniers messages.
+"""
+
+import collections
+import secrets
+import threading
+import time
+from common.protocol import *
+from server.timing_wheel import HashedTimingWheel, DEFAULT_TICK
+
+# Valeurs par défaut
+RESUME_GRACE = 30.0      # Délai (secondes) pour reprendre une session détachée
+REPLAY_MESSAGES = 256    # Messages gardés par salon pour être rejoués
+
+
+class RoomSequence:
+    """
+    Numérotation des messages d'un salon et derniers messages, pour le rejeu.
+
+    Le verrou est tenu pendant toute une diffusion : les membres reçoivent
+    les messages dans l'ordre des séquences, et un rejeu ne croise jamais
+    une diffusion en cours.
+    """
+
+    __slots__ = ("seq", "messages", "lock")
+
+    def __init__(self, max_messages: int):
+        self.seq = 0  # Séquence du dernier message diffusé
+        self.messages = collections.deque(maxlen=max_messages)  # (séquence, exclu, payload MSG_BROADCAST_SEQ)
+        self.lock = threading.Lock()
+
+    def append(self, sender: str, text: str, exclude_pseudo: str = None) -> tuple[int, bytes]:
+        """
+        Numérote un message (verrou tenu par l'appelant).
+
+        Returns:
+            tuple: (séquence, payload MSG_BROADCAST_SEQ)
+        """
+        self.seq += 1
+        payload = encode_payload(MSG_BROADCAST_SEQ, self.seq, sender, text)
+        self.messages.append((self.seq, exclude_pseudo, payload))
+        return self.seq, payload
+
+    def since(self, last_seq: int, pseudo: str) -> tuple[list, bool]:
+        """
+        Messages postérieurs à last_seq, destinés à pseudo (verrou tenu par l'appelant).
+
+        Returns:
+            tuple: (payloads MSG_BROADCAST_SEQ, True si des messages manquent)
+        """
+        gap = bool(self.messages) and last_seq + 1 < self.messages[0][0]
+        missed = [payload for seq, exclude, payload in self.messages if seq > last_seq and exclude != pseudo]
+        return missed, gap
+
+
+class SessionManager:
+    """
+    Jetons de session, sessions détachées (en délai de grâce) et séquences des salons.
+    """
+
+    def __init__(self, on_expire, grace: float = RESUME_GRACE,
+                 replay_messages: int = REPLAY_MESSAGES,
+                 tick: float = DEFAULT_TICK, clock=time.monotonic):
+        """
+        Args:
+            on_expire: Fonction(client) appelée quand une session détachée expire
+            grace: Délai (secondes) pour reprendre une session détachée
+            replay_messages: Messages gardés par salon pour être rejoués
+            tick: Précision du délai de grâce (secondes)
+            clock: Horloge (remplaçable dans les tests)
+        """
+        self.on_expire = on_expire
+        self.grace = grace
+        self.replay_messages = replay_messages
+
+        self._tokens = {}      # jeton → ClientContext
+        self._detached = set()  # ClientContext en délai de grâce
+        self._rooms = {}       # nom_salon → RoomSequence
+        self._lock = threading.Lock()
+        self.wheel = HashedTimingWheel(self._on_expire, tick, clock=clock)
+
+        # Statistiques
+        self.resumed = 0
+        self.expired = 0
+
+    def start(self):
+        self.wheel.start()
+
+    def stop(self):
+        self.wheel.stop()
+
+    def open(self, client) -> bytes:
+        """Crée le jeton de session d'un client authentifié."""
+        token = secrets.token_bytes(SESSION_TOKEN_LEN)
+        with self._lock:
+            self._tokens[token] = client
+        client.session = token
+        return token
+
+    def close(self, client):
+        """Oublie la session d'un client (départ définitif)."""
+        self.wheel.cancel(client)
+        with self._lock:
+            self._detached.discard(client)
+            if client.session is not None and self._tokens.get(client.session) is client:
+                del self._tokens[client.session]
+
+    def detach(self, client, sock) -> bool:
+        """
+        La connexion sock du client est perdue : la session attend une reprise.
+
+        Returns:
+            bool: False si la session a déjà été rattachée à une autre connexion
+        """
+        with self._lock:
+            if client.sock is not sock:
+                return False
+            self._detached.add(client)
+        self.wheel.schedule(client, self.grace)
+        return True
+
+    def attach(self, client, sock, outbox, writer):
+        """
+        Rattache une session reprise (voir claim) à sa nouvelle connexion.
+
+        Sous le même verrou que detach : une ancienne connexion dont la fin
+        est constatée au même moment ne détache pas la session reprise.
+        """
+        with self._lock:
+            client.sock, client.outbox, client.writer = sock, outbox, writer
+            self._detached.discard(client)
+        self.wheel.cancel(client)
+
+    def is_detached(self, client) -> bool:
+        with self._lock:
+            return client in self._detached
+
+    def claim(self, token: bytes):
+        """
+        Reprend une session (détachée ou non : le client peut voir la coupure
+        avant le serveur).
+
+        Returns:
+            ClientContext: Le client de la session, None si le jeton est inconnu ou expiré
+        """
+        with self._lock:
+            client = self._tokens.get(token)
+            if client is None:
+                return None
+            self._detached.discard(client)
+        self.wheel.cancel(client)
+        self.resumed += 1
+        return client
+
+    def room(self, room_name: str) -> RoomSequence:
+        """Séquence d'un salon (créée au premier message)."""
+        with self._lock:
+            sequence = self._rooms.get(room_name)
+            if sequence is None:
+                sequence = self._rooms[room_name] = RoomSequence(self.replay_messages)
+            return sequence
+
+    def forget_room(self, room_name: str):
+        """Le salon est supprimé (vide) : ses séquences repartent de zéro."""
+        with self._lock:
+            self._rooms.pop(room_name, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tokens)
+
+    def _on_expire(self, client):
+        with self._lock:
+            if client not in self._detached:
+                return  # Reprise entre-temps
+            self._detached.discard(client)
+        self.expired += 1
+        self.on_expire(client)
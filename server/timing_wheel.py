@@ -0,0 +1,122 @@
+"""
+timing_wheel.py
+
+Roue temporelle hachée (« hashed timing wheel »).
+
+Gère un grand nombre d'échéances avec un seul thread : le temps est découpé
+en ticks, et chaque échéance est rangée dans la case (tick courant + délai)
+modulo la taille de la roue. Un délai plus long qu'un tour de roue est
+compté en nombre de tours restants.
+
+- schedule / cancel : O(1)
+- avance d'un tick : proportionnelle au nombre d'échéances de la case
+
+Chaque clé (par exemple un ClientContext) a au plus une échéance en cours :
+pas d'objet minuteur ni de thread par connexion.
+"""
+
+import threading
+import time
+
+# Valeurs par défaut
+DEFAULT_TICK = 1.0         # Durée d'un tick (secondes)
+DEFAULT_WHEEL_SIZE = 512   # Nombre de cases (un tour ≈ 8 minutes avec des ticks d'1 s)
+
+
+class HashedTimingWheel:
+    """
+    Roue temporelle : appelle on_expire(clé) quand l'échéance d'une clé arrive.
+    """
+
+    def __init__(self, on_expire, tick: float = DEFAULT_TICK,
+                 wheel_size: int = DEFAULT_WHEEL_SIZE, clock=time.monotonic):
+        """
+        Args:
+            on_expire: Fonction(clé) appelée à l'échéance (hors du lock de la roue)
+            tick: Durée d'un tick (secondes)
+            wheel_size: Nombre de cases de la roue
+            clock: Horloge (remplaçable dans les tests)
+        """
+        self.on_expire = on_expire
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.clock = clock
+
+        # Chaque case : clé → nombre de tours restants
+        self._slots = [{} for _ in range(wheel_size)]
+        # clé → indice de sa case (pour l'annulation en O(1))
+        self._where = {}
+        self._cursor = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def schedule(self, key, delay: float):
+        """
+        Programme (ou reprogramme) l'échéance d'une clé dans `delay` secondes.
+        La précision est d'un tick.
+        """
+        ticks = max(1, int(-(-delay // self.tick)))  # arrondi supérieur
+        with self._lock:
+            self._remove_locked(key)
+            index = (self._cursor + ticks) % self.wheel_size
+            self._slots[index][key] = (ticks - 1) // self.wheel_size
+            self._where[key] = index
+
+    def cancel(self, key):
+        """Annule l'échéance d'une clé (sans effet si elle n'en a pas)."""
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key):
+        index = self._where.pop(key, None)
+        if index is not None:
+            del self._slots[index][key]
+
+    def __len__(self):
+        return len(self._where)
+
+    def advance(self):
+        """
+        Avance la roue d'un tick et déclenche les échéances arrivées.
+        """
+        expired = []
+        with self._lock:
+            self._cursor = (self._cursor + 1) % self.wheel_size
+            slot = self._slots[self._cursor]
+            for key, rounds in list(slot.items()):
+                if rounds > 0:
+                    slot[key] = rounds - 1
+                else:
+                    del slot[key]
+                    del self._where[key]
+                    expired.append(key)
+
+        for key in expired:
+            try:
+                self.on_expire(key)
+            except Exception as e:
+                print(f"Erreur d'échéance : {e}")
+
+    def _run(self):
+        next_tick = self.clock() + self.tick
+        while not self._stop.is_set():
+            delay = next_tick - self.clock()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            # Rattraper les ticks manqués (thread retardé) sans dériver
+            while next_tick <= self.clock():
+                self.advance()
+                next_tick += self.tick
+
+    def start(self):
+        """Démarre le thread qui fait tourner la roue."""
+        self._thread = threading.Thread(target=self._run, daemon=True, name="timing-wheel")
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le thread de la roue."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
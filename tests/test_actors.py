@@ -0,0 +1,128 @@
+"""
+test_actors.py
+
+Tests du mode « un acteur par salon » (ActorChatServer) : mêmes échanges
+que ChatServer, traités par les boîtes aux lettres des salons.
+"""
+
+import unittest
+import socket
+import time
+from server.actors import ActorChatServer
+from server.server import ClientContext
+from common.protocol import *
+
+
+class TestActorChatServer(unittest.TestCase):
+
+    def setUp(self):
+        """Deux clients authentifiés : Alice et Bob."""
+        self.server = ActorChatServer()
+        self.sockets = []
+        self.alice, self.alice_peer = self._add_client("Alice")
+        self.bob, self.bob_peer = self._add_client("Bob")
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+
+    def _add_client(self, pseudo):
+        srv_sock, cli_sock = socket.socketpair()
+        cli_sock.settimeout(2.0)
+        self.sockets += [srv_sock, cli_sock]
+        client = ClientContext(srv_sock)
+        client.pseudo = pseudo
+        client.state = STATE_AUTHENTICATED
+        self.server.clients[pseudo] = client
+        return client, (cli_sock, FrameDecoder())
+
+    def _next_frame(self, peer, msg_type):
+        """Lit les trames jusqu'à trouver une trame du type attendu."""
+        sock, decoder = peer
+        while True:
+            frame = recv_frame(sock, decoder)
+            self.assertIsNotNone(frame)
+            if frame[0] == msg_type:
+                return frame[1]
+
+    def _wait_until(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("Condition jamais atteinte")
+
+    def test_join_and_message(self):
+        self.server.handle_join(self.alice, pack_string("général"))
+        self.server.handle_join(self.bob, pack_string("général"))
+
+        self._next_frame(self.bob_peer, JOIN_OK)
+        self.server.handle_msg(self.alice, pack_string("Salut"))
+
+        payload = self._next_frame(self.bob_peer, MSG_BROADCAST)
+        pseudo, offset = unpack_string_from(payload)
+        self.assertEqual((pseudo, unpack_string_from(payload, offset)[0]), ("Alice", "Salut"))
+        self.assertEqual(set(self.server.room_members("général")), {"Alice", "Bob"})
+
+    def test_rooms_are_independent_actors(self):
+        self.server.handle_join(self.alice, pack_string("général"))
+        self.server.handle_join(self.bob, pack_string("dev"))
+
+        self._next_frame(self.alice_peer, JOIN_OK)
+        self._next_frame(self.bob_peer, JOIN_OK)
+
+        self.assertIsNot(self.server.actors["général"], self.server.actors["dev"])
+        self.assertEqual(self.server.room_members("dev"), ["Bob"])
+
+    def test_empty_room_actor_is_retired(self):
+        self.server.handle_join(self.alice, pack_string("temp"))
+        self._next_frame(self.alice_peer, JOIN_OK)
+
+        self.server.handle_leave(self.alice)
+
+        self._wait_until(lambda: "temp" not in self.server.actors)
+        self.assertEqual(self.alice.state, STATE_AUTHENTICATED)
+        self.assertEqual(self.server.directory.counts(), {})
+
+    def test_clients_info_goes_through_actors(self):
+        self.server.handle_join(self.alice, pack_string("général"))
+
+        info = {c['pseudo']: c['room'] for c in self.server.get_clients_info()}
+
+        self.assertEqual(info, {"Alice": "général", "Bob": "-"})
+
+    def test_kick_notifies_room(self):
+        self.server.handle_join(self.alice, pack_string("général"))
+        self.server.handle_join(self.bob, pack_string("général"))
+        self._next_frame(self.alice_peer, JOIN_OK)
+
+        self.assertTrue(self.server.kick_client("Bob"))
+
+        self.assertNotIn("Bob", self.server.clients)
+        self.assertEqual(self.server.room_members("général"), ["Alice"])
+
+    def test_presence_without_global_lock(self):
+        self.server.handle_join(self.alice, pack_string("général"))
+        self._next_frame(self.alice_peer, ROOM_UPDATE)  # Sa propre arrivée
+
+        # Liste des clients inchangée : JOIN et LEAVE n'attendent pas le lock global
+        with self.server.lock:
+            self.server.handle_join(self.bob, pack_string("général"))
+            self.assertEqual(self._next_frame(self.alice_peer, ROOM_UPDATE),
+                             encode_payload(ROOM_UPDATE, "général", "Bob", "join"))
+            self.server.handle_leave(self.bob)
+            self.assertEqual(self._next_frame(self.alice_peer, ROOM_UPDATE),
+                             encode_payload(ROOM_UPDATE, "général", "Bob", "leave"))
+
+        # Un client connecté ensuite (LOGIN) reçoit les présences suivantes
+        srv_sock, cli_sock = socket.socketpair()
+        cli_sock.settimeout(2.0)
+        self.sockets += [srv_sock, cli_sock]
+        self.server.handle_login(ClientContext(srv_sock), LOGIN, pack_string("Charlie"))
+        charlie_peer = (cli_sock, FrameDecoder())
+        self.server.handle_join(self.bob, pack_string("dev"))
+        self.assertEqual(self._next_frame(charlie_peer, ROOM_UPDATE), encode_payload(ROOM_UPDATE, "dev", "Bob", "join"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+test_aliases.py
+
+Tests unitaires des alias numériques (CAP_ALIASES) : table des alias,
+annonce unique par connexion, diffusions et présences aliasées, et
+résolution côté client par le FrameDecoder.
+"""
+
+import unittest
+import socket
+from server.server import ChatServer, ClientContext
+from server.presence import PresenceAggregator
+from server.aliases import AliasRegistry, MAX_CONNECTION_ALIASES
+from common.protocol import *
+from tests.utils import FakeSocket
+
+
+class TestAliasRegistry(unittest.TestCase):
+
+    def test_alias_lives_until_last_release(self):
+        registry = AliasRegistry()
+        alias = registry.register("dev")
+
+        self.assertEqual(registry.register("dev"), alias)
+        registry.release("dev")
+        self.assertEqual(registry.lookup(["dev"]), (alias,))
+        registry.release("dev")
+        self.assertIsNone(registry.lookup(["dev"]))
+
+    def test_aliases_are_never_reused(self):
+        registry = AliasRegistry()
+        first = registry.register("Alice")
+        registry.release("Alice")
+
+        self.assertNotEqual(registry.register("Alice"), first)
+
+    def test_announce_once_per_connection(self):
+        registry = AliasRegistry()
+        ids = (registry.register("Alice"), registry.register("dev"))
+        client = ClientContext(FakeSocket())
+
+        self.assertTrue(registry.announce(client, ("Alice", "dev"), ids))
+        self.assertTrue(registry.announce(client, ("Alice", "dev"), ids))
+
+        self.assertEqual(client.sock.sent, [
+            encode_message(ALIAS, ids[0], "Alice"),
+            encode_message(ALIAS, ids[1], "dev"),
+        ])
+
+    def test_known_aliases_are_bounded(self):
+        registry = AliasRegistry()
+        client = ClientContext(FakeSocket())
+        names = [f"utilisateur_{i}" for i in range(MAX_CONNECTION_ALIASES + 10)]
+
+        registry.announce(client, names, [registry.register(name) for name in names])
+
+        self.assertLessEqual(len(client.aliases), MAX_CONNECTION_ALIASES)
+
+
+class TestAliasedBroadcast(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Alice et Bob dans « général » ; Alice annonce CAP_ALIASES, Bob non.
+        """
+        self.server = ChatServer()
+        self.sockets = []
+        self.alice_ctx, self.alice = self._join("Alice", CAP_ALIASES)
+        self.bob_ctx, self.bob = self._join("Bob", 0)
+
+        # Oublier les trames du LOGIN et du JOIN ; les tests lisent Alice avec
+        # un décodeur neuf : repartir d'une table d'alias vide
+        for cli_sock in (self.alice, self.bob):
+            self._drain(cli_sock)
+        self.alice_ctx.aliases = None
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+
+    def _join(self, pseudo, capabilities):
+        srv_sock, cli_sock = socket.socketpair()
+        cli_sock.settimeout(1.0)
+        self.sockets += [srv_sock, cli_sock]
+        client = ClientContext(srv_sock)
+        self.server.dispatch(client, LOGIN, pack_login(pseudo, capabilities))
+        self.server.dispatch(client, JOIN, encode_payload(JOIN, "général"))
+        return client, cli_sock
+
+    @staticmethod
+    def _drain(cli_sock):
+        cli_sock.setblocking(False)
+        try:
+            while cli_sock.recv(RECV_BUFFER_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        cli_sock.settimeout(1.0)
+
+    def test_capable_client_receives_alias_then_aliased_broadcast(self):
+        self.server.handle_msg(self.bob_ctx, pack_string("Salut"))
+        self.server.handle_msg(self.bob_ctx, pack_string("Encore"))
+
+        raw = FrameDecoder()
+        alias, first, second = (recv_frame(self.alice, raw) for _ in range(3))
+        bob_id = self.server.aliases.lookup(["Bob"])[0]
+        self.assertEqual(alias, (ALIAS, encode_payload(ALIAS, bob_id, "Bob")))
+        self.assertEqual(first, (MSG_BROADCAST_ALIAS, encode_payload(MSG_BROADCAST_ALIAS, bob_id, "Salut")))
+        self.assertEqual(second[0], MSG_BROADCAST_ALIAS)
+
+        # Bob n'a pas annoncé CAP_ALIASES : noms en clair
+        self.assertEqual(recv_frame(self.bob, FrameDecoder()),
+                         (MSG_BROADCAST, encode_payload(MSG_BROADCAST, "Bob", "Salut")))
+
+    def test_decoder_restores_original_frames(self):
+        self.server.handle_msg(self.bob_ctx, pack_string("Salut"))
+        self.server._broadcast_room_update("général", "Bob", "leave")
+
+        decoder = FrameDecoder(resolve_aliases=True)
+        self.assertEqual(recv_frame(self.alice, decoder),
+                         (MSG_BROADCAST, encode_payload(MSG_BROADCAST, "Bob", "Salut")))
+        self.assertEqual(recv_frame(self.alice, decoder),
+                         (ROOM_UPDATE, encode_payload(ROOM_UPDATE, "général", "Bob", "leave")))
+
+    def test_name_without_alias_is_sent_plain(self):
+        """Présence d'un pseudo qui n'est plus connecté : envoyée en clair."""
+        self.server._broadcast_room_update("général", "Charlie", "leave")
+
+        self.assertEqual(recv_frame(self.alice, FrameDecoder()),
+                         (ROOM_UPDATE, encode_payload(ROOM_UPDATE, "général", "Charlie", "leave")))
+
+    def test_aliases_released_on_disconnect_and_empty_room(self):
+        self.server.disconnect(self.alice_ctx)
+        self.server.disconnect(self.bob_ctx)
+
+        self.assertIsNone(self.server.aliases.lookup(["Alice"]))
+        self.assertIsNone(self.server.aliases.lookup(["général"]))
+        self.assertEqual(len(self.server.aliases), 1)  # Expéditeur « Serveur »
+
+    def test_presence_batch_mixes_aliased_and_plain(self):
+        self.alice_ctx.capabilities |= CAP_PRESENCE_BATCH
+        aggregator = PresenceAggregator(self.server)
+        aggregator.add("général", "Bob", "leave")
+        aggregator.add("général", "Charlie", "join")
+        aggregator.flush()
+
+        raw = FrameDecoder()
+        frames = [recv_frame(self.alice, raw) for _ in range(3)]
+        self.assertEqual([msg_type for msg_type, _ in frames], [ALIAS, ALIAS, ROOM_UPDATE_BATCH_ALIAS])
+        self.assertEqual(recv_frame(self.alice, raw),
+                         (ROOM_UPDATE_BATCH, pack_room_update_batch([("général", "Charlie", "join")])))
+
+
+class TestAliasCodecs(unittest.TestCase):
+
+    def test_batch_roundtrip(self):
+        updates = [(1, 2, "join"), (1, 70000, "leave")]
+
+        self.assertEqual(unpack_room_update_batch_alias(pack_room_update_batch_alias(updates)), updates)
+
+    def test_unknown_alias_is_rejected(self):
+        decoder = FrameDecoder(resolve_aliases=True)
+        decoder.feed(encode_message(MSG_BROADCAST_ALIAS, 42, "Salut"))
+
+        with self.assertRaises(ValueError):
+            decoder.next_frame()
+
+    def test_aliased_update_is_smaller(self):
+        plain = encode_payload(ROOM_UPDATE, "général", "utilisateur_042", "join")
+        aliased = encode_payload(ROOM_UPDATE_ALIAS, 1, 2, ACTION_JOIN)
+
+        self.assertLess(len(aliased) * 3, len(plain))
+
+    def test_login_negotiates_aliases(self):
+        server = ChatServer()
+        srv_sock, cli_sock = socket.socketpair()
+        try:
+            client = ClientContext(srv_sock)
+            server.dispatch(client, LOGIN, pack_login("Alice", CAP_ALIASES))
+            msg_type, payload = recv_frame(cli_sock, FrameDecoder())
+        finally:
+            srv_sock.close()
+            cli_sock.close()
+
+        self.assertEqual((msg_type, unpack_int(payload)), (LOGIN_OK, CAP_ALIASES))
+
+
+if __name__ == "__main__":
+    unittest.main()
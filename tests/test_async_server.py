@@ -0,0 +1,89 @@
+"""
+test_async_server.py
+
+Tests du moteur asyncio : mêmes échanges que le moteur à threads,
+sur une vraie socket TCP locale.
+"""
+
+import unittest
+import socket
+import threading
+import time
+from server.server import ChatServer
+from server.async_server import AsyncChatServer
+from client.client import login, join_room, send_message, receive_broadcast
+from common.protocol import *
+
+
+class TestAsyncServer(unittest.TestCase):
+
+    def setUp(self):
+        """Démarre le moteur asyncio sur un port libre."""
+        self.server = ChatServer()
+        self.engine = AsyncChatServer(self.server, "127.0.0.1", 0)
+        self.thread = threading.Thread(target=self.engine.run, daemon=True)
+        self.thread.start()
+        self.assertTrue(self.engine.ready.wait(timeout=5))
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.engine.stop()
+        self.thread.join(timeout=5)
+
+    def _connect(self):
+        sock = socket.create_connection(("127.0.0.1", self.engine.port), timeout=5)
+        self.sockets.append(sock)
+        return sock
+
+    def test_login_ok(self):
+        sock = self._connect()
+
+        msg_type, _ = login(sock, "Alice")
+
+        self.assertEqual(msg_type, LOGIN_OK)
+
+    def test_login_duplicate_pseudo(self):
+        first = self._connect()
+        self.assertEqual(login(first, "Bob")[0], LOGIN_OK)
+
+        second = self._connect()
+        msg_type, _ = login(second, "Bob")
+
+        self.assertEqual(msg_type, LOGIN_ERR)
+
+    def test_join_and_broadcast(self):
+        sock = self._connect()
+        login(sock, "Alice")
+
+        msg_type, _ = join_room(sock, "général")
+        self.assertEqual(msg_type, JOIN_OK)
+
+        # ROOM_UPDATE de notre propre arrivée
+        msg_type, _ = receive_broadcast(sock)[2:]
+        self.assertEqual(msg_type, ROOM_UPDATE)
+
+        send_message(sock, "Bonjour")
+        pseudo, message = receive_broadcast(sock)
+
+        self.assertEqual(pseudo, "Alice")
+        self.assertEqual(message, "Bonjour")
+
+    def test_disconnect_frees_pseudo(self):
+        sock = self._connect()
+        login(sock, "Alice")
+        sock.close()
+        self.sockets.remove(sock)
+
+        # Le pseudo est libéré une fois la déconnexion traitée
+        for _ in range(50):
+            if "Alice" not in self.server.clients:
+                break
+            time.sleep(0.02)
+
+        self.assertNotIn("Alice", self.server.clients)
+
+
+if __name__ == "__main__":
+    unittest.main()
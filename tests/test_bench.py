@@ -0,0 +1,110 @@
+"""
+test_bench.py
+
+Tests du banc de charge : histogramme de latences, scénario court
+de clients virtuels contre un serveur asyncio local et latence du chat
+pendant un transfert de fichier.
+"""
+
+import unittest
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from server.server import ChatServer
+from server.async_server import AsyncChatServer
+from bench.loadgen import LatencyHistogram, LoadProfile, run_clients
+from bench.file_latency import run_scenario, check
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertIsNone(LatencyHistogram().percentile(50))
+
+    def test_percentiles_within_one_percent(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 1001):
+            histogram.record(i / 1000)  # 1 ms … 1 s
+
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.5 * 0.01)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99, delta=0.99 * 0.01)
+        self.assertAlmostEqual(histogram.percentile(100), 1.0, delta=0.01)
+
+    def test_merge(self):
+        fast, slow = LatencyHistogram(), LatencyHistogram()
+        for _ in range(90):
+            fast.record(0.001)
+        for _ in range(10):
+            slow.record(0.1)
+
+        merged = LatencyHistogram(fast.counts)
+        merged.merge(slow)
+
+        self.assertEqual(merged.total, 100)
+        self.assertAlmostEqual(merged.percentile(50), 0.001, delta=0.00001)
+        self.assertAlmostEqual(merged.percentile(99), 0.1, delta=0.001)
+
+
+class TestLoadGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.async_server = AsyncChatServer(ChatServer(), "127.0.0.1", 0)
+        threading.Thread(target=self.async_server.run, daemon=True).start()
+        self.assertTrue(self.async_server.ready.wait(5))
+
+    def tearDown(self):
+        self.async_server.stop()
+
+    def test_short_run(self):
+        profile = LoadProfile(rooms=2, msg_rate=20, churn_rate=1)
+        stats = asyncio.run(run_clients(
+            "127.0.0.1", self.async_server.port, 10, profile,
+            start_at=time.time(), ramp=0.2, duration=0.5,
+        ))
+
+        self.assertEqual(stats.connected, 10)
+        self.assertEqual(stats.connect_failures, 0)
+        self.assertGreater(stats.messages_sent, 0)
+        self.assertGreater(stats.deliveries, 0)
+        self.assertEqual(stats.latency.total, stats.deliveries)
+
+    def test_files_are_sent(self):
+        profile = LoadProfile(rooms=1, msg_rate=5, file_rate=10, file_size=200 * 1000)
+        stats = asyncio.run(run_clients(
+            "127.0.0.1", self.async_server.port, 3, profile,
+            start_at=time.time(), ramp=0.2, duration=1.0,
+        ))
+
+        self.assertGreater(stats.file_starts, 0)
+        self.assertGreater(stats.file_bytes, 0)
+        self.assertEqual(stats.errors, 0)
+
+
+class TestFileLatency(unittest.TestCase):
+    """
+    Comportement seulement : le budget de latence (en ms) dépend de la
+    machine, il est vérifié par bench.file_latency et sa référence.
+    """
+
+    def test_chat_delivered_during_transfer(self):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = run_scenario(1000 * 1000, 4e6, msg_interval=0.002)
+
+        self.assertTrue(report["file_complete"])
+        self.assertGreater(report["messages"], 0)
+
+    def test_check_against_budget_and_baseline(self):
+        def report(p99, complete=True):
+            return {"link_rate_mb_per_s": 10.0,
+                    "chat_with_transfer": {"file_size": 100, "latency_p99_ms": p99, "file_complete": complete}}
+
+        self.assertEqual(check(report(5.0), report(4.0)), [])
+        self.assertEqual(len(check(report(50.0), {})), 1)             # Au-delà du budget
+        self.assertEqual(len(check(report(9.0), report(4.0))), 1)     # Plus de deux fois la référence
+        self.assertEqual(len(check(report(5.0, complete=False), {})), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
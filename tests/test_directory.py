@@ -0,0 +1,150 @@
+"""
+test_directory.py
+
+Tests unitaires de l'annuaire des salons (DIRECTORY) et du chargement
+à la demande des membres (ROOM_QUERY).
+"""
+
+import unittest
+import socket
+import threading
+from server.server import ChatServer, ClientContext
+from server.directory import RoomDirectory
+from server.presence import PresenceAggregator
+from client.client import login
+from common.protocol import *
+from tests.utils import FakeSocket
+
+
+class TestRoomDirectory(unittest.TestCase):
+
+    def test_counts_follow_joins_and_leaves(self):
+        directory = RoomDirectory()
+        directory.member_joined("général")
+        directory.member_joined("général")
+        directory.member_joined("dev")
+        directory.member_left("dev")
+
+        self.assertEqual(directory.counts(), {"général": 2})
+
+    def test_payload_is_cached_until_change(self):
+        directory = RoomDirectory()
+        directory.member_joined("général")
+
+        first = directory.snapshot_payload()
+        self.assertIs(directory.snapshot_payload(), first)
+
+        directory.member_joined("dev")
+        self.assertEqual(unpack_directory(directory.snapshot_payload()), {"général": 1, "dev": 1})
+
+    def test_server_keeps_directory_in_sync(self):
+        server = ChatServer()
+        srv_sock, cli_sock = socket.socketpair()
+        try:
+            client = ClientContext(srv_sock)
+            client.pseudo = "Alice"
+            client.state = STATE_AUTHENTICATED
+            server.clients["Alice"] = client
+
+            server.handle_join(client, pack_string("général"))
+            self.assertEqual(server.directory.counts(), {"général": 1})
+
+            server.handle_join(client, pack_string("dev"))
+            self.assertEqual(server.directory.counts(), {"dev": 1})
+
+            server.handle_leave(client)
+            self.assertEqual(server.directory.counts(), {})
+        finally:
+            srv_sock.close()
+            cli_sock.close()
+
+
+class TestDirectoryWithPresence(unittest.TestCase):
+
+    def setUp(self):
+        """Agrégation des présences, envoyées à chaque flush()."""
+        self.server = ChatServer()
+        self.server.presence = PresenceAggregator(self.server)
+        self.bob = self._login("Bob", CAP_PRESENCE_BATCH)
+
+    def _login(self, pseudo, capabilities):
+        client = ClientContext(FakeSocket())
+        self.server.handle_login(client, LOGIN, pack_login(pseudo, capabilities))
+        client.sock.sent.clear()
+        return client
+
+    def _frames(self, client):
+        decoder = FrameDecoder()
+        for data in client.sock.sent:
+            decoder.feed(bytes(data))
+        client.sock.sent.clear()
+        return list(decoder)
+
+    def test_directory_sent_with_the_next_batch(self):
+        self.server.handle_join(self.bob, pack_string("dev"))
+        alice = self._login("Alice", CAP_DIRECTORY | CAP_PRESENCE_BATCH)
+        self.assertEqual(self._frames(alice), [])
+
+        self.server.presence.flush()
+
+        # Le DIRECTORY compte déjà l'arrivée de Bob : pas de lot en plus
+        self.assertEqual(self._frames(alice), [(DIRECTORY, pack_directory({"dev": 1}))])
+        self.assertEqual(self._frames(self.bob)[-1],
+                         (ROOM_UPDATE_BATCH, pack_room_update_batch([("dev", "Bob", "join")])))
+
+        self.server.handle_leave(self.bob)
+        self.server.presence.flush()
+        self.assertEqual(self._frames(alice), [(ROOM_UPDATE_BATCH, pack_room_update_batch([("dev", "Bob", "leave")]))])
+        self.assertEqual(self.server.directory.counts(), {})
+
+
+class TestDirectoryOnLogin(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ChatServer()
+        self.server.rooms["général"] = {"Bob", "Charlie"}
+        self.server.directory.member_joined("général")
+        self.server.directory.member_joined("général")
+
+        self.srv_sock, self.cli_sock = socket.socketpair()
+        self.thread = threading.Thread(target=self.server.handle_client, args=(self.srv_sock,))
+        self.thread.start()
+        self.decoder = FrameDecoder()
+
+    def tearDown(self):
+        self.cli_sock.close()
+        self.thread.join()
+        self.srv_sock.close()
+
+    def test_directory_follows_login_ok(self):
+        self.cli_sock.send(pack_message(LOGIN, pack_login("Alice", CAP_DIRECTORY)))
+
+        self.assertEqual(recv_frame(self.cli_sock, self.decoder)[0], LOGIN_OK)
+        msg_type, payload = recv_frame(self.cli_sock, self.decoder)
+
+        self.assertEqual(msg_type, DIRECTORY)
+        self.assertEqual(unpack_directory(payload), {"général": 2})
+
+    def test_legacy_login_gets_no_directory(self):
+        msg_type, _ = login(self.cli_sock, "Alice")
+        self.assertEqual(msg_type, LOGIN_OK)
+
+        self.cli_sock.settimeout(0.2)
+        with self.assertRaises(socket.timeout):
+            self.cli_sock.recv(1)
+
+    def test_room_query_returns_snapshot(self):
+        self.cli_sock.send(pack_message(LOGIN, pack_login("Alice", 0)))
+        recv_frame(self.cli_sock, self.decoder)
+
+        self.cli_sock.send(pack_message(ROOM_QUERY, pack_string("général")))
+        msg_type, payload = recv_frame(self.cli_sock, self.decoder)
+
+        self.assertEqual(msg_type, ROOM_SNAPSHOT)
+        room_name, _, members = unpack_room_snapshot(payload)
+        self.assertEqual(room_name, "général")
+        self.assertEqual(set(members), {"Bob", "Charlie"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+"""
+test_file_cache.py
+
+Tests unitaires du cache des fichiers adressé par contenu (FileCache) :
+remplissage après un transfert vérifié, offre servie depuis le cache sans
+envoi de l'émetteur, éviction LRU sur disque, niveau chaud en mémoire et
+statistiques.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from server.server import ChatServer
+from server.file_relay import FileRelay
+from server.file_spool import FileSpool
+from server.file_cache import FileCache
+from common.protocol import *
+from tests.utils import frames, join_client, received_data
+
+DATA = bytes(range(256)) * 600  # 153 600 octets
+
+
+class TestFileCacheRelay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = FileCache(os.path.join(self.directory, "cache"))
+        relay = FileRelay(spool=FileSpool(self.directory), cache=self.cache)
+        self.server = ChatServer(file_relay=relay)
+        self.alice, self.bob = join_client(self.server, "Alice"), join_client(self.server, "Bob")
+
+    def tearDown(self):
+        self.server.files.stop()
+        shutil.rmtree(self.directory)
+
+    def _offer(self, data=DATA, digest=None):
+        """Offre d'Alice acceptée par Bob ; renvoie l'identifiant du transfert."""
+        digest = file_digest(data) if digest is None else digest
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", len(data), digest))
+        transfer_id = self.alice.pending_file.id
+        self.server.dispatch(self.bob, FILE_ACCEPT, encode_payload(FILE_ACCEPT, transfer_id))
+        return transfer_id
+
+    def _upload(self, data=DATA, digest=None):
+        transfer_id = self._offer(data, digest)
+        for offset in range(0, len(data), FILE_CHUNK_SIZE):
+            chunk = data[offset:offset + FILE_CHUNK_SIZE]
+            self.server.dispatch(self.alice, FILE_DATA, pack_file_data(transfer_id, offset, chunk))
+        self.server.dispatch(self.alice, FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK))
+        return transfer_id
+
+    def _clear(self):
+        for client in (self.alice, self.bob):
+            client.sock.sent.clear()
+
+    def test_verified_upload_is_cached(self):
+        self._upload()
+
+        self.assertIn(file_digest(DATA), self.cache)
+        with open(self.cache.path(file_digest(DATA)), "rb") as file:
+            self.assertEqual(file.read(), DATA)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_corrupt_upload_not_cached(self):
+        self._upload(digest=file_digest(b"autre chose"))
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_repeated_offer_served_from_cache(self):
+        self._upload()
+        self._clear()
+
+        transfer_id = self._offer()
+
+        # L'émetteur n'a rien à envoyer
+        self.assertEqual([msg_type for msg_type, _ in frames(self.alice.sock)], [FILE_START, FILE_END])
+        self.assertEqual(frames(self.alice.sock)[1], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)))
+        self.assertEqual(self.alice.state, STATE_IN_ROOM)
+
+        received = frames(self.bob.sock)
+        self.assertEqual([msg_type for msg_type, _ in received[:2]], [FILE_REQUEST, FILE_START])
+        self.assertEqual(received_data(self.bob.sock), DATA)
+        self.assertEqual(received[-1], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)))
+
+        stats = self.server.get_file_stats()
+        self.assertEqual((stats['cache_hits'], stats['cache_hit_rate'], stats['bytes_saved']), (1, 0.5, len(DATA)))
+
+    def test_sender_frames_ignored_after_cache_hit(self):
+        self._upload()
+        transfer_id = self._offer()
+        self._clear()
+
+        # Un client qui envoie quand même le fichier ne reçoit pas d'erreur
+        self.server.dispatch(self.alice, FILE_DATA, pack_file_data(transfer_id, 0, DATA[:FILE_CHUNK_SIZE]))
+        self.server.dispatch(self.alice, FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK))
+
+        self.assertEqual(self.alice.sock.sent, [])
+        self.assertEqual(self.bob.sock.sent, [])
+
+    def test_size_mismatch_is_a_miss(self):
+        self._upload()
+        self._clear()
+
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", len(DATA) + 1, file_digest(DATA)))
+        self.server.dispatch(self.bob, FILE_ACCEPT, encode_payload(FILE_ACCEPT, self.alice.pending_file.id))
+
+        self.assertEqual([msg_type for msg_type, _ in frames(self.alice.sock)], [FILE_START])
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_recipient_resumes_cached_transfer(self):
+        self._upload()
+        transfer_id = self._offer()
+        self._clear()
+
+        self.server.dispatch(self.bob, FILE_RESUME, encode_payload(FILE_RESUME, transfer_id, 100000))
+
+        self.assertEqual(received_data(self.bob.sock), bytes(100000) + DATA[100000:])  # Rien avant la reprise
+        self.assertEqual(frames(self.bob.sock)[-1], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)))
+
+    def test_cache_hits_kept_only_for_resume(self):
+        self._upload()
+        hits = [self.server.files._done[self._offer()] for _ in range(20)]
+        self.assertEqual(len(self.server.files._done), 21)
+
+        # Fin du délai de reprise de chaque transfert servi depuis le cache
+        for transfer in hits:
+            self.server.files.wheel.schedule(transfer, 0)
+        self.server.files.wheel.advance()
+
+        self.assertEqual(len(self.server.files._done), 1)  # Le premier envoi, dans la réserve
+        self.assertEqual(len(self.server.files.wheel), 0)
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sources = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.sources)
+
+    def _source(self, content: bytes) -> str:
+        path = os.path.join(self.sources, file_digest(content))
+        with open(path, "wb") as file:
+            file.write(content)
+        return path
+
+    def _add(self, cache, content: bytes) -> str:
+        digest = file_digest(content)
+        cache.add(digest, self._source(content))
+        return digest
+
+    def test_least_recently_used_evicted(self):
+        cache = FileCache(self.directory, max_bytes=250)
+        evicted = []
+        cache.on_evict = evicted.append
+        first = self._add(cache, b"a" * 100)
+        second = self._add(cache, b"b" * 100)
+        self.assertTrue(cache.lookup(first, 100))  # first redevient le plus récent
+
+        third = self._add(cache, b"c" * 100)
+
+        self.assertEqual(evicted, [second])
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([first, third]))
+        self.assertEqual(cache.size, 200)
+
+    def test_small_files_kept_in_memory(self):
+        cache = FileCache(self.directory, hot_bytes=150, hot_file_bytes=100)
+        small, other, large = (self._add(cache, content) for content in (b"a" * 100, b"b" * 100, b"c" * 200))
+
+        self.assertEqual(cache.read(small, 10, 5), b"aaaaa")
+        os.remove(cache.path(small))
+        self.assertEqual(cache.read(small, 0, 3), b"aaa")  # Servi depuis la mémoire
+
+        cache.read(large, 0, 10)
+        self.assertEqual(cache.hot_size, 100)  # Trop grand pour la mémoire
+
+        cache.read(other, 0, 10)
+        self.assertEqual(cache.hot_size, 100)  # other a remplacé small
+        self.assertIsNone(cache.read(small, 0, 3))
+
+    def test_lookup_statistics(self):
+        cache = FileCache(self.directory)
+        digest = self._add(cache, b"x" * 10)
+
+        self.assertFalse(cache.lookup(file_digest(b"y"), 1))
+        self.assertTrue(cache.lookup(digest, 10))
+        self.assertFalse(cache.lookup(digest, 11))
+
+        self.assertEqual((cache.hits, cache.misses, cache.bytes_saved), (1, 2, 10))
+        self.assertAlmostEqual(cache.hit_rate, 1 / 3)
+
+    def test_cache_survives_restart(self):
+        digest = self._add(FileCache(self.directory), b"x" * 10)
+
+        cache = FileCache(self.directory)
+
+        self.assertIn(digest, cache)
+        self.assertEqual(cache.read(digest, 0, 20), b"x" * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
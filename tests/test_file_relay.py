@@ -0,0 +1,321 @@
+"""
+test_file_relay.py
+
+Tests unitaires des transferts de fichiers (FileRelay) : offres
+simultanées désignées par leur identifiant, refus, départs et échéance,
+ouverture du transfert après les acceptations, relais des morceaux sans
+copie par destinataire, réserve bornée pour les destinataires en retard
+et abandons.
+"""
+
+import unittest
+import zlib
+from server.server import ChatServer, SERVER_SENDER
+from server.file_relay import FileRelay, OFFER_ACCEPTED
+from server.outbound import OutboundQueue
+from common.protocol import *
+from tests.utils import frames, join_client
+
+
+class TestFileRelay(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ChatServer(file_relay=FileRelay(spool_bytes=256 * 1024, relay_chunk=FILE_CHUNK_SIZE))
+        self.alice, self.bob, self.charlie = (join_client(self.server, pseudo) for pseudo in ("Alice", "Bob", "Charlie"))
+
+    def tearDown(self):
+        self.server.files.stop()
+
+    def _open(self, size, outboxes=False):
+        """FILE_OFFER d'Alice accepté par Bob et Charlie ; renvoie l'identifiant du transfert."""
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", size, ""))
+        for client in (self.bob, self.charlie):
+            self.server.dispatch(client, FILE_ACCEPT, b"")
+        for client in (self.alice, self.bob, self.charlie):
+            (msg_type, payload), = [frame for frame in frames(client.sock) if frame[0] == FILE_START]
+            client.sock.sent.clear()
+            if outboxes:
+                client.outbox = OutboundQueue(128 * 1024, 64 * 1024)
+        return decode_payload(FILE_START, payload).transfer
+
+    def _send_chunks(self, transfer_id, count, size=FILE_CHUNK_SIZE):
+        for i in range(count):
+            self.server.dispatch(self.alice, FILE_DATA, pack_file_data(transfer_id, i * size, bytes([i]) * size))
+
+    def test_start_announces_transfer_to_everyone(self):
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", 10, ""))
+        self.server.dispatch(self.bob, FILE_ACCEPT, b"")
+        self.assertNotIn(FILE_START, [msg_type for msg_type, _ in frames(self.alice.sock)])  # Charlie n'a pas répondu
+        self.server.dispatch(self.charlie, FILE_ACCEPT, b"")
+
+        start = frames(self.alice.sock)[-1]
+        self.assertEqual(start[0], FILE_START)
+        self.assertEqual(decode_payload(FILE_START, start[1])[1:], ("Alice", "son.wav", 10, ""))
+        self.assertIn(start, frames(self.bob.sock))
+        self.assertEqual(self.alice.state, STATE_IN_ROOM)
+
+    def test_chunks_relayed_in_order_then_end(self):
+        transfer_id = self._open(1000)
+        data = bytes(range(256)) * 4
+        self.server.dispatch(self.alice, FILE_DATA, pack_file_data(transfer_id, 0, data[:600]))
+        self.server.dispatch(self.alice, FILE_DATA, pack_file_data(transfer_id, 600, data[600:1000]))
+        self.server.dispatch(self.alice, FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK))
+
+        for client in (self.bob, self.charlie):
+            received = frames(client.sock)
+            self.assertEqual(b"".join(bytes(unpack_file_data(payload)[3]) for _, payload in received[:2]), data[:1000])
+            self.assertEqual(received[2], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)))
+        self.assertEqual(self.alice.sock.sent, [])
+        self.assertEqual(len(self.server.files), 0)
+
+    def test_chunk_is_shared_by_all_recipients(self):
+        transfer_id = self._open(FILE_CHUNK_SIZE, outboxes=True)
+        payload = pack_file_data(transfer_id, 0, b"x" * FILE_CHUNK_SIZE)
+        self.server.dispatch(self.alice, FILE_DATA, payload)
+
+        bob_frame, = self.bob.outbox.take_nowait()
+        charlie_frame, = self.charlie.outbox.take_nowait()
+        self.assertIs(bob_frame, charlie_frame)
+        self.assertIs(bob_frame.payload, payload)
+
+    def test_large_chunk_split_once_for_all_recipients(self):
+        transfer_id = self._open(FILE_CHUNK_SIZE, outboxes=True)
+        self.server.files.relay_chunk = 16 * 1024
+        data = bytes(range(256)) * 256
+        self.server.dispatch(self.alice, FILE_DATA, pack_file_data(transfer_id, 0, data))
+
+        # Quatre trames de 16 Ko, une par écriture, partagées par Bob et Charlie
+        pieces = [self.bob.outbox.take_nowait() for _ in range(4)]
+        self.assertEqual([len(taken) for taken in pieces], [1, 1, 1, 1])
+        for i, (frame,) in enumerate(pieces):
+            self.assertIs(frame, self.charlie.outbox.take_nowait()[0])
+            _, offset, crc, chunk = unpack_file_data(frame.payload)
+            self.assertEqual((offset, bytes(chunk)), (i * 16 * 1024, data[i * 16 * 1024:(i + 1) * 16 * 1024]))
+            self.assertEqual(crc, zlib.crc32(chunk))
+
+    def test_slow_recipient_waits_in_spool(self):
+        transfer_id = self._open(10 * FILE_CHUNK_SIZE, outboxes=True)
+        self._send_chunks(transfer_id, 3)
+
+        # Une file d'envoi de 128 Ko n'accepte qu'un morceau de 64 Ko à la fois
+        taken = self.bob.outbox.take_nowait()
+        self.assertEqual(len(taken), 1)
+        self.assertEqual(self.server.files.get(transfer_id).spooled, sum(len(frame) for frame in taken) * 2)
+
+        # La file se vide : les morceaux suivants partent
+        self.bob.outbox.release(sum(len(frame) for frame in taken))
+        self.assertEqual([bytes(unpack_file_data(frame.payload)[3][:1]) for frame in self.bob.outbox.take_nowait()],
+                         [b"\x01"])
+
+    def test_too_slow_recipient_is_dropped(self):
+        transfer_id = self._open(10 * FILE_CHUNK_SIZE, outboxes=True)
+        self._send_chunks(transfer_id, 7)
+
+        # Bob ne vide jamais sa file : il est retiré quand la réserve dépasse 256 Ko
+        transfer = self.server.files.get(transfer_id)
+        self.assertNotIn(self.bob, transfer.positions)
+        self.assertLessEqual(transfer.spooled, 256 * 1024)
+        self.assertEqual(self.server.files.too_slow, 2)  # Charlie non plus ne vide pas sa file
+
+        # Le FILE_END suit le morceau déjà dans sa file (un morceau par écriture)
+        (first,), (end,) = self.bob.outbox.take_nowait(), self.bob.outbox.take_nowait()
+        self.assertEqual(bytes(first)[0], FILE_DATA)
+        self.assertEqual(bytes(end), pack_message(FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_TOO_SLOW)))
+
+    def test_sender_leaving_aborts_transfer(self):
+        transfer_id = self._open(1000)
+        self._send_chunks(transfer_id, 1, 100)
+
+        self.server.disconnect(self.alice)
+
+        end = (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_ABORTED))
+        for client in (self.bob, self.charlie):
+            received = frames(client.sock)
+            self.assertEqual(received[0][0], FILE_DATA)
+            self.assertIn(end, received)
+        self.assertIsNone(self.server.files.get(transfer_id))
+
+    def test_more_data_than_announced_aborts_transfer(self):
+        transfer_id = self._open(100)
+        self._send_chunks(transfer_id, 1, 101)
+
+        self.assertEqual(frames(self.bob.sock), [(FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_ABORTED))])
+        self.assertEqual(frames(self.alice.sock), frames(self.bob.sock))
+
+    def test_only_sender_may_send_data(self):
+        transfer_id = self._open(100)
+        self.server.dispatch(self.bob, FILE_DATA, pack_file_data(transfer_id, 0, b"intrus"))
+
+        (msg_type, payload), = frames(self.bob.sock)
+        self.assertEqual((msg_type, decode_payload(ERROR, payload).code), (ERROR, 0x06))
+        self.assertEqual(frames(self.charlie.sock), [])
+
+    def test_offer_too_large(self):
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "gros.wav", MAX_FILE_SIZE + 1))
+
+        (msg_type, payload), = [frame for frame in frames(self.alice.sock) if frame[0] == ERROR]
+        self.assertEqual(decode_payload(ERROR, payload).code, 0x07)
+        self.assertEqual(self.alice.state, STATE_IN_ROOM)
+
+
+class TestFileOffers(unittest.TestCase):
+    """Plusieurs offres en attente en même temps, dans un ou plusieurs salons."""
+
+    def setUp(self):
+        self.server = ChatServer()
+        self.alice, self.bob, self.charlie = (join_client(self.server, pseudo) for pseudo in ("Alice", "Bob", "Charlie"))
+        self.dave, self.eve = (join_client(self.server, pseudo, "dev") for pseudo in ("Dave", "Eve"))
+        for client in (self.alice, self.bob, self.charlie, self.dave, self.eve):
+            client.sock.sent.clear()
+
+    def _offer(self, client, filename="son.wav"):
+        """FILE_OFFER ; renvoie l'identifiant de l'offre."""
+        self.server.dispatch(client, FILE_OFFER, encode_payload(FILE_OFFER, filename, 100, ""))
+        return client.pending_file.id
+
+    def _respond(self, client, transfer_id, accepted=True):
+        msg_type = FILE_ACCEPT if accepted else FILE_REJECT
+        self.server.dispatch(client, msg_type, encode_payload(msg_type, transfer_id))
+
+    def _types(self, client):
+        return [msg_type for msg_type, _ in frames(client.sock)]
+
+    def test_request_carries_transfer_id(self):
+        transfer_id = self._offer(self.alice)
+
+        for client in (self.bob, self.charlie):
+            self.assertEqual(frames(client.sock),
+                             [(FILE_REQUEST, encode_payload(FILE_REQUEST, transfer_id, "Alice", "son.wav", 100, ""))])
+        self.assertEqual(frames(self.dave.sock), [])
+
+    def test_concurrent_offers_in_two_rooms(self):
+        first = self._offer(self.alice)
+        second = self._offer(self.dave)
+        self.assertNotEqual(first, second)
+
+        self._respond(self.eve, second)
+        self.assertEqual(self._types(self.dave), [FILE_START])
+        self.assertEqual(self._types(self.alice), [])  # Toujours en attente de Bob et Charlie
+
+        self._respond(self.bob, first)
+        self._respond(self.charlie, first)
+        self.assertEqual(decode_payload(FILE_START, frames(self.alice.sock)[0][1]).transfer, first)
+
+    def test_concurrent_offers_in_one_room(self):
+        first = self._offer(self.alice, "a.wav")
+        second = self._offer(self.bob, "b.wav")
+
+        # Réponse sans identifiant : ambiguë avec deux offres dans le salon, ignorée
+        self.server.dispatch(self.charlie, FILE_ACCEPT, b"")
+        self.assertEqual(self.server.files.get(first).accepted, 0)
+
+        # Bob attend les réponses à sa propre offre, mais peut répondre à celle d'Alice
+        self._respond(self.bob, first)
+        self._respond(self.charlie, first)
+        self.assertIn(FILE_START, self._types(self.alice))
+        self.assertEqual(self.bob.state, STATE_WAITING_FILE_CONFIRMATION)
+
+        self._respond(self.alice, second, accepted=False)
+        self.assertIn((FILE_CANCEL, encode_payload(FILE_CANCEL, second, "Refus d'un participant")),
+                      frames(self.bob.sock))
+        self.assertEqual(self.bob.state, STATE_IN_ROOM)
+        self.assertIsNone(self.server.files.get(second))
+
+    def test_reject_cancels_for_sender_and_pending_recipients(self):
+        transfer_id = self._offer(self.alice)
+        self._respond(self.bob, transfer_id, accepted=False)
+
+        cancel = (FILE_CANCEL, encode_payload(FILE_CANCEL, transfer_id, "Refus d'un participant"))
+        self.assertEqual(frames(self.alice.sock), [cancel])
+        self.assertIn(cancel, frames(self.charlie.sock))
+        self.assertNotIn(cancel, frames(self.bob.sock))
+
+        # Réponse tardive à une offre close : ignorée
+        self._respond(self.charlie, transfer_id)
+        self.assertEqual(frames(self.alice.sock), [cancel])
+
+    def test_member_leaving_is_no_longer_expected(self):
+        transfer_id = self._offer(self.alice)
+        self._respond(self.bob, transfer_id)
+
+        self.server.handle_leave(self.charlie)
+
+        start, = [frame for frame in frames(self.alice.sock) if frame[0] == FILE_START]
+        self.assertEqual(decode_payload(FILE_START, start[1]).transfer, transfer_id)
+        self.assertEqual(list(self.server.files.get(transfer_id).positions), [self.bob])
+
+    def test_deadline_sends_to_those_who_accepted(self):
+        transfer_id = self._offer(self.alice)
+        self._respond(self.bob, transfer_id)
+
+        offer = self.server.files.get(transfer_id)
+        self.server.files.wheel.schedule(offer, 0)
+        self.server.files.wheel.advance()
+
+        self.assertIn(FILE_START, self._types(self.alice))
+        self.assertIn(FILE_START, self._types(self.bob))
+        self.assertNotIn(FILE_START, self._types(self.charlie))
+        self.assertEqual(self.alice.state, STATE_IN_ROOM)
+
+    def test_deadline_without_acceptance_cancels(self):
+        transfer_id = self._offer(self.alice)
+
+        offer = self.server.files.get(transfer_id)
+        self.server.files.wheel.schedule(offer, 0)
+        self.server.files.wheel.advance()
+
+        cancel = (FILE_CANCEL, encode_payload(FILE_CANCEL, transfer_id, "Délai dépassé"))
+        self.assertEqual(frames(self.alice.sock), [cancel])
+        self.assertIn(cancel, frames(self.bob.sock))
+        self.assertEqual(len(self.server.files), 0)
+
+    def test_sender_leaving_cancels_offer(self):
+        transfer_id = self._offer(self.alice)
+
+        self.server.disconnect(self.alice)
+
+        cancel = (FILE_CANCEL, encode_payload(FILE_CANCEL, transfer_id, "L'émetteur s'est déconnecté"))
+        self.assertIn(cancel, frames(self.bob.sock))
+        self.assertEqual(len(self.server.files), 0)
+        self.assertEqual(len(self.server.files.wheel), 0)
+
+    def test_sender_leaving_during_offer_leaves_room(self):
+        self._offer(self.alice)
+
+        self.server.disconnect(self.alice)
+
+        self.assertEqual(self.server.rooms["musique"], {"Bob", "Charlie"})
+        self.assertEqual(self.server.directory.counts()["musique"], 2)
+        self.assertIn((MSG_BROADCAST, encode_payload(MSG_BROADCAST, SERVER_SENDER, "Alice s'est déconnecté")),
+                      frames(self.bob.sock))
+
+    def test_offer_without_recipients_cancelled_at_once(self):
+        transfer_id = self._offer(self.eve)  # Eve et Dave dans « dev »
+        self.server.handle_leave(self.dave)
+        self.assertIn((FILE_CANCEL, encode_payload(FILE_CANCEL, transfer_id, "Aucun destinataire")),
+                      frames(self.eve.sock))
+        self.assertEqual(self.eve.state, STATE_IN_ROOM)
+
+        # Seule dans le salon : annulée sans attendre l'échéance
+        self.eve.sock.sent.clear()
+        self.server.dispatch(self.eve, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", 100, ""))
+
+        (msg_type, payload), = frames(self.eve.sock)
+        self.assertEqual((msg_type, decode_payload(FILE_CANCEL, payload).reason), (FILE_CANCEL, "Aucun destinataire"))
+        self.assertEqual(self.eve.state, STATE_IN_ROOM)
+        self.assertEqual(len(self.server.files), 0)
+        self.assertEqual(len(self.server.files.wheel), 0)
+
+    def test_responses_tracked_in_bitmasks(self):
+        relay = FileRelay()
+        pseudos = [f"membre{i}" for i in range(200)]
+        offer = relay.offer(self.alice, "son.wav", 100, "musique", pseudos)
+
+        for pseudo in pseudos[:-1]:
+            self.assertEqual(relay.respond(offer.id, pseudo, True), (offer, None))
+        self.assertEqual(relay.respond(offer.id, pseudos[-1], True), (offer, OFFER_ACCEPTED))
+        self.assertEqual(offer.accepted, offer.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+test_file_resume.py
+
+Tests unitaires de la reprise des transferts de fichiers : morceaux
+vérifiés (position, CRC32), empreinte du fichier entier, FILE_RESUME de
+l'émetteur et des destinataires, et réserve sur disque (FileSpool) bornée
+par une éviction LRU.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from server.server import ChatServer
+from server.file_relay import FileRelay
+from server.file_spool import FileSpool
+from common.protocol import *
+from tests.utils import frames, join_client, received_data
+
+DATA = bytes(range(256)) * 1000  # 256 000 octets
+
+
+class TestFileResume(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spool = FileSpool(self.directory, max_bytes=1024 * 1024)
+        self.server = ChatServer(file_relay=FileRelay(spool=self.spool))
+        self.alice, self.bob = join_client(self.server, "Alice"), join_client(self.server, "Bob")
+
+    def tearDown(self):
+        self.server.files.stop()
+        shutil.rmtree(self.directory)
+
+    def _open(self, digest=None):
+        """FILE_OFFER d'Alice (DATA) accepté par Bob ; renvoie l'identifiant du transfert."""
+        digest = file_digest(DATA) if digest is None else digest
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", len(DATA), digest))
+        transfer_id = self.alice.pending_file.id
+        self.server.dispatch(self.bob, FILE_ACCEPT, encode_payload(FILE_ACCEPT, transfer_id))
+        for client in (self.alice, self.bob):
+            client.sock.sent.clear()
+        return transfer_id
+
+    def _send(self, transfer_id, start, end, sender=None):
+        for offset in range(start, end, FILE_CHUNK_SIZE):
+            chunk = DATA[offset:min(end, offset + FILE_CHUNK_SIZE)]
+            self.server.dispatch(sender or self.alice, FILE_DATA, pack_file_data(transfer_id, offset, chunk))
+
+    def _end(self, transfer_id, sender=None):
+        self.server.dispatch(sender or self.alice, FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK))
+
+    def _resume(self, client, transfer_id, offset=0):
+        self.server.dispatch(client, FILE_RESUME, encode_payload(FILE_RESUME, transfer_id, offset))
+
+    def test_digest_carried_in_request_and_start(self):
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", 10, file_digest(b"x" * 10)))
+
+        request = decode_payload(FILE_REQUEST, frames(self.bob.sock)[-1][1])
+        self.assertEqual(request.digest, file_digest(b"x" * 10))
+
+    def test_offer_without_digest_accepted(self):
+        self.server.dispatch(self.alice, FILE_OFFER, pack_string("son.wav") + pack_int(10))
+
+        self.assertEqual(decode_payload(FILE_REQUEST, frames(self.bob.sock)[-1][1]).digest, "")
+
+    def test_invalid_digest_rejected(self):
+        self.server.dispatch(self.alice, FILE_OFFER, encode_payload(FILE_OFFER, "son.wav", 10, "pas une empreinte"))
+
+        (msg_type, payload), = [frame for frame in frames(self.alice.sock) if frame[0] == ERROR]
+        self.assertEqual(decode_payload(ERROR, payload).code, 0x06)
+        self.assertEqual(self.alice.state, STATE_IN_ROOM)
+
+    def test_corrupt_chunk_asks_sender_to_resume(self):
+        transfer_id = self._open()
+        self._send(transfer_id, 0, FILE_CHUNK_SIZE)
+
+        # Morceau altéré puis morceau suivant : un seul FILE_RESUME, rien de relayé
+        payload = bytearray(pack_file_data(transfer_id, FILE_CHUNK_SIZE, DATA[FILE_CHUNK_SIZE:2 * FILE_CHUNK_SIZE]))
+        payload[-1] ^= 0xFF
+        self.server.dispatch(self.alice, FILE_DATA, bytes(payload))
+        self._send(transfer_id, 2 * FILE_CHUNK_SIZE, 3 * FILE_CHUNK_SIZE)
+
+        self.assertEqual(frames(self.alice.sock),
+                         [(FILE_RESUME, encode_payload(FILE_RESUME, transfer_id, FILE_CHUNK_SIZE))])
+        self.assertEqual(received_data(self.bob.sock), DATA[:FILE_CHUNK_SIZE])
+        self.assertEqual(self.server.files.rejected_chunks, 2)
+
+        # L'émetteur reprend à la position vérifiée
+        self._send(transfer_id, FILE_CHUNK_SIZE, len(DATA))
+        self._end(transfer_id)
+        self.assertEqual(received_data(self.bob.sock), DATA)
+        self.assertEqual(frames(self.bob.sock)[-1], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)))
+
+    def test_digest_mismatch_is_corrupt(self):
+        transfer_id = self._open(digest=file_digest(b"autre chose"))
+        self._send(transfer_id, 0, len(DATA))
+        self._end(transfer_id)
+
+        end = (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_CORRUPT))
+        self.assertEqual(frames(self.bob.sock)[-1], end)
+        self.assertEqual(frames(self.alice.sock), [end])
+        self.assertNotIn(transfer_id, self.spool)
+
+    def test_recipient_resumes_from_offset(self):
+        transfer_id = self._open()
+        self._send(transfer_id, 0, 2 * FILE_CHUNK_SIZE)
+
+        # Bob revient sur une nouvelle connexion avec un morceau et demi
+        self.server.disconnect(self.bob)
+        bob = join_client(self.server, "Bob")
+        self._resume(bob, transfer_id, FILE_CHUNK_SIZE + 1000)
+
+        self.assertEqual(received_data(bob.sock)[FILE_CHUNK_SIZE + 1000:], DATA[FILE_CHUNK_SIZE + 1000:2 * FILE_CHUNK_SIZE])
+
+        # La suite arrive en direct
+        self._send(transfer_id, 2 * FILE_CHUNK_SIZE, len(DATA))
+        self._end(transfer_id)
+        self.assertEqual(received_data(bob.sock)[FILE_CHUNK_SIZE + 1000:], DATA[FILE_CHUNK_SIZE + 1000:])
+        self.assertEqual(frames(bob.sock)[-1][0], FILE_END)
+        self.assertEqual(self.server.files.resumed, 1)
+
+    def test_recipient_resumes_after_end(self):
+        transfer_id = self._open()
+        self._send(transfer_id, 0, len(DATA))
+        self._end(transfer_id)
+        self.assertEqual(len(self.server.files), 0)
+
+        self.bob.sock.sent.clear()
+        self._resume(self.bob, transfer_id, 100000)
+
+        self.assertEqual(received_data(self.bob.sock)[100000:], DATA[100000:])
+        self.assertEqual(frames(self.bob.sock)[-1], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)))
+
+    def test_only_recipients_may_resume(self):
+        transfer_id = self._open()
+        charlie = join_client(self.server, "Charlie")  # Arrivé après l'offre
+        self._resume(charlie, transfer_id)
+
+        (msg_type, payload), = [frame for frame in frames(charlie.sock) if frame[0] == ERROR]
+        self.assertEqual(decode_payload(ERROR, payload).code, 0x06)
+        self.assertNotIn(FILE_DATA, [msg_type for msg_type, _ in frames(charlie.sock)])
+
+    def test_sender_resumes_after_disconnect(self):
+        transfer_id = self._open()
+        self._send(transfer_id, 0, 2 * FILE_CHUNK_SIZE)
+
+        self.server.disconnect(self.alice)
+        self.assertNotIn((FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_ABORTED)), frames(self.bob.sock))
+
+        alice = join_client(self.server, "Alice")
+        self._resume(alice, transfer_id)
+        (msg_type, payload), = [frame for frame in frames(alice.sock) if frame[0] == FILE_RESUME]
+        offset = decode_payload(FILE_RESUME, payload).offset
+        self.assertEqual(offset, 2 * FILE_CHUNK_SIZE)
+
+        self._send(transfer_id, offset, len(DATA), sender=alice)
+        self._end(transfer_id, sender=alice)
+        self.assertEqual(received_data(self.bob.sock), DATA)
+        self.assertEqual(frames(self.bob.sock)[-1], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_OK)))
+
+    def test_sender_not_back_in_time_aborts(self):
+        transfer_id = self._open()
+        self._send(transfer_id, 0, FILE_CHUNK_SIZE)
+        self.server.disconnect(self.alice)
+
+        transfer = self.server.files.get(transfer_id)
+        self.server.files.wheel.schedule(transfer, 0)
+        self.server.files.wheel.advance()
+
+        self.assertEqual(frames(self.bob.sock)[-1], (FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_ABORTED)))
+        self.assertNotIn(transfer_id, self.spool)
+
+    def test_resume_after_eviction_aborts(self):
+        transfer_id = self._open()
+        self._send(transfer_id, 0, len(DATA))
+        self._end(transfer_id)
+        self.spool.discard(transfer_id)
+
+        self.bob.sock.sent.clear()
+        self._resume(self.bob, transfer_id)
+
+        self.assertEqual(frames(self.bob.sock), [(FILE_END, encode_payload(FILE_END, transfer_id, FILE_END_ABORTED))])
+
+
+class TestFileSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _complete(self, spool, transfer_id, size):
+        spool.create(transfer_id)
+        spool.write(transfer_id, 0, b"x" * size)
+        spool.close(transfer_id)
+
+    def test_write_and_read_at_offset(self):
+        spool = FileSpool(self.directory)
+        spool.create(1)
+        spool.write(1, 0, b"abc")
+        spool.write(1, 3, b"def")
+
+        self.assertEqual(spool.read(1, 2, 3), b"cde")  # Lisible avant la fin de l'écriture
+        self.assertEqual(spool.size, 6)
+        self.assertIsNone(spool.read(2, 0, 3))
+
+    def test_least_recently_used_evicted(self):
+        spool = FileSpool(self.directory, max_bytes=250)
+        evicted = []
+        spool.on_evict = evicted.append
+        self._complete(spool, 1, 100)
+        self._complete(spool, 2, 100)
+        spool.read(1, 0, 10)  # 1 redevient le plus récent
+
+        self._complete(spool, 3, 100)
+
+        self.assertEqual(evicted, [2])
+        self.assertEqual(sorted(os.listdir(self.directory)), ["1.part", "3.part"])
+        self.assertEqual(spool.size, 200)
+
+    def test_file_being_written_never_evicted(self):
+        spool = FileSpool(self.directory, max_bytes=100)
+        spool.create(1)
+        spool.write(1, 0, b"x" * 150)
+
+        self.assertIn(1, spool)
+        spool.close(1)
+        self.assertNotIn(1, spool)
+
+    def test_stale_files_removed_at_startup(self):
+        with open(os.path.join(self.directory, "7.part"), "wb") as file:
+            file.write(b"ancien")
+
+        spool = FileSpool(self.directory)
+
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(len(spool), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
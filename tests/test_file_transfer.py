@@ -5,6 +5,7 @@ from tests.utils import FakeSocket
 
 def test_msg_blocked_during_file_offer():
     server = ChatServer()
+    server.rooms["music"] = {"Bob"}  # Un destinataire attendu : l'offre reste en attente
     sock = FakeSocket()
 
     def send(msg):
@@ -0,0 +1,172 @@
+"""
+test_heartbeat.py
+
+Tests unitaires de la roue temporelle et de la surveillance des connexions
+(PING / PONG, délai de LOGIN, inactivité). Le temps est simulé : la roue
+avance à la main, d'un tick à la fois.
+"""
+
+import unittest
+from server.server import ChatServer, ClientContext
+from server.timing_wheel import HashedTimingWheel
+from server.heartbeat import HeartbeatMonitor
+from common.protocol import *
+from tests.utils import FakeSocket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHashedTimingWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.expired = []
+        self.wheel = HashedTimingWheel(self.expired.append, tick=1.0, wheel_size=8)
+
+    def advance(self, ticks):
+        for _ in range(ticks):
+            self.wheel.advance()
+
+    def test_fires_after_delay(self):
+        self.wheel.schedule("a", 3)
+
+        self.advance(2)
+        self.assertEqual(self.expired, [])
+        self.advance(1)
+        self.assertEqual(self.expired, ["a"])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_delay_longer_than_one_turn(self):
+        self.wheel.schedule("a", 8)
+        self.wheel.schedule("b", 19)
+
+        self.advance(7)
+        self.assertEqual(self.expired, [])
+        self.advance(1)
+        self.assertEqual(self.expired, ["a"])
+        self.advance(10)
+        self.assertEqual(self.expired, ["a"])
+        self.advance(1)
+        self.assertEqual(self.expired, ["a", "b"])
+
+    def test_cancel(self):
+        self.wheel.schedule("a", 2)
+        self.wheel.cancel("a")
+        self.wheel.cancel("inconnu")
+
+        self.advance(8)
+        self.assertEqual(self.expired, [])
+
+    def test_reschedule_replaces_previous_deadline(self):
+        self.wheel.schedule("a", 2)
+        self.wheel.schedule("a", 5)
+
+        self.advance(4)
+        self.assertEqual(self.expired, [])
+        self.advance(1)
+        self.assertEqual(self.expired, ["a"])
+
+
+class TestHeartbeatMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.monitor = HeartbeatMonitor(
+            ping_interval=30, max_missed_pings=3, login_timeout=10,
+            idle_timeout=None, tick=1.0, clock=self.clock,
+        )
+        # Roue pilotée à la main : le moniteur n'est pas démarré
+        self.server = ChatServer()
+        self.server.heartbeat = self.monitor
+
+    def elapse(self, seconds):
+        for _ in range(seconds):
+            self.clock.now += 1
+            self.monitor.wheel.advance()
+
+    def connect(self, pseudo=None):
+        client = ClientContext(FakeSocket())
+        self.server.connect(client)
+        if pseudo is not None:
+            self.server.dispatch(client, LOGIN, pack_login(pseudo))
+            client.sock.sent.clear()
+        return client
+
+    def pings(self, client):
+        return client.sock.sent.count(pack_message(PING))
+
+    def test_login_timeout(self):
+        client = self.connect()
+
+        self.elapse(9)
+        self.assertFalse(client.sock.shut_down)
+        self.elapse(1)
+        self.assertTrue(client.sock.shut_down)
+
+    def test_logged_in_client_is_not_dropped_at_login_timeout(self):
+        client = self.connect("Alice")
+
+        self.elapse(15)
+        self.assertFalse(client.sock.shut_down)
+
+    def test_active_client_is_never_pinged(self):
+        client = self.connect("Alice")
+
+        for _ in range(10):
+            self.elapse(20)
+            self.server.dispatch(client, ROOM_QUERY, pack_string("général"))
+
+        self.assertEqual(self.pings(client), 0)
+        self.assertFalse(client.sock.shut_down)
+
+    def test_silent_client_is_pinged_then_dropped(self):
+        client = self.connect("Alice")
+
+        self.elapse(30)
+        self.assertEqual(self.pings(client), 1)
+
+        self.elapse(60)
+        self.assertEqual(self.pings(client), 3)
+        self.assertFalse(client.sock.shut_down)
+
+        self.elapse(30)
+        self.assertTrue(client.sock.shut_down)
+
+    def test_pong_keeps_client_alive(self):
+        client = self.connect("Alice")
+
+        for _ in range(5):
+            self.elapse(30)
+            self.server.dispatch(client, PONG, b"")
+
+        self.assertEqual(self.pings(client), 5)
+        self.assertFalse(client.sock.shut_down)
+        # PONG est accepté sans réponse d'erreur
+        self.assertEqual(client.sock.sent, [pack_message(PING)] * 5)
+
+    def test_idle_timeout_ignores_pong(self):
+        self.monitor.idle_timeout = 100
+        client = self.connect("Alice")
+
+        for _ in range(3):
+            self.elapse(30)
+            self.server.dispatch(client, PONG, b"")
+        self.assertFalse(client.sock.shut_down)
+
+        self.elapse(10)
+        self.assertTrue(client.sock.shut_down)
+
+    def test_disconnect_cancels_deadline(self):
+        client = self.connect("Alice")
+        self.server.disconnect(client)
+
+        self.assertEqual(len(self.monitor.wheel), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
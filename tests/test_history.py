@@ -0,0 +1,104 @@
+"""
+test_history.py
+
+Tests unitaires de l'historique récent des salons (RoomHistory) et de son
+rejeu à l'entrée dans un salon.
+"""
+
+import unittest
+from server.server import ChatServer, ClientContext
+from server.history import RoomHistory, ROOM_OVERHEAD
+from common.protocol import *
+from tests.utils import FakeSocket
+
+
+def broadcast(pseudo, text):
+    return encode_message(MSG_BROADCAST, pseudo, text)
+
+
+class TestRoomHistory(unittest.TestCase):
+
+    def test_keeps_last_messages_in_order(self):
+        history = RoomHistory(max_messages=3)
+        frames = [broadcast("Alice", f"message {i}") for i in range(5)]
+        for frame in frames:
+            history.append("dev", frame)
+
+        self.assertEqual(history.tail("dev"), b"".join(frames[2:]))
+        self.assertEqual(history.tail("inconnu"), b"")
+
+    def test_room_byte_limit(self):
+        frame = broadcast("Alice", "x" * 100)
+        history = RoomHistory(max_messages=100, max_bytes=len(frame) * 2)
+        for _ in range(5):
+            history.append("dev", frame)
+
+        self.assertEqual(history.tail("dev"), frame * 2)
+
+    def test_budget_evicts_least_recently_active_rooms(self):
+        frame = broadcast("Alice", "x" * 100)
+        room_cost = len(frame) + ROOM_OVERHEAD
+        history = RoomHistory(budget=room_cost * 3)
+
+        for room_name in ("a", "b", "c"):
+            history.append(room_name, frame)
+        history.append("a", frame)  # « a » redevient le plus récent
+        history.append("d", frame)
+
+        self.assertEqual(history.tail("b"), b"")
+        self.assertEqual(history.tail("a"), frame * 2)
+        self.assertLessEqual(history.size(), history.budget)
+        self.assertEqual(history.evicted_rooms, 2)
+
+    def test_memory_bounded_by_room_count(self):
+        history = RoomHistory(budget=64 * 1024)
+        for i in range(10000):
+            history.append(f"salon_{i}", broadcast("Alice", "Salut"))
+
+        self.assertLessEqual(history.size(), 64 * 1024)
+        self.assertLessEqual(len(history), 64 * 1024 // ROOM_OVERHEAD)
+
+
+class TestHistoryReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ChatServer(history=RoomHistory())
+        self.alice = self._login("Alice")
+        self.server.handle_join(self.alice, pack_string("dev"))
+
+    def _login(self, pseudo):
+        client = ClientContext(FakeSocket())
+        self.server.handle_login(client, LOGIN, pack_string(pseudo))
+        return client
+
+    def test_joiner_receives_history_in_one_write(self):
+        self.server.handle_msg(self.alice, pack_string("premier"))
+        self.server.handle_msg(self.alice, pack_string("second"))
+
+        bob = self._login("Bob")
+        bob.sock.sent.clear()
+        self.server.handle_join(bob, pack_string("dev"))
+
+        self.assertEqual(bob.sock.sent[0], pack_message(JOIN_OK))
+        self.assertIn(broadcast("Alice", "premier") + broadcast("Alice", "second"), bob.sock.sent)
+
+    def test_history_survives_empty_room(self):
+        self.server.handle_msg(self.alice, pack_string("quelqu'un ?"))
+        self.server.handle_leave(self.alice)
+
+        bob = self._login("Bob")
+        self.server.handle_join(bob, pack_string("dev"))
+
+        self.assertIn(broadcast("Alice", "quelqu'un ?"), bob.sock.sent)
+
+    def test_other_room_history_not_replayed(self):
+        self.server.handle_msg(self.alice, pack_string("secret"))
+
+        bob = self._login("Bob")
+        self.server.handle_join(bob, pack_string("général"))
+
+        self.assertNotIn(broadcast("Alice", "secret"), bob.sock.sent)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+"""
+test_memory.py
+
+Tests de l'empreinte mémoire par connexion : les budgets de bench/memory.py
+sont tenus, et l'état par client reste compact.
+"""
+
+import unittest
+from bench.memory import IDLE_CONNECTION_BUDGET, IN_ROOM_CONNECTION_BUDGET, measure_connections
+from server.outbound import OutboundQueue
+from server.server import ClientContext
+from tests.utils import FakeSocket
+
+
+class TestConnectionMemory(unittest.TestCase):
+
+    def test_idle_connection_budget(self):
+        self.assertLessEqual(measure_connections(500, in_room=False), IDLE_CONNECTION_BUDGET)
+
+    def test_in_room_connection_budget(self):
+        self.assertLessEqual(measure_connections(500, in_room=True, room_size=50),
+                             IN_ROOM_CONNECTION_BUDGET)
+
+    def test_per_client_state_has_no_instance_dict(self):
+        self.assertFalse(hasattr(ClientContext(FakeSocket()), "__dict__"))
+        self.assertFalse(hasattr(OutboundQueue(), "__dict__"))
+
+
+if __name__ == "__main__":
+    unittest.main()
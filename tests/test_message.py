@@ -9,6 +9,7 @@ client / serveur sans réseau réel.
 
 import unittest
 import socket
+from unittest import mock
 from server.server import ChatServer, ClientContext
 from client.client import send_message
 from common.protocol import *
@@ -169,5 +170,34 @@ class TestMessage(unittest.TestCase):
         srv_sock3.close()
 
 
+    def test_broadcast_compressed_once_for_capable_clients(self):
+        """Avec CAP_COMPRESSION, le broadcast arrive compressé ; il n'est compressé qu'une fois."""
+        self.alice.capabilities = CAP_COMPRESSION
+        self.bob.capabilities = CAP_COMPRESSION
+        message = "Bonjour, est-ce que quelqu'un a le fichier audio ? merci " * 4
+
+        with mock.patch("common.protocol.pack_compressed", wraps=pack_compressed) as compress:
+            self.server.handle_msg(self.alice, pack_string(message))
+        self.assertEqual(compress.call_count, 1)
+
+        for cli_sock in (self.cli_sock1, self.cli_sock2):
+            decoder = FrameDecoder(inflate=True)
+            msg_type, payload = recv_frame(cli_sock, decoder)
+            self.assertEqual(msg_type, MSG_BROADCAST)
+            self.assertEqual(tuple(decode_payload(MSG_BROADCAST, payload)), ("Alice", message))
+
+    def test_broadcast_stays_raw_without_capability(self):
+        """Un client sans CAP_COMPRESSION reçoit la trame brute."""
+        self.alice.capabilities = CAP_COMPRESSION
+        message = "x" * 500
+
+        self.server.handle_msg(self.alice, pack_string(message))
+
+        msg_type, _ = recv_frame(self.cli_sock1, FrameDecoder())
+        self.assertEqual(msg_type, COMPRESSED)
+        self.assertEqual(recv_frame(self.cli_sock2, FrameDecoder()),
+                         (MSG_BROADCAST, encode_payload(MSG_BROADCAST, "Alice", message)))
+
+
 if __name__ == "__main__":
     unittest.main()
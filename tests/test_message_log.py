@@ -0,0 +1,204 @@
+"""
+test_message_log.py
+
+Tests unitaires du journal durable des messages (MessageLog) : pagination,
+reprise après redémarrage, fin d'enregistrement incomplète, rétention et
+requêtes HISTORY_REQUEST.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from server.server import ChatServer, ClientContext
+from server.message_log import MessageLog
+from common.protocol import *
+from tests.utils import FakeSocket
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestMessageLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _log(self, **kwargs):
+        return MessageLog(self.directory, clock=self.clock, **kwargs)
+
+    def _fill(self, log, count, room_name="dev"):
+        for i in range(count):
+            log.append(room_name, "Alice", f"message {i}")
+        log.flush()
+
+    def _room_files(self, suffix):
+        room_dir, = os.listdir(self.directory)
+        room_dir = os.path.join(self.directory, room_dir)
+        return sorted(os.path.join(room_dir, name) for name in os.listdir(room_dir) if name.endswith(suffix))
+
+    def test_pages_walk_back_to_start(self):
+        log = self._log(segment_size=1024)
+        self._fill(log, 300)
+
+        entries, at_start = log.read("dev", 0, 100)
+        self.assertEqual([entry.seq for entry in entries], list(range(201, 301)))
+        self.assertEqual(entries[-1].text, "message 299")
+        self.assertFalse(at_start)
+
+        entries, _ = log.read("dev", entries[0].seq, 100)
+        entries, at_start = log.read("dev", entries[0].seq, 100)
+        self.assertEqual([entry.seq for entry in entries], list(range(1, 101)))
+        self.assertEqual(entries[0], HistoryEntry(1, 1_700_000_000_000, "Alice", "message 0"))
+        self.assertTrue(at_start)
+        self.assertGreater(len(self._room_files(".log")), 1)
+
+    def test_unknown_room_is_empty(self):
+        self.assertEqual(self._log().read("inconnu", 0, 10), ([], True))
+
+    def test_restart_continues_sequence(self):
+        log = self._log()
+        self._fill(log, 10)
+
+        log = self._log()
+        log.append("dev", "Bob", "après redémarrage")
+        log.flush()
+
+        entries, at_start = log.read("dev", 0, 100)
+        self.assertEqual([entry.seq for entry in entries], list(range(1, 12)))
+        self.assertEqual(entries[-1].sender, "Bob")
+        self.assertTrue(at_start)
+
+    def test_torn_tail_is_truncated(self):
+        log = self._log()
+        self._fill(log, 5)
+        segment, = self._room_files(".log")
+        with open(segment, "ab") as f:
+            f.write(b"\x00\x00\x00\x40partiel")
+
+        log = self._log()
+        self.assertEqual(len(log.read("dev", 0, 100)[0]), 5)
+        log.append("dev", "Bob", "suite")
+        log.flush()
+
+        entries, _ = log.read("dev", 0, 100)
+        self.assertEqual(entries[-1], HistoryEntry(6, 1_700_000_000_000, "Bob", "suite"))
+
+    def test_corrupted_record_is_dropped(self):
+        log = self._log()
+        self._fill(log, 3)
+        segment, = self._room_files(".log")
+        with open(segment, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"#")
+
+        entries, _ = self._log().read("dev", 0, 100)
+        self.assertEqual([entry.seq for entry in entries], [1, 2])
+
+    def test_retention_by_size_keeps_active_segment(self):
+        log = self._log(segment_size=1024, retention_bytes=2048)
+        self._fill(log, 500)
+
+        entries, at_start = log.read("dev", 0, MAX_HISTORY_COUNT)
+        self.assertEqual(entries[-1].seq, 500)
+        self.assertLessEqual(sum(os.path.getsize(path) for path in self._room_files(".log")), 2048 + 1024)
+
+        # La page la plus ancienne commence au premier message conservé
+        before = entries[0].seq
+        while not at_start:
+            entries, at_start = log.read("dev", before, MAX_HISTORY_COUNT)
+            before = entries[0].seq
+        self.assertGreater(before, 1)
+
+    def test_retention_by_age(self):
+        log = self._log(segment_size=1024, retention_seconds=3600)
+        self._fill(log, 100)
+        self.clock.now += 7200
+        self._fill(log, 1)
+
+        # Seul le segment actif reste (il contient les derniers anciens messages)
+        self.assertEqual(len(self._room_files(".log")), 1)
+        entries, at_start = log.read("dev", 0, 100)
+        self.assertGreater(entries[0].seq, 1)
+        self.assertEqual(entries[-1].seq, 101)
+        self.assertTrue(at_start)
+
+    def test_backlog_is_bounded(self):
+        log = self._log(max_pending=3)
+        results = [log.append("dev", "Alice", "x") for _ in range(5)]
+
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(log.dropped, 2)
+
+    def test_writer_thread(self):
+        log = self._log()
+        log.start()
+        log.append("dev", "Alice", "en arrière-plan")
+        log.stop()
+
+        self.assertEqual(log.read("dev", 0, 10)[0][0].text, "en arrière-plan")
+
+
+class TestHistoryRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = MessageLog(self.directory)
+        self.server = ChatServer(message_log=self.log)
+        self.alice = ClientContext(FakeSocket())
+        self.server.handle_login(self.alice, LOGIN, pack_string("Alice"))
+        self.server.handle_join(self.alice, pack_string("dev"))
+
+    def tearDown(self):
+        self.log.stop()
+        shutil.rmtree(self.directory)
+
+    def _request(self, room_name, before, count):
+        self.alice.sock.sent.clear()
+        self.server.dispatch(self.alice, HISTORY_REQUEST, encode_payload(HISTORY_REQUEST, room_name, before, count))
+        frame, = self.alice.sock.sent
+        return unpack_history_chunk(frame[5:])
+
+    def test_messages_are_logged_and_paged(self):
+        for i in range(3):
+            self.server.handle_msg(self.alice, pack_string(f"message {i}"))
+        self.log.flush()
+
+        room_name, flags, entries = self._request("dev", 0, 2)
+        self.assertEqual(room_name, "dev")
+        self.assertEqual([(entry.seq, entry.text) for entry in entries], [(2, "message 1"), (3, "message 2")])
+        self.assertFalse(flags & HISTORY_AT_START)
+
+        _, flags, entries = self._request("dev", 2, 2)
+        self.assertEqual([entry.text for entry in entries], ["message 0"])
+        self.assertTrue(flags & HISTORY_AT_START)
+
+    def test_count_is_capped(self):
+        for i in range(MAX_HISTORY_COUNT + 5):
+            self.log.append("dev", "Alice", str(i))
+        self.log.flush()
+
+        _, _, entries = self._request("dev", 0, 1000)
+        self.assertEqual(len(entries), MAX_HISTORY_COUNT)
+
+    def test_without_log_returns_empty_page(self):
+        server = ChatServer()
+        client = ClientContext(FakeSocket())
+        server.handle_login(client, LOGIN, pack_string("Bob"))
+        client.sock.sent.clear()
+        server.dispatch(client, HISTORY_REQUEST, encode_payload(HISTORY_REQUEST, "dev", 0, 10))
+
+        self.assertEqual(client.sock.sent, [pack_message(HISTORY_CHUNK, pack_history_chunk("dev", [], True))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+test_micro.py
+
+Tests des microbenchmarks : chaque benchmark s'exécute, et la comparaison
+à la référence détecte les régressions.
+"""
+
+import unittest
+from bench.micro import BENCHMARKS, CALIBRATION, compare, run_benchmarks
+
+
+class TestMicrobenchmarks(unittest.TestCase):
+
+    def test_every_benchmark_runs(self):
+        for name, setup in BENCHMARKS.items():
+            with self.subTest(name=name):
+                setup()()
+
+    def test_run_benchmarks_is_relative_to_calibration(self):
+        results = run_benchmarks(["pack_message"], repeat=1, min_time=0.001)
+
+        self.assertEqual(results[CALIBRATION]["relative"], 1.0)
+        self.assertGreater(results["pack_message"]["ns"], 0)
+
+    def test_compare_reports_regressions_only(self):
+        baseline = {
+            CALIBRATION: {"ns": 1000.0, "relative": 1.0},
+            "rapide": {"ns": 100.0, "relative": 0.1},
+            "lent": {"ns": 100.0, "relative": 0.1},
+        }
+        results = {
+            CALIBRATION: {"ns": 2000.0, "relative": 1.0},
+            "rapide": {"ns": 210.0, "relative": 0.105},
+            "lent": {"ns": 400.0, "relative": 0.2},
+            "nouveau": {"ns": 50.0, "relative": 0.05},
+        }
+
+        regressions = compare(results, baseline, threshold=1.25)
+
+        self.assertEqual([name for name, _ in regressions], ["lent"])
+        self.assertAlmostEqual(regressions[0][1], 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
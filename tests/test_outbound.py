@@ -0,0 +1,247 @@
+"""
+test_outbound.py
+
+Tests unitaires des files d'envoi par client (seuils, politiques) et de la
+diffusion vers un salon contenant un client lent.
+"""
+
+import unittest
+import socket
+import threading
+import time
+from server.server import ChatServer, ClientContext
+from server.outbound import *
+from common.protocol import *
+
+
+class TestOutboundQueue(unittest.TestCase):
+
+    def test_frames_are_taken_in_order(self):
+        queue = OutboundQueue(100, 50)
+        queue.put(b"a")
+        queue.put(b"bc")
+
+        self.assertEqual(queue.take(), [b"a", b"bc"])
+        self.assertEqual(queue.size, 3)  # Comptés jusqu'au release
+        queue.release(3)
+        self.assertEqual(queue.size, 0)
+
+    def test_drop_policy_over_high_watermark(self):
+        queue = OutboundQueue(10, 4, POLICY_DROP)
+        self.assertTrue(queue.put(b"x" * 8))
+        self.assertFalse(queue.put(b"y" * 8))
+
+        self.assertTrue(queue.congested)
+        self.assertEqual(queue.dropped, 1)
+
+    def test_congestion_ends_under_low_watermark(self):
+        queue = OutboundQueue(10, 4, POLICY_DROP)
+        queue.put(b"x" * 8)
+        queue.put(b"y" * 8)
+
+        frames = queue.take()
+        # Toujours en retard tant que l'envoi n'est pas terminé
+        self.assertFalse(queue.put(b"z"))
+        queue.release(sum(len(f) for f in frames))
+
+        self.assertFalse(queue.congested)
+        self.assertTrue(queue.put(b"z"))
+
+    def test_disconnect_policy_closes_queue(self):
+        queue = OutboundQueue(10, 4, POLICY_DISCONNECT)
+        queue.put(b"x" * 8)
+        self.assertFalse(queue.put(b"y" * 8))
+
+        self.assertTrue(queue.closed)
+        self.assertTrue(queue.overflowed)
+        self.assertFalse(queue.put(b"z"))
+
+    def test_coalesce_policy_replaces_pending_presence(self):
+        queue = OutboundQueue(10, 4, POLICY_COALESCE)
+        key = (ROOM_UPDATE, "général", "Bob")
+        queue.put(b"join", key)
+        queue.put(b"xxxxxx")
+
+        # En retard : la présence remplace celle en attente, le reste est jeté
+        self.assertTrue(queue.put(b"leave", key))
+        self.assertFalse(queue.put(b"chat"))
+
+        self.assertEqual(queue.take(), [b"leave", b"xxxxxx"])
+        self.assertEqual(queue.coalesced, 1)
+        self.assertEqual(queue.dropped, 1)
+
+    def test_closed_queue_returns_none_when_empty(self):
+        queue = OutboundQueue()
+        queue.put(b"last")
+        queue.close()
+
+        self.assertEqual(queue.take(), [b"last"])
+        self.assertIsNone(queue.take())
+
+
+class TestOutboundPriorities(unittest.TestCase):
+
+    CHUNK = bytes(FILE_CHUNK_SIZE)
+
+    def _chunk(self, transfer_id, offset=0):
+        return Frame(FILE_DATA, pack_file_data(transfer_id, offset, self.CHUNK))
+
+    def _transfers(self, frames):
+        return [unpack_file_data(frame.payload)[0] for frame in frames if isinstance(frame, Frame)]
+
+    def test_control_and_chat_overtake_file_data(self):
+        queue = OutboundQueue(1024 * 1024, 64 * 1024)
+        for i in range(3):
+            queue.put(self._chunk(1, i * FILE_CHUNK_SIZE))
+        msg = pack_message(MSG_BROADCAST, encode_payload(MSG_BROADCAST, "Alice", "salut"))
+        queue.put(msg)
+        queue.put(pack_message(PING))
+
+        # Un seul morceau par écriture, après le PING et le message
+        first = queue.take_nowait()
+        self.assertEqual(first[:2], [pack_message(PING), msg])
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(queue.take_nowait()), 1)
+
+    def test_file_end_follows_its_data(self):
+        queue = OutboundQueue(1024 * 1024, 64 * 1024)
+        queue.put(self._chunk(1))
+        end = Frame(FILE_END, encode_payload(FILE_END, 1, FILE_END_OK))
+        queue.put(end)
+
+        self.assertEqual(queue.take_nowait()[0].header[0], FILE_DATA)
+        self.assertEqual(queue.take_nowait(), [end])
+
+    def test_file_data_has_its_own_window(self):
+        queue = OutboundQueue(160 * 1024, 96 * 1024, POLICY_DROP)
+        for i in range(2):
+            queue.put(self._chunk(1, i * FILE_CHUNK_SIZE))
+
+        # La fenêtre des fichiers est pleine, le chat passe toujours
+        self.assertFalse(queue.has_room(len(self._chunk(1))))
+        self.assertTrue(queue.put(b"x" * 1000))
+        self.assertFalse(queue.congested)
+
+        drained = []
+        queue.on_drain = lambda: drained.append(queue.bulk_size)
+        frames = queue.take_nowait()
+        queue.release(sum(len(frame) for frame in frames))
+        self.assertEqual(drained, [len(self._chunk(1))])
+        self.assertTrue(queue.has_room(len(self._chunk(1))))
+
+    def test_transfers_share_by_weight(self):
+        queue = OutboundQueue(4 * 1024 * 1024, 64 * 1024)
+        for i in range(6):
+            queue.put(self._chunk(1, i * FILE_CHUNK_SIZE), weight=2)
+            queue.put(self._chunk(2, i * FILE_CHUNK_SIZE))
+
+        order = [self._transfers(queue.take_nowait()) for _ in range(6)]
+
+        self.assertEqual(order, [[1], [1], [2], [1], [1], [2]])
+
+    def test_transfers_share_bytes_not_frames(self):
+        queue = OutboundQueue(8 * 1024 * 1024, 64 * 1024)
+        # Transfert 1 en gros morceaux (poids 2), transfert 2 en petits (poids 1)
+        for i in range(60):
+            queue.put(Frame(FILE_DATA, pack_file_data(1, i * 16384, bytes(16384))), weight=2)
+        for i in range(240):
+            queue.put(Frame(FILE_DATA, pack_file_data(2, i * 4096, bytes(4096))))
+
+        sent = {1: 0, 2: 0}
+        while sum(sent.values()) < 600 * 1024:
+            for frame in queue.take_nowait():
+                sent[unpack_file_data(frame.payload)[0]] += len(frame)
+
+        # Octets au prorata des poids, à un quantum près
+        self.assertLessEqual(abs(sent[1] - 2 * sent[2]), 2 * BULK_QUANTUM)
+
+    def test_each_transfer_stays_in_order(self):
+        queue = OutboundQueue(4 * 1024 * 1024, 64 * 1024)
+        for i in range(4):
+            for transfer_id in (1, 2, 3):
+                queue.put(self._chunk(transfer_id, i * FILE_CHUNK_SIZE))
+
+        offsets = {}
+        while True:
+            frames = queue.take_nowait()
+            if not frames:
+                break
+            for frame in frames:
+                transfer_id, offset, _, _ = unpack_file_data(frame.payload)
+                offsets.setdefault(transfer_id, []).append(offset)
+
+        expected = [i * FILE_CHUNK_SIZE for i in range(4)]
+        self.assertEqual(offsets, {1: expected, 2: expected, 3: expected})
+
+
+class TestSlowClientFanout(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Deux clients dans le même salon, chacun avec sa file et son écrivain.
+        Le client « lent » ne lit jamais sa socket.
+        """
+        self.server = ChatServer(high_watermark=16 * 1024, low_watermark=4 * 1024,
+                                 slow_client_policy=POLICY_DROP)
+        self.sockets = []
+        self.fast, self.fast_peer = self._add_client("Alice")
+        self.slow, self.slow_peer = self._add_client("Bob")
+        self.server.rooms["général"] = {"Alice", "Bob"}
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+
+    def _add_client(self, pseudo):
+        srv_sock, cli_sock = socket.socketpair()
+        srv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        self.sockets += [srv_sock, cli_sock]
+
+        client = ClientContext(srv_sock)
+        client.pseudo = pseudo
+        client.state = STATE_IN_ROOM
+        client.room = "général"
+        client.outbox = self.server.create_outbox()
+        client.writer = ClientWriter(srv_sock, client.outbox)
+        client.writer.start()
+        self.server.clients[pseudo] = client
+        return client, cli_sock
+
+    def test_slow_member_does_not_block_room(self):
+        message = "x" * 1000
+        count = 500
+
+        # Le client rapide lit en continu
+        received = []
+        def read_fast():
+            decoder = FrameDecoder()
+            self.fast_peer.settimeout(5)
+            while len(received) < count:
+                frame = recv_frame(self.fast_peer, decoder)
+                if frame is None:
+                    break
+                received.append(frame[0])
+
+        reader = threading.Thread(target=read_fast)
+        reader.start()
+
+        start = time.monotonic()
+        for _ in range(count):
+            self.server.handle_msg(self.fast, pack_string(message))
+            time.sleep(0.0005)
+        elapsed = time.monotonic() - start
+        reader.join(timeout=5)
+
+        # La diffusion n'a jamais attendu le client lent
+        self.assertLess(elapsed, 3.0)
+
+        # Le client rapide reçoit tout
+        self.assertEqual(received, [MSG_BROADCAST] * count)
+
+        # Le client lent a perdu des trames au lieu de bloquer les autres
+        self.assertGreater(self.slow.outbox.dropped, 0)
+        self.assertLessEqual(self.slow.outbox.size, 16 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
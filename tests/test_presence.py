@@ -0,0 +1,154 @@
+"""
+test_presence.py
+
+Tests unitaires de l'agrégation des présences (ROOM_UPDATE_BATCH)
+et de la négociation des capacités au LOGIN.
+"""
+
+import unittest
+import socket
+import threading
+from server.server import ChatServer, ClientContext
+from server.presence import PresenceAggregator
+from client.client import login
+from common.protocol import *
+from tests.utils import FakeSocket
+
+
+class TestPresenceAggregator(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Préparation :
+        - Alice annonce CAP_PRESENCE_BATCH
+        - Bob est un client d'origine
+        """
+        self.server = ChatServer()
+        self.aggregator = PresenceAggregator(self.server)
+        self.sockets = []
+        self.alice = self._add_client("Alice", CAP_PRESENCE_BATCH)
+        self.bob = self._add_client("Bob", 0)
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+
+    def _add_client(self, pseudo, capabilities):
+        srv_sock, cli_sock = socket.socketpair()
+        cli_sock.settimeout(1.0)
+        self.sockets += [srv_sock, cli_sock]
+        client = ClientContext(srv_sock)
+        client.pseudo = pseudo
+        client.state = STATE_AUTHENTICATED
+        client.capabilities = capabilities
+        self.server.clients[pseudo] = client
+        return cli_sock
+
+    def _read_frames(self, sock, count):
+        decoder = FrameDecoder()
+        return [recv_frame(sock, decoder) for _ in range(count)]
+
+    def test_batch_for_capable_client(self):
+        self.aggregator.add("dev", "Charlie", "join")
+        self.aggregator.add("dev", "Dave", "join")
+        self.aggregator.flush()
+
+        msg_type, payload = self._read_frames(self.alice, 1)[0]
+
+        self.assertEqual(msg_type, ROOM_UPDATE_BATCH)
+        self.assertEqual(unpack_room_update_batch(payload), [
+            ("dev", "Charlie", "join"),
+            ("dev", "Dave", "join"),
+        ])
+
+    def test_legacy_client_gets_single_updates(self):
+        self.aggregator.add("dev", "Charlie", "join")
+        self.aggregator.add("dev", "Dave", "join")
+        self.aggregator.flush()
+
+        frames = self._read_frames(self.bob, 2)
+
+        self.assertEqual([t for t, _ in frames], [ROOM_UPDATE, ROOM_UPDATE])
+        self.assertEqual(
+            frames[1][1],
+            pack_string("dev") + pack_string("Dave") + pack_string("join")
+        )
+
+    def test_last_change_per_member_wins(self):
+        self.aggregator.add("dev", "Charlie", "join")
+        self.aggregator.add("dev", "Charlie", "leave")
+        self.aggregator.add("dev", "Dave", "join")
+        self.aggregator.flush()
+
+        msg_type, payload = self._read_frames(self.alice, 1)[0]
+
+        self.assertEqual(unpack_room_update_batch(payload), [("dev", "Charlie", "leave"), ("dev", "Dave", "join")])
+
+    def test_leave_after_snapshot_is_not_lost(self):
+        """Un membre vu dans un ROOM_SNAPSHOT puis parti dans le même tick."""
+        self.server.presence = self.aggregator
+        x, j = ClientContext(FakeSocket()), ClientContext(FakeSocket())
+        self.server.handle_login(x, LOGIN, pack_login("X", 0))
+        self.server.handle_join(x, pack_string("R"))
+        self.server.handle_login(j, LOGIN, pack_login("J", CAP_PRESENCE_BATCH | CAP_ROOM_SNAPSHOT))
+        self.server.handle_join(j, pack_string("R"))
+        self.server.handle_leave(x)
+        j.sock.sent.clear()
+
+        self.aggregator.flush()
+
+        decoder = FrameDecoder()
+        for data in j.sock.sent:
+            decoder.feed(bytes(data))
+        (msg_type, payload), = list(decoder)
+        self.assertIn(("R", "X", "leave"), unpack_room_update_batch(payload))
+
+    def test_nothing_sent_when_idle(self):
+        self.aggregator.flush()
+
+        self.alice.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            self.alice.recv(1)
+
+    def test_server_defers_updates_to_aggregator(self):
+        self.server.presence = self.aggregator
+
+        self.server._broadcast_room_update("dev", "Charlie", "join")
+        self.alice.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            self.alice.recv(1)
+
+        self.alice.setblocking(True)
+        self.aggregator.flush()
+        self.assertEqual(self._read_frames(self.alice, 1)[0][0], ROOM_UPDATE_BATCH)
+
+
+class TestCapabilityNegotiation(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ChatServer()
+        self.srv_sock, self.cli_sock = socket.socketpair()
+        self.thread = threading.Thread(target=self.server.handle_client, args=(self.srv_sock,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.cli_sock.close()
+        self.thread.join()
+        self.srv_sock.close()
+
+    def test_legacy_login_ok_is_empty(self):
+        msg_type, payload = login(self.cli_sock, "Alice")
+
+        self.assertEqual(msg_type, LOGIN_OK)
+        self.assertEqual(payload, b"")
+
+    def test_login_ok_echoes_supported_capabilities(self):
+        msg_type, payload = login(self.cli_sock, "Alice", CAP_PRESENCE_BATCH | 0x8000)
+
+        self.assertEqual(msg_type, LOGIN_OK)
+        self.assertEqual(unpack_int(payload), CAP_PRESENCE_BATCH)
+        self.assertEqual(self.server.clients["Alice"].capabilities, CAP_PRESENCE_BATCH)
+
+
+if __name__ == "__main__":
+    unittest.main()
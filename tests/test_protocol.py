@@ -0,0 +1,271 @@
+"""
+test_protocol.py
+
+Tests unitaires du décodage de trames (FrameDecoder) : lectures TCP
+partielles ou regroupant plusieurs trames, trames trop grandes.
+"""
+
+import unittest
+import socket
+import threading
+import zlib
+from common.protocol import *
+from server.server import ChatServer
+from tests.utils import FakeSocket
+
+
+class TestFrameDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.frames = [
+            (LOGIN, pack_string("Alice")),
+            (JOIN_OK, b""),
+            (MSG_BROADCAST, pack_string("Bob") + pack_string("Salut !")),
+        ]
+        self.stream = b"".join(pack_message(t, p) for t, p in self.frames)
+
+    def test_single_frame(self):
+        decoder = FrameDecoder()
+        decoder.feed(pack_message(LOGIN, pack_string("Alice")))
+
+        self.assertEqual(list(decoder), [(LOGIN, pack_string("Alice"))])
+        self.assertEqual(decoder.pending(), 0)
+
+    def test_coalesced_frames(self):
+        """Plusieurs trames reçues dans un seul recv."""
+        decoder = FrameDecoder()
+        decoder.feed(self.stream)
+
+        self.assertEqual(list(decoder), self.frames)
+
+    def test_byte_by_byte(self):
+        """Trames découpées octet par octet."""
+        decoder = FrameDecoder()
+        received = []
+        for i in range(len(self.stream)):
+            decoder.feed(self.stream[i:i + 1])
+            received.extend(decoder)
+
+        self.assertEqual(received, self.frames)
+        self.assertEqual(decoder.pending(), 0)
+
+    def test_partial_payload_is_kept(self):
+        """Une trame incomplète n'est restituée qu'une fois complète."""
+        message = pack_message(MSG, pack_string("Bonjour"))
+        decoder = FrameDecoder()
+
+        decoder.feed(message[:7])
+        self.assertIsNone(decoder.next_frame())
+        self.assertEqual(decoder.pending(), 7)
+
+        decoder.feed(message[7:])
+        self.assertEqual(decoder.next_frame(), (MSG, pack_string("Bonjour")))
+
+    def test_oversized_frame_rejected_on_header(self):
+        """Une trame trop grande est refusée dès son en-tête, sans attendre le payload."""
+        decoder = FrameDecoder()
+        decoder.feed(pack_message(FILE_DATA, pack_file_data(1, 0, bytes(FILE_CHUNK_SIZE))))
+        self.assertEqual(decoder.next_frame()[0], FILE_DATA)  # Morceau plein : accepté
+
+        decoder.feed(bytes([MSG]) + (0xFFFFFFF0).to_bytes(4, "big"))
+        with self.assertRaises(ValueError):
+            decoder.next_frame()
+
+        unbounded = FrameDecoder(max_frame=None)
+        unbounded.feed(pack_message(DIRECTORY, bytes(MAX_FRAME_SIZE)))
+        self.assertEqual(unbounded.next_frame(), (DIRECTORY, bytes(MAX_FRAME_SIZE)))
+
+    def test_server_closes_connection_on_oversized_frame(self):
+        sock = FakeSocket()
+        sock.to_recv = [bytes([LOGIN]) + (0xFFFFFFF0).to_bytes(4, "big"), bytes(RECV_BUFFER_SIZE)]
+
+        ChatServer().handle_client(sock)
+
+        # Rien de plus n'est lu ni gardé après l'en-tête
+        self.assertEqual(len(sock.to_recv), 1)
+
+    def test_recv_frame_keeps_extra_bytes(self):
+        """Les trames lues en trop restent disponibles pour l'appel suivant."""
+        srv_sock, cli_sock = socket.socketpair()
+        try:
+            srv_sock.sendall(self.stream)
+            decoder = FrameDecoder()
+
+            received = [recv_frame(cli_sock, decoder) for _ in self.frames]
+            self.assertEqual(received, self.frames)
+
+            srv_sock.close()
+            self.assertIsNone(recv_frame(cli_sock, decoder))
+        finally:
+            cli_sock.close()
+
+
+class TestPayloadCodecs(unittest.TestCase):
+
+    def test_login_without_capabilities(self):
+        self.assertEqual(pack_login("Alice"), pack_string("Alice"))
+        self.assertEqual(unpack_login(pack_string("Alice")), ("Alice", None))
+
+    def test_login_with_capabilities(self):
+        payload = pack_login("Élodie", CAP_PRESENCE_BATCH)
+
+        self.assertEqual(unpack_login(payload), ("Élodie", CAP_PRESENCE_BATCH))
+
+    def test_room_update_batch_roundtrip(self):
+        updates = [("général", "Alice", "join"), ("dev", "Bob", "leave")]
+
+        self.assertEqual(unpack_room_update_batch(pack_room_update_batch(updates)), updates)
+
+    def test_schema_codec_matches_hand_encoding(self):
+        payload = pack_string("général") + pack_string("Élodie") + pack_string("join")
+
+        self.assertEqual(encode_payload(ROOM_UPDATE, "général", "Élodie", "join"), payload)
+        update = decode_payload(ROOM_UPDATE, payload)
+        self.assertEqual((update.room, update.user, update.action), ("général", "Élodie", "join"))
+
+    def test_schema_codec_mixed_fields(self):
+        payload = encode_payload(FILE_REQUEST, 7, "Alice", "morceau é.wav", 123456, "")
+
+        self.assertEqual(payload, pack_int(7) + pack_string("Alice") + pack_string("morceau é.wav") + pack_int(123456)
+                         + pack_string(""))
+        self.assertEqual(tuple(decode_payload(FILE_REQUEST, payload)), (7, "Alice", "morceau é.wav", 123456, ""))
+
+        error = decode_payload(ERROR, bytes([0x06]) + pack_string("Action non autorisée"))
+        self.assertEqual((error.code, error.message), (0x06, "Action non autorisée"))
+
+    def test_encode_message(self):
+        self.assertEqual(encode_message(MSG, "Salut"), pack_message(MSG, pack_string("Salut")))
+
+    def test_room_snapshot_single_fragment(self):
+        payloads = pack_room_snapshot("dev", ["Alice", "Bob"])
+
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(unpack_room_snapshot(payloads[0]),
+                         ("dev", SNAPSHOT_FIRST | SNAPSHOT_LAST, ["Alice", "Bob"]))
+
+    def test_room_snapshot_empty_room(self):
+        payloads = pack_room_snapshot("dev", [])
+
+        self.assertEqual(unpack_room_snapshot(payloads[0]),
+                         ("dev", SNAPSHOT_FIRST | SNAPSHOT_LAST, []))
+
+    def test_room_snapshot_is_chunked(self):
+        members = [f"utilisateur_{i:05d}" for i in range(5000)]
+        payloads = pack_room_snapshot("général", members, max_payload=4096)
+
+        self.assertGreater(len(payloads), 1)
+        decoded = [unpack_room_snapshot(p) for p in payloads]
+        self.assertTrue(all(len(p) <= 4096 for p in payloads))
+        self.assertEqual(decoded[0][1], SNAPSHOT_FIRST)
+        self.assertEqual(decoded[-1][1], SNAPSHOT_LAST)
+        self.assertEqual([m for _, _, chunk in decoded for m in chunk], members)
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_roundtrip(self):
+        payload = encode_payload(MSG_BROADCAST, "Élodie", "Bonjour à tous, merci pour le fichier audio ! " * 3)
+        packed = pack_compressed(MSG_BROADCAST, payload)
+
+        self.assertLess(len(packed), len(payload))
+        self.assertEqual(unpack_compressed(packed), (MSG_BROADCAST, payload))
+
+    def test_small_or_incompressible_payload_stays_raw(self):
+        self.assertIsNone(pack_compressed(MSG_BROADCAST, encode_payload(MSG_BROADCAST, "Bob", "Salut")))
+        self.assertIsNone(pack_compressed(MSG_BROADCAST, bytes(range(256))))
+
+    def test_decoder_inflates_only_when_asked(self):
+        payload = pack_room_update_batch([("général", f"utilisateur_{i}", "join") for i in range(20)])
+        frame = pack_message(COMPRESSED, pack_compressed(ROOM_UPDATE_BATCH, payload))
+
+        inflating = FrameDecoder(inflate=True)
+        inflating.feed(frame)
+        self.assertEqual(list(inflating), [(ROOM_UPDATE_BATCH, payload)])
+
+        raw = FrameDecoder()
+        raw.feed(frame)
+        self.assertEqual(next(iter(raw))[0], COMPRESSED)
+
+    def test_decompression_is_bounded(self):
+        """Une trame qui se décompresse au-delà de la limite est refusée."""
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=COMPRESSION_DICTIONARY)
+        bomb = bytes([MSG_BROADCAST]) + compressor.compress(bytes(MAX_DECOMPRESSED_PAYLOAD + 1)) + compressor.flush()
+
+        with self.assertRaises(ValueError):
+            unpack_compressed(bomb)
+        with self.assertRaises(ValueError):
+            unpack_compressed(bytes([MSG_BROADCAST]) + b"pas du deflate")
+
+    def test_shared_frame_depends_on_capabilities(self):
+        payload = encode_payload(MSG_BROADCAST, "Alice", "a" * 300)
+        shared = SharedFrame(MSG_BROADCAST, payload)
+
+        self.assertEqual(bytes(shared.for_capabilities(0)), pack_message(MSG_BROADCAST, payload))
+        compressed = shared.for_capabilities(CAP_COMPRESSION)
+        self.assertIs(shared.for_capabilities(CAP_COMPRESSION | CAP_DIRECTORY), compressed)
+        self.assertEqual(compressed.header[0], COMPRESSED)
+
+
+class TestSendFrames(unittest.TestCase):
+
+    def test_frame_matches_pack_message(self):
+        payload = pack_string("Bob") + pack_string("Salut !")
+
+        self.assertEqual(bytes(Frame(MSG_BROADCAST, payload)), pack_message(MSG_BROADCAST, payload))
+        self.assertEqual(len(Frame(MSG_BROADCAST, payload)), len(pack_message(MSG_BROADCAST, payload)))
+        self.assertEqual(bytes(Frame(LEAVE)), pack_message(LEAVE))
+
+    def test_vectored_send_mixed_frames(self):
+        """Trames Frame et bytes envoyées ensemble, payload en memoryview."""
+        payload = bytearray(b"x" * 100)
+        frames = [Frame(MSG, memoryview(payload)), pack_message(LEAVE), Frame(JOIN_OK)]
+        srv_sock, cli_sock = socket.socketpair()
+        try:
+            send_frames(srv_sock, frames)
+            srv_sock.close()
+
+            decoder = FrameDecoder()
+            received = []
+            frame = recv_frame(cli_sock, decoder)
+            while frame is not None:
+                received.append(frame)
+                frame = recv_frame(cli_sock, decoder)
+        finally:
+            cli_sock.close()
+
+        self.assertEqual(received, [(MSG, bytes(payload)), (LEAVE, b""), (JOIN_OK, b"")])
+
+    def test_partial_sends_are_completed(self):
+        """Un payload plus gros que le tampon socket part en plusieurs sendmsg."""
+        payload = bytes(range(256)) * 16384  # 4 Mio
+        srv_sock, cli_sock = socket.socketpair()
+        received = bytearray()
+
+        def reader():
+            while True:
+                data = cli_sock.recv(RECV_BUFFER_SIZE)
+                if not data:
+                    break
+                received.extend(data)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        try:
+            send_frames(srv_sock, [Frame(MSG, payload), Frame(LEAVE)])
+        finally:
+            srv_sock.close()
+            thread.join()
+            cli_sock.close()
+
+        self.assertEqual(bytes(received), pack_message(MSG, payload) + pack_message(LEAVE))
+
+    def test_fallback_without_sendmsg(self):
+        """Sans sendmsg, chaque trame part entière avec sendall."""
+        sock = FakeSocket()
+        send_frames(sock, [Frame(MSG, pack_string("a")), pack_message(LEAVE)])
+
+        self.assertEqual(sock.sent, [pack_message(MSG, pack_string("a")), pack_message(LEAVE)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+test_reconnect.py
+
+Tests de la reconnexion automatique du client (NetworkManager) : délais
+étalés, reprise de session, nouveau LOGIN avec retour dans le channel,
+messages gardés pendant la coupure et abandon après les tentatives.
+"""
+
+import random
+import socket
+import threading
+import time
+import unittest
+from server.server import ChatServer
+from client.client import login, join_room, send_message, receive_broadcast
+from client.network.connection import NetworkManager
+from common.protocol import *
+
+
+class TestReconnectDelay(unittest.TestCase):
+
+    def test_first_attempt_spread_over_window(self):
+        network = NetworkManager(None, None, reconnect_window=20.0, rng=random.Random(1))
+        delays = [network.next_delay(1) for _ in range(1000)]
+
+        self.assertTrue(all(0 <= delay <= 20.0 for delay in delays))
+        # Les tentatives couvrent toute la fenêtre
+        self.assertLess(min(delays), 1.0)
+        self.assertGreater(max(delays), 19.0)
+
+    def test_later_attempts_back_off_up_to_cap(self):
+        network = NetworkManager(None, None, reconnect_delay=1.0, reconnect_max_delay=8.0,
+                                 rng=random.Random(1))
+
+        for attempt, ceiling in ((2, 1.0), (3, 2.0), (4, 4.0), (5, 8.0), (12, 8.0)):
+            delays = [network.next_delay(attempt) for _ in range(200)]
+            self.assertLessEqual(max(delays), ceiling)
+            self.assertGreater(max(delays), ceiling * 0.9)
+
+
+class TestReconnect(unittest.TestCase):
+    """Un NetworkManager connecté au moteur à threads sur une vraie socket TCP locale."""
+
+    def setUp(self):
+        self.server = ChatServer(resume_grace=30.0)
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+        self.received = []
+        self.reconnected = threading.Event()
+        self.resumed = None
+        self.disconnected = threading.Event()
+        self.network = NetworkManager(
+            self._on_message, self.disconnected.set,
+            on_reconnected_callback=self._on_reconnected,
+            reconnect_window=0, reconnect_delay=0.05, reconnect_attempts=3,
+        )
+        self.sockets = []
+
+    def tearDown(self):
+        self.network.disconnect()
+        self._stop_listening()
+        for sock in self.sockets:
+            sock.close()
+        self.server.sessions.stop()
+
+    def _stop_listening(self):
+        # shutdown réveille accept() bloqué dans le thread d'écoute
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.server.handle_client, args=(sock,), daemon=True).start()
+
+    def _on_message(self, msg_type, payload):
+        self.received.append((msg_type, payload))
+
+    def _on_reconnected(self, resumed):
+        self.resumed = resumed
+        self.reconnected.set()
+
+    def _connect(self, pseudo="Alice"):
+        self.assertEqual(self.network.connect("127.0.0.1", self.port, pseudo), (True, None))
+        self.network.start_receive_loop()
+        self.network.send_join("dev")
+        self._wait_for(lambda: self.network.current_room == "dev")
+
+    def _bob(self):
+        """Un second membre du channel, client brut."""
+        sock = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+        self.sockets.append(sock)
+        login(sock, "Bob")
+        join_room(sock, "dev")
+        return sock
+
+    def _next_message(self, sock):
+        """Prochain message d'un membre reçu sur une socket brute (présences ignorées)."""
+        while True:
+            received = receive_broadcast(sock)
+            if len(received) == 2 and received[0] != "Serveur":
+                return received
+
+    def _wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("condition non atteinte")
+
+    def _broadcasts(self):
+        return [decode_payload(MSG_BROADCAST, payload).text
+                for msg_type, payload in self.received if msg_type == MSG_BROADCAST]
+
+    def test_session_resumed_after_connection_loss(self):
+        self._connect()
+        bob = self._bob()
+
+        self.network.sock.shutdown(socket.SHUT_RDWR)
+        self.assertTrue(self.reconnected.wait(5))
+
+        self.assertTrue(self.resumed)
+        send_message(bob, "toujours là ?")
+        self._wait_for(lambda: "toujours là ?" in self._broadcasts())
+        self.assertEqual(sorted(self.server.room_members("dev")), ["Alice", "Bob"])
+
+    def test_room_rejoined_when_session_lost(self):
+        self._connect()
+
+        # Le serveur oublie la session avant que le client ne voie la coupure
+        self.server.kick_client("Alice")
+        self.network.sock.shutdown(socket.SHUT_RDWR)
+        self.assertTrue(self.reconnected.wait(5))
+
+        self.assertFalse(self.resumed)
+        self._wait_for(lambda: self.network.current_room == "dev")
+        self.assertIn("Alice", self.server.room_members("dev"))
+
+    def test_messages_sent_while_disconnected_are_delivered(self):
+        self.network.on_reconnecting = lambda attempt, delay: self.network.send_message("pendant la coupure")
+        self._connect()
+        bob = self._bob()
+
+        self.network.sock.shutdown(socket.SHUT_RDWR)
+        self.assertTrue(self.reconnected.wait(5))
+
+        self.assertEqual(self._next_message(bob), ("Alice", "pendant la coupure"))
+
+    def test_gives_up_after_attempts(self):
+        self._connect()
+
+        self._stop_listening()
+        self.network.sock.shutdown(socket.SHUT_RDWR)
+
+        self.assertTrue(self.disconnected.wait(5))
+        self.assertFalse(self.network.connected)
+        self.assertFalse(self.reconnected.is_set())
+
+    def test_disconnect_does_not_reconnect(self):
+        self._connect()
+
+        self.network.disconnect()
+        time.sleep(0.2)
+
+        self.assertFalse(self.reconnected.is_set())
+        self.assertFalse(self.disconnected.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -122,5 +122,24 @@ class TestRoom(unittest.TestCase):
         self.assertNotIn("temp_room", self.server.rooms)
 
 
+    def test_join_sends_single_snapshot(self):
+        """Un client CAP_ROOM_SNAPSHOT reçoit la liste des membres en une trame."""
+        
+        self.server.rooms["général"] = {f"user{i}" for i in range(500)}
+        self.client.capabilities = CAP_ROOM_SNAPSHOT
+        
+        self.server.handle_join(self.client, pack_string("général"))
+        
+        decoder = FrameDecoder()
+        self.assertEqual(recv_frame(self.cli_sock, decoder)[0], JOIN_OK)
+        msg_type, payload = recv_frame(self.cli_sock, decoder)
+        
+        self.assertEqual(msg_type, ROOM_SNAPSHOT)
+        room_name, flags, members = unpack_room_snapshot(payload)
+        self.assertEqual(room_name, "général")
+        self.assertEqual(flags, SNAPSHOT_FIRST | SNAPSHOT_LAST)
+        self.assertEqual(set(members), self.server.rooms["général"])
+
+
 if __name__ == "__main__":
     unittest.main()
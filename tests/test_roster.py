@@ -0,0 +1,60 @@
+"""
+test_roster.py
+
+Tests unitaires des membres et du nombre de membres des rooms côté client
+(RoomRoster) : annuaire, ROOM_SNAPSHOT et ROOM_UPDATE.
+"""
+
+import unittest
+from client.roster import RoomRoster
+from common.protocol import *
+
+
+class TestRoomRoster(unittest.TestCase):
+
+    def setUp(self):
+        self.roster = RoomRoster()
+        self.roster.set_counts({"général": 2, "dev": 1})
+
+    def test_counts_follow_updates(self):
+        self.roster.apply_update("dev", "Alice", "join")
+        self.roster.apply_update("général", "Bob", "leave")
+        self.roster.apply_update("musique", "Charlie", "join")
+
+        self.assertEqual(self.roster.counts, {"général": 1, "dev": 2, "musique": 1})
+
+    def test_snapshot_resets_count(self):
+        self.roster.apply_update("général", "Alice", "join")
+
+        self.assertFalse(self.roster.apply_snapshot("général", SNAPSHOT_FIRST, ["Bob"]))
+        self.assertTrue(self.roster.apply_snapshot("général", SNAPSHOT_LAST, ["Charlie", "Dave", "Erin"]))
+
+        self.assertEqual(self.roster.members["général"], {"Bob", "Charlie", "Dave", "Erin"})
+        self.assertEqual(self.roster.counts["général"], 4)
+
+        self.roster.apply_snapshot("général", SNAPSHOT_FIRST | SNAPSHOT_LAST, [])
+        self.assertNotIn("général", self.roster.counts)
+
+    def test_known_changes_counted_once(self):
+        self.roster.apply_snapshot("général", SNAPSHOT_FIRST | SNAPSHOT_LAST, ["Alice", "Bob"])
+
+        self.assertFalse(self.roster.apply_update("général", "Alice", "join"))   # Déjà dans la liste
+        self.assertFalse(self.roster.apply_update("général", "Charlie", "leave"))  # Jamais vu
+        self.assertEqual(self.roster.counts["général"], 2)
+
+        self.assertTrue(self.roster.apply_update("général", "Bob", "leave"))
+        self.assertFalse(self.roster.apply_update("général", "Bob", "leave"))
+        self.assertEqual(self.roster.counts["général"], 1)
+
+    def test_directory_replaces_counts(self):
+        self.roster.apply_snapshot("général", SNAPSHOT_FIRST | SNAPSHOT_LAST, ["Alice"])
+
+        self.roster.set_counts({"général": 3})
+
+        # Liste peut-être incomplète (reprise de session) : le nombre suit les ROOM_UPDATE
+        self.roster.apply_update("général", "Bob", "leave")
+        self.assertEqual(self.roster.counts, {"général": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
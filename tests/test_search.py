@@ -0,0 +1,147 @@
+"""
+test_search.py
+
+Tests unitaires de la recherche plein texte (SearchIndex) : normalisation
+des mots, postings compressés, classement, pagination, mémoire bornée et
+requêtes SEARCH.
+"""
+
+import unittest
+from server.server import ChatServer, ClientContext
+from server.search import SearchIndex, Postings, decode_postings, fold, tokenize
+from common.protocol import *
+from tests.utils import FakeSocket
+
+
+class TestTokenize(unittest.TestCase):
+
+    def test_accents_and_case_are_folded(self):
+        self.assertEqual(fold("Été À Noël, cœur"), "ete a noel, coeur")
+
+    def test_stop_words_and_short_tokens_dropped(self):
+        self.assertEqual(tokenize("L'école de la République est fermée"),
+                         ["ecole", "republique", "fermee"])
+
+
+class TestPostings(unittest.TestCase):
+
+    def test_roundtrip_and_compression(self):
+        postings = Postings()
+        for doc_id in range(1000, 2000, 3):
+            postings.add(doc_id, 1)
+
+        self.assertEqual(decode_postings(postings.data), {doc_id: 1 for doc_id in range(1000, 2000, 3)})
+        # Écarts de 3 et une occurrence : 2 octets par message (sauf le premier)
+        self.assertLessEqual(len(postings.data), 2 * postings.count + 2)
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SearchIndex(clock=lambda: 1_700_000_000.0)
+
+    def _add(self, *messages, room_name="dev"):
+        for sender, text in messages:
+            self.index.add(room_name, sender, text)
+        self.index.flush()
+
+    def test_all_words_must_match(self):
+        self._add(("Alice", "Le déploiement est prévu demain"),
+                  ("Bob", "Demain je suis absent"),
+                  ("Alice", "Déploiement terminé"))
+
+        total, entries = self.index.search("dev", "deploiement demain")
+        self.assertEqual(total, 1)
+        self.assertEqual(entries, [HistoryEntry(1, 1_700_000_000_000, "Alice", "Le déploiement est prévu demain")])
+
+    def test_ranked_by_occurrences_then_recency(self):
+        self._add(("Alice", "café"), ("Bob", "café café"), ("Charlie", "un café"))
+
+        _, entries = self.index.search("dev", "CAFE")
+        self.assertEqual([entry.sender for entry in entries], ["Bob", "Charlie", "Alice"])
+
+    def test_pagination(self):
+        self._add(*[("Alice", f"réunion {i}") for i in range(25)])
+
+        total, first = self.index.search("dev", "reunion", 0, 10)
+        _, last = self.index.search("dev", "reunion", 20, 10)
+        self.assertEqual(total, 25)
+        self.assertEqual([entry.text for entry in first[:2]], ["réunion 24", "réunion 23"])
+        self.assertEqual(len(last), 5)
+
+    def test_rooms_are_separate(self):
+        self._add(("Alice", "secret"), room_name="privé")
+
+        self.assertEqual(self.index.search("dev", "secret"), (0, []))
+        self.assertEqual(self.index.search("privé", "secret")[0], 1)
+
+    def test_empty_query(self):
+        self._add(("Alice", "Salut"))
+
+        self.assertEqual(self.index.search("dev", "le la de"), (0, []))
+
+    def test_oldest_messages_forgotten_and_compacted(self):
+        self.index = SearchIndex(max_documents=10)
+        self._add(*[("Alice", f"bonjour message{i}") for i in range(35)])
+
+        total, entries = self.index.search("dev", "bonjour", 0, 50)
+        self.assertEqual(total, 10)
+        self.assertEqual(entries[-1].text, "bonjour message25")
+        self.assertEqual(len(self.index), 10)
+        self.assertNotIn("message0", self.index._rooms["dev"])
+
+    def test_background_worker(self):
+        self.index.start()
+        self.index.add("dev", "Alice", "indexé en arrière-plan")
+        self.index.stop()
+
+        self.assertEqual(self.index.search("dev", "arriere")[0], 1)
+
+
+class TestSearchRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SearchIndex()
+        self.server = ChatServer(search=self.index)
+        self.alice = ClientContext(FakeSocket())
+        self.server.handle_login(self.alice, LOGIN, pack_string("Alice"))
+        self.server.handle_join(self.alice, pack_string("dev"))
+
+    def tearDown(self):
+        self.index.stop()
+
+    def _search(self, server, client, query, offset=0, count=10):
+        client.sock.sent.clear()
+        server.dispatch(client, SEARCH, encode_payload(SEARCH, "dev", query, offset, count))
+        frame, = client.sock.sent
+        self.assertEqual(frame[0], SEARCH_RESULTS)
+        return unpack_search_results(frame[5:])
+
+    def test_broadcast_messages_are_searchable(self):
+        self.server.handle_msg(self.alice, pack_string("Rendez-vous à l'hôpital"))
+        self.server.handle_msg(self.alice, pack_string("Autre chose"))
+        self.index.flush()
+
+        room_name, query, total, offset, entries = self._search(self.server, self.alice, "hopital")
+        self.assertEqual((room_name, query, total, offset), ("dev", "hopital", 1, 0))
+        self.assertEqual(entries[0].text, "Rendez-vous à l'hôpital")
+
+    def test_count_is_capped(self):
+        for i in range(MAX_SEARCH_RESULTS + 5):
+            self.index.add("dev", "Alice", f"ticket {i}")
+        self.index.flush()
+
+        _, _, total, _, entries = self._search(self.server, self.alice, "ticket", count=1000)
+        self.assertEqual(total, MAX_SEARCH_RESULTS + 5)
+        self.assertEqual(len(entries), MAX_SEARCH_RESULTS)
+
+    def test_without_index_returns_empty_page(self):
+        server = ChatServer()
+        client = ClientContext(FakeSocket())
+        server.handle_login(client, LOGIN, pack_string("Bob"))
+
+        self.assertEqual(self._search(server, client, "hopital"), ("dev", "hopital", 0, 0, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+test_sessions.py
+
+Tests unitaires de la reprise de session (CAP_RESUME) : jeton dans
+LOGIN_OK, session détachée sans présence diffusée, rejeu des seuls
+messages manqués, expiration du délai de grâce et reprise d'une
+connexion que le serveur croit encore ouverte.
+"""
+
+import collections
+import unittest
+import socket
+import threading
+from server.server import ChatServer, ClientContext
+from common.protocol import *
+from tests.utils import FakeSocket, frames, login_client
+
+
+class TestSessionResume(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ChatServer(resume_grace=30.0)
+        self.alice = login_client(self.server, "Alice", CAP_RESUME)
+        self.bob = login_client(self.server, "Bob", 0)
+        for client in (self.alice, self.bob):
+            self.server.handle_join(client, pack_string("dev"))
+        for client in (self.alice, self.bob):
+            client.sock.sent.clear()
+
+    def tearDown(self):
+        self.server.sessions.stop()
+
+    def _resume(self, token, last_seq):
+        client = ClientContext(FakeSocket())
+        return client, self.server.resume(client, pack_resume(token, last_seq))
+
+    def test_login_ok_carries_token(self):
+        client = ClientContext(FakeSocket())
+        self.server.handle_login(client, LOGIN, pack_login("Charlie", CAP_RESUME))
+
+        (msg_type, payload), = frames(client.sock)
+        self.assertEqual(unpack_login_ok(payload), (CAP_RESUME, client.session))
+        self.assertEqual(len(client.session), SESSION_TOKEN_LEN)
+
+    def test_resume_not_granted_without_grace(self):
+        server = ChatServer()
+        client = ClientContext(FakeSocket())
+        server.handle_login(client, LOGIN, pack_login("Charlie", CAP_RESUME))
+
+        self.assertEqual(unpack_login_ok(frames(client.sock)[0][1]), (0, None))
+
+    def test_messages_carry_room_sequence(self):
+        self.server.handle_msg(self.bob, pack_string("Salut"))
+
+        self.assertEqual(frames(self.alice.sock),
+                         [(MSG_BROADCAST_SEQ, encode_payload(MSG_BROADCAST_SEQ, 3, "Bob", "Salut"))])
+        self.assertEqual(frames(self.bob.sock),
+                         [(MSG_BROADCAST, encode_payload(MSG_BROADCAST, "Bob", "Salut"))])
+
+    def test_disconnect_detaches_silently(self):
+        self.server.disconnect(self.alice)
+
+        self.assertEqual(self.bob.sock.sent, [])
+        self.assertIn("Alice", self.server.room_members("dev"))
+        self.assertTrue(self.server.sessions.is_detached(self.alice))
+
+    def test_resume_replays_only_missed_messages(self):
+        self.server.handle_msg(self.bob, pack_string("reçu"))
+        last_seq = decode_payload(MSG_BROADCAST_SEQ, frames(self.alice.sock)[-1][1]).seq
+        self.server.disconnect(self.alice)
+        self.server.handle_msg(self.bob, pack_string("manqué 1"))
+        self.server.handle_msg(self.bob, pack_string("manqué 2"))
+
+        connection, resumed = self._resume(self.alice.session, last_seq)
+
+        self.assertIs(resumed, self.alice)
+        self.assertIs(resumed.sock, connection.sock)
+        received = frames(connection.sock)
+        self.assertEqual(received[0], (RESUME_OK, encode_payload(RESUME_OK, 0)))
+        self.assertEqual([decode_payload(MSG_BROADCAST_SEQ, payload).text for _, payload in received[1:]],
+                         ["manqué 1", "manqué 2"])
+
+        # Ni départ ni arrivée pour les autres membres
+        self.assertEqual([msg_type for msg_type, _ in frames(self.bob.sock)], [MSG_BROADCAST] * 3)
+
+        # Les messages suivants arrivent sur la nouvelle connexion
+        self.server.handle_msg(self.bob, pack_string("en direct"))
+        self.assertEqual(decode_payload(MSG_BROADCAST_SEQ, frames(connection.sock)[-1][1]).text, "en direct")
+
+    def test_gap_is_flagged(self):
+        self.server.sessions.room("dev").messages = collections.deque(maxlen=2)
+        self.server.disconnect(self.alice)
+        for i in range(5):
+            self.server.handle_msg(self.bob, pack_string(f"message {i}"))
+
+        connection, _ = self._resume(self.alice.session, 1)
+
+        received = frames(connection.sock)
+        self.assertEqual(received[0], (RESUME_OK, encode_payload(RESUME_OK, RESUME_GAP)))
+        self.assertEqual(len(received), 3)
+
+    def test_unknown_token_allows_login(self):
+        connection, resumed = self._resume(bytes(SESSION_TOKEN_LEN), 0)
+
+        self.assertIs(resumed, connection)
+        self.assertEqual(frames(connection.sock)[0][0], LOGIN_ERR)
+        self.assertTrue(self.server.dispatch(connection, LOGIN, pack_login("Charlie", CAP_RESUME)))
+        self.assertTrue(connection.is_authenticated())
+
+    def test_grace_expiry_is_a_normal_departure(self):
+        self.server.disconnect(self.alice)
+        self.server.sessions.wheel.schedule(self.alice, 0)
+        self.server.sessions.wheel.advance()
+
+        self.assertNotIn("Alice", self.server.clients)
+        self.assertNotIn("Alice", self.server.room_members("dev"))
+        self.assertIn((ROOM_UPDATE, encode_payload(ROOM_UPDATE, "dev", "Alice", "leave")), frames(self.bob.sock))
+        self.assertEqual(self._resume(self.alice.session, 0)[1].state, STATE_CONNECTED)
+
+    def test_login_replaces_detached_session(self):
+        self.server.disconnect(self.alice)
+
+        client = login_client(self.server, "Alice", 0)
+
+        self.assertIs(self.server.clients["Alice"], client)
+        self.assertEqual(len(self.server.sessions), 0)
+
+    def test_kick_ends_session(self):
+        self.server.kick_client("Alice")
+
+        self.assertEqual(self._resume(self.alice.session, 0)[1].state, STATE_CONNECTED)
+
+
+class TestResumeTakeover(unittest.TestCase):
+    """
+    Le client voit la coupure avant le serveur : il reprend la session sur une
+    nouvelle connexion pendant que l'ancienne est encore ouverte côté serveur.
+    """
+
+    def setUp(self):
+        self.server = ChatServer(resume_grace=30.0)
+        self.sockets = []
+        self.threads = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        for thread in self.threads:
+            thread.join(2.0)
+        self.server.sessions.stop()
+
+    def _connect(self):
+        srv_sock, cli_sock = socket.socketpair()
+        cli_sock.settimeout(2.0)
+        self.sockets.append(cli_sock)
+        thread = threading.Thread(target=self.server.handle_client, args=(srv_sock,), daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return cli_sock
+
+    def test_resume_closes_previous_connection(self):
+        first, decoder = self._connect(), FrameDecoder()
+        first.sendall(pack_message(LOGIN, pack_login("Alice", CAP_RESUME)))
+        _, token = unpack_login_ok(recv_frame(first, decoder)[1])
+        first.sendall(encode_message(JOIN, "dev"))
+        join_seq = decode_payload(JOIN_OK, recv_frame(first, decoder)[1]).seq
+
+        second, decoder = self._connect(), FrameDecoder()
+        second.sendall(pack_message(RESUME, pack_resume(token, join_seq)))
+        self.assertEqual(recv_frame(second, decoder), (RESUME_OK, encode_payload(RESUME_OK, 0)))
+
+        # L'ancienne connexion est fermée par le serveur
+        self.assertIsNone(recv_frame(first, FrameDecoder()))
+
+        # La session continue sur la nouvelle, toujours dans son salon
+        second.sendall(encode_message(MSG, "toujours là"))
+        msg_type, payload = recv_frame(second, decoder)
+        self.assertEqual(msg_type, MSG_BROADCAST_SEQ)
+        self.assertEqual(decode_payload(MSG_BROADCAST_SEQ, payload).text, "toujours là")
+        self.assertEqual(self.server.room_members("dev"), ["Alice"])
+
+
+if __name__ == "__main__":
+    unittest.main()
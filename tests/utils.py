@@ -1,15 +1,61 @@
+import zlib
+from server.server import ClientContext
+from common.protocol import FILE_DATA, LOGIN, FrameDecoder, pack_login, pack_string, unpack_file_data
+
+
 class FakeSocket:
     def __init__(self):
         self.sent = []
         self.to_recv = []
+        self.shut_down = False
 
     def send(self, data):
         self.sent.append(data)
 
+    def sendall(self, data):
+        self.sent.append(data)
+
     def recv(self, n):
         if not self.to_recv:
             return b""
         return self.to_recv.pop(0)
 
+    def shutdown(self, how):
+        self.shut_down = True
+
     def close(self):
         pass
+
+
+def frames(sock: FakeSocket) -> list:
+    """Trames envoyées sur une FakeSocket (une écriture peut en contenir plusieurs)."""
+    decoder = FrameDecoder()
+    for data in sock.sent:
+        decoder.feed(bytes(data))
+    return list(decoder)
+
+
+def received_data(sock: FakeSocket) -> bytes:
+    """Octets du fichier reçus sur une FakeSocket, à leur position (CRC32 vérifié)."""
+    content = bytearray()
+    for msg_type, payload in frames(sock):
+        if msg_type == FILE_DATA:
+            _, offset, crc, data = unpack_file_data(payload)
+            assert zlib.crc32(data) == crc
+            content.extend(bytes(max(0, offset - len(content))))
+            content[offset:offset + len(data)] = data
+    return bytes(content)
+
+
+def login_client(server, pseudo: str, capabilities: int = None) -> ClientContext:
+    """Client authentifié sur une FakeSocket (LOGIN d'origine sans capacités)."""
+    client = ClientContext(FakeSocket())
+    server.handle_login(client, LOGIN, pack_login(pseudo, capabilities))
+    return client
+
+
+def join_client(server, pseudo: str, room_name: str = "musique") -> ClientContext:
+    """Client authentifié puis entré dans room_name."""
+    client = login_client(server, pseudo)
+    server.handle_join(client, pack_string(room_name))
+    return client